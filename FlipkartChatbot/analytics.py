@@ -0,0 +1,485 @@
+# analytics.py
+"""Per-turn chat analytics: one compact event per turn, rolled up per minute, hour and day.
+
+Every finished turn appends one fixed-size binary record (EVENT_FORMAT, 24
+bytes) to the day's segment under ``events/``: when it started, the query
+type (one of COMMON_QUERY_TYPES, or "Other"), the language, how it was
+answered (fast path, reply cache, speculation or the model), whether it
+ended in an error, time to first chunk and to the last one, and estimated
+prompt and reply tokens. The write is a single ``os.write`` to a file
+opened for appending, so several processes can share the directory.
+
+``RollupStore.update`` folds the events appended since the last update
+into per-day rollups, stored column by column (numpy .npz, one file per
+day and granularity):
+
+    rollups/minute/2024-01-24.npz   one row per (minute, intent, language, route)
+    rollups/hour/2024-01-24.npz     the same rows summed per hour
+    rollups/day/2024-01-24.npz      ... and per day
+
+A row holds sums (turns, errors, latency, tokens) and a latency histogram
+(LATENCY_BOUNDS_MS), so percentiles can be read from any sum of rows.
+The minute file records how far into the day's segment it has read; the
+hour and day files are always recomputed from it, so an update that dies
+halfway is repeated rather than counted twice. Raw events and minute
+rollups are deleted after ``raw_retention_days``; hour and day rollups are
+kept.
+
+Dashboards (analytics_dashboard.py) read only the rollups: 30 days at
+hourly resolution is 30 small files, whatever the traffic was.
+
+Keep the rollups up to date with:
+
+    python analytics.py --follow
+"""
+import argparse
+import io
+import logging
+import os
+import re
+import struct
+import threading
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from language_id import default_identifier
+from prompts import COMMON_QUERY_TYPES
+
+logger = logging.getLogger(__name__)
+
+QUERY_TYPES = tuple(COMMON_QUERY_TYPES) + ("Other",)
+LANGUAGES = ("en", "hi", "hinglish")
+# fast_path: intent router template; cache: reply cache; speculation: answered before it was asked
+ROUTES = ("fast_path", "cache", "speculation", "llm")
+# Routes that spend no upstream tokens on the turn; a speculation was answered by the model, only earlier
+LOCAL_ROUTES = ("fast_path", "cache")
+
+# Intent router intents that are already one of the query types
+FAST_PATH_QUERY_TYPES = {
+    "return_policy": "Return Policy",
+    "payment_methods": "Payment Options",
+    "order_status": "Order Status",
+}
+
+# (query type, pattern) in the order they are tried, English, Hinglish and Devanagari; the first match wins
+QUERY_TYPE_SIGNALS = [
+    ("Connect to Human Agent", r'\b(?:human|agent|representative|customer care|executive|real person|call me)\b'
+                               r'|एजेंट|इंसान|कस्टमर केयर|किसी से बात'),
+    ("Refund Status", r'\b(?:refund|money back|paise? (?:wapas|vapas))\b|रिफंड|पैसे वापस'),
+    ("Initiate Return", r'\b(?:initiate|start|raise|want to|wanna|how (?:do|can) i)\b.{0,30}\b(?:return|exchange|replace)'
+                        r'|\b(?:return|wapas|vapas) (?:karna|karo|krna)\b|वापस करना|रिटर्न करना|बदलना चाह'),
+    ("Return Policy", r'\b(?:return|exchange|replacement)|रिटर्न|वापसी'),
+    ("Warranty Information", r'\b(?:warrant(?:y|ies)|guarantee)\b|वारंटी|गारंटी'),
+    ("Payment Options", r'\b(?:pay|payment|upi|emi|cod|cash on delivery|net ?banking|wallets?|credit card|debit card)\b'
+                        r'|भुगतान|पेमेंट'),
+    ("Current Promotions", r'\b(?:offers?|discounts?|deals?|sale|coupons?|promo(?:tion)?s?|cashback)\b|ऑफर|छूट|डिस्काउंट|सेल'),
+    ("Delivery Time", r'\b(?:how long|how many days|delivery (?:time|date)|deliver(?:ed)? by|kitne din|kab tak)\b'
+                      r'|कितने दिन|कब तक'),
+    ("Track Delivery", r'\b(?:track(?:ing)?|shipment|courier|package|parcel|out for delivery)\b|TRK\d+|ट्रैक|पैकेज'),
+    ("Product Availability", r'\b(?:in stock|out of stock|available|availability|stock)\b|उपलब्ध|स्टॉक'),
+    ("Order Status", r'\b(?:orders?|status|where is|kahan|kab aayega)\b|ORD\d+|ऑर्डर|स्टेटस|कहाँ|कहां'),
+    ("Product Details", r'\b(?:price|specs?|specifications?|features?|details?|size|colou?r|rating|battery|compare|'
+                        r'tell me (?:more )?about)\b|कीमत|दाम|फीचर|के बारे में'),
+]
+_QUERY_TYPE_SIGNALS = [(QUERY_TYPES.index(name), re.compile(pattern, re.IGNORECASE))
+                       for name, pattern in QUERY_TYPE_SIGNALS]
+
+# at, intent, language, route, error, latency_ms, ttft_ms, prompt_tokens, completion_tokens
+EVENT_FORMAT = struct.Struct("<IBBBBffII")
+EVENT_DTYPE = np.dtype([("at", "<u4"), ("intent", "u1"), ("language", "u1"), ("route", "u1"), ("error", "u1"),
+                        ("latency_ms", "<f4"), ("ttft_ms", "<f4"), ("prompt_tokens", "<u4"),
+                        ("completion_tokens", "<u4")])
+SEGMENT_SUFFIX = ".events"
+
+GRANULARITIES = {"minute": 60, "hour": 3600, "day": 86400}
+# Upper bounds of the latency histogram's slots; the last slot is everything slower
+LATENCY_BOUNDS_MS = np.array([50, 100, 250, 500, 1000, 2000, 3000, 5000, 8000, 13000, 20000, 30000], dtype=np.float64)
+HISTOGRAM_SLOTS = len(LATENCY_BOUNDS_MS) + 1
+KEY_COLUMNS = ("bucket", "intent", "language", "route")
+SUM_COLUMNS = ("turns", "errors", "latency_ms_sum", "ttft_ms_sum", "prompt_tokens", "completion_tokens")
+COLUMN_TYPES = {"bucket": np.int64, "intent": np.uint8, "language": np.uint8, "route": np.uint8,
+                "turns": np.int32, "errors": np.int32, "latency_ms_sum": np.float64, "ttft_ms_sum": np.float64,
+                "prompt_tokens": np.int64, "completion_tokens": np.int64, "latency_hist": np.int32}
+
+assert EVENT_FORMAT.size == EVENT_DTYPE.itemsize
+
+
+def classify_query(text, fast_path_intent=None):
+    """Index into QUERY_TYPES for a user message"""
+    if fast_path_intent in FAST_PATH_QUERY_TYPES:
+        return QUERY_TYPES.index(FAST_PATH_QUERY_TYPES[fast_path_intent])
+    for index, pattern in _QUERY_TYPE_SIGNALS:
+        if pattern.search(text):
+            return index
+    return len(QUERY_TYPES) - 1
+
+
+def day_name(at):
+    """UTC date of an epoch time, as segments and rollup files are named"""
+    return time.strftime("%Y-%m-%d", time.gmtime(at))
+
+
+@dataclass
+class TurnEvent:
+    """One turn being recorded; the pipeline fills it in as the turn goes"""
+    text: str
+    route: str = "llm"
+    fast_path_intent: str = None
+    error: bool = False
+    prompt_tokens: int = 0
+    at: float = field(default_factory=time.time)
+    started: float = field(default_factory=time.perf_counter)
+    recorded = True
+
+    def set(self, **fields):
+        for name, value in fields.items():
+            setattr(self, name, value)
+
+
+class _NullEvent:
+    """Stands in for a turn when analytics are off"""
+    recorded = False
+
+    def set(self, **fields):
+        pass
+
+
+NULL_EVENT = _NullEvent()
+
+
+class EventLog:
+    """Appends event records to one segment per UTC day"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._fd = None
+        self._day = None
+        self._lock = threading.Lock()
+
+    def append(self, record, at):
+        day = day_name(at)
+        with self._lock:
+            if day != self._day:
+                self.close()
+                flags = os.O_WRONLY | os.O_APPEND | os.O_CREAT | getattr(os, "O_BINARY", 0)
+                self._fd = os.open(os.path.join(self.directory, day + SEGMENT_SUFFIX), flags, 0o644)
+                self._day = day
+            os.write(self._fd, record)
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd, self._day = None, None
+
+
+class Analytics:
+    """Records an event per turn under ``directory`` (nothing when it is None)"""
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.log = EventLog(os.path.join(directory, "events")) if directory else None
+
+    @property
+    def enabled(self):
+        return self.log is not None
+
+    def start(self, text):
+        return TurnEvent(text) if self.log is not None else NULL_EVENT
+
+    def observe_stream(self, chunks, event):
+        """Pass ``chunks`` through and record the turn once they end; unwrapped for NULL_EVENT"""
+        if not event.recorded:
+            return chunks
+        return self._observed(chunks, event)
+
+    def _observed(self, chunks, event):
+        first, reply_bytes = None, 0
+        try:
+            for chunk in chunks:
+                if first is None:
+                    first = time.perf_counter()
+                reply_bytes += len(chunk.encode("utf-8"))
+                yield chunk
+        except Exception:
+            event.error = True
+            raise
+        finally:
+            self.record(event, first, reply_bytes)
+
+    def observe_astream(self, chunks, event):
+        """``observe_stream`` for async iterators"""
+        if not event.recorded:
+            return chunks
+        return self._aobserved(chunks, event)
+
+    async def _aobserved(self, chunks, event):
+        first, reply_bytes = None, 0
+        try:
+            async for chunk in chunks:
+                if first is None:
+                    first = time.perf_counter()
+                reply_bytes += len(chunk.encode("utf-8"))
+                yield chunk
+        except Exception:
+            event.error = True
+            raise
+        finally:
+            self.record(event, first, reply_bytes)
+
+    def record(self, event, first=None, reply_bytes=0):
+        end = time.perf_counter()
+        record = EVENT_FORMAT.pack(
+            int(event.at), classify_query(event.text, event.fast_path_intent),
+            LANGUAGES.index(default_identifier().identify(event.text)), ROUTES.index(event.route), event.error,
+            (end - event.started) * 1000, ((first or end) - event.started) * 1000,
+            event.prompt_tokens, (reply_bytes + 3) // 4)
+        try:
+            self.log.append(record, event.at)
+        except OSError:
+            logger.exception("could not record a chat analytics event")
+
+
+def _grouped(columns):
+    """Sum the rows of ``columns`` that share KEY_COLUMNS; rows come out in key order"""
+    composite = (columns["bucket"].astype(np.int64) << 24 | columns["intent"].astype(np.int64) << 16
+                 | columns["language"].astype(np.int64) << 8 | columns["route"].astype(np.int64))
+    order = np.argsort(composite, kind="stable")
+    ordered = composite[order]
+    starts = np.flatnonzero(np.concatenate(([True], ordered[1:] != ordered[:-1]))) if len(ordered) else \
+        np.zeros(0, dtype=np.int64)
+    keys = ordered[starts]
+    rows = {"bucket": keys >> 24, "intent": keys >> 16 & 0xFF, "language": keys >> 8 & 0xFF, "route": keys & 0xFF}
+    for name in SUM_COLUMNS + ("latency_hist",):
+        values = columns[name][order]
+        rows[name] = np.add.reduceat(values, starts, axis=0) if len(starts) else values[:0]
+    return {name: rows[name].astype(COLUMN_TYPES[name], copy=False) for name in COLUMN_TYPES}
+
+
+def aggregate_events(events, seconds):
+    """Rollup rows for an array of EVENT_DTYPE records, in buckets of ``seconds``"""
+    hist = np.zeros((len(events), HISTOGRAM_SLOTS), dtype=np.int32)
+    hist[np.arange(len(events)), np.searchsorted(LATENCY_BOUNDS_MS, events["latency_ms"])] = 1
+    return _grouped({
+        "bucket": events["at"].astype(np.int64) // seconds * seconds,
+        "intent": events["intent"], "language": events["language"], "route": events["route"],
+        "turns": np.ones(len(events), dtype=np.int32), "errors": events["error"].astype(np.int32),
+        "latency_ms_sum": events["latency_ms"].astype(np.float64),
+        "ttft_ms_sum": events["ttft_ms"].astype(np.float64),
+        "prompt_tokens": events["prompt_tokens"].astype(np.int64),
+        "completion_tokens": events["completion_tokens"].astype(np.int64),
+        "latency_hist": hist,
+    })
+
+
+def regroup(parts, seconds):
+    """Rollup rows (one or more sets) summed into buckets of ``seconds``"""
+    columns = {name: np.concatenate([part[name] for part in parts]) for name in COLUMN_TYPES}
+    columns["bucket"] = columns["bucket"] // seconds * seconds
+    return _grouped(columns)
+
+
+def empty_rows():
+    rows = {name: np.zeros(0, dtype=dtype) for name, dtype in COLUMN_TYPES.items()}
+    rows["latency_hist"] = np.zeros((0, HISTOGRAM_SLOTS), dtype=np.int32)
+    return rows
+
+
+def latency_percentile(hist, q):
+    """Latency in ms below which a ``q`` fraction of turns fall, per row of histograms (NaN for no turns)"""
+    hist = np.atleast_2d(hist).astype(np.float64)
+    totals = hist.sum(axis=1)
+    cumulative = np.cumsum(hist, axis=1)
+    target = q * totals
+    slot = np.minimum((cumulative < target[:, None]).sum(axis=1), HISTOGRAM_SLOTS - 1)
+    rows = np.arange(len(hist))
+    lower = np.concatenate(([0.0], LATENCY_BOUNDS_MS))[slot]
+    # The open-ended last slot is reported at its lower bound
+    upper = np.concatenate((LATENCY_BOUNDS_MS, LATENCY_BOUNDS_MS[-1:]))[slot]
+    in_slot = hist[rows, slot]
+    before = cumulative[rows, slot] - in_slot
+    fraction = np.divide(target - before, in_slot, out=np.zeros_like(target), where=in_slot > 0)
+    return np.where(totals > 0, lower + fraction * (upper - lower), np.nan)
+
+
+def summarize(rows, by=("bucket",)):
+    """DataFrame of ``rows`` summed per ``by`` columns, with rates and latency percentiles.
+
+    Codes in intent, language and route become their names, and a
+    ``bucket`` column is joined by ``time`` (UTC). ``answered_locally`` is
+    the share of turns on ``LOCAL_ROUTES``, which spent no model tokens.
+    """
+    import pandas as pd
+
+    by = list(by)
+    composite = np.zeros(len(rows["turns"]), dtype=np.int64)
+    for name in by:
+        # Codes fit in 8 bits, bucket times in 40
+        composite = composite << (40 if name == "bucket" else 8) | rows[name].astype(np.int64)
+    _, first, inverse = np.unique(composite, return_index=True, return_inverse=True)
+    n = len(first)
+    sums = {name: np.bincount(inverse, weights=rows[name], minlength=n) for name in SUM_COLUMNS}
+    local_codes = [ROUTES.index(route) for route in LOCAL_ROUTES]
+    local = np.bincount(inverse, weights=np.where(np.isin(rows["route"], local_codes), rows["turns"], 0),
+                        minlength=n)
+    starts = np.concatenate(([0], np.cumsum(np.bincount(inverse, minlength=n))[:-1])) if n else inverse[:0]
+    hist = np.add.reduceat(rows["latency_hist"][np.argsort(inverse, kind="stable")], starts, axis=0) if n else \
+        np.zeros((0, HISTOGRAM_SLOTS))
+
+    frame = pd.DataFrame({name: rows[name][first].astype(np.int64) for name in by})
+    for name, labels in (("intent", QUERY_TYPES), ("language", LANGUAGES), ("route", ROUTES)):
+        if name in frame:
+            frame[name] = np.asarray(labels, dtype=object)[frame[name].to_numpy()]
+    if "bucket" in frame:
+        frame["time"] = pd.to_datetime(frame["bucket"], unit="s", utc=True)
+    turns = sums["turns"]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        frame["turns"] = turns.astype(np.int64)
+        frame["errors"] = sums["errors"].astype(np.int64)
+        frame["error_rate"] = sums["errors"] / turns
+        frame["answered_locally"] = local / turns
+        frame["avg_latency_ms"] = sums["latency_ms_sum"] / turns
+        frame["avg_ttft_ms"] = sums["ttft_ms_sum"] / turns
+        frame["p50_latency_ms"] = latency_percentile(hist, 0.5)
+        frame["p95_latency_ms"] = latency_percentile(hist, 0.95)
+        frame["prompt_tokens"] = sums["prompt_tokens"].astype(np.int64)
+        frame["completion_tokens"] = sums["completion_tokens"].astype(np.int64)
+        frame["tokens_per_turn"] = (sums["prompt_tokens"] + sums["completion_tokens"]) / turns
+    return frame
+
+
+def granularity_for(seconds, max_points=1500):
+    """The finest granularity that draws a span of ``seconds`` in at most ``max_points`` buckets"""
+    for name, size in GRANULARITIES.items():
+        if seconds / size <= max_points:
+            return name
+    return "day"
+
+
+class RollupStore:
+    """Minute, hour and day rollups of the events under ``directory``"""
+
+    def __init__(self, directory, raw_retention_days=7):
+        self.directory = directory
+        self.events_dir = os.path.join(directory, "events")
+        self.raw_retention_days = raw_retention_days
+        # day -> (segment offset, minute rows) as of the last update, so the current day isn't re-read each time
+        self._minutes = {}
+        self._lock = threading.Lock()
+
+    def _path(self, granularity, day):
+        return os.path.join(self.directory, "rollups", granularity, day + ".npz")
+
+    def _read(self, granularity, day):
+        """(rows, segment offset) of a rollup file, or (None, 0) if there isn't one"""
+        try:
+            with np.load(self._path(granularity, day)) as data:
+                return {name: data[name] for name in COLUMN_TYPES}, int(data["events_offset"])
+        except FileNotFoundError:
+            return None, 0
+
+    def _write(self, granularity, day, rows, offset):
+        path = self._path(granularity, day)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        buffer = io.BytesIO()
+        np.savez(buffer, events_offset=np.int64(offset), **rows)
+        temp = f"{path}.{os.getpid()}.tmp"
+        with open(temp, "wb") as f:
+            f.write(buffer.getbuffer())
+        os.replace(temp, path)
+
+    def update(self, now=None):
+        """Fold events appended since the last update into the rollups; returns what was done"""
+        started = time.perf_counter()
+        events = days = 0
+        with self._lock:
+            for name in sorted(os.listdir(self.events_dir)) if os.path.isdir(self.events_dir) else ():
+                if not name.endswith(SEGMENT_SUFFIX):
+                    continue
+                day = name[:-len(SEGMENT_SUFFIX)]
+                added = self._update_day(day, os.path.join(self.events_dir, name))
+                events += added
+                days += added > 0
+            pruned = self._prune(time.time() if now is None else now)
+        return {"events": events, "days": days, "pruned_days": pruned,
+                "seconds": round(time.perf_counter() - started, 3)}
+
+    def _update_day(self, day, segment):
+        offset, minutes = self._minutes.get(day) or (None, None)
+        if minutes is None:
+            minutes, offset = self._read("minute", day)
+        size = os.path.getsize(segment)
+        if size < offset:
+            logger.warning("analytics segment %s shrank; rebuilding its rollups", segment)
+            minutes, offset = None, 0
+        count = (size - offset) // EVENT_DTYPE.itemsize
+        if count == 0:
+            return 0
+        added = aggregate_events(np.fromfile(segment, dtype=EVENT_DTYPE, count=count, offset=offset),
+                                 GRANULARITIES["minute"])
+        minutes = added if minutes is None else regroup([minutes, added], GRANULARITIES["minute"])
+        end = offset + count * EVENT_DTYPE.itemsize
+        # Hour and day first: they are only ever derived from the minute file, which moves the offset last
+        for granularity in ("hour", "day"):
+            self._write(granularity, day, regroup([minutes], GRANULARITIES[granularity]), end)
+        self._write("minute", day, minutes, end)
+        self._minutes[day] = (end, minutes)
+        return count
+
+    def _prune(self, now):
+        """Delete raw segments and minute rollups of days past retention that are fully rolled up"""
+        cutoff = day_name(now - self.raw_retention_days * 86400)
+        pruned = 0
+        minute_dir = os.path.join(self.directory, "rollups", "minute")
+        days = {name[:-len(SEGMENT_SUFFIX)] for name in os.listdir(self.events_dir) if name.endswith(SEGMENT_SUFFIX)} \
+            if os.path.isdir(self.events_dir) else set()
+        days |= {name[:-4] for name in os.listdir(minute_dir) if name.endswith(".npz")} \
+            if os.path.isdir(minute_dir) else set()
+        for day in sorted(days):
+            if day >= cutoff:
+                continue
+            segment = os.path.join(self.events_dir, day + SEGMENT_SUFFIX)
+            if os.path.exists(segment):
+                if self._read("minute", day)[1] < os.path.getsize(segment) // EVENT_DTYPE.itemsize * EVENT_DTYPE.itemsize:
+                    continue
+                os.remove(segment)
+            if os.path.exists(self._path("minute", day)):
+                os.remove(self._path("minute", day))
+            self._minutes.pop(day, None)
+            pruned += 1
+        return pruned
+
+    def query(self, start, end, granularity="hour"):
+        """Rollup rows with ``start <= bucket < end`` (epoch seconds)"""
+        parts = []
+        day = int(start) // 86400 * 86400
+        while day < end:
+            rows, _ = self._read(granularity, day_name(day))
+            if rows is not None:
+                keep = (rows["bucket"] >= start) & (rows["bucket"] < end)
+                parts.append(rows if keep.all() else {name: values[keep] for name, values in rows.items()})
+            day += 86400
+        if not parts:
+            return empty_rows()
+        return parts[0] if len(parts) == 1 else {name: np.concatenate([p[name] for p in parts]) for name in COLUMN_TYPES}
+
+
+if __name__ == "__main__":
+    from config import ANALYTICS_DIR, ANALYTICS_RAW_RETENTION_DAYS, ANALYTICS_ROLLUP_SECONDS
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dir", default=ANALYTICS_DIR)
+    parser.add_argument("--follow", action="store_true", help="keep updating every ANALYTICS_ROLLUP_SECONDS")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    store = RollupStore(args.dir, ANALYTICS_RAW_RETENTION_DAYS)
+    while True:
+        result = store.update()
+        if result["events"] or not args.follow:
+            logger.info("rolled up %(events)d events over %(days)d days in %(seconds).3fs", result)
+        if not args.follow:
+            break
+        time.sleep(ANALYTICS_ROLLUP_SECONDS)
@@ -0,0 +1,162 @@
+# analytics_dashboard.py
+"""Admin dashboard over the chat analytics rollups (see analytics.py).
+
+    streamlit run analytics_dashboard.py --server.port 8600
+
+Every chart is drawn from the minute, hour or day rollups, whichever
+shows the chosen range in at most MAX_CHART_POINTS buckets, and never
+from raw events, so a range costs the same whatever the traffic was.
+Keep the rollups current with ``python analytics.py --follow``, or with
+the sidebar button. Times are UTC. The page has no login of its own: run
+it where only staff can reach it.
+"""
+import time
+
+import numpy as np
+import plotly.express as px
+import streamlit as st
+
+st.set_page_config(
+    page_title="Chat Analytics",
+    page_icon="📊",
+    layout="wide"
+)
+
+from analytics import GRANULARITIES, LANGUAGES, ROUTES, RollupStore, granularity_for, summarize
+from config import ANALYTICS_DIR, ANALYTICS_RAW_RETENTION_DAYS, ANALYTICS_ROLLUP_SECONDS
+
+RANGES = {
+    "Last hour": 3600,
+    "Last 24 hours": 86400,
+    "Last 7 days": 7 * 86400,
+    "Last 30 days": 30 * 86400,
+    "Last 90 days": 90 * 86400,
+}
+MAX_CHART_POINTS = 1500
+ROUTE_LABELS = {"fast_path": "Fast path", "cache": "Reply cache", "speculation": "Speculation", "llm": "Model"}
+
+
+@st.cache_resource
+def get_rollup_store():
+    return RollupStore(ANALYTICS_DIR, ANALYTICS_RAW_RETENTION_DAYS)
+
+
+# Summaries, not rows, are cached: a range's end only moves once per bucket, so reruns within it are free
+@st.cache_data(ttl=ANALYTICS_ROLLUP_SECONDS, show_spinner=False)
+def load_summaries(start, end, granularity, languages, routes):
+    rows = get_rollup_store().query(start, end, granularity)
+    if len(languages) < len(LANGUAGES) or len(routes) < len(ROUTES):
+        keep = (np.isin(rows["language"], [LANGUAGES.index(name) for name in languages])
+                & np.isin(rows["route"], [ROUTES.index(name) for name in routes]))
+        rows = {name: values[keep] for name, values in rows.items()}
+    return {
+        "total": summarize(rows, ()),
+        "over_time": summarize(rows, ("bucket",)),
+        "by_route": summarize(rows, ("bucket", "route")),
+        "by_intent_language": summarize(rows, ("intent", "language")),
+        "by_intent": summarize(rows, ("intent",)),
+    }
+
+
+def format_ms(value):
+    return "–" if value != value else f"{value / 1000:.2f} s" if value >= 1000 else f"{value:.0f} ms"
+
+
+st.title("📊 Chat Analytics")
+
+with st.sidebar:
+    range_name = st.selectbox("Range", list(RANGES), index=1)
+    granularity_choice = st.selectbox("Resolution", ["Auto"] + list(GRANULARITIES))
+    languages = tuple(st.multiselect("Language", LANGUAGES, default=LANGUAGES))
+    routes = tuple(st.multiselect("Answered by", ROUTES, default=ROUTES, format_func=ROUTE_LABELS.get))
+    if st.button("🔄 Roll up new events now"):
+        with st.spinner("Rolling up..."):
+            result = get_rollup_store().update()
+        load_summaries.clear()
+        st.success(f"{result['events']:,} new events in {result['seconds']:.2f}s")
+    st.caption(f"Rollups in `{ANALYTICS_DIR}`. Minute resolution covers the last "
+               f"{ANALYTICS_RAW_RETENTION_DAYS} days. Times are UTC.")
+
+span = RANGES[range_name]
+granularity = granularity_for(span, MAX_CHART_POINTS)
+if granularity_choice != "Auto":
+    if span / GRANULARITIES[granularity_choice] > MAX_CHART_POINTS * 10:
+        st.warning(f"{range_name} per {granularity_choice} is too many points to draw; showing it per "
+                   f"{granularity} instead.")
+    else:
+        granularity = granularity_choice
+if granularity == "minute" and span > ANALYTICS_RAW_RETENTION_DAYS * 86400:
+    st.info(f"Minute rollups are only kept for {ANALYTICS_RAW_RETENTION_DAYS} days; earlier minutes are empty.")
+size = GRANULARITIES[granularity]
+now = time.time()
+end = int(now) // size * size + size
+start = int(now - span) // size * size
+
+summaries = load_summaries(start, end, granularity, languages, routes)
+total = summaries["total"]
+
+if total.empty or not total["turns"].iloc[0]:
+    st.info("No turns recorded in this range yet. Turns are recorded by the chat app and chat_api.py; "
+            "run `python analytics.py --follow` to roll them up.")
+    st.stop()
+
+total = total.iloc[0]
+kpis = st.columns(6)
+kpis[0].metric("Turns", f"{int(total['turns']):,}")
+kpis[1].metric("Answered without the model", f"{total['answered_locally']:.1%}")
+kpis[2].metric("Error rate", f"{total['error_rate']:.2%}")
+kpis[3].metric("p50 latency", format_ms(total["p50_latency_ms"]))
+kpis[4].metric("p95 latency", format_ms(total["p95_latency_ms"]))
+kpis[5].metric("Tokens per turn", f"{total['tokens_per_turn']:.0f}")
+
+left, right = st.columns(2)
+with left:
+    by_route = summaries["by_route"].assign(route=lambda f: f["route"].map(ROUTE_LABELS))
+    figure = px.bar(by_route, x="time", y="turns", color="route", title=f"Turns per {granularity}",
+                    labels={"time": "", "turns": "Turns", "route": "Answered by"})
+    figure.update_layout(bargap=0, legend_orientation="h")
+    st.plotly_chart(figure, use_container_width=True)
+with right:
+    over_time = summaries["over_time"]
+    figure = px.line(over_time, x="time", y=["p50_latency_ms", "p95_latency_ms", "avg_ttft_ms"],
+                     title="Reply latency (ms)", labels={"time": "", "value": "ms", "variable": ""})
+    figure.for_each_trace(lambda trace: trace.update(name={"p50_latency_ms": "p50", "p95_latency_ms": "p95",
+                                                           "avg_ttft_ms": "avg. first chunk"}[trace.name]))
+    figure.update_layout(legend_orientation="h")
+    st.plotly_chart(figure, use_container_width=True)
+
+left, right = st.columns(2)
+with left:
+    figure = px.bar(summaries["by_intent_language"], y="intent", x="turns", color="language", orientation="h",
+                    title="What customers ask", labels={"intent": "", "turns": "Turns", "language": "Language"})
+    figure.update_layout(yaxis={"categoryorder": "total ascending"}, legend_orientation="h")
+    st.plotly_chart(figure, use_container_width=True)
+with right:
+    figure = px.line(over_time, x="time", y=["answered_locally", "error_rate"], title="Answered without the model, errors",
+                     labels={"time": "", "value": "", "variable": ""})
+    figure.for_each_trace(lambda trace: trace.update(name={"answered_locally": "answered without the model",
+                                                           "error_rate": "error rate"}[trace.name]))
+    figure.update_layout(yaxis_tickformat=".0%", legend_orientation="h")
+    st.plotly_chart(figure, use_container_width=True)
+
+figure = px.area(over_time, x="time", y=["prompt_tokens", "completion_tokens"], title=f"Tokens per {granularity}",
+                 labels={"time": "", "value": "Tokens", "variable": ""})
+figure.update_layout(legend_orientation="h")
+st.plotly_chart(figure, use_container_width=True)
+
+st.subheader("By query type")
+by_intent = summaries["by_intent"].sort_values("turns", ascending=False)
+st.dataframe(
+    by_intent[["intent", "turns", "answered_locally", "error_rate", "p50_latency_ms", "p95_latency_ms",
+               "tokens_per_turn"]],
+    hide_index=True, use_container_width=True,
+    column_config={
+        "intent": "Query type",
+        "turns": st.column_config.NumberColumn("Turns", format="%d"),
+        "answered_locally": st.column_config.ProgressColumn("Without the model", format="%.2f", min_value=0,
+                                                            max_value=1),
+        "error_rate": st.column_config.NumberColumn("Error rate", format="%.4f"),
+        "p50_latency_ms": st.column_config.NumberColumn("p50 ms", format="%.0f"),
+        "p95_latency_ms": st.column_config.NumberColumn("p95 ms", format="%.0f"),
+        "tokens_per_turn": st.column_config.NumberColumn("Tokens/turn", format="%.0f"),
+    })
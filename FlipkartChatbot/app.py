@@ -2,11 +2,9 @@
 import streamlit as st
 import json
 import os
+import time
 import uuid
 from datetime import datetime
-from pathlib import Path
-import re
-from groq import Groq
 
 # Set page config FIRST, before any other Streamlit commands
 st.set_page_config(
@@ -21,8 +19,20 @@ CHAT_HISTORY_DIR = "chat_history"
 os.makedirs(CHAT_HISTORY_DIR, exist_ok=True)
 
 # Import configurations and prompts
-from config import GROQ_API_KEY, GROQ_MODEL_NAME
-from prompts import SYSTEM_PROMPT, PRODUCT_DATA_INSTRUCTION, ORDER_DATA_INSTRUCTION
+from config import (CHAT_API_URL, CHAT_DB_PATH, CHAT_PAGE_SIZE, CHAT_SEARCH_RESULTS, HISTORY_RENDER_WINDOW,
+                    CHAT_API_TOKEN, STREAM_RENDER_INTERVAL_MS, SESSION_BACKEND, SESSION_DB_PATH, SESSION_LEASE_SECONDS,
+                    SESSION_MAX_AGE_DAYS, TRACE_SAMPLE_RATE, TRACE_LOG_PATH, METRICS_ENABLED, METRICS_HOST,
+                    METRICS_PORT, SPECULATION_ENABLED, SPECULATION_SESSION_TOKEN_BUDGET, SPECULATION_MAX_QUEUE_DEPTH,
+                    SPECULATION_WORKERS)
+from conversation_memory import ConversationSummary
+from conversation_store import ConversationStore
+from chat_pipeline import ChatPipeline, create_groq_gateway
+from language_id import detect_language
+from chat_client import ChatApiClient
+from stream_renderer import StreamRenderer
+from session_store import create_session_store
+from telemetry import Telemetry, serve_metrics
+from speculation import SpeculationEngine
 
 # Custom CSS for modern aesthetic
 st.markdown("""
@@ -83,24 +93,6 @@ st.markdown("""
 
 
 # --- Helper Functions ---
-def detect_language(text):
-    """Detect if text is in Hindi or English"""
-    devanagari_pattern = re.compile(r'[\u0900-\u097F]')
-    if devanagari_pattern.search(text):
-        return "hi"
-
-    hindi_words = ['mera', 'kya', 'kahan', 'kaise', 'hai', 'mein', 'ka', 'ki', 'ko', 'aur', 'order', 'karna', 'chahta',
-                   'chahte']
-    text_lower = text.lower()
-
-    hindi_indicators = sum(1 for word in hindi_words if word in text_lower)
-    english_words = ['the', 'and', 'or', 'but', 'what', 'how', 'where', 'when', 'why', 'is', 'are', 'can', 'do', 'does',
-                     'will', 'would', 'should', 'could']
-    english_indicators = sum(1 for word in english_words if word in text_lower)
-
-    return "hi" if hindi_indicators > english_indicators else "en"
-
-
 def text_to_speech_js(text):
     """Generate JavaScript for text-to-speech"""
     clean_text = text.replace('\n', ' ').replace('*', '').replace('#', '').replace('`', '')
@@ -136,50 +128,20 @@ def scroll_to_bottom_js():
     """
 
 
-def get_chat_preview(messages):
-    """Generate a preview snippet from chat messages"""
-    if not messages:
-        return "No messages"
-
-    user_msg = next((m for m in messages if m['role'] == 'user'), None)
-    assistant_msg = next((m for m in messages if m['role'] == 'assistant'), None)
-
-    preview = ""
-    if user_msg:
-        preview += f"Q: {user_msg['content'][:50]}"
-        if len(user_msg['content']) > 50:
-            preview += "..."
-    if assistant_msg:
-        preview += f"\nA: {assistant_msg['content'][:50]}"
-        if len(assistant_msg['content']) > 50:
-            preview += "..."
-    return preview
+def load_saved_chats():
+    """Load the first page of saved chats for the sidebar"""
+    st.session_state.saved_chats, st.session_state.saved_chats_cursor = conversation_store.list_chats(CHAT_PAGE_SIZE)
 
 
-def load_saved_chats():
-    """Load all saved chats from the chat history directory"""
-    saved_chats = []
-    for file in Path(CHAT_HISTORY_DIR).glob("*.json"):
-        try:
-            with open(file, 'r') as f:
-                chat_data = json.load(f)
-                saved_chats.append({
-                    'id': file.stem,
-                    'title': chat_data.get('title', 'Untitled Chat'),
-                    'timestamp': chat_data.get('timestamp'),
-                    'preview': get_chat_preview(chat_data['messages'])
-                })
-        except Exception as e:
-            st.error(f"Error loading chat {file}: {e}")
-    st.session_state.saved_chats = sorted(
-        saved_chats,
-        key=lambda x: x.get('timestamp', ''),
-        reverse=True
-    )
+def load_more_saved_chats():
+    """Append the next page of saved chats (keyset pagination on timestamp, id)"""
+    chats, st.session_state.saved_chats_cursor = conversation_store.list_chats(
+        CHAT_PAGE_SIZE, st.session_state.saved_chats_cursor)
+    st.session_state.saved_chats.extend(chats)
 
 
 def save_current_chat(title=None):
-    """Save the current chat to a JSON file"""
+    """Save the current chat; only messages added since the last save are written"""
     if not st.session_state.messages:
         st.warning("No messages to save")
         return
@@ -188,16 +150,7 @@ def save_current_chat(title=None):
         first_user_msg = next((m for m in st.session_state.messages if m['role'] == 'user'), None)
         title = first_user_msg['content'][:30] + "..." if first_user_msg else "Untitled Chat"
 
-    chat_data = {
-        'id': st.session_state.current_chat_id,
-        'title': title,
-        'timestamp': datetime.now().isoformat(),
-        'messages': st.session_state.messages
-    }
-
-    file_path = os.path.join(CHAT_HISTORY_DIR, f"{st.session_state.current_chat_id}.json")
-    with open(file_path, 'w') as f:
-        json.dump(chat_data, f, indent=2)
+    conversation_store.save_chat(st.session_state.current_chat_id, title, st.session_state.messages)
 
     load_saved_chats()
     st.success(f"Chat saved as '{title}'")
@@ -205,16 +158,24 @@ def save_current_chat(title=None):
 
 def load_chat(chat_id):
     """Load a chat from history"""
-    file_path = os.path.join(CHAT_HISTORY_DIR, f"{chat_id}.json")
     try:
-        with open(file_path, 'r') as f:
-            chat_data = json.load(f)
-            st.session_state.messages = chat_data['messages']
-            st.session_state.current_chat_id = chat_id
-            st.session_state.auto_scroll = True
-            st.rerun()
+        messages = conversation_store.load_messages(chat_id)
     except Exception as e:
         st.error(f"Error loading chat: {e}")
+        return
+    if messages is None:
+        st.error("Chat not found")
+        return
+    st.session_state.messages = messages
+    st.session_state.conversation_summary = ConversationSummary()
+    st.session_state.current_chat_id = chat_id
+    st.session_state.processing = False
+    if speculation_engine is not None:
+        speculation_engine.cancel(st.session_state.session_id)
+    persist_session()
+    st.session_state.history_window = HISTORY_RENDER_WINDOW
+    st.session_state.auto_scroll = True
+    st.rerun()
 
 
 def start_new_chat():
@@ -223,54 +184,114 @@ def start_new_chat():
         "role": "assistant",
         "content": "👋 Hello! I'm Chatbot. How can I help you today?"
     }]
+    st.session_state.conversation_summary = ConversationSummary()
     st.session_state.current_chat_id = str(uuid.uuid4())
+    st.session_state.processing = False
+    if speculation_engine is not None:
+        speculation_engine.cancel(st.session_state.session_id)
+    persist_session()
+    st.session_state.history_window = HISTORY_RENDER_WINDOW
     st.session_state.auto_scroll = True
     st.rerun()
 
 
-# --- Data Loading ---
-@st.cache_data
-def load_product_data():
-    try:
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        data_path = os.path.join(current_dir, "data", "products.json")
-        with open(data_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        st.error("products.json not found. Make sure it's in the 'data/' directory.")
-        return []
-    except json.JSONDecodeError:
-        st.error("Error decoding products.json. Please check file format.")
-        return []
-
-
-@st.cache_data
-def load_order_data():
+def store_conversation(session):
+    """Copy this tab's conversation into a Session about to be saved"""
+    session.messages = st.session_state.messages
+    session.chat_id = st.session_state.current_chat_id
+    session.summary_text, session.summary_covered = st.session_state.conversation_summary.snapshot()
+
+
+def adopt_session(session):
+    """Show the stored conversation (saved by another worker or tab, or before a restart)"""
+    st.session_state.messages = session.messages
+    st.session_state.current_chat_id = session.chat_id or st.session_state.current_chat_id
+    summary = ConversationSummary()
+    summary.update(session.summary_text, session.summary_covered)
+    st.session_state.conversation_summary = summary
+    st.session_state.session_version = session.version
+
+
+def persist_session():
+    """Overwrite the stored session with this tab's conversation (New Chat, loading a saved chat).
+
+    Any claim is dropped, so a reply still being written elsewhere for the old conversation is discarded.
+    """
+    def replace_conversation(session):
+        store_conversation(session)
+        session.processing_owner, session.processing_until = "", 0.0
+
+    st.session_state.session_version = session_store.update(
+        st.session_state.session_id, replace_conversation).version
+
+
+def show_earlier_messages():
+    """Render another window's worth of older messages"""
+    st.session_state.history_window += HISTORY_RENDER_WINDOW
+
+
+# Traces and metrics for every session in this process; /metrics is served from a background thread
+@st.cache_resource
+def get_telemetry():
+    telemetry = Telemetry(TRACE_SAMPLE_RATE, TRACE_LOG_PATH, METRICS_ENABLED)
+    if METRICS_ENABLED:
+        serve_metrics(telemetry, METRICS_HOST, METRICS_PORT)
+    return telemetry
+
+
+# The shared pipeline owns the Groq client (one connection pool and rate limiter per process) and the
+# data layer, which picks up changes to data/*.json and data/deltas/*.jsonl without a restart
+@st.cache_resource
+def get_chat_pipeline():
+    return ChatPipeline.from_data_files(create_groq_gateway(), telemetry=get_telemetry())
+
+
+# Quick actions offered under a reply are answered in the background while it is read
+@st.cache_resource
+def get_speculation_engine():
+    return SpeculationEngine(get_chat_pipeline(), SPECULATION_SESSION_TOKEN_BUDGET,
+                             workers=SPECULATION_WORKERS, max_queue_depth=SPECULATION_MAX_QUEUE_DEPTH)
+
+
+# With CHAT_API_URL set, replies come from chat_api.py and this script only renders
+@st.cache_resource
+def get_chat_api_client():
+    return ChatApiClient(CHAT_API_URL, CHAT_API_TOKEN)
+
+
+telemetry = get_telemetry()
+chat_pipeline = None
+chat_api_client = None
+speculation_engine = None
+if CHAT_API_URL:
+    chat_api_client = get_chat_api_client()
+else:
     try:
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        data_path = os.path.join(current_dir, "data", "orders.json")
-        with open(data_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        st.warning("orders.json not found. Creating sample order data.")
-        return []
-    except json.JSONDecodeError:
-        st.error("Error decoding orders.json. Please check file format.")
-        return []
-
-
-products = load_product_data()
-orders = load_order_data()
-
-# Prepare data for LLM
-product_info_for_llm = json.dumps(products, indent=2)
-order_info_for_llm = json.dumps(orders, indent=2)
-
-system_prompt_with_data = (
-        SYSTEM_PROMPT + "\n\n" +
-        PRODUCT_DATA_INSTRUCTION.format(product_data=product_info_for_llm) + "\n\n" +
-        ORDER_DATA_INSTRUCTION.format(order_data=order_info_for_llm)
-)
+        chat_pipeline = get_chat_pipeline()
+    except Exception as e:
+        st.error(f"Failed to initialize Groq client. Please check your API key: {e}")
+        st.stop()
+    if SPECULATION_ENABLED:
+        speculation_engine = get_speculation_engine()
+
+@st.cache_resource
+def get_conversation_store():
+    store = ConversationStore(CHAT_DB_PATH)
+    # One-off import of chats saved as JSON files by earlier versions
+    store.migrate_json_dir(CHAT_HISTORY_DIR)
+    return store
+
+
+conversation_store = get_conversation_store()
+
+
+# Conversation state shared by every worker (see session_store.py); SESSION_BACKEND=sqlite to share across processes
+@st.cache_resource
+def get_session_store():
+    return create_session_store(SESSION_BACKEND, SESSION_DB_PATH, SESSION_MAX_AGE_DAYS * 86400)
+
+
+session_store = get_session_store()
 
 # --- Session State Initialization ---
 if "messages" not in st.session_state:
@@ -285,6 +306,7 @@ if "current_chat_id" not in st.session_state:
 
 if "saved_chats" not in st.session_state:
     st.session_state.saved_chats = []
+    st.session_state.saved_chats_cursor = None
     load_saved_chats()
 
 if "voice_enabled" not in st.session_state:
@@ -298,34 +320,39 @@ if "processing" not in st.session_state:
 if "auto_scroll" not in st.session_state:
     st.session_state.auto_scroll = False
 
-# Initialize Groq client
-try:
-    client = Groq(api_key=GROQ_API_KEY)
-except Exception as e:
-    st.error(f"Failed to initialize Groq client. Please check your API key: {e}")
-    st.stop()
-
-
-# --- Response Generation Functions ---
-def generate_response_stream(api_messages_payload):
-    """Generate AI response and stream it."""
-    try:
-        stream = client.chat.completions.create(
-            model=GROQ_MODEL_NAME,
-            messages=api_messages_payload,
-            stream=True,
-            temperature=0.7,
-            max_tokens=800
-        )
-        for chunk in stream:
-            if chunk.choices[0].delta.content is not None:
-                yield chunk.choices[0].delta.content
-    except Exception as e:
-        yield f"😔 I apologize, but I encountered an error: {e}."
-
-
-def add_quick_action_buttons_streamlit(response_text, user_lang="en", message_index=0):
-    """Add contextual quick action buttons using Streamlit buttons"""
+if "conversation_summary" not in st.session_state:
+    st.session_state.conversation_summary = ConversationSummary()
+
+if "last_context_stats" not in st.session_state:
+    st.session_state.last_context_stats = None
+
+if "history_window" not in st.session_state:
+    st.session_state.history_window = HISTORY_RENDER_WINDOW
+
+# The session id is kept in the URL, so a reload, or another worker behind a load balancer, resumes the conversation
+if "session_id" not in st.session_state:
+    st.session_state.session_id = st.query_params.get("session") or str(uuid.uuid4())
+    st.query_params["session"] = st.session_state.session_id
+    st.session_state.session_owner = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    st.session_state.session_version = 0
+
+stored_session = session_store.get(st.session_state.session_id)
+if stored_session is None:
+    persist_session()
+elif stored_session.version != st.session_state.session_version:
+    adopt_session(stored_session)
+# Another worker (or tab) is writing the reply; this one waits for it instead of answering twice
+answering_elsewhere = (stored_session is not None and stored_session.processing
+                       and stored_session.processing_owner != st.session_state.session_owner)
+if stored_session is not None and stored_session.awaiting_reply and not st.session_state.processing:
+    # The worker that was answering died; pick the turn up here
+    claimed = session_store.claim(st.session_state.session_id, st.session_state.session_owner, SESSION_LEASE_SECONDS)
+    if claimed is not None:
+        st.session_state.session_version = claimed.version
+        st.session_state.processing = True
+
+def quick_actions(response_text, user_lang="en"):
+    """(label, prompt) follow-ups offered under a reply"""
     buttons_to_show = []
 
     if any(word in response_text.lower() for word in ['return', 'refund', 'रिटर्न']):
@@ -345,9 +372,22 @@ def add_quick_action_buttons_streamlit(response_text, user_lang="en", message_in
             buttons_to_show.append(("📦 दूसरा ऑर्डर ट्रैक करें", "मैं दूसरा ऑर्डर ट्रैक करना चाहता हूं"))
         else:
             buttons_to_show.append(("📦 Track Another Order", "I want to track another order"))
+    return buttons_to_show
+
 
+def choose_quick_action(prompt):
+    st.session_state.quick_action_prompt = prompt
 
 
+def add_quick_action_buttons_streamlit(response_text, user_lang="en", message_index=0):
+    """Add contextual quick action buttons using Streamlit buttons"""
+    buttons_to_show = quick_actions(response_text, user_lang)
+    if not buttons_to_show:
+        return
+    for column, (j, (label, prompt)) in zip(st.columns(len(buttons_to_show)), enumerate(buttons_to_show)):
+        with column:
+            st.button(label, key=f"quick_{message_index}_{j}", on_click=choose_quick_action, args=(prompt,))
+
 
 # --- UI Layout ---
 st.markdown("""
@@ -359,25 +399,49 @@ st.markdown("""
 
 # --- Process New User Input ---
 new_user_prompt_content = None
+quick_action_prompt = st.session_state.pop("quick_action_prompt", None)
+if quick_action_prompt and not st.session_state.processing and not answering_elsewhere:
+    new_user_prompt_content = quick_action_prompt
 
 
+if answering_elsewhere:
+    st.info("⏳ This conversation is being answered in another window. Refresh in a moment to see the reply.")
 
 typed_prompt = st.chat_input("💬 Ask me anything about your order, products, or services...",
-                             disabled=st.session_state.processing,
+                             disabled=st.session_state.processing or answering_elsewhere,
                              key="chat_input_main")
 if typed_prompt and not st.session_state.processing:
     new_user_prompt_content = typed_prompt
 
+turn_trace = None
 if new_user_prompt_content:
-    st.session_state.messages.append({"role": "user", "content": new_user_prompt_content})
-    st.session_state.processing = True
+    turn_trace = telemetry.start_trace("turn", session=st.session_state.session_id)
+
+    # The message and the processing claim are saved together, so a worker that dies mid-reply leaves the turn
+    # unanswered but claimable
+    def add_user_message(session):
+        session.messages.append({"role": "user", "content": new_user_prompt_content})
+
+    with turn_trace.span("input"):
+        claimed = session_store.claim(st.session_state.session_id, st.session_state.session_owner,
+                                      SESSION_LEASE_SECONDS, add_user_message)
+    if claimed is None:
+        st.warning("Another window is still answering this conversation; your message wasn't sent.")
+    else:
+        adopt_session(claimed)
+        st.session_state.processing = True
 
 # Main chat area
 col1, col2 = st.columns([3, 1])
 
 with col1:
-    # Display chat messages
-    for i, message in enumerate(st.session_state.messages):
+    # Display chat messages; only the latest window is rendered on each rerun, older ones on request
+    messages = st.session_state.messages
+    first_visible = max(0, len(messages) - st.session_state.history_window)
+    if first_visible:
+        st.button(f"⬆️ Show earlier messages ({first_visible} hidden)", on_click=show_earlier_messages)
+    for i in range(first_visible, len(messages)):
+        message = messages[i]
         with st.chat_message(message["role"]):
             st.markdown(message["content"])
             if message["role"] == "assistant" and i > 0:
@@ -393,40 +457,69 @@ with col1:
     # Generate bot response
     if st.session_state.processing and st.session_state.messages[-1]["role"] == "user":
         with st.chat_message("assistant"):
-            message_placeholder = st.empty()
-            message_placeholder.markdown("Typing... ⏳")
-            full_response = ""
-
-            api_messages_payload = [{"role": "system", "content": system_prompt_with_data}]
-            history_plus_current = st.session_state.messages[-9:]
-            for msg_content in history_plus_current:
-                api_messages_payload.append({"role": msg_content["role"], "content": msg_content["content"]})
-
+            # Batches chunks and re-sends only the unfinished block, not the whole reply, per update
+            renderer = StreamRenderer(st.container(), interval=STREAM_RENDER_INTERVAL_MS / 1000,
+                                      placeholder="Typing... ⏳")
+
+            # A turn picked up from a worker that died has no input stage
+            trace = turn_trace or telemetry.start_trace("turn", session=st.session_state.session_id, recovered=True)
+            if chat_api_client is not None:
+                turn = chat_api_client.respond(st.session_state.messages, st.session_state.current_chat_id)
+                # The API process records its own stages; here the stream is timed as the UI sees it
+                chunks = telemetry.observe_stream(turn.chunks, trace)
+            else:
+                # A quick action answered in the background is replayed; any other message cancels those
+                turn = None
+                if speculation_engine is not None:
+                    turn = speculation_engine.take(st.session_state.session_id, st.session_state.messages)
+                    trace.set(speculated=turn is not None)
+                if turn is None:
+                    turn = chat_pipeline.respond(st.session_state.messages, st.session_state.conversation_summary,
+                                                 trace)
+                chunks = turn.chunks
+            if turn.context_stats:
+                st.session_state.last_context_stats = turn.context_stats
+            render_started = time.perf_counter()
             try:
-                for content_chunk in generate_response_stream(api_messages_payload):
-                    full_response += content_chunk
-                    message_placeholder.markdown(full_response + "▌")
-                message_placeholder.markdown(full_response)
+                for content_chunk in chunks:
+                    renderer.write(content_chunk)
+                full_response = renderer.close()
             except Exception as e:
+                telemetry.count_error(e)
                 full_response = f"😔 I apologize, but I encountered an error: {e}."
-                message_placeholder.error(full_response)
+                renderer.error(full_response)
+            # Total time spent drawing, from the start of the stream
+            trace.add_span("render", render_started, render_started + renderer.render_seconds,
+                           flushes=renderer.flushes)
 
             st.session_state.messages.append({"role": "assistant", "content": full_response})
+            if chat_pipeline is not None:
+                chat_pipeline.finish(st.session_state.messages, st.session_state.conversation_summary)
+            if speculation_engine is not None:
+                offered = quick_actions(full_response, detect_language(st.session_state.messages[-2]["content"]))
+                speculation_engine.speculate(st.session_state.session_id, st.session_state.messages,
+                                             st.session_state.conversation_summary,
+                                             [prompt for _, prompt in offered])
             st.session_state.processing = False
+            with trace.span("save"):
+                released = session_store.release(st.session_state.session_id, st.session_state.session_owner,
+                                                 store_conversation)
+            if released is not None:
+                st.session_state.session_version = released.version
+            # else: the claim expired and another worker took the turn over; the next run shows its reply
+            trace.finish()
             st.session_state.auto_scroll = True
             st.rerun()
 
 def delete_chat(chat_id):
     """Delete a saved chat from history"""
     try:
-        file_path = os.path.join(CHAT_HISTORY_DIR, f"{chat_id}.json")
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        if conversation_store.delete_chat(chat_id):
             load_saved_chats()  # Refresh the chat list
             st.success("Chat deleted successfully!")
             st.rerun()
         else:
-            st.error("Chat file not found")
+            st.error("Chat not found")
     except Exception as e:
         st.error(f"Error deleting chat: {e}")
 
@@ -448,6 +541,27 @@ with st.sidebar:
             if st.button("Save", disabled=not chat_title):
                 save_current_chat(chat_title)
 
+    st.markdown("### 🔍 Search Chats")
+    search_query = st.text_input("Search saved chats", key="chat_search_query", label_visibility="collapsed",
+                                 placeholder="headphone refund, रिफंड, kharab...")
+    if search_query.strip():
+        search_started = time.perf_counter()
+        try:
+            search_results = conversation_store.search(search_query, CHAT_SEARCH_RESULTS, "**", "**")
+        except Exception as e:
+            search_results = []
+            st.error(f"Error searching chats: {e}")
+        st.caption(f"{len(search_results)} chats found in {(time.perf_counter() - search_started) * 1000:.0f} ms")
+        for result in search_results:
+            col1, col2 = st.columns([5, 1])
+            with col1:
+                st.markdown(f"**{result['title']}** · {result['timestamp'][:16].replace('T', ' ')}")
+                st.caption(("🧑 " if result['role'] == 'user' else "🤖 ") + result['snippet'])
+            with col2:
+                if st.button("↩️", key=f"search_load_{result['id']}"):
+                    load_chat(result['id'])
+        st.divider()
+
     st.markdown("### 📂 Recent Chats")
     if not st.session_state.saved_chats:
         st.info("No saved chats yet")
@@ -468,6 +582,67 @@ with st.sidebar:
 
             st.divider()
 
+        if st.session_state.saved_chats_cursor is not None:
+            st.button("⬇️ Load more", on_click=load_more_saved_chats, use_container_width=True)
+
+    if st.session_state.last_context_stats:
+        stats = st.session_state.last_context_stats
+        st.caption(
+            f"📊 Last prompt: {stats.order_records} orders, {stats.product_records} products, "
+            f"~{stats.prompt_tokens} tokens ({stats.history_tokens} history + {stats.data_tokens} data"
+            f" of {stats.token_budget})"
+            + (" · truncated" if stats.truncated else "")
+            + (f" · prompt {stats.prompt_hash[:8]}" if stats.prompt_hash else "")
+            + (f" · {stats.model}" if stats.model else ""))
+
+    if chat_pipeline is not None:
+        data_stats = chat_pipeline.data.stats()
+        st.caption(f"🗂️ Data v{data_stats['generation']} ({data_stats['version'][:8]}): "
+                   f"{data_stats['orders']} orders, {data_stats['products']} products")
+        if data_stats['last_error']:
+            st.warning(f"Data reload failed, still serving the previous version: {data_stats['last_error']}")
+
+    if chat_pipeline is not None and chat_pipeline.intent_router.total:
+        st.caption("⚡ Fast path: " + ", ".join(
+            f"{intent} {rate:.0%}" for intent, rate in chat_pipeline.intent_router.hit_rates().items()))
+
+    tool_stats = chat_pipeline.tools.stats() if chat_pipeline is not None else {}
+    if tool_stats.get('calls'):
+        st.caption(
+            f"🧰 Tools: {tool_stats['calls']} calls, {tool_stats.get('cache_hits', 0)} answered from the turn cache, "
+            f"{tool_stats.get('errors', 0)} errors")
+
+    cache_stats = chat_pipeline.response_cache.stats() if chat_pipeline is not None else {}
+    if cache_stats.get('misses') or cache_stats.get('hits'):
+        st.caption(
+            f"🗃️ Reply cache: {cache_stats['hit_rate']:.0%} hits, {cache_stats['entries']} entries, "
+            f"{cache_stats.get('evictions', 0)} evicted")
+
+    gateway_stats = chat_pipeline.gateway.stats() if chat_pipeline is not None else {}
+    if gateway_stats.get('scheduler_admitted'):
+        st.caption(
+            f"⏱️ Upstream queue: {gateway_stats['scheduler_queue_depth']} waiting, "
+            f"mean wait {gateway_stats['scheduler_mean_wait_seconds'] * 1000:.0f} ms, "
+            f"{gateway_stats.get('retries', 0)} retries")
+
+    model_stats = chat_pipeline.model_router.stats()["models"] if chat_pipeline is not None else {}
+    if model_stats:
+        st.caption("🔀 Models: " + ", ".join(
+            f"{model} {entry['requests']} requests ({entry['fallback_rate']:.0%} fell back"
+            + (f", p50 first token {entry['ttft_p50_ms']:.0f} ms" if 'ttft_p50_ms' in entry else "") + ")"
+            for model, entry in model_stats.items()))
+
+    speculation_stats = speculation_engine.stats() if speculation_engine is not None else {}
+    if speculation_stats.get('done'):
+        st.caption(
+            f"🔮 Speculation: {speculation_stats['hit_rate']:.0%} of follow-ups answered ahead, "
+            f"{speculation_stats.get('used_tokens', 0)} tokens used, {speculation_stats.get('wasted_tokens', 0)} wasted")
+
+    if chat_pipeline is not None and chat_pipeline.single_flight.metrics['coalesced']:
+        st.caption(
+            f"🔗 Coalesced {chat_pipeline.single_flight.metrics['coalesced']} requests onto "
+            f"{chat_pipeline.single_flight.metrics['upstream']} upstream streams")
+
     # Import/Export
     with st.expander("🔄 Import/Export"):
         if st.session_state.messages:
@@ -487,15 +662,25 @@ with st.sidebar:
             )
 
         uploaded_file = st.file_uploader("📥 Import Chat", type=["json"])
-        if uploaded_file is not None:
+        # The uploader keeps its file across reruns; import each upload once
+        if uploaded_file is not None and uploaded_file.file_id != st.session_state.get("imported_file_id"):
             try:
                 chat_data = json.load(uploaded_file)
                 if 'messages' in chat_data:
+                    st.session_state.imported_file_id = uploaded_file.file_id
                     st.session_state.messages = chat_data['messages']
+                    st.session_state.conversation_summary = ConversationSummary()
                     if 'metadata' in chat_data and 'chat_id' in chat_data['metadata']:
                         st.session_state.current_chat_id = chat_data['metadata']['chat_id']
                     else:
                         st.session_state.current_chat_id = str(uuid.uuid4())
+                    st.session_state.processing = False
+                    # As with loading a saved chat: drop answers speculated for the old conversation, and
+                    # replace the stored session so the next message doesn't resume the old one
+                    if speculation_engine is not None:
+                        speculation_engine.cancel(st.session_state.session_id)
+                    persist_session()
+                    st.session_state.history_window = HISTORY_RENDER_WINDOW
                     st.success("Chat imported successfully!")
                     st.session_state.auto_scroll = True
                     st.rerun()
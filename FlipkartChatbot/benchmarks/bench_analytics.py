@@ -0,0 +1,218 @@
+# benchmarks/bench_analytics.py
+"""Analytics event recording cost, rollup throughput and dashboard load time over synthetic traffic.
+
+Run from the FlipkartChatbot directory:
+
+    python -m benchmarks.bench_analytics --days 30 --turns-per-day 1000000
+
+``record`` times ``Analytics`` around one-chunk replies to the bench_load
+questions: query type, language, the packed record and its append.
+
+``backfill`` writes ``--days`` days of synthetic events ending now
+(``--turns-per-day`` each, busier in the evening) straight into the
+event segments, one day at a time, and runs ``RollupStore.update`` after
+each day, as ``python analytics.py --follow`` would if it had fallen
+that far behind. ``incremental`` then appends one minute of traffic and
+times the update that picks it up, in the same store and in a new one
+(a restarted follower). ``storage`` is the size on disk once retention
+has run.
+
+``query`` times what the dashboard does for each range: read the rollup
+rows and summarize them. ``dashboard`` runs analytics_dashboard.py itself
+(Streamlit's AppTest) for each range with its cache cleared, and again
+with it warm. ``raw`` is the ad-hoc alternative, pandas over the raw
+events still kept, for comparison.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from analytics import (EVENT_DTYPE, GRANULARITIES, LANGUAGES, QUERY_TYPES, ROUTES, SEGMENT_SUFFIX, Analytics,
+                       RollupStore, day_name, granularity_for, summarize)
+from benchmarks.bench_load import QUERIES
+from config import ANALYTICS_RAW_RETENTION_DAYS
+
+DASHBOARD_RANGES = {"Last hour": 3600, "Last 24 hours": 86400, "Last 7 days": 7 * 86400, "Last 30 days": 30 * 86400}
+# Share of turns per hour of the day (UTC), an evening peak
+HOURLY_WEIGHTS = 1.2 + np.sin((np.arange(24) - 9) / 24 * 2 * np.pi)
+ROUTE_WEIGHTS = (0.35, 0.15, 0.05, 0.45)
+# Median reply latency in ms per route
+ROUTE_LATENCY_MS = (2, 40, 300, 1800)
+LANGUAGE_WEIGHTS = (0.6, 0.25, 0.15)
+ERROR_RATE = 0.004
+
+
+def synthetic_events(rng, day_start, count, until=None):
+    """``count`` events spread over one day, in time order, cut off at ``until``"""
+    hours = rng.choice(24, size=count, p=HOURLY_WEIGHTS / HOURLY_WEIGHTS.sum())
+    at = np.sort(day_start + hours * 3600 + rng.integers(0, 3600, size=count))
+    if until is not None:
+        at = at[at < until]
+    n = len(at)
+    events = np.zeros(n, dtype=EVENT_DTYPE)
+    events["at"] = at
+    intent_weights = rng.dirichlet(np.ones(len(QUERY_TYPES)) * 3)
+    events["intent"] = rng.choice(len(QUERY_TYPES), size=n, p=intent_weights)
+    events["language"] = rng.choice(len(LANGUAGES), size=n, p=LANGUAGE_WEIGHTS)
+    route = rng.choice(len(ROUTES), size=n, p=ROUTE_WEIGHTS)
+    events["route"] = route
+    events["error"] = rng.random(n) < ERROR_RATE
+    latency = np.asarray(ROUTE_LATENCY_MS, dtype=np.float64)[route] * rng.lognormal(0, 0.5, size=n)
+    events["latency_ms"] = latency
+    events["ttft_ms"] = np.where(route == ROUTES.index("llm"), latency * 0.3, latency)
+    events["prompt_tokens"] = np.where(route == ROUTES.index("llm"), rng.integers(800, 3000, size=n), 0)
+    events["completion_tokens"] = rng.integers(30, 300, size=n)
+    return events
+
+
+def append_events(directory, events):
+    """Append to the day segments the way EventLog does, minus the per-turn writes"""
+    os.makedirs(os.path.join(directory, "events"), exist_ok=True)
+    days = np.asarray(events["at"]) // 86400
+    for day in np.unique(days):
+        with open(os.path.join(directory, "events", day_name(int(day) * 86400) + SEGMENT_SUFFIX), "ab") as f:
+            events[days == day].tofile(f)
+
+
+def bench_record(directory, turns):
+    analytics = Analytics(directory)
+    texts = [text.format(order_id="ORD12345", tracking_number="TRK789456124", product="Samsung Galaxy S23")
+             for pair in QUERIES.values() for text in pair]
+    started = time.perf_counter()
+    for i in range(turns):
+        event = analytics.start(texts[i % len(texts)])
+        event.set(route=ROUTES[i % len(ROUTES)], prompt_tokens=1500)
+        for _ in analytics.observe_stream(iter(("Here is your answer.",)), event):
+            pass
+    elapsed = time.perf_counter() - started
+    analytics.log.close()
+    return {"case": "record", "turns": turns, "us_per_turn": round(elapsed / turns * 1e6, 1),
+            "turns_per_second": round(turns / elapsed)}
+
+
+def bench_backfill(directory, days, turns_per_day, now, rng):
+    store = RollupStore(directory, ANALYTICS_RAW_RETENTION_DAYS)
+    first_day = int(now) // 86400 * 86400 - (days - 1) * 86400
+    events = seconds = 0
+    for i in range(days):
+        day_events = synthetic_events(rng, first_day + i * 86400, turns_per_day, until=now)
+        append_events(directory, day_events)
+        result = store.update(now)
+        events += result["events"]
+        seconds += result["seconds"]
+    return store, {"case": "backfill", "days": days, "events": events, "seconds": round(seconds, 2),
+                   "events_per_second": round(events / seconds), "seconds_per_day": round(seconds / days, 3)}
+
+
+def bench_incremental(directory, store, turns_per_day, now, rng):
+    minute = synthetic_events(rng, int(now) // 86400 * 86400, turns_per_day)
+    minute = minute[(minute["at"] >= now - 60) & (minute["at"] < now)]
+    result = {"case": "incremental", "events": len(minute)}
+    for name, target in (("warm_ms", store), ("restarted_ms", RollupStore(directory, ANALYTICS_RAW_RETENTION_DAYS))):
+        append_events(directory, minute)
+        started = time.perf_counter()
+        target.update(now)
+        result[name] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+
+def directory_bytes(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def bench_queries(store, now):
+    for range_name, span in DASHBOARD_RANGES.items():
+        granularity = granularity_for(span)
+        size = GRANULARITIES[granularity]
+        end, start = int(now) // size * size + size, int(now - span) // size * size
+        started = time.perf_counter()
+        rows = store.query(start, end, granularity)
+        read = time.perf_counter()
+        for by in ((), ("bucket",), ("bucket", "route"), ("intent", "language"), ("intent",)):
+            summarize(rows, by)
+        done = time.perf_counter()
+        yield {"case": "query", "range": range_name, "granularity": granularity, "rows": len(rows["turns"]),
+               "turns": int(rows["turns"].sum()), "read_ms": round((read - started) * 1000, 1),
+               "summarize_ms": round((done - read) * 1000, 1), "total_ms": round((done - started) * 1000, 1)}
+
+
+def bench_dashboard(directory):
+    """Run the dashboard page per range over ``directory``"""
+    import streamlit as st
+    from streamlit.testing.v1 import AppTest
+
+    import config
+
+    # AppTest runs the page in this process, where config is already imported
+    config.ANALYTICS_DIR = directory
+
+    script = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "analytics_dashboard.py")
+    page = AppTest.from_file(script, default_timeout=60)
+    page.run()
+    for range_name in DASHBOARD_RANGES:
+        page.sidebar.selectbox[0].set_value(range_name)
+        timings = {}
+        for cache in ("cold_ms", "warm_ms"):
+            if cache == "cold_ms":
+                st.cache_data.clear()
+            started = time.perf_counter()
+            page.run()
+            timings[cache] = round((time.perf_counter() - started) * 1000, 1)
+        errors = [str(e.value) for e in page.exception]
+        yield {"case": "dashboard", "range": range_name, **timings, "charts": len(page.get("plotly_chart")),
+               "turns": page.metric[0].value if page.metric else None, "errors": errors}
+
+
+def bench_raw(directory, now, days):
+    """Hourly turns and p95 latency straight from the raw events, with pandas"""
+    import pandas as pd
+
+    started = time.perf_counter()
+    parts = []
+    for i in range(days + 1):
+        path = os.path.join(directory, "events", day_name(now - i * 86400) + SEGMENT_SUFFIX)
+        if os.path.exists(path):
+            parts.append(np.fromfile(path, dtype=EVENT_DTYPE))
+    frame = pd.DataFrame(np.concatenate(parts))
+    frame = frame[frame["at"] >= now - days * 86400]
+    frame["hour"] = frame["at"] // 3600 * 3600
+    grouped = frame.groupby("hour").agg(turns=("at", "size"), p95=("latency_ms", lambda s: s.quantile(0.95)))
+    return {"case": "raw", "days": days, "events": len(frame), "buckets": len(grouped),
+            "total_ms": round((time.perf_counter() - started) * 1000, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--turns-per-day", type=int, default=1_000_000)
+    parser.add_argument("--record-turns", type=int, default=50_000)
+    parser.add_argument("--no-dashboard", action="store_true", help="skip running the Streamlit page")
+    args = parser.parse_args()
+    rng = np.random.default_rng(7)
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(json.dumps(bench_record(os.path.join(directory, "record"), args.record_turns)))
+
+        directory = os.path.join(directory, "analytics")
+        now = time.time()
+        store, result = bench_backfill(directory, args.days, args.turns_per_day, now, rng)
+        print(json.dumps(result))
+        print(json.dumps(bench_incremental(directory, store, args.turns_per_day, now, rng)))
+        print(json.dumps({"case": "storage", "events_mb": round(directory_bytes(os.path.join(directory, "events")) / 2**20, 1),
+                          **{f"{g}_rollups_mb": round(directory_bytes(os.path.join(directory, "rollups", g)) / 2**20, 1)
+                             for g in GRANULARITIES}}))
+        for result in bench_queries(store, now):
+            print(json.dumps(result))
+        if not args.no_dashboard:
+            for result in bench_dashboard(directory):
+                print(json.dumps(result))
+        for days in (1, min(args.days, ANALYTICS_RAW_RETENTION_DAYS)):
+            print(json.dumps(bench_raw(directory, now, days)))
+
+
+if __name__ == "__main__":
+    main()
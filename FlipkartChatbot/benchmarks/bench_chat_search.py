@@ -0,0 +1,137 @@
+# benchmarks/bench_chat_search.py
+"""Saved-chat search latency and index upkeep with a million messages.
+
+Run from the FlipkartChatbot directory:
+
+    python -m benchmarks.bench_chat_search --messages 1000000
+
+Fills a ConversationStore with synthetic English, Hindi and romanized
+Hindi support chats through ``save_chat`` (so the search index is built
+incrementally, as the app builds it), then times:
+
+- ``search``: p50/p99 per query kind: an order id, a common word, two
+  words, Devanagari, romanized Hindi finding Devanagari (and the reverse)
+  and a word prefix
+- ``append_save``/``rewrite_save``/``delete``: a save adding one message,
+  a save replacing a chat's messages and a delete, index upkeep included
+- ``reindex_s`` with ``--reindex``: indexing every message from scratch
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.bench_conversation_store import timed
+from conversation_store import ConversationStore
+
+PRODUCTS = ["headphones", "smartwatch", "running shoes", "coffee maker", "backpack", "desk lamp", "office chair",
+            "हेडफोन", "स्मार्टवॉच", "जूते", "कुर्सी"]
+USER = [
+    "Where is my order ORD{n}?", "I want to return my {product}", "My {product} stopped working after a week",
+    "Do you have {product} under {price}?", "What is your refund policy?", "Track TRK{n} please",
+    "मेरा ऑर्डर कहाँ है?", "मुझे {product} वापस करना है", "मेरा {product} खराब है, रिफंड चाहिए",
+    "mera order kab aayega", "{product} kharab ho gaya, refund chahiye", "kya {product} stock mein hai?",
+]
+ASSISTANT = [
+    "Your order ORD{n} was shipped and should be delivered in 2 days.",
+    "I'm sorry to hear about your {product}. I have started a return; a pickup is scheduled for tomorrow.",
+    "Refunds are credited to the original payment method within 5-7 business days after pickup.",
+    "We have {product} in stock starting at Rs. {price}. Would you like to see the options?",
+    "आपका ऑर्डर ORD{n} भेज दिया गया है और 2 दिनों में पहुँच जाएगा।",
+    "आपका रिफंड 5-7 दिनों में आपके खाते में आ जाएगा।",
+]
+QUERIES = {
+    "order_id": ["ORD{n}"],
+    "common_word": ["order", "refund"],
+    "two_words": ["headphones refund", "return pickup"],
+    "devanagari": ["ऑर्डर कहाँ", "रिफंड"],
+    "romanized_to_devanagari": ["kharab headphone", "joote wapas"],
+    "devanagari_to_romanized": ["खराब हेडफोन", "स्टॉक"],
+    "prefix": ["smartw", "delive"],
+}
+
+
+def fill(rng, template):
+    return template.format(n=rng.randrange(10 ** 6), product=rng.choice(PRODUCTS), price=rng.randrange(500, 5000))
+
+
+def synthetic_chats(messages, seed=42):
+    """(chat_id, title, messages, timestamp) until about ``messages`` messages"""
+    rng = random.Random(seed)
+    start = datetime(2023, 1, 1)
+    produced = i = 0
+    while produced < messages:
+        chat = []
+        for _ in range(rng.randrange(1, 6)):
+            chat.append({"role": "user", "content": fill(rng, rng.choice(USER))})
+            chat.append({"role": "assistant", "content": fill(rng, rng.choice(ASSISTANT))})
+        produced += len(chat)
+        timestamp = (start + timedelta(seconds=rng.randrange(2 * 365 * 86400))).isoformat()
+        yield "chat-%08d" % i, chat[0]["content"][:30] + "...", chat, timestamp
+        i += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--reindex", action="store_true", help="also time indexing every message from scratch")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "chats.db")
+        store = ConversationStore(path)
+        started = time.perf_counter()
+        chats = 0
+        for chat_id, title, messages, timestamp in synthetic_chats(args.messages):
+            store.save_chat(chat_id, title, messages, timestamp)
+            chats += 1
+        build_seconds = time.perf_counter() - started
+        print("build  ", json.dumps({
+            "messages": args.messages, "chats": chats, "build_s": round(build_seconds, 1),
+            "messages_per_s": round(args.messages / build_seconds),
+            "db_mb": round(os.path.getsize(path) / 2 ** 20, 1)}))
+
+        rng = random.Random(7)
+        # An order id that occurs in the data
+        order_id = next(word.strip("?.") for i in range(chats // 2, chats) for m in store.load_messages("chat-%08d" % i)
+                        for word in m["content"].split() if word.startswith("ORD"))
+        for kind, queries in QUERIES.items():
+            queries = [q.replace("ORD{n}", order_id) for q in queries]
+            results = store.search(queries[0])
+            print("search ", json.dumps({
+                "kind": kind, "queries": queries, "chats_found": len(results),
+                "top_snippet": results[0]["snippet"] if results else None,
+                **timed(lambda: store.search(rng.choice(queries)), args.repeats)}, ensure_ascii=False))
+
+        chat_id = "chat-%08d" % (chats // 3)
+        messages = store.load_messages(chat_id)
+
+        def append_save():
+            messages.append({"role": "user", "content": "mera refund kab milega?"})
+            store.save_chat(chat_id, "t", messages)
+
+        counter = iter(range(10 ** 9))
+
+        def rewrite_save():
+            n = next(counter)
+            store.save_chat(chat_id, "t", [{"role": "user", "content": "imported chat about headphones"},
+                                           {"role": "assistant", "content": f"Refund {n} is on its way."}])
+
+        victims = iter("chat-%08d" % i for i in range(0, chats, max(1, chats // (args.repeats + 1))))
+        print("upkeep ", json.dumps({
+            "append_save": timed(append_save, args.repeats),
+            "rewrite_save": timed(rewrite_save, args.repeats),
+            "delete": timed(lambda: store.delete_chat(next(victims)), args.repeats)}))
+
+        if args.reindex:
+            started = time.perf_counter()
+            indexed = store.rebuild_search_index()
+            print("reindex", json.dumps({"messages": indexed, "reindex_s": round(time.perf_counter() - started, 1)}))
+
+
+if __name__ == "__main__":
+    main()
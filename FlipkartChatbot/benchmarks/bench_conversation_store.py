@@ -0,0 +1,120 @@
+# benchmarks/bench_conversation_store.py
+"""Sidebar load time with many saved chats: SQLite store vs. the old JSON directory.
+
+Run from the FlipkartChatbot directory:
+
+    python -m benchmarks.bench_conversation_store --chats 100000
+
+The store side times the first sidebar page, a page deep into the history
+(following cursors) and loading one chat. The legacy side re-creates the
+old ``load_saved_chats`` (glob, parse every file, build previews, sort) on
+``--legacy-chats`` JSON files; pass 0 to skip it.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from conversation_store import ConversationStore, chat_preview
+
+PAGE_SIZE = 20
+REPEATS = 200
+QUESTIONS = [
+    "Where is my order ORD{n}?", "I want to return my headphones", "Do you have running shoes under 2000?",
+    "मेरा ऑर्डर कहाँ है?", "What is your refund policy?", "Track TRK{n} please",
+]
+
+
+def synthetic_chats(count, seed=42):
+    rng = random.Random(seed)
+    start = datetime(2023, 1, 1)
+    for i in range(count):
+        messages = [{"role": "assistant", "content": "👋 Hello! I'm Chatbot. How can I help you today?"}]
+        for _ in range(rng.randrange(1, 6)):
+            messages.append({"role": "user", "content": rng.choice(QUESTIONS).format(n=rng.randrange(10 ** 6))})
+            messages.append({"role": "assistant", "content": "Here is what I found. " * rng.randrange(5, 40)})
+        timestamp = (start + timedelta(seconds=rng.randrange(2 * 365 * 86400))).isoformat()
+        yield "chat-%08d" % i, messages[1]["content"][:30] + "...", messages, timestamp
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return {"p50_ms": round(statistics.median(samples) * 1000, 3),
+            "p99_ms": round(samples[int(len(samples) * 0.99) - 1] * 1000, 3)}
+
+
+def timed(fn, repeats=REPEATS):
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return percentiles(samples)
+
+
+def bench_store(directory, count):
+    store = ConversationStore(os.path.join(directory, "chats.db"))
+    started = time.perf_counter()
+    for chat_id, title, messages, timestamp in synthetic_chats(count):
+        store.save_chat(chat_id, title, messages, timestamp)
+    build_seconds = time.perf_counter() - started
+
+    cursor = None
+    for _ in range(count // PAGE_SIZE // 2):
+        _, cursor = store.list_chats(PAGE_SIZE, cursor)
+    middle = cursor
+
+    messages = store.load_messages("chat-%08d" % (count // 2))
+    messages.append({"role": "user", "content": "one more question"})
+    return {
+        "chats": count,
+        "build_s": round(build_seconds, 1),
+        "db_mb": round(os.path.getsize(os.path.join(directory, "chats.db")) / 2 ** 20, 1),
+        "first_page": timed(lambda: store.list_chats(PAGE_SIZE)),
+        "middle_page": timed(lambda: store.list_chats(PAGE_SIZE, middle)),
+        "load_chat": timed(lambda: store.load_messages("chat-%08d" % (count // 2))),
+        "append_save": timed(lambda: store.save_chat("chat-%08d" % (count // 2), "t", messages), repeats=20),
+    }
+
+
+def legacy_load_saved_chats(directory):
+    saved_chats = []
+    for file in Path(directory).glob("*.json"):
+        with open(file, 'r') as f:
+            chat_data = json.load(f)
+            saved_chats.append({
+                'id': file.stem,
+                'title': chat_data.get('title', 'Untitled Chat'),
+                'timestamp': chat_data.get('timestamp'),
+                'preview': chat_preview(chat_data['messages'])
+            })
+    return sorted(saved_chats, key=lambda x: x.get('timestamp', ''), reverse=True)
+
+
+def bench_legacy(directory, count):
+    for chat_id, title, messages, timestamp in synthetic_chats(count):
+        with open(os.path.join(directory, chat_id + ".json"), 'w') as f:
+            json.dump({'id': chat_id, 'title': title, 'timestamp': timestamp, 'messages': messages}, f, indent=2)
+    return {"chats": count, "sidebar_load": timed(lambda: legacy_load_saved_chats(directory), repeats=3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chats", type=int, default=100_000)
+    parser.add_argument("--legacy-chats", type=int, default=100_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        print("store  ", json.dumps(bench_store(directory, args.chats)))
+    if args.legacy_chats:
+        with tempfile.TemporaryDirectory() as directory:
+            print("legacy ", json.dumps(bench_legacy(directory, args.legacy_chats)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+# benchmarks/bench_data_layer.py
+"""Time to pick up data changes: full reload vs. incremental JSONL deltas.
+
+Run from the FlipkartChatbot directory:
+
+    python -m benchmarks.bench_data_layer --orders 1000000 --products 20000
+
+``full_reload`` re-reads both base files (what a restart or an edit to
+orders.json costs). ``order_delta`` and ``product_delta`` append a batch
+of upserts/deletes to a delta file and time ``refresh``, which puts them
+in the overlays. While deltas are applied, a reader thread keeps resolving
+orders from ``layer.snapshot`` and reports its lookup latency and any
+lookup that saw a half-applied batch. ``product_search`` times a query
+with the product overlay in place and after ``compact``, which times
+folding the overlays into new base structures (normally done on a
+background thread once they pass the thresholds in data_layer.py).
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+from benchmarks.bench_order_store import synthetic_orders
+from benchmarks.bench_product_search import synthetic_catalog
+from data_layer import DataLayer, compact
+
+BATCHES = 5
+SEARCHES = ("wireless headphones", "cotton shirt", "smartwatch black", "")
+
+
+def write_base(directory, orders, products):
+    orders_path = os.path.join(directory, "orders.jsonl")
+    with open(orders_path, "w", encoding="utf-8") as f:
+        for order in synthetic_orders(orders):
+            f.write(json.dumps(order) + "\n")
+    products_path = os.path.join(directory, "products.json")
+    with open(products_path, "w", encoding="utf-8") as f:
+        json.dump(list(synthetic_catalog(products)), f)
+    return products_path, orders_path
+
+
+def order_batch(rng, orders, size, batch):
+    # Each batch marks its orders with the batch number, so a reader can spot mixed versions
+    lines = []
+    for order in synthetic_orders(size, seed=rng.randrange(10 ** 6)):
+        order["order_id"] = "ORD%08d" % rng.randrange(orders)
+        order["status"] = f"batch-{batch}"
+        lines.append(json.dumps({"op": "upsert", "kind": "order", "record": order}))
+    return lines
+
+
+def product_batch(rng, products, size):
+    lines = []
+    for product in synthetic_catalog(size, seed=rng.randrange(10 ** 6)):
+        if rng.random() < 0.2:
+            lines.append(json.dumps({"op": "delete", "kind": "product", "id": "PROD%07d" % rng.randrange(products)}))
+        else:
+            product["id"] = "PROD%07d" % rng.randrange(products)
+            lines.append(json.dumps({"op": "upsert", "kind": "product", "record": product}))
+    return lines
+
+
+def timed_refresh(layer, path, lines):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    started = time.perf_counter()
+    assert layer.refresh()
+    return time.perf_counter() - started
+
+
+class Reader(threading.Thread):
+    """Looks up the same ten orders in one snapshot and checks they agree on the batch"""
+
+    def __init__(self, layer, order_ids):
+        super().__init__(daemon=True)
+        self.layer = layer
+        self.order_ids = order_ids
+        self.samples = []
+        self.mixed = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            started = time.perf_counter()
+            snapshot = self.layer.snapshot
+            statuses = {snapshot.order_store.get(order_id).status for order_id in self.order_ids}
+            self.samples.append(time.perf_counter() - started)
+            if len({s for s in statuses if s.startswith("batch-")}) > 1:
+                self.mixed += 1
+            time.sleep(0.0005)
+
+
+def time_searches(layer, rounds=20):
+    index = layer.snapshot.product_index
+    samples = []
+    for _ in range(rounds):
+        for query in SEARCHES:
+            started = time.perf_counter()
+            index.search(query, k=5)
+            samples.append(time.perf_counter() - started)
+    return samples
+
+
+def summary(samples):
+    return {"mean_ms": round(statistics.fmean(samples) * 1000, 1), "max_ms": round(max(samples) * 1000, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=1_000_000)
+    parser.add_argument("--products", type=int, default=20_000)
+    parser.add_argument("--batch", type=int, default=1000, help="changes per delta batch")
+    args = parser.parse_args()
+    rng = random.Random(7)
+
+    with tempfile.TemporaryDirectory() as directory:
+        products_path, orders_path = write_base(directory, args.orders, args.products)
+        deltas_dir = os.path.join(directory, "deltas")
+        os.mkdir(deltas_dir)
+        delta_path = os.path.join(deltas_dir, "0001.jsonl")
+
+        started = time.perf_counter()
+        layer = DataLayer(products_path, orders_path, deltas_dir, poll_seconds=0)
+        print(json.dumps({"case": "full_reload", "orders": args.orders, "products": args.products,
+                          "seconds": round(time.perf_counter() - started, 2)}))
+
+        # The reader's orders are all rewritten by every batch, alongside the random ones
+        watched = ["ORD%08d" % i for i in range(10)]
+        reader = Reader(layer, watched)
+        reader.start()
+        samples = []
+        for batch in range(BATCHES):
+            lines = order_batch(rng, args.orders, args.batch, batch)
+            lines += [json.dumps({"op": "upsert", "kind": "order", "record": dict(
+                layer.snapshot.order_store.get(order_id).to_dict(), status=f"batch-{batch}")}) for order_id in watched]
+            samples.append(timed_refresh(layer, delta_path, lines))
+        reader.stopped.set()
+        reader.join()
+        print(json.dumps({"case": "order_delta", "changes": args.batch, **summary(samples),
+                          "reader_lookups": len(reader.samples), "reader": summary(reader.samples),
+                          "mixed_versions_seen": reader.mixed}))
+
+        samples = [timed_refresh(layer, delta_path, product_batch(rng, args.products, args.batch))
+                   for _ in range(BATCHES)]
+        print(json.dumps({"case": "product_delta", "changes": args.batch, **summary(samples)}))
+        print(json.dumps({"case": "product_search", "overlay": layer.stats()["product_overlay"],
+                          **summary(time_searches(layer))}))
+
+        compactor = layer._compactor
+        if compactor is not None:
+            compactor.join()
+        layered = layer.snapshot
+        started = time.perf_counter()
+        compacted = compact(layered)
+        print(json.dumps({"case": "compact", "order_changes": len(getattr(layered.order_store, "changes", ())),
+                          "product_changes": len(getattr(layered.product_index, "changes", ())),
+                          "seconds": round(time.perf_counter() - started, 2)}))
+        layer.snapshot = compacted
+        print(json.dumps({"case": "product_search", "overlay": 0, **summary(time_searches(layer))}))
+        print(json.dumps({"case": "final", **layer.stats()}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+# benchmarks/bench_landing.py
+"""Landing page throughput and /start_chatbot time to a usable chat, development vs. production.
+
+Run from the FlipkartChatbot directory:
+
+    python -m benchmarks.bench_landing --clients 16 --seconds 10 --workers 2
+
+Page views: chatbot.py's app is served in this process (threaded) in
+each mode, and ``--clients`` threads load the page the way a browser
+does: the HTML, then every /static/ file it names, keeping a cache that
+follows Cache-Control and ETag and accepts gzip. Reported per mode, for a first visit
+(empty cache) and a repeat visit (warm cache): requests and bytes per
+page view, and page views and requests per second.
+
+/start_chatbot: ``spawn`` is the old endpoint, which started a new
+``streamlit run`` per request; it is timed from the request until the new
+process answers its health check (``--spawn-samples`` times, one at a
+time). ``pool`` starts ``--workers`` warm workers first, then the
+clients hit /start_chatbot for ``--seconds``; reported are requests per
+second, latency, the time from the request until the worker it redirects
+to answers, and the processes started (the pool's size, however many
+requests there were).
+"""
+import argparse
+import contextlib
+import gzip
+import http.client
+import json
+import logging
+import re
+import socket
+import subprocess
+import threading
+import time
+from urllib.parse import urljoin, urlsplit
+
+from werkzeug.serving import make_server
+
+from benchmarks.bench_load import free_port, percentiles
+from chat_workers import WorkerPool, check_health, streamlit_command
+from chatbot import create_app
+
+STATIC_URL = re.compile(r'''["'(](/static/[^"')]+)''')
+CSS_URL = re.compile(r'''url\(\s*['"]?([^'")]+)''')
+
+
+def serve(app):
+    port = free_port()
+    server = make_server("127.0.0.1", port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, port
+
+
+def free_ports(count, first=20000, last=60000):
+    """The first of ``count`` consecutive free ports (WorkerPool's workers listen on base_port + i)"""
+    for base in range(first, last, count):
+        try:
+            with contextlib.ExitStack() as stack:
+                for port in range(base, base + count):
+                    stack.enter_context(socket.socket()).bind(("127.0.0.1", port))
+            return base
+        except OSError:
+            continue
+    raise RuntimeError(f"no {count} consecutive free ports")
+
+
+class Browser:
+    """One visitor: a keep-alive connection and an HTTP cache"""
+
+    def __init__(self, port):
+        self.connection = http.client.HTTPConnection("127.0.0.1", port)
+        # url -> (etag, fresh without asking)
+        self.cache = {}
+        self.assets = []
+
+    def get(self, url):
+        headers = {"Accept-Encoding": "gzip"}
+        cached = self.cache.get(url)
+        if cached and cached[1]:
+            return None
+        if cached and cached[0]:
+            headers["If-None-Match"] = cached[0]
+        self.connection.request("GET", url, headers=headers)
+        response = self.connection.getresponse()
+        body = response.read()
+        cache_control = response.getheader("Cache-Control") or ""
+        fresh = "immutable" in cache_control or re.search(r'max-age=[1-9]', cache_control) is not None
+        etag = response.getheader("ETag")
+        if etag or fresh:
+            self.cache[url] = (etag, fresh)
+        if response.getheader("Content-Encoding") == "gzip":
+            decoded = gzip.decompress(body)
+        else:
+            decoded = body
+        # Headers are roughly what a response costs besides its body
+        return response.status, len(body) + sum(len(k) + len(v) + 4 for k, v in response.getheaders()), decoded
+
+    def page_view(self):
+        """Load the page and its assets; returns (requests, bytes)"""
+        status, transferred, html = self.get("/")
+        requests = 1
+        if status == 200:
+            self.assets = list(dict.fromkeys(STATIC_URL.findall(html.decode("utf-8"))))
+        # Files named by a stylesheet are fetched too, as a browser drawing the page would
+        for url in self.assets:
+            result = self.get(url)
+            if result is None:
+                continue
+            requests += 1
+            transferred += result[1]
+            if result[0] == 200 and url.split("?")[0].endswith(".css"):
+                for target in CSS_URL.findall(result[2].decode("utf-8")):
+                    if urljoin(url, target) not in self.assets:
+                        self.assets.append(urljoin(url, target))
+        return requests, transferred
+
+
+def bench_pages(port, clients, seconds, warm):
+    counts = {"views": 0, "requests": 0, "bytes": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client():
+        browser = Browser(port)
+        if warm:
+            browser.page_view()
+        while time.perf_counter() < deadline:
+            if not warm:
+                browser.cache.clear()
+            requests, transferred = browser.page_view()
+            with lock:
+                counts["views"] += 1
+                counts["requests"] += requests
+                counts["bytes"] += transferred
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    views = max(1, counts["views"])
+    return {"requests_per_view": round(counts["requests"] / views, 1),
+            "kb_per_view": round(counts["bytes"] / views / 1024, 1),
+            "views_per_s": round(counts["views"] / elapsed, 1),
+            "requests_per_s": round(counts["requests"] / elapsed, 1)}
+
+
+def bench_spawn(samples):
+    """The old /start_chatbot: a new Streamlit process per request, timed until it can serve a chat"""
+    ready = []
+    for _ in range(samples):
+        port = free_port()
+        started = time.perf_counter()
+        process = subprocess.Popen(streamlit_command(port), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            while not check_health(port) and time.perf_counter() - started < 60:
+                time.sleep(0.05)
+            ready.append(time.perf_counter() - started)
+        finally:
+            process.terminate()
+            process.wait()
+    return {"request_to_chat_ms": percentiles(ready, 1000), "processes_started_per_request": 1}
+
+
+def bench_pool(workers, clients, seconds):
+    base_port = free_ports(workers)
+    pool = WorkerPool(workers, base_port, health_interval=1.0)
+    started = time.perf_counter()
+    pool.start()
+    try:
+        pool.wait_ready(timeout=120, count=workers)
+        warm_up = time.perf_counter() - started
+        server, port = serve(create_app(True, pool))
+        latencies, to_chat, lock = [], [], threading.Lock()
+        deadline = time.perf_counter() + seconds
+
+        def client():
+            connection = http.client.HTTPConnection("127.0.0.1", port)
+            while time.perf_counter() < deadline:
+                began = time.perf_counter()
+                connection.request("GET", "/start_chatbot")
+                response = connection.getresponse()
+                response.read()
+                answered = time.perf_counter()
+                location = urlsplit(response.getheader("Location") or "")
+                healthy = response.status == 302 and check_health(location.port)
+                with lock:
+                    latencies.append(answered - began)
+                    if healthy:
+                        to_chat.append(time.perf_counter() - began)
+
+        threads = [threading.Thread(target=client) for _ in range(clients)]
+        began = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - began
+        server.shutdown()
+        server.server_close()
+        return {"workers": workers, "pool_warm_up_s": round(warm_up, 1),
+                "requests_per_s": round(len(latencies) / elapsed, 1),
+                "latency_ms": percentiles(latencies, 1000), "request_to_chat_ms": percentiles(to_chat, 1000),
+                "processes_started": workers + sum(w["restarts"] for w in pool.stats()["workers"])}
+    finally:
+        pool.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--spawn-samples", type=int, default=3)
+    args = parser.parse_args()
+    # One line per request would be the bottleneck
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+
+    for mode, production in (("development", False), ("production", True)):
+        server, port = serve(create_app(production, None))
+        for visit, warm in (("first_visit", False), ("repeat_visit", True)):
+            result = bench_pages(port, args.clients, args.seconds, warm)
+            print(json.dumps({"mode": mode, "visit": visit, **result}))
+        server.shutdown()
+        server.server_close()
+    print(json.dumps({"start_chatbot": "spawn", **bench_spawn(args.spawn_samples)}))
+    print(json.dumps({"start_chatbot": "pool", **bench_pool(args.workers, args.clients, args.seconds)}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+# benchmarks/bench_language_id.py
+"""Accuracy and throughput of language identification on a labeled corpus.
+
+Run from the FlipkartChatbot directory:
+
+    python -m benchmarks.bench_language_id --messages 200000
+
+The corpus is built from message templates written separately from the
+training samples in data/language_samples.jsonl, filled with order ids,
+products and amounts so nearly every message is distinct. Accuracy is
+reported per language for the n-gram identifier and for the keyword
+heuristic it replaced. Throughput is measured on one core for fresh
+messages (``identify_batch`` on unseen text) and for already-seen ones
+(re-rendered history, served from the message memo).
+"""
+import argparse
+import json
+import random
+import re
+import time
+from collections import Counter
+
+from language_id import LanguageIdentifier, load_samples, REPLY_LANGUAGE
+
+TEMPLATES = {
+    "en": [
+        "Hi, where is my order {order}?",
+        "Can you check when {order} will be delivered?",
+        "I want to return the {product}, it stopped working",
+        "Is the {product} available in stock right now?",
+        "The {product} I got is defective, what should I do",
+        "How much does the {product} cost?",
+        "Please make sure my order {order} reaches before the weekend",
+        "This {product} is not the one I ordered",
+        "What is the status of my refund of Rs {amount}?",
+        "Why was I charged {amount} twice for {order}",
+        "Do you have any cheaper alternative to the {product}",
+        "My package {order} shows delivered but it is not here",
+        "Could you help me exchange the {product} for a bigger size",
+        "Is there a warranty on the {product}?",
+        "I'd like to speak with someone about order {order}",
+        "Thanks, this really helps",
+        "Does the {product} ship to Pune?",
+        "Any discount on the {product} this week?",
+        "Cancel {order} please, I don't need it anymore",
+        "Which {product} would you recommend for my father?",
+        "ok thanks",
+        "make it quick",
+        "is it original?",
+        "any update on {order}",
+        "still waiting",
+        "yes",
+        "Hi",
+        "hii",
+        "hello",
+        "bye",
+    ],
+    "hinglish": [
+        "bhai mera order {order} kab aayega?",
+        "{order} ki delivery kab tak hogi bata do",
+        "mujhe {product} wapas karna hai, kaam nahi kar raha",
+        "kya {product} abhi stock mein hai?",
+        "jo {product} mila hai wo kharab hai, ab kya karun",
+        "{product} ka price kitna hai?",
+        "dhyan rakhna ki {order} weekend se pehle aa jaye",
+        "ye {product} maine nahi mangaya tha",
+        "mere {amount} rupaye ka refund kahan atka hai?",
+        "{order} ke liye do baar {amount} kyun kate",
+        "{product} se sasta koi aur option hai kya",
+        "{order} delivered dikha raha hai lekin mujhe mila nahi",
+        "{product} ko bade size se badal sakte ho kya",
+        "{product} par warranty milti hai kya?",
+        "order {order} ke baare mein kisi se baat karwa do",
+        "shukriya yaar, bahut madad mili",
+        "kya {product} Pune mein deliver hoga?",
+        "is hafte {product} par koi chhoot hai kya?",
+        "{order} cancel kar do, ab zarurat nahi hai",
+        "papa ke liye kaunsa {product} lena chahiye?",
+        "ok bhai",
+        "jaldi karo",
+        "asli hai na?",
+        "{order} ka kuch pata chala",
+        "abhi tak nahi aaya",
+        "haan",
+        "namaste",
+        "theek hai bhai",
+    ],
+    "hi": [
+        "मेरा ऑर्डर {order} कब आएगा?",
+        "{product} वापस करना है",
+        "क्या {product} स्टॉक में है?",
+        "{order} का रिफंड अभी तक नहीं मिला",
+        "मुझे {product} की कीमत बताइए",
+        "{order} रद्द कर दीजिए",
+    ],
+}
+PRODUCTS = ["Smartphone X1", "Wireless Headphones", "Laptop Pro 15", "smart watch", "Bluetooth Speaker",
+            "Gaming Mouse", "mixer grinder", "running shoes", "LED TV 43 inch", "power bank"]
+
+
+def legacy_detect_language(text):
+    """The keyword heuristic language_id replaced, kept for comparison"""
+    if re.search(r'[\u0900-\u097F]', text):
+        return "hi"
+    hindi_words = ['mera', 'kya', 'kahan', 'kaise', 'hai', 'mein', 'ka', 'ki', 'ko', 'aur', 'order', 'karna', 'chahta',
+                   'chahte']
+    text_lower = text.lower()
+    hindi_indicators = sum(1 for word in hindi_words if word in text_lower)
+    english_words = ['the', 'and', 'or', 'but', 'what', 'how', 'where', 'when', 'why', 'is', 'are', 'can', 'do', 'does',
+                     'will', 'would', 'should', 'could']
+    english_indicators = sum(1 for word in english_words if word in text_lower)
+    return "hi" if hindi_indicators > english_indicators else "en"
+
+
+def labeled_corpus(count, seed=11):
+    rng = random.Random(seed)
+    langs = list(TEMPLATES)
+    corpus = []
+    for _ in range(count):
+        lang = rng.choice(langs)
+        text = rng.choice(TEMPLATES[lang]).format(order="ORD%08d" % rng.randrange(10 ** 8),
+                                                  product=rng.choice(PRODUCTS), amount=rng.randrange(99, 99999))
+        corpus.append((lang, text))
+    return corpus
+
+
+def accuracy(predict, corpus, labels):
+    correct, total = Counter(), Counter()
+    for lang, text in corpus:
+        total[lang] += 1
+        correct[lang] += predict(text) == labels[lang]
+    return {lang: round(correct[lang] / total[lang], 4) for lang in total} | {
+        "overall": round(sum(correct.values()) / sum(total.values()), 4)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=200_000)
+    args = parser.parse_args()
+
+    corpus = labeled_corpus(args.messages)
+    texts = [text for _, text in corpus]
+
+    started = time.perf_counter()
+    identifier = LanguageIdentifier(load_samples())
+    print(json.dumps({"case": "train", "ms": round((time.perf_counter() - started) * 1000, 1),
+                      "ngrams": identifier.stats()["ngrams"]}))
+
+    # The legacy heuristic only tells "hi" from "en", so it is compared on reply language
+    print(json.dumps({"case": "accuracy",
+                      "identifier": accuracy(identifier.identify, corpus, {lang: lang for lang in TEMPLATES}),
+                      "identifier_reply_language": accuracy(
+                          lambda text: REPLY_LANGUAGE[identifier.identify(text)], corpus, REPLY_LANGUAGE),
+                      "legacy_reply_language": accuracy(legacy_detect_language, corpus, REPLY_LANGUAGE)}))
+
+    # "fresh" sees every distinct message once; "memoized" is the whole corpus, all seen before
+    identifier = LanguageIdentifier(load_samples())
+    for case, batch in (("fresh", list(dict.fromkeys(texts))), ("memoized", texts)):
+        started = time.perf_counter()
+        identifier.identify_batch(batch)
+        seconds = time.perf_counter() - started
+        print(json.dumps({"case": case, "messages": len(batch), "messages_per_second": round(len(batch) / seconds),
+                          **identifier.stats()}))
+
+    started = time.perf_counter()
+    for text in texts:
+        legacy_detect_language(text)
+    print(json.dumps({"case": "legacy", "messages_per_second": round(len(texts) / (time.perf_counter() - started))}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+# benchmarks/bench_load.py
+"""Concurrent multi-turn conversations against the fake Groq server.
+
+Run from the FlipkartChatbot directory:
+
+    python -m benchmarks.bench_load --sessions 10 100 --turns 6 --output load.json
+    python -m benchmarks.bench_load --sessions 10 100 --compare load.json
+
+Starts ``benchmarks.fake_groq`` on a free port (``--ttft-ms``,
+``--tokens-per-second`` and the failure rates are passed through) and runs
+ChatPipeline in this process with its gateway pointed at it, the way
+chat_api.py serves it. For each ``--sessions`` level that many
+conversations run at once: ``--turns`` user messages each, built from
+COMMON_QUERY_TYPES in English or Hindi, with ``--think-ms`` between a
+reply and the next message. Every conversation starts with its own
+greeting, so replies don't come from the reply cache.
+
+Per level it reports p50/p95/p99 time to first chunk and end-to-end reply
+time (for turns that went to the model and for fast-path replies), prompt
+tokens per model turn, error replies, RSS growth per session, the
+model router's per-model stats (with ``MODEL_ROUTING=cascade``), and
+the gateway and fake-server counters. ``--output`` writes the results with the
+commit they were measured on; ``--compare`` prints the change of each
+percentile against an earlier file.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+import uuid
+from dataclasses import fields
+
+from analytics import Analytics
+from benchmarks.fake_groq import FakeGroqConfig
+from chat_pipeline import ChatPipeline, ERROR_REPLY, ORDERS_PATH, PRODUCTS_PATH
+from config import GROQ_MODEL_NAME
+from conversation_memory import ConversationSummary
+from groq_client import GroqGateway
+from prompts import COMMON_QUERY_TYPES
+
+# One user message per query type, as (English, Hindi)
+QUERIES = {
+    "Order Status": ("What's the status of my order {order_id}?", "मेरे ऑर्डर {order_id} का स्टेटस क्या है?"),
+    "Track Delivery": ("Where is my package with tracking number {tracking_number}?",
+                       "ट्रैकिंग नंबर {tracking_number} वाला मेरा पैकेज कहाँ है?"),
+    "Return Policy": ("What is your return policy?", "आपकी रिटर्न पॉलिसी क्या है?"),
+    "Initiate Return": ("I want to return the {product} from order {order_id}",
+                        "मैं ऑर्डर {order_id} का {product} वापस करना चाहता हूँ"),
+    "Refund Status": ("When will I get the refund for order {order_id}?", "ऑर्डर {order_id} का रिफंड कब मिलेगा?"),
+    "Delivery Time": ("How many days does delivery to Pune usually take?", "पुणे में डिलीवरी में कितने दिन लगते हैं?"),
+    "Product Details": ("Tell me more about the {product}", "{product} के बारे में और बताइए"),
+    "Product Availability": ("Is the {product} in stock?", "क्या {product} स्टॉक में है?"),
+    "Payment Options": ("What payment methods do you accept?", "आप कौन से भुगतान तरीके स्वीकार करते हैं?"),
+    "Current Promotions": ("Are there any offers on the {product} right now?", "क्या {product} पर अभी कोई ऑफर है?"),
+    "Warranty Information": ("What warranty comes with the {product}?", "{product} के साथ कितनी वारंटी मिलती है?"),
+    "Connect to Human Agent": ("Can I talk to a human agent?", "क्या मैं किसी एजेंट से बात कर सकता हूँ?"),
+}
+GREETINGS = ("Hi, I'm customer {name}.", "नमस्ते, मैं ग्राहक {name} हूँ।")
+ERROR_PREFIX = ERROR_REPLY.split("{")[0]
+# Reported metrics compared by --compare
+COMPARED = ("ttft_ms", "e2e_ms", "fast_path_ms", "prompt_tokens", "rss_kb_per_session")
+
+
+def script(rng, name, turns, hindi_share, orders, products):
+    """User messages of one conversation, in one language"""
+    language = 1 if rng.random() < hindi_share else 0
+    messages = []
+    for i in range(turns):
+        order = rng.choice(orders)
+        text = QUERIES[rng.choice(COMMON_QUERY_TYPES)][language].format(
+            order_id=order["order_id"], tracking_number=order.get("tracking_number", ""),
+            product=rng.choice(products)["name"])
+        messages.append(GREETINGS[language].format(name=name) + " " + text if i == 0 else text)
+    return messages
+
+
+def percentiles(samples, scale=1):
+    if not samples:
+        return None
+    samples = sorted(samples)
+    pick = lambda q: round(samples[min(len(samples) - 1, int(len(samples) * q))] * scale, 1)
+    return {"p50": pick(0.5), "p95": pick(0.95), "p99": pick(0.99), "count": len(samples)}
+
+
+def rss_kb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+
+
+async def run_session(pipeline, user_messages, think, rng, turns):
+    messages = [{"role": "assistant", "content": "How can I help you today?"}]
+    summary = ConversationSummary()
+    for text in user_messages:
+        messages.append({"role": "user", "content": text})
+        started = time.perf_counter()
+        turn = pipeline.arespond(messages, summary)
+        first, reply = None, []
+        async for chunk in turn.chunks:
+            if first is None:
+                first = time.perf_counter() - started
+            reply.append(chunk)
+        elapsed = time.perf_counter() - started
+        reply = "".join(reply)
+        messages.append({"role": "assistant", "content": reply})
+        pipeline.finish(messages, summary)
+        turns.append({"intent": turn.intent, "ttft": first, "e2e": elapsed, "error": ERROR_PREFIX in reply,
+                      "prompt_tokens": turn.context_stats.prompt_tokens if turn.context_stats else 0})
+        await asyncio.sleep(rng.uniform(0.5, 1.5) * think)
+    return messages
+
+
+async def run_level(args, base_url, sessions, level):
+    gateway = GroqGateway("fake", args.rpm, args.tpm, base_url=base_url, max_connections=args.max_connections)
+    pipeline = ChatPipeline.from_data_files(gateway, poll_seconds=0, tracking=None, model=args.model,
+                                            analytics=Analytics(None))
+    with open(ORDERS_PATH) as f:
+        orders = json.load(f)
+    with open(PRODUCTS_PATH) as f:
+        products = json.load(f)
+    rng = random.Random(level)
+    run = uuid.uuid4().hex[:6]
+    scripts = [script(rng, f"{run}-{i}", args.turns, args.hindi_share, orders, products) for i in range(sessions)]
+    turns = []
+    rss_before = rss_kb()
+    started = time.perf_counter()
+    conversations = await asyncio.gather(*(
+        run_session(pipeline, user_messages, args.think_ms / 1000, random.Random(i), turns)
+        for i, user_messages in enumerate(scripts)))
+    elapsed = time.perf_counter() - started
+    # Measured while every conversation is still referenced
+    rss_growth = rss_kb() - rss_before
+    del conversations
+    await gateway.aclose()
+    pipeline.data.stop()
+
+    llm = [t for t in turns if t["intent"] == "llm"]
+    return {
+        "sessions": sessions,
+        "turns": len(turns),
+        "seconds": round(elapsed, 2),
+        "turns_per_second": round(len(turns) / elapsed, 1),
+        "llm_turns": len(llm),
+        "errors": sum(t["error"] for t in turns),
+        "ttft_ms": percentiles([t["ttft"] for t in llm if t["ttft"] is not None], 1000),
+        "e2e_ms": percentiles([t["e2e"] for t in llm], 1000),
+        "fast_path_ms": percentiles([t["e2e"] for t in turns if t["intent"] != "llm"], 1000),
+        "prompt_tokens": percentiles([t["prompt_tokens"] for t in llm]),
+        "rss_kb_per_session": {"p50": round(rss_growth / sessions, 1)},
+        "gateway": gateway.stats(),
+        "models": pipeline.model_router.stats(),
+    }
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_fake(args):
+    port = free_port()
+    command = [sys.executable, "-m", "benchmarks.fake_groq", "--port", str(port)]
+    for f in fields(FakeGroqConfig):
+        command += ["--" + f.name.replace("_", "-"), str(getattr(args, f.name))]
+    process = subprocess.Popen(command)
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(base_url + "/stats", timeout=1).read()
+            return process, base_url
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("fake Groq server didn't start")
+
+
+def fake_stats(base_url, reset=False):
+    if reset:
+        return json.loads(urllib.request.urlopen(urllib.request.Request(
+            base_url + "/stats/reset", method="POST")).read())
+    return json.loads(urllib.request.urlopen(base_url + "/stats").read())
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old, new):
+    """Print each percentile's change from ``old`` runs to ``new`` runs at the same session count"""
+    previous = {run["sessions"]: run for run in old["runs"]}
+    print(f"vs. {old.get('commit')} ({old.get('timestamp')}):")
+    for run in new["runs"]:
+        before = previous.get(run["sessions"])
+        if before is None:
+            continue
+        for metric in COMPARED:
+            if not run.get(metric) or not before.get(metric):
+                continue
+            changes = []
+            for q in ("p50", "p95", "p99"):
+                if q in run[metric] and before[metric].get(q):
+                    a, b = before[metric][q], run[metric][q]
+                    changes.append(f"{q} {a} -> {b} ({(b - a) / a:+.1%})")
+            print(f"  {run['sessions']} sessions {metric}: " + ", ".join(changes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, nargs="+", default=[10, 100])
+    parser.add_argument("--turns", type=int, default=6)
+    parser.add_argument("--think-ms", type=float, default=200, help="mean pause before the next user message")
+    parser.add_argument("--hindi-share", type=float, default=0.3)
+    parser.add_argument("--model", default=GROQ_MODEL_NAME)
+    # The gateway's own limits; high by default so the app, not the quota, is measured
+    parser.add_argument("--rpm", type=float, default=1_000_000)
+    parser.add_argument("--tpm", type=float, default=1_000_000_000)
+    parser.add_argument("--max-connections", type=int, default=100)
+    defaults = FakeGroqConfig()
+    for f in fields(FakeGroqConfig):
+        parser.add_argument("--" + f.name.replace("_", "-"), type=f.type, default=getattr(defaults, f.name))
+    parser.add_argument("--output", help="write the results here as JSON")
+    parser.add_argument("--compare", help="earlier --output file to compare against")
+    args = parser.parse_args()
+
+    process, base_url = start_fake(args)
+    runs = []
+    try:
+        for level in args.sessions:
+            fake_stats(base_url, reset=True)
+            run = asyncio.run(run_level(args, base_url, level, len(runs)))
+            run["fake_server"] = fake_stats(base_url)
+            print(json.dumps(run))
+            runs.append(run)
+    finally:
+        process.terminate()
+        process.wait()
+
+    result = {"commit": git_commit(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare")}, "runs": runs}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), result)
+
+
+if __name__ == "__main__":
+    main()
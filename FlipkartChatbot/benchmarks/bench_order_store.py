@@ -0,0 +1,124 @@
+# benchmarks/bench_order_store.py
+"""Lookup latency and resident memory of OrderStore at increasing sizes.
+
+Run from the FlipkartChatbot directory:
+
+    python -m benchmarks.bench_order_store --sizes 100000 1000000 10000000
+
+Each size is measured in a fresh subprocess so RSS numbers don't bleed
+into each other.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import date, timedelta
+
+from order_store import OrderStore
+
+STATUSES = ["Order Placed", "In Transit", "Out for Delivery", "Delivered"]
+LOCATIONS = ["Mumbai Warehouse", "Delhi Hub", "Bangalore Hub", "Chennai Hub", "Kolkata Hub", "Mumbai Local"]
+CITIES = ["Mumbai, Maharashtra", "Bangalore, Karnataka", "Delhi, Delhi", "Chennai, Tamil Nadu", "Pune, Maharashtra"]
+PRODUCTS = [("PROD%03d" % i, "Product %d" % i, round(random.Random(i).uniform(5, 500), 2)) for i in range(1, 500)]
+LOOKUPS = 100_000
+
+
+def synthetic_orders(count, seed=42):
+    rng = random.Random(seed)
+    start = date(2023, 1, 1)
+    for i in range(count):
+        order_date = start + timedelta(days=rng.randrange(730))
+        steps = rng.randrange(1, len(STATUSES) + 1)
+        product_id, product_name, price = rng.choice(PRODUCTS)
+        quantity = rng.randrange(1, 4)
+        yield {
+            "order_id": "ORD%08d" % i,
+            "customer_email": "customer%d@email.com" % rng.randrange(count // 2 + 1),
+            "order_date": order_date.isoformat(),
+            "status": STATUSES[steps - 1],
+            "total_amount": round(price * quantity, 2),
+            "items": [{"product_id": product_id, "product_name": product_name, "quantity": quantity, "price": price}],
+            "shipping_address": "%d Main St, %s" % (rng.randrange(1, 999), rng.choice(CITIES)),
+            "tracking_number": "TRK%09d" % i,
+            "estimated_delivery": (order_date + timedelta(days=5)).isoformat(),
+            "tracking_status": [
+                {"status": STATUSES[s], "date": (order_date + timedelta(days=s)).isoformat(),
+                 "location": LOCATIONS[(i + s) % len(LOCATIONS)]}
+                for s in range(steps)
+            ],
+        }
+
+
+def resident_memory_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def time_lookups(fn, keys):
+    started = time.perf_counter()
+    for key in keys:
+        fn(key)
+    return (time.perf_counter() - started) / len(keys) * 1e9
+
+
+def measure(count):
+    rss_before = resident_memory_mb()
+    started = time.perf_counter()
+    store = OrderStore(synthetic_orders(count))
+    build_seconds = time.perf_counter() - started
+    rss_after = resident_memory_mb()
+
+    rng = random.Random(7)
+    indices = [rng.randrange(count) for _ in range(LOOKUPS)]
+    order_ids = ["ORD%08d" % i for i in indices]
+    tracking_numbers = ["TRK%09d" % i for i in indices]
+    emails = [store.get(order_id).customer_email for order_id in order_ids]
+
+    started = time.perf_counter()
+    store.between("2024-01-01", "2024-01-01")
+    date_index_seconds = time.perf_counter() - started
+    days = [(date(2023, 1, 1) + timedelta(days=rng.randrange(730))).isoformat() for _ in range(1000)]
+
+    return {
+        "orders": count,
+        "build_s": round(build_seconds, 2),
+        "rss_mb": round(rss_after - rss_before, 1),
+        "bytes_per_order": round((rss_after - rss_before) * 2 ** 20 / count),
+        "order_id_ns": round(time_lookups(store.get, order_ids)),
+        "tracking_ns": round(time_lookups(store.by_tracking_number, tracking_numbers)),
+        "email_ns": round(time_lookups(store.by_email, emails)),
+        "date_index_build_s": round(date_index_seconds, 2),
+        "one_day_range_us": round(time_lookups(lambda d: store.between(d, d), days) / 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10 ** 5, 10 ** 6, 10 ** 7])
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(measure(args.worker)))
+        return
+
+    for count in args.sizes:
+        result = subprocess.run([sys.executable, "-m", "benchmarks.bench_order_store", "--worker", str(count)],
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            print(f"{count:>10} orders: failed ({result.stderr.strip().splitlines()[-1:]})")
+            continue
+        row = json.loads(result.stdout)
+        print("  ".join(f"{key}={value}" for key, value in row.items()))
+
+
+if __name__ == "__main__":
+    main()
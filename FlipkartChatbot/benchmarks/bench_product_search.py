@@ -0,0 +1,93 @@
+# benchmarks/bench_product_search.py
+"""Query latency of ProductIndex on a synthetic catalog.
+
+    python -m benchmarks.bench_product_search --products 1000000
+
+Reports build time and p50/p95/p99 latency over a mixed workload of
+English, Hinglish and Devanagari queries with and without facet filters.
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from product_search import ProductIndex
+
+CATEGORIES = ["Electronics", "Furniture", "Groceries", "Kitchen", "Sports", "Fashion", "Books", "Toys"]
+NOUNS = ["watch", "smartwatch", "chair", "coffee", "headphones", "shoes", "shirt", "phone", "smartphone",
+         "book", "lamp", "bag", "backpack", "speaker", "bottle", "mat", "camera", "mouse", "keyboard", "table",
+         "jacket", "kurta", "saree", "mixer", "kettle", "blender", "sofa", "pillow", "charger", "cable"]
+ADJECTIVES = ["wireless", "ergonomic", "organic", "premium", "portable", "smart", "waterproof", "classic",
+              "cotton", "steel", "leather", "bluetooth", "foldable", "compact", "deluxe", "eco", "gaming", "kids"]
+# Long tail of brand/model words so the vocabulary looks like a real catalog
+BRANDS = ["brand%d" % i for i in range(5000)]
+QUERIES = [
+    "wireless headphones", "bluetooth speaker", "ergonomic office chair", "organic coffee", "running shoes",
+    "cotton kurta", "waterproof smartwatch", "gaming mouse", "leather bag", "steel bottle",
+    "mujhe ghadi chahiye", "kursi dikhao", "sasta phone", "joote", "kapde", "घड़ी", "कुर्सी दिखाओ", "मोबाइल फोन",
+    "brand42 camera", "premium deluxe sofa",
+]
+
+
+def synthetic_catalog(count, seed=1):
+    rng = random.Random(seed)
+    for i in range(count):
+        noun = rng.choice(NOUNS)
+        adjectives = rng.sample(ADJECTIVES, 2)
+        brand = BRANDS[int(rng.paretovariate(1.2)) % len(BRANDS)]
+        yield {
+            "id": "PROD%07d" % i,
+            "name": f"{brand} {adjectives[0]} {noun}",
+            "category": rng.choice(CATEGORIES),
+            "price": round(rng.uniform(5, 2000), 2),
+            "description": f"{adjectives[1].capitalize()} {noun} by {brand} with {rng.choice(ADJECTIVES)} finish.",
+            "features": [f"{rng.choice(ADJECTIVES)} design", f"{rng.randrange(1, 48)}-month warranty"],
+            "in_stock": rng.random() < 0.8,
+            "rating": round(rng.uniform(2.5, 5.0), 1),
+            "reviews_count": rng.randrange(5000),
+        }
+
+
+def random_filters(rng):
+    filters = {}
+    if rng.random() < 0.3:
+        filters["category"] = rng.choice(CATEGORIES)
+    if rng.random() < 0.3:
+        filters["in_stock"] = True
+    if rng.random() < 0.3:
+        filters["max_price"] = rng.choice([100, 500, 1000])
+    if rng.random() < 0.3:
+        filters["min_rating"] = rng.choice([3.5, 4.0, 4.5])
+    return filters
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=5000)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    index = ProductIndex(synthetic_catalog(args.products))
+    print(f"built index over {len(index):,} products, {len(index.vocabulary):,} terms "
+          f"in {time.perf_counter() - started:.1f}s")
+
+    rng = random.Random(3)
+    workload = [(rng.choice(QUERIES), random_filters(rng)) for _ in range(args.queries)]
+    for query, filters in workload[:50]:
+        index.search(query, k=args.k, **filters)
+
+    latencies = np.empty(len(workload))
+    for i, (query, filters) in enumerate(workload):
+        started = time.perf_counter()
+        index.search(query, k=args.k, **filters)
+        latencies[i] = (time.perf_counter() - started) * 1000
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    print(f"{len(workload)} queries: p50={p50:.2f}ms p95={p95:.2f}ms p99={p99:.2f}ms max={latencies.max():.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
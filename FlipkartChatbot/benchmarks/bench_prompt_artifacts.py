@@ -0,0 +1,90 @@
+# benchmarks/bench_prompt_artifacts.py
+"""Per-turn CPU time and prompt tokens of the system prompt for each data encoding.
+
+    python -m benchmarks.bench_prompt_artifacts --products 100000 --orders 100000
+
+``full_dump`` is the original approach (every product and order as
+``json.dumps(indent=2)`` on each rerun). ``json`` and ``table`` build a
+retrieved prompt from shared PromptArtifacts; ``cold`` is the first time
+each record is encoded, ``warm`` the steady state once records are cached.
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+
+from benchmarks.bench_order_store import synthetic_orders
+from benchmarks.bench_product_search import synthetic_catalog, QUERIES
+from order_store import OrderStore
+from product_search import ProductIndex
+from prompt_artifacts import PromptArtifacts
+from prompts import SYSTEM_PROMPT, PRODUCT_DATA_INSTRUCTION, ORDER_DATA_INSTRUCTION
+from retrieval import ContextRetriever, estimate_tokens
+
+TURNS = 2000
+
+
+def conversations(orders, count, seed=3):
+    rng = random.Random(seed)
+    order_ids = [o.order_id for o in orders]
+    for _ in range(count):
+        order = orders[rng.randrange(len(orders))]
+        yield rng.choice([
+            f"Where is my order {rng.choice(order_ids)}?",
+            f"Track {order.tracking_number} please",
+            f"Show my orders for {order.customer_email}",
+            rng.choice(QUERIES),
+            f"{rng.choice(QUERIES)} for order {order.order_id}",
+        ])
+
+
+def full_dump_prompt(products, orders):
+    return (SYSTEM_PROMPT + "\n\n"
+            + PRODUCT_DATA_INSTRUCTION.format(product_data=json.dumps(products, indent=2)) + "\n\n"
+            + ORDER_DATA_INSTRUCTION.format(order_data=json.dumps(orders, indent=2)))
+
+
+def measure_turns(retriever, texts):
+    cpu, tokens, data_tokens = [], [], []
+    for text in texts:
+        started = time.process_time()
+        messages = [{"role": "user", "content": text}]
+        _, stats = retriever.build_system_prompt(messages, 3000, messages)
+        cpu.append(time.process_time() - started)
+        tokens.append(stats.prompt_tokens)
+        data_tokens.append(stats.data_tokens)
+    return {"cpu_ms_mean": round(statistics.fmean(cpu) * 1000, 3),
+            "prompt_tokens_mean": round(statistics.fmean(tokens)),
+            "data_tokens_mean": round(statistics.fmean(data_tokens))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--orders", type=int, default=100_000)
+    parser.add_argument("--skip-full-dump", action="store_true")
+    args = parser.parse_args()
+
+    products = list(synthetic_catalog(args.products))
+    store = OrderStore(synthetic_orders(args.orders))
+    index = ProductIndex(products)
+    texts = list(conversations(list(store), TURNS))
+
+    if not args.skip_full_dump:
+        order_dicts = [o.to_dict() for o in store]
+        started = time.process_time()
+        prompt = full_dump_prompt(products, order_dicts)
+        print(json.dumps({"encoding": "full_dump", "cpu_ms": round((time.process_time() - started) * 1000, 1),
+                          "prompt_tokens": estimate_tokens(prompt)}))
+
+    for encoding in ("json", "table"):
+        retriever = ContextRetriever(index, store, artifacts=PromptArtifacts("bench", encoding))
+        cold = measure_turns(retriever, texts)
+        warm = measure_turns(retriever, texts)
+        print(json.dumps({"encoding": encoding, "prompt_hash": retriever.artifacts.content_hash,
+                          "cold": cold, "warm": warm}))
+
+
+if __name__ == "__main__":
+    main()
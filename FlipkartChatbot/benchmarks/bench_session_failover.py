@@ -0,0 +1,192 @@
+# benchmarks/bench_session_failover.py
+"""Workers sharing a SQLiteSessionStore, killed mid-conversation.
+
+Run from the FlipkartChatbot directory:
+
+    python -m benchmarks.bench_session_failover --workers 6 --sessions 50 --seconds 20
+
+Worker processes take turns on random sessions the way app.py does: claim
+the session together with a new user message, "stream" a reply for a
+while, then release it with the reply. Every ``--kill-every`` seconds one
+worker is SIGKILLed (usually mid-reply, holding a claim) and replaced.
+Workers that find a session whose claim has expired with the user's
+message unanswered answer it first.
+
+At the end every session is checked: roles alternate, each reply answers
+the message before it, no user message appears twice and none is left
+unanswered. Any violation is printed and the exit status is 1.
+"""
+import argparse
+import json
+import os
+import random
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from session_store import SQLiteSessionStore, Session
+
+WELCOME = {"role": "assistant", "content": "welcome"}
+
+
+def reply_to(message):
+    return {"role": "assistant", "content": "reply to " + message["content"]}
+
+
+def timed(samples, fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    samples.append(time.perf_counter() - started)
+    return result
+
+
+def run_worker(args):
+    store = SQLiteSessionStore(args.db)
+    owner = f"worker-{os.getpid()}"
+    rng = random.Random(os.getpid())
+    stats = {"turns": 0, "recovered": 0, "busy": 0, "lost": 0}
+    samples = []
+    stop = []
+    signal.signal(signal.SIGTERM, lambda *_: stop.append(True))
+
+    def answer(session):
+        session.messages.append(reply_to(session.messages[-1]))
+
+    turn = 0
+    while not stop:
+        session_id = "session-%d" % rng.randrange(args.sessions)
+        session = store.get(session_id)
+        if session.awaiting_reply:
+            # Its worker died mid-reply
+            claimed = timed(samples, store.claim, session_id, owner, args.lease)
+            recovering = True
+        else:
+            turn += 1
+            message = {"role": "user", "content": f"{owner}-{turn}"}
+            claimed = timed(samples, store.claim, session_id, owner, args.lease,
+                            lambda s: s.messages.append(message))
+            recovering = False
+        if claimed is None:
+            stats["busy"] += 1
+            continue
+        time.sleep(rng.uniform(args.reply_ms[0], args.reply_ms[1]) / 1000)
+        if timed(samples, store.release, session_id, owner, answer) is None:
+            stats["lost"] += 1
+            continue
+        stats["turns"] += 1
+        stats["recovered"] += recovering
+    stats["saves"] = len(samples)
+    stats["save_ms"] = [round(s * 1000, 3) for s in samples]
+    print(json.dumps(stats))
+
+
+def check(session):
+    """Problems with one session's messages, if any"""
+    problems = []
+    seen = set()
+    messages = session.messages
+    if messages[0] != WELCOME:
+        problems.append("welcome message lost")
+    for i in range(1, len(messages), 2):
+        user = messages[i]
+        if user["role"] != "user":
+            problems.append(f"message {i} should be a user message")
+            break
+        if user["content"] in seen:
+            problems.append(f"user message {user['content']} stored twice")
+        seen.add(user["content"])
+        if i + 1 >= len(messages):
+            problems.append(f"user message {user['content']} never answered")
+        elif messages[i + 1] != reply_to(user):
+            problems.append(f"message {i + 1} doesn't answer {user['content']}")
+    if session.processing_owner:
+        problems.append(f"still claimed by {session.processing_owner}")
+    return problems
+
+
+def start_worker(args):
+    return subprocess.Popen([sys.executable, "-m", "benchmarks.bench_session_failover", "--worker", "--db", args.db,
+                             "--sessions", str(args.sessions), "--lease", str(args.lease),
+                             "--reply-ms", *map(str, args.reply_ms)], stdout=subprocess.PIPE, text=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=6)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--kill-every", type=float, default=0.5)
+    parser.add_argument("--lease", type=float, default=1.0, help="claim lease in seconds")
+    parser.add_argument("--reply-ms", type=float, nargs=2, default=[20, 200], help="min/max simulated reply time")
+    parser.add_argument("--db")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        return run_worker(args)
+
+    with tempfile.TemporaryDirectory() as directory:
+        args.db = os.path.join(directory, "sessions.db")
+        store = SQLiteSessionStore(args.db)
+        for i in range(args.sessions):
+            store.save(Session("session-%d" % i, messages=[WELCOME]))
+
+        rng = random.Random(1)
+        workers = [start_worker(args) for _ in range(args.workers)]
+        kills = 0
+        started = time.monotonic()
+        while time.monotonic() - started < args.seconds:
+            time.sleep(args.kill_every)
+            victim = rng.randrange(len(workers))
+            workers[victim].kill()
+            workers[victim].wait()
+            kills += 1
+            workers[victim] = start_worker(args)
+        for worker in workers:
+            worker.terminate()
+        totals, samples = {"turns": 0, "recovered": 0, "busy": 0, "lost": 0}, []
+        for worker in workers:
+            output, _ = worker.communicate()
+            if not output:
+                continue  # stopped before it got going
+            stats = json.loads(output)
+            samples += stats.pop("save_ms")
+            stats.pop("saves")
+            for key, value in stats.items():
+                totals[key] += value
+        elapsed = time.monotonic() - started
+
+        # Claims of the last killed worker run out, then a final pass answers what it left
+        time.sleep(args.lease)
+        final_recoveries = 0
+        for i in range(args.sessions):
+            session_id = "session-%d" % i
+            if store.get(session_id).awaiting_reply and store.claim(session_id, "final", args.lease):
+                store.release(session_id, "final", lambda s: s.messages.append(reply_to(s.messages[-1])))
+                final_recoveries += 1
+
+        violations = {}
+        answered = 0
+        for i in range(args.sessions):
+            session = store.get("session-%d" % i)
+            answered += (len(session.messages) - 1) // 2
+            problems = check(session)
+            if problems:
+                violations[session.session_id] = problems
+        samples.sort()
+        print(json.dumps({"workers": args.workers, "sessions": args.sessions, "seconds": round(elapsed, 1),
+                          "kills": kills, "answered_turns": answered, "turns_per_second": round(answered / elapsed, 1),
+                          # Only workers that exited cleanly report their counters
+                          "surviving_workers": totals, "final_recoveries": final_recoveries,
+                          "save_p50_ms": round(statistics.median(samples), 2),
+                          "save_p99_ms": round(samples[int(len(samples) * 0.99) - 1], 2),
+                          "violations": len(violations)}))
+        for session_id, problems in violations.items():
+            print(session_id, "; ".join(problems), file=sys.stderr)
+        return 1 if violations else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
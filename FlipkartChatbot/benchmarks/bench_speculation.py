@@ -0,0 +1,119 @@
+# benchmarks/bench_speculation.py
+"""Time to first chunk for quick-action clicks with and without speculation.
+
+Run from the FlipkartChatbot directory:
+
+    python -m benchmarks.bench_speculation --sessions 20 --read-ms 3000 --click-share 0.6
+
+Starts ``benchmarks.fake_groq`` like bench_load and runs ``--sessions``
+conversations at once on threads, the way the Streamlit app serves them.
+Each asks a unique order question; once the reply is in, the follow-ups
+the app offers under an order reply are handed to the SpeculationEngine
+and the user reads for ``--read-ms`` (jittered). Then a ``--click-share``
+of users click one of them and the rest type another question.
+
+Both runs see the same script; ``off`` answers every follow-up live.
+Reported per run: p50/p95 time to first chunk for clicks and for typed
+questions (so the cost of speculation to live turns shows), the engine's
+hit rate and used and wasted tokens, and the fake server's request count.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from dataclasses import fields
+
+from analytics import Analytics
+from benchmarks.bench_load import fake_stats, percentiles, start_fake
+from benchmarks.fake_groq import FakeGroqConfig
+from chat_pipeline import ChatPipeline
+from config import GROQ_MODEL_NAME
+from conversation_memory import ConversationSummary
+from groq_client import GroqGateway
+from speculation import SpeculationEngine
+
+# What app.py offers under a reply that mentions an order or a return (English)
+FOLLOW_UPS = ["I want to initiate a return", "What is your return policy?", "I want to track another order"]
+TYPED = ["Can I change the delivery address for order {order_id}?", "Do you have any offers on headphones?",
+         "How do I update my phone number?"]
+
+
+def run_session(pipeline, engine, rng, args, results):
+    session_id = uuid.uuid4().hex
+    summary = ConversationSummary()
+    messages = [{"role": "assistant", "content": "How can I help you today?"},
+                {"role": "user", "content": f"Hi, I'm {session_id[:8]}. Where is my order OD{rng.randrange(10**9)}?"}]
+    turn = pipeline.respond(messages, summary)
+    messages.append({"role": "assistant", "content": "".join(turn.chunks)})
+    pipeline.finish(messages, summary)
+    if engine is not None:
+        engine.speculate(session_id, messages, summary, FOLLOW_UPS)
+    time.sleep(rng.uniform(0.5, 1.5) * args.read_ms / 1000)
+
+    clicked = rng.random() < args.click_share
+    text = rng.choice(FOLLOW_UPS) if clicked else rng.choice(TYPED).format(order_id=f"OD{rng.randrange(10**9)}")
+    messages.append({"role": "user", "content": text})
+    started = time.perf_counter()
+    turn = engine.take(session_id, messages) if engine is not None else None
+    if turn is None:
+        turn = pipeline.respond(messages, summary)
+    first = next(iter(turn.chunks), None) and time.perf_counter() - started
+    for _ in turn.chunks:
+        pass
+    if turn.intent == "llm" and first:
+        results["click" if clicked else "typed"].append(first)
+
+
+def run(args, base_url, speculate):
+    gateway = GroqGateway("fake", args.rpm, args.tpm, base_url=base_url)
+    pipeline = ChatPipeline.from_data_files(gateway, poll_seconds=0, tracking=None, model=args.model,
+                                            analytics=Analytics(None))
+    engine = SpeculationEngine(pipeline, args.budget, workers=args.workers,
+                               max_queue_depth=args.max_queue_depth) if speculate else None
+    results = {"click": [], "typed": []}
+    threads = [threading.Thread(target=run_session, args=(pipeline, engine, random.Random(i), args, results))
+               for i in range(args.sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    pipeline.data.stop()
+    return {
+        "click_ttft_ms": percentiles(results["click"], 1000),
+        "typed_ttft_ms": percentiles(results["typed"], 1000),
+        "speculation": engine.stats() if engine is not None else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--read-ms", type=float, default=3000, help="mean time spent reading a reply")
+    parser.add_argument("--click-share", type=float, default=0.6)
+    parser.add_argument("--model", default=GROQ_MODEL_NAME)
+    parser.add_argument("--budget", type=int, default=8000, help="speculation tokens per session")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--max-queue-depth", type=int, default=0)
+    parser.add_argument("--rpm", type=float, default=1_000_000)
+    parser.add_argument("--tpm", type=float, default=1_000_000_000)
+    defaults = FakeGroqConfig()
+    for f in fields(FakeGroqConfig):
+        parser.add_argument("--" + f.name.replace("_", "-"), type=f.type, default=getattr(defaults, f.name))
+    args = parser.parse_args()
+
+    process, base_url = start_fake(args)
+    try:
+        for name, speculate in (("off", False), ("speculation", True)):
+            fake_stats(base_url, reset=True)
+            result = run(args, base_url, speculate)
+            result["upstream_requests"] = fake_stats(base_url)["requests"]
+            print(json.dumps({"run": name, **result}))
+    finally:
+        process.terminate()
+        process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+# benchmarks/bench_stream_render.py
+"""Server CPU and bytes sent per streamed reply, per-chunk redraw vs. StreamRenderer.
+
+Run from the FlipkartChatbot directory:
+
+    python -m benchmarks.bench_stream_render --tokens 200 2000 8000
+
+Elements are written through Streamlit itself: a script-run context is
+installed whose enqueue serializes every ForwardMsg the way the server does
+before sending it, so the CPU time includes building and serializing each
+update. A simulated clock streams ``--tokens-per-second`` one-token chunks
+without sleeping.
+
+``per_chunk`` is the old loop (whole reply + cursor on every chunk),
+``batched`` redraws the whole reply at most every ``--interval-ms``, and
+``incremental`` is StreamRenderer (batched, and finished blocks sent once).
+``history`` times one rerun of a long conversation, all messages vs. the
+rendered window.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+
+import streamlit as st
+from streamlit.runtime.fragment import MemoryFragmentStorage
+from streamlit.runtime.memory_uploaded_file_manager import MemoryUploadedFileManager
+from streamlit.runtime.runtime_util import serialize_forward_msg
+from streamlit.runtime.scriptrunner import ScriptRunContext, add_script_run_ctx
+from streamlit.runtime.state import SafeSessionState, SessionState
+
+from config import HISTORY_RENDER_WINDOW
+from stream_renderer import StreamRenderer
+
+WORDS = ["order", "delivery", "the", "your", "refund", "will", "be", "processed", "within", "days", "product",
+         "warranty", "please", "check", "and", "return", "policy", "for", "this", "item", "is", "available"]
+
+
+class Sink:
+    """Counts the serialized ForwardMsgs a script run would send"""
+
+    def __init__(self):
+        self.messages = 0
+        self.bytes = 0
+
+    def __call__(self, msg):
+        self.messages += 1
+        self.bytes += len(serialize_forward_msg(msg))
+
+
+def install_context():
+    sink = Sink()
+    ctx = ScriptRunContext(
+        session_id="bench", _enqueue=sink, query_string="",
+        session_state=SafeSessionState(SessionState(), lambda: None),
+        uploaded_file_mgr=MemoryUploadedFileManager("/upload"), main_script_path="", page_script_hash="",
+        user_info={"email": "bench@example.com"}, fragment_storage=MemoryFragmentStorage())
+    add_script_run_ctx(threading.current_thread(), ctx)
+    return sink
+
+
+def synthetic_reply(tokens, seed=5):
+    """One-token chunks of a markdown reply: paragraphs, a bullet list and a code block now and then"""
+    rng = random.Random(seed)
+    chunks = []
+    while len(chunks) < tokens:
+        kind = rng.random()
+        if kind < 0.15:
+            chunks += [f"- {rng.choice(WORDS)}", *(f" {rng.choice(WORDS)}" for _ in range(8)), "\n"] * 4
+        elif kind < 0.2:
+            chunks += ["```python\n"] + [f"x = {rng.choice(WORDS)!r}\n" for _ in range(12)] + ["```"]
+        else:
+            chunks += [f" {rng.choice(WORDS)}" for _ in range(rng.randrange(30, 90))] + ["."]
+        chunks.append("\n\n")
+    return chunks[:tokens]
+
+
+class SimulatedClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def per_chunk(container, chunks, clock, step, interval):
+    placeholder = container.empty()
+    text = ""
+    for chunk in chunks:
+        clock.now += step
+        text += chunk
+        placeholder.markdown(text + "▌")
+    placeholder.markdown(text)
+
+
+def batched(container, chunks, clock, step, interval):
+    placeholder = container.empty()
+    text, last = "", clock()
+    for chunk in chunks:
+        clock.now += step
+        text += chunk
+        if clock() - last >= interval:
+            placeholder.markdown(text + "▌")
+            last = clock()
+    placeholder.markdown(text)
+
+
+def incremental(container, chunks, clock, step, interval):
+    renderer = StreamRenderer(container, interval=interval, clock=clock)
+    for chunk in chunks:
+        clock.now += step
+        renderer.write(chunk)
+    renderer.close()
+
+
+def measure(sink, fn, *args):
+    sink.messages = sink.bytes = 0
+    started = time.process_time()
+    fn(*args)
+    return {"cpu_ms": round((time.process_time() - started) * 1000, 1), "updates": sink.messages,
+            "kb_sent": round(sink.bytes / 1024)}
+
+
+def render_history(messages):
+    for message in messages:
+        st.markdown(message)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tokens", type=int, nargs="+", default=[200, 2000, 8000])
+    parser.add_argument("--tokens-per-second", type=float, default=250)
+    parser.add_argument("--interval-ms", type=float, default=50)
+    parser.add_argument("--history-messages", type=int, default=400)
+    args = parser.parse_args()
+    sink = install_context()
+    step, interval = 1 / args.tokens_per_second, args.interval_ms / 1000
+
+    for tokens in args.tokens:
+        chunks = synthetic_reply(tokens)
+        result = {"case": "reply", "tokens": tokens, "chars": len("".join(chunks))}
+        for name, fn in (("per_chunk", per_chunk), ("batched", batched), ("incremental", incremental)):
+            result[name] = measure(sink, fn, st.container(), chunks, SimulatedClock(), step, interval)
+        print(json.dumps(result))
+
+    history = ["".join(synthetic_reply(150, seed=i)) for i in range(args.history_messages)]
+    print(json.dumps({"case": "history", "messages": len(history),
+                      "all": measure(sink, render_history, history),
+                      f"window_{HISTORY_RENDER_WINDOW}": measure(sink, render_history,
+                                                                 history[-HISTORY_RENDER_WINDOW:])}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# benchmarks/bench_telemetry.py
+"""Per-turn CPU cost of tracing and metrics in ChatPipeline.
+
+Run from the FlipkartChatbot directory:
+
+    python -m benchmarks.bench_telemetry --turns 5000 --chunks 200
+
+Each turn is a product question whose reply comes from an in-process
+gateway yielding ``--chunks`` chunks with no network or sleeps, so the
+time measured is the pipeline's own work: routing, retrieval, prompt
+assembly, the reply cache and single-flight, and the telemetry wrapped
+around them. Messages are unique, so every turn misses the reply cache.
+
+``off`` is the default configuration, ``metrics`` has METRICS_ENABLED,
+``sampled`` adds 10% trace sampling and ``traced`` traces every turn to a
+JSONL file. Overhead is relative to ``off``; a scrape of /metrics is timed
+at the end.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from analytics import Analytics
+from chat_pipeline import ChatPipeline
+from conversation_memory import ConversationSummary
+from telemetry import Telemetry
+
+QUESTIONS = ["Tell me about the Smartwatch Pro X", "Is the Premium Yoga Mat in stock?",
+             "Which headphones have noise cancelling?", "What warranty comes with the Ergonomic Office Chair?"]
+
+
+class InstantGateway:
+    """Gateway stand-in that streams a fixed reply at once"""
+    deadline_seconds = 30
+
+    def __init__(self, chunks):
+        self.chunks = [" word"] * chunks
+
+    def stream(self, priority=None, deadline=None, **request):
+        yield from self.chunks
+
+    def stats(self):
+        return {}
+
+
+def run(telemetry, turns, chunks):
+    pipeline = ChatPipeline.from_data_files(InstantGateway(chunks), poll_seconds=0, tracking=None,
+                                            telemetry=telemetry, analytics=Analytics(None))
+    samples = []
+    for i in range(turns):
+        messages = [{"role": "user", "content": f"{QUESTIONS[i % len(QUESTIONS)]} ({i})"}]
+        started = time.process_time()
+        trace = telemetry.start_trace("turn", session="bench")
+        turn = pipeline.respond(messages, ConversationSummary(), trace)
+        for _ in turn.chunks:
+            pass
+        trace.finish()
+        samples.append(time.process_time() - started)
+    pipeline.data.stop()
+    samples.sort()
+    return pipeline, {"mean_us": round(sum(samples) / len(samples) * 1e6, 1),
+                      "p50_us": round(samples[len(samples) // 2] * 1e6, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=5000)
+    parser.add_argument("--chunks", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        trace_path = os.path.join(directory, "traces.jsonl")
+        configs = {
+            "off": Telemetry(),
+            "metrics": Telemetry(metrics_enabled=True),
+            "sampled": Telemetry(0.1, trace_path, metrics_enabled=True),
+            "traced": Telemetry(1.0, trace_path, metrics_enabled=True),
+        }
+        # Warm up imports, indexes and the prompt artifacts
+        run(Telemetry(), 200, args.chunks)
+        results, baseline = {}, None
+        for name, telemetry in configs.items():
+            pipeline, result = run(telemetry, args.turns, args.chunks)
+            baseline = baseline or result["mean_us"]
+            result["overhead"] = f"{(result['mean_us'] - baseline) / baseline:+.1%}"
+            results[name] = result
+        started = time.perf_counter()
+        scrape = pipeline.telemetry.render_metrics()
+        print(json.dumps({"turns": args.turns, "chunks": args.chunks, **results,
+                          "scrape_ms": round((time.perf_counter() - started) * 1000, 3),
+                          "scrape_bytes": len(scrape)}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# benchmarks/bench_tracking_events.py
+"""Tracking log ingest and replay throughput, and status lookup latency.
+
+Run from the FlipkartChatbot directory:
+
+    python -m benchmarks.bench_tracking_events --orders 200000 --events 2000000
+
+Ingest appends ``--events`` synthetic carrier scans in batches of each
+``--batch-sizes`` size and reports events/sec (log write + view update).
+Replay rebuilds every view from the resulting log. Lookups compare the
+materialized view with rendering status from the order record.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from benchmarks.bench_order_store import synthetic_orders, LOCATIONS
+from benchmarks.bench_product_search import synthetic_catalog
+from data_layer import DataLayer
+from intent_router import format_order_timeline
+from tracking_events import TrackingService
+
+SCAN_STATUSES = ["In Transit", "Arrived at Hub", "Departed Hub", "Out for Delivery", "Delivered"]
+LOOKUPS = 100_000
+
+
+def synthetic_scans(orders, count, seed=9):
+    rng = random.Random(seed)
+    for i in range(count):
+        day = 1 + i * 28 // count
+        yield {
+            "tracking_number": "TRK%09d" % rng.randrange(orders),
+            "status": rng.choice(SCAN_STATUSES),
+            "at": "2025-02-%02dT%02d:%02d:00" % (day, rng.randrange(24), rng.randrange(60)),
+            "location": rng.choice(LOCATIONS),
+        }
+
+
+def write_data(directory, orders):
+    orders_path = os.path.join(directory, "orders.jsonl")
+    with open(orders_path, "w", encoding="utf-8") as f:
+        for order in synthetic_orders(orders):
+            f.write(json.dumps(order) + "\n")
+    products_path = os.path.join(directory, "products.json")
+    with open(products_path, "w", encoding="utf-8") as f:
+        json.dump(list(synthetic_catalog(100)), f)
+    return DataLayer(products_path, orders_path, poll_seconds=0)
+
+
+def bench_ingest(data, directory, scans, batch_size):
+    service = TrackingService(os.path.join(directory, f"log-{batch_size}.jsonl"), data, poll_seconds=0)
+    started = time.perf_counter()
+    for start in range(0, len(scans), batch_size):
+        service.ingest(scans[start:start + batch_size])
+    seconds = time.perf_counter() - started
+    return service, {"case": "ingest", "batch_size": batch_size, "events": len(scans),
+                     "events_per_second": round(len(scans) / seconds)}
+
+
+def lookup_latency(fn, keys):
+    samples = []
+    for key in keys:
+        started = time.perf_counter()
+        fn(key)
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return {"p50_us": round(statistics.median(samples) * 1e6, 2),
+            "p99_us": round(samples[int(len(samples) * 0.99) - 1] * 1e6, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=200_000)
+    parser.add_argument("--events", type=int, default=2_000_000)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[10, 1000, 10000])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        data = write_data(directory, args.orders)
+        scans = list(synthetic_scans(args.orders, args.events))
+        service = None
+        for batch_size in args.batch_sizes:
+            # Small batches are slow; a slice of the scans is enough to measure them
+            sample = scans if batch_size >= 1000 else scans[:len(scans) // 20]
+            service, result = bench_ingest(data, directory, sample, batch_size)
+            print(json.dumps(result))
+
+        events, seconds = service.replay()
+        print(json.dumps({"case": "replay", "events": events, "views": service.stats()["scanned_orders"],
+                          "events_per_second": round(events / seconds)}))
+
+        rng = random.Random(3)
+        order_store = data.snapshot.order_store
+        keys = ["ORD%08d" % rng.randrange(args.orders) for _ in range(LOOKUPS)]
+        print(json.dumps({"case": "lookup", "view": lookup_latency(service.view, keys),
+                          "view_timeline": lookup_latency(
+                              lambda k: format_order_timeline(order_store.get(k), "en", service.view(k)), keys),
+                          "record_timeline": lookup_latency(
+                              lambda k: format_order_timeline(order_store.get(k), "en"), keys)}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+# benchmarks/bench_voice.py
+"""Speech end to first reply audio over chat_api.py's /voice/ws.
+
+Run from the FlipkartChatbot directory:
+
+    python -m benchmarks.bench_voice --rounds 2
+    python -m benchmarks.bench_voice --fixtures recordings/ --stt vosk --tts espeak
+
+Starts ``benchmarks.fake_groq`` and serves chat_api.py's app in this
+process with its pipeline pointed at it. Each fixture utterance is
+streamed to /voice/ws in 20 ms chunks at real-time pace, one conversation
+at a time, and the client times the replies against the moment the
+speech in the fixture ended (where the voice activity detector puts its
+last voiced frame):
+
+- ``end_detect_ms``: until the transcript arrives (end-of-speech silence
+  plus the final decode)
+- ``first_token_ms``: until the first reply token
+- ``first_audio_ms``: until the first synthesized sentence arrives
+- ``whole_reply_audio_ms``: until the whole reply would have been spoken
+  had it been synthesized in one piece after it finished, as the
+  browser's speechSynthesis did: reply done plus one synthesis of the
+  full text
+
+Rounds after the first repeat the fixtures in new conversations, so the
+replies (not the reply cache) are the same and their sentences come from
+the audio cache.
+
+``--fixtures DIR`` reads recordings: a manifest.json of
+``{"file", "language", "transcript"}`` entries next to 16 kHz mono 16-bit
+WAV files. Without it, utterances are synthesized from FIXTURES as
+voiced bursts between room noise. ``--stt``/``--tts`` pick real engines
+(see voice.py); the default "fixture" engines stand in for them: the
+transcriber returns the fixture's transcript, spending ``--decode-rtf``
+of each chunk's duration decoding it and ``--final-decode-ms`` at the end,
+and the synthesizer returns a tone after ``--synthesis-ms-per-char``.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import time
+import uuid
+from dataclasses import fields
+
+import aiohttp
+import numpy as np
+from aiohttp import web
+
+from analytics import Analytics
+from benchmarks.bench_load import fake_stats, free_port, percentiles, start_fake
+from benchmarks.fake_groq import FakeGroqConfig
+from chat_api import create_app
+from chat_pipeline import ChatPipeline
+from config import GROQ_MODEL_NAME, VOICE_STT_MODELS, VOICE_TTS_VOICES
+from groq_client import GroqGateway
+from session_store import MemorySessionStore
+from voice import (SAMPLE_RATE, SYNTHESIZERS, TRANSCRIBERS, AudioCache, Voice, VoiceActivityDetector, read_wav,
+                   wav_bytes)
+
+FIXTURES = [
+    ("en", "where is my order"),
+    ("en", "I want to return the headphones I bought last week"),
+    ("en", "is the smartwatch pro x in stock"),
+    ("hi", "मेरा ऑर्डर कहाँ है"),
+    ("hi", "मुझे रिफंड कब मिलेगा"),
+]
+CHUNK_MS = 20
+CHUNK_BYTES = SAMPLE_RATE * CHUNK_MS // 1000 * 2
+
+
+class FixtureTranscriber:
+    """Stands in for a speech engine: the transcript is known, decoding time is simulated"""
+    name = "fixture"
+
+    def __init__(self, decode_rtf, final_decode_ms):
+        self.decode_rtf = decode_rtf
+        self.final_decode_ms = final_decode_ms
+        self.transcript = ""
+
+    def stream(self, language):
+        return _FixtureStream(self)
+
+
+class _FixtureStream:
+    def __init__(self, engine):
+        self.engine = engine
+        self.words = engine.transcript.split()
+        self.seconds = 0.0
+
+    def accept(self, pcm):
+        seconds = len(pcm) / (2 * SAMPLE_RATE)
+        time.sleep(seconds * self.engine.decode_rtf)
+        self.seconds += seconds
+        # Roughly two and a half words a second
+        return " ".join(self.words[:int(self.seconds * 2.5)]) or None
+
+    def finish(self):
+        time.sleep(self.engine.final_decode_ms / 1000)
+        return self.engine.transcript
+
+
+class ToneSynthesizer:
+    """Stands in for a TTS engine: a tone as long as the text would take to say"""
+    name = "tone"
+
+    def __init__(self, ms_per_char):
+        self.ms_per_char = ms_per_char
+
+    def synthesize(self, text, language):
+        time.sleep(len(text) * self.ms_per_char / 1000)
+        samples = np.arange(int(SAMPLE_RATE * len(text) * 0.06))
+        tone = (3000 * np.sin(2 * math.pi * 220 * samples / SAMPLE_RATE)).astype("<i2")
+        return wav_bytes(tone.tobytes())
+
+
+def synthetic_utterance(text, rng):
+    """Room noise, a voiced burst per syllable-sized piece of each word, and trailing noise, as PCM"""
+    def noise(ms, level):
+        return rng.normal(0, 32768 * 10 ** (level / 20), int(SAMPLE_RATE * ms / 1000))
+
+    parts = [noise(600, -62)]
+    for word in text.split():
+        for _ in range(max(1, len(word) // 3)):
+            t = np.arange(int(SAMPLE_RATE * 0.16)) / SAMPLE_RATE
+            pitch = rng.uniform(110, 220)
+            envelope = np.sin(math.pi * t / t[-1])
+            voiced = sum(np.sin(2 * math.pi * pitch * k * t) / k for k in range(1, 6)) * envelope * 6000
+            parts.append(voiced + noise(160, -45))
+        parts.append(noise(60, -62))
+    parts.append(noise(1500, -62))
+    return np.clip(np.concatenate(parts), -32768, 32767).astype("<i2").tobytes()
+
+
+def speech_end_ms(pcm):
+    """Where the voice activity detector puts the end of the last utterance in ``pcm``"""
+    vad, end = VoiceActivityDetector(), None
+    for offset in range(0, len(pcm), CHUNK_BYTES):
+        for kind, value in vad.push(pcm[offset:offset + CHUNK_BYTES]):
+            if kind == "end":
+                end = (offset + CHUNK_BYTES) * 1000 // (2 * SAMPLE_RATE) - value
+    return end if end is not None else len(pcm) * 1000 // (2 * SAMPLE_RATE)
+
+
+def load_fixtures(directory, seed):
+    if directory is None:
+        rng = np.random.default_rng(seed)
+        fixtures = [{"language": language, "transcript": text, "pcm": synthetic_utterance(text, rng)}
+                    for language, text in FIXTURES]
+    else:
+        with open(os.path.join(directory, "manifest.json"), encoding="utf-8") as f:
+            fixtures = json.load(f)
+        for fixture in fixtures:
+            fixture["pcm"] = read_wav(os.path.join(directory, fixture["file"]))
+    for fixture in fixtures:
+        fixture["speech_end_ms"] = speech_end_ms(fixture["pcm"])
+    return fixtures
+
+
+async def converse(session, url, fixture, transcriber):
+    """Stream one fixture and time the replies; returns the timings in ms from the end of speech"""
+    if isinstance(transcriber, FixtureTranscriber):
+        transcriber.transcript = fixture["transcript"]
+    marks, reply = {}, ""
+    async with session.ws_connect(url) as ws:
+        # A distinct opening turn keeps the reply cache out of the measurement
+        await ws.send_json({"type": "start", "language": fixture["language"], "conversation_id": uuid.uuid4().hex,
+                            "messages": [{"role": "assistant", "content": f"Hello {uuid.uuid4().hex[:8]}"}]})
+        started = time.perf_counter()
+
+        async def send():
+            pcm = fixture["pcm"]
+            for i, offset in enumerate(range(0, len(pcm), CHUNK_BYTES)):
+                await asyncio.sleep(max(0.0, started + i * CHUNK_MS / 1000 - time.perf_counter()))
+                await ws.send_bytes(pcm[offset:offset + CHUNK_BYTES])
+
+        sender = asyncio.create_task(send())
+        async for msg in ws:
+            now = time.perf_counter()
+            if msg.type != aiohttp.WSMsgType.TEXT:
+                continue
+            data = json.loads(msg.data)
+            kind = data["type"]
+            if kind in ("transcript", "token", "done", "audio") and kind not in marks:
+                marks[kind] = now
+            if kind == "done":
+                reply = data["content"]
+            elif kind == "error":
+                raise RuntimeError(data["error"])
+            elif kind == "audio_done" or (kind == "transcript" and not data["text"]):
+                break
+        sender.cancel()
+    speech_end = started + fixture["speech_end_ms"] / 1000
+    return {kind: (t - speech_end) * 1000 for kind, t in marks.items()}, reply
+
+
+async def run(args, base_url):
+    gateway = GroqGateway("fake", args.rpm, args.tpm, base_url=base_url)
+    pipeline = ChatPipeline.from_data_files(gateway, poll_seconds=0, tracking=None, model=args.model,
+                                            analytics=Analytics(None))
+    if args.stt == "fixture":
+        transcriber = FixtureTranscriber(args.decode_rtf, args.final_decode_ms)
+    else:
+        transcriber = TRANSCRIBERS[args.stt](VOICE_STT_MODELS)
+    synthesizer = (ToneSynthesizer(args.synthesis_ms_per_char) if args.tts == "fixture"
+                   else SYNTHESIZERS[args.tts](VOICE_TTS_VOICES))
+    voice = Voice(transcriber, synthesizer, AudioCache(), end_silence_ms=args.end_silence_ms)
+    runner = web.AppRunner(create_app(pipeline, MemorySessionStore(), voice))
+    await runner.setup()
+    port = free_port()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    url = f"http://127.0.0.1:{port}/voice/ws"
+    fixtures = load_fixtures(args.fixtures, args.seed)
+    results = []
+    try:
+        async with aiohttp.ClientSession() as session:
+            for round_number in range(args.rounds):
+                samples = []
+                for fixture in fixtures:
+                    marks, reply = await converse(session, url, fixture, transcriber)
+                    # What speaking the reply after it finished would have added
+                    started = time.perf_counter()
+                    await asyncio.get_running_loop().run_in_executor(
+                        None, synthesizer.synthesize, reply, fixture["language"])
+                    marks["whole"] = marks.get("done", 0.0) + (time.perf_counter() - started) * 1000
+                    samples.append(marks)
+                results.append({
+                    "round": round_number + 1,
+                    "utterances": len(samples),
+                    "end_detect_ms": percentiles([s["transcript"] for s in samples if "transcript" in s]),
+                    "first_token_ms": percentiles([s["token"] for s in samples if "token" in s]),
+                    "first_audio_ms": percentiles([s["audio"] for s in samples if "audio" in s]),
+                    "whole_reply_audio_ms": percentiles([s["whole"] for s in samples]),
+                    "audio_cache": voice.cache.stats(),
+                })
+    finally:
+        await runner.cleanup()
+        pipeline.data.stop()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fixtures", help="directory with manifest.json and recorded WAV files")
+    parser.add_argument("--rounds", type=int, default=2)
+    parser.add_argument("--stt", default="fixture", choices=["fixture"] + sorted(TRANSCRIBERS))
+    parser.add_argument("--tts", default="fixture", choices=["fixture"] + sorted(SYNTHESIZERS))
+    parser.add_argument("--decode-rtf", type=float, default=0.1, help="fixture decoder time per second of audio")
+    parser.add_argument("--final-decode-ms", type=float, default=40)
+    parser.add_argument("--synthesis-ms-per-char", type=float, default=1.5)
+    parser.add_argument("--end-silence-ms", type=int, default=500)
+    parser.add_argument("--model", default=GROQ_MODEL_NAME)
+    parser.add_argument("--rpm", type=float, default=1_000_000)
+    parser.add_argument("--tpm", type=float, default=1_000_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    defaults = FakeGroqConfig()
+    for f in fields(FakeGroqConfig):
+        if f.name != "seed":
+            parser.add_argument("--" + f.name.replace("_", "-"), type=f.type, default=getattr(defaults, f.name))
+    args = parser.parse_args()
+
+    process, base_url = start_fake(args)
+    try:
+        fake_stats(base_url, reset=True)
+        for result in asyncio.run(run(args, base_url)):
+            print(json.dumps(result, ensure_ascii=False))
+    finally:
+        process.terminate()
+        process.wait()
+
+
+if __name__ == "__main__":
+    main()
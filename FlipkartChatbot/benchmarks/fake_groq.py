@@ -0,0 +1,195 @@
+# benchmarks/fake_groq.py
+"""Local OpenAI/Groq-compatible chat completions server for offline benchmarks.
+
+Run from the FlipkartChatbot directory:
+
+    python -m benchmarks.fake_groq --port 8931 --ttft-ms 300 --tokens-per-second 250 --rate-limit-rate 0.02
+
+and point the app at it with ``GROQ_BASE_URL=http://127.0.0.1:8931``.
+``POST /openai/v1/chat/completions`` answers streaming and non-streaming
+requests: after ``--ttft-ms`` (± ``--ttft-jitter-ms``) it sends
+``--reply-tokens`` words (capped by the request's max_tokens) at
+``--tokens-per-second``, in Hindi if the last message has Devanagari in it,
+as sentences of ``--sentence-words`` words.
+
+Failures are injected per request: ``--rate-limit-rate`` answers 429 with
+Retry-After, ``--error-rate`` answers 500, and ``--mid-stream-error-rate``
+drops the connection halfway through a streamed reply. ``--stall-ms``
+pauses every streamed reply once halfway through, as a generation that
+slows down does.
+
+``--model-ttft-ms`` and ``--model-rate-limit-rate`` take ``model=value``
+pairs separated by commas to make one model slower or more rate limited
+than the others, e.g. ``--model-ttft-ms llama3-70b-8192=900``.
+
+``GET /stats`` returns request counters and the prompt/completion tokens
+served; ``POST /stats/reset`` zeroes them.
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass
+
+from aiohttp import web
+
+from retrieval import estimate_tokens
+
+COMPLETIONS_PATH = "/openai/v1/chat/completions"
+EN_WORDS = ["your", "order", "is", "on", "its", "way", "and", "should", "arrive", "within", "two", "days", "you",
+            "can", "track", "it", "from", "the", "orders", "page", "let", "me", "know", "if", "anything", "else"]
+HI_WORDS = ["आपका", "ऑर्डर", "रास्ते", "में", "है", "और", "दो", "दिनों", "में", "पहुंच", "जाएगा", "आप", "इसे",
+            "ऑर्डर", "पेज", "से", "ट्रैक", "कर", "सकते", "हैं"]
+_DEVANAGARI = re.compile(r'[\u0900-\u097F]')
+
+
+@dataclass
+class FakeGroqConfig:
+    ttft_ms: float = 300.0
+    ttft_jitter_ms: float = 100.0
+    tokens_per_second: float = 250.0
+    reply_tokens: int = 120
+    # Words per sentence; each sentence ends with a full stop (a danda in Hindi)
+    sentence_words: int = 12
+    # Tokens are written in batches this often rather than one timer per token
+    chunk_ms: float = 20.0
+    rate_limit_rate: float = 0.0
+    retry_after_seconds: float = 0.5
+    error_rate: float = 0.0
+    mid_stream_error_rate: float = 0.0
+    stall_ms: float = 0.0
+    # Per-model overrides of ttft_ms and rate_limit_rate, as "model=value,model=value"
+    model_ttft_ms: str = ""
+    model_rate_limit_rate: str = ""
+    seed: int = 0
+
+
+def _per_model(spec):
+    pairs = (item.rsplit("=", 1) for item in spec.split(",") if item.strip())
+    return {model.strip(): float(value) for model, value in pairs}
+
+
+class FakeGroq:
+    def __init__(self, config):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.stats = Counter()
+        self.model_ttft_ms = _per_model(config.model_ttft_ms)
+        self.model_rate_limit_rate = _per_model(config.model_rate_limit_rate)
+
+    def _reply_words(self, request):
+        last = request["messages"][-1].get("content") or ""
+        hindi = _DEVANAGARI.search(last)
+        words, stop = (HI_WORDS, "।") if hindi else (EN_WORDS, ".")
+        count = min(self.config.reply_tokens, request.get("max_tokens") or self.config.reply_tokens)
+        sentence = self.config.sentence_words
+        return [" " + words[i % len(words)] + (stop if sentence and (i + 1) % sentence == 0 else "")
+                for i in range(count)]
+
+    def _error(self, request):
+        """An injected failure response for this request, or None"""
+        roll = self.rng.random()
+        rate_limit_rate = self.model_rate_limit_rate.get(request.get("model"), self.config.rate_limit_rate)
+        if roll < rate_limit_rate:
+            self.stats["rate_limited"] += 1
+            return web.json_response({"error": {"message": "Rate limit reached", "type": "rate_limit_exceeded"}},
+                                     status=429, headers={"Retry-After": str(self.config.retry_after_seconds)})
+        if roll < rate_limit_rate + self.config.error_rate:
+            self.stats["errors"] += 1
+            return web.json_response({"error": {"message": "Internal server error"}}, status=500)
+        return None
+
+    async def completions(self, request):
+        body = await request.json()
+        self.stats["requests"] += 1
+        self.stats["requests." + str(body.get("model"))] += 1
+        prompt_tokens = sum(estimate_tokens(m.get("content") or "") for m in body.get("messages", ()))
+        failure = self._error(body)
+        if failure is not None:
+            return failure
+        self.stats["prompt_tokens"] += prompt_tokens
+        ttft_ms = self.model_ttft_ms.get(body.get("model"), self.config.ttft_ms)
+        ttft = max(0.0, ttft_ms + self.rng.uniform(-1, 1) * self.config.ttft_jitter_ms) / 1000
+        await asyncio.sleep(ttft)
+        words = self._reply_words(body)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(words),
+                 "total_tokens": prompt_tokens + len(words)}
+        if not body.get("stream"):
+            await asyncio.sleep(len(words) / self.config.tokens_per_second)
+            self.stats["completion_tokens"] += len(words)
+            return web.json_response({
+                "id": f"fake-{self.stats['requests']}", "object": "chat.completion", "created": int(time.time()),
+                "model": body.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(words).strip()},
+                             "finish_reason": "stop"}],
+                "usage": usage,
+            })
+        self.stats["streams"] += 1
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        try:
+            await self._stream(request, response, body, words, usage)
+        except ConnectionResetError:
+            # The client gave up, e.g. its first-token budget ran out
+            self.stats["client_disconnects"] += 1
+        return response
+
+    async def _stream(self, request, response, body, words, usage):
+        fail_at = len(words) // 2 if self.rng.random() < self.config.mid_stream_error_rate else None
+        stall_at = len(words) // 2 if self.config.stall_ms > 0 else None
+        await response.prepare(request)
+        per_chunk = max(1, round(self.config.tokens_per_second * self.config.chunk_ms / 1000))
+        for start in range(0, len(words), per_chunk):
+            if fail_at is not None and start >= fail_at:
+                self.stats["mid_stream_errors"] += 1
+                request.transport.close()
+                return
+            if stall_at is not None and start >= stall_at:
+                stall_at = None
+                await asyncio.sleep(self.config.stall_ms / 1000)
+            batch = words[start:start + per_chunk]
+            await response.write(b"".join(b"data: " + json.dumps({
+                "id": "fake", "object": "chat.completion.chunk", "model": body.get("model"),
+                "choices": [{"index": 0, "delta": {"content": word}, "finish_reason": None}],
+            }).encode() + b"\n\n" for word in batch))
+            self.stats["completion_tokens"] += len(batch)
+            if start + per_chunk < len(words):
+                await asyncio.sleep(len(batch) / self.config.tokens_per_second)
+        await response.write(b"data: " + json.dumps({
+            "id": "fake", "object": "chat.completion.chunk", "model": body.get("model"),
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "x_groq": {"usage": usage},
+        }).encode() + b"\n\ndata: [DONE]\n\n")
+
+    async def get_stats(self, request):
+        return web.json_response(dict(self.stats))
+
+    async def reset_stats(self, request):
+        self.stats.clear()
+        return web.json_response({})
+
+
+def create_app(config):
+    fake = FakeGroq(config)
+    app = web.Application(client_max_size=32 * 2 ** 20)
+    app.router.add_post(COMPLETIONS_PATH, fake.completions)
+    app.router.add_get("/stats", fake.get_stats)
+    app.router.add_post("/stats/reset", fake.reset_stats)
+    return app
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8931)
+    defaults = FakeGroqConfig()
+    for name, value in vars(defaults).items():
+        parser.add_argument("--" + name.replace("_", "-"), type=type(value), default=value)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    config = FakeGroqConfig(**{k: v for k, v in vars(args).items() if k not in ("host", "port")})
+    web.run_app(create_app(config), host=args.host, port=args.port, print=None, backlog=4096)
@@ -0,0 +1,481 @@
+# chat_api.py
+"""Headless chat API: POST /chat streams the reply over Server-Sent Events,
+GET /chat/ws streams it over a WebSocket.
+
+Run with ``python chat_api.py``. Requests carry the whole conversation:
+
+    {"conversation_id": "...", "messages": [{"role": "user", "content": "..."}]}
+
+The last message must be from the user. Each turn claims the conversation
+in the session store (see session_store.py) together with that message,
+and the reply is saved when the claim is released, so with
+SESSION_BACKEND=sqlite any worker can carry on a conversation another one
+started. Once a conversation is stored, its stored history is what the
+reply is built from and what is saved; the messages before the last one
+in a request only start a conversation the store hasn't seen. A turn for a
+conversation another worker is still answering gets 409 (or an error
+event on a socket). The rolling summary of older turns is cached per
+conversation_id in this process.
+
+The server binds CHAT_API_HOST (127.0.0.1 unless set) and won't start on
+any other address without CHAT_API_TOKEN. With the token set, every request
+but GET /health needs it in an ``Authorization: Bearer`` header. Browsers
+may call it from CHAT_API_CORS_ORIGINS (the landing page by default).
+
+GET /metrics serves Prometheus metrics when METRICS_ENABLED=1, and GET
+/traces the last sampled turn traces (TRACE_SAMPLE_RATE).
+
+POST /tracking/events appends a batch of carrier scans (a JSON array, see
+tracking_events.py) to the tracking log. It needs the TRACKING_INGEST_TOKEN
+secret in an X-Ingest-Token header, is refused while that isn't set, and
+never gets CORS headers: it is for carriers' servers, not browsers.
+
+GET /voice/ws holds a voice conversation (see voice.py). The client sends
+
+    {"type": "start", "conversation_id": "...", "messages": [...earlier turns], "language": "en"}
+
+then 16 kHz mono 16-bit PCM as binary messages, e.g. one per 20 ms.
+While the user speaks the server sends {"type": "partial", "text"}; when
+speech ends, {"type": "transcript", "text"}, then the reply's meta, token
+and done events as on /chat/ws. Each sentence of the reply is sent as it
+is synthesized, during the token stream: an {"type": "audio", "index",
+"sentence", "format": "wav", "bytes"} message followed by the WAV as a
+binary message; {"type": "audio_done"} follows the last one. The socket
+stays open for the next utterance. {"type": "end"} closes an utterance
+the client cut off without trailing silence.
+"""
+import asyncio
+import hmac
+import ipaddress
+import json
+import logging
+import os
+import uuid
+from collections import OrderedDict
+from dataclasses import asdict
+
+from aiohttp import web, WSMsgType
+
+from config import (CHAT_API_HOST, CHAT_API_PORT, CHAT_API_CORS_ORIGINS, CHAT_API_MAX_CONVERSATIONS, CHAT_API_TOKEN,
+                    SESSION_BACKEND, SESSION_DB_PATH, SESSION_LEASE_SECONDS, SESSION_MAX_AGE_DAYS,
+                    TRACKING_INGEST_TOKEN)
+from chat_pipeline import ChatPipeline, create_groq_gateway
+from conversation_memory import ConversationSummary
+from language_id import detect_language
+from session_store import SessionStore, create_session_store
+from telemetry import PROMETHEUS_CONTENT_TYPE
+from voice import Voice, create_voice
+
+MAX_REQUEST_MESSAGES = 500
+MAX_TRACKING_BATCH = 10_000
+MAX_MESSAGE_CHARS = 8000
+CHAT_ROLES = {"user", "assistant"}
+# Server-to-server endpoints a browser page has no business calling
+NO_CORS_PATHS = {"/tracking/events"}
+# Paths served without CHAT_API_TOKEN: the health check, and scan ingest, which has its own token
+OPEN_PATHS = {"/health", "/tracking/events"}
+BUSY_ERROR = "this conversation is still being answered elsewhere; try again when that reply is done"
+
+PIPELINE_KEY = web.AppKey("pipeline", ChatPipeline)
+SUMMARIES_KEY = web.AppKey("summaries", OrderedDict)
+SESSIONS_KEY = web.AppKey("sessions", SessionStore)
+VOICE_KEY = web.AppKey("voice", Voice)
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def parse_chat_request(body):
+    """Validate a chat request body; returns (conversation_id, messages)"""
+    if not isinstance(body, dict):
+        raise BadRequest("request body must be a JSON object")
+    messages = body.get("messages")
+    if not isinstance(messages, list) or not messages:
+        raise BadRequest("'messages' must be a non-empty list")
+    if len(messages) > MAX_REQUEST_MESSAGES:
+        raise BadRequest(f"at most {MAX_REQUEST_MESSAGES} messages per request")
+    cleaned = []
+    for message in messages:
+        if (not isinstance(message, dict) or message.get("role") not in CHAT_ROLES
+                or not isinstance(message.get("content"), str)):
+            raise BadRequest("each message needs a 'role' of user/assistant and a string 'content'")
+        if len(message["content"]) > MAX_MESSAGE_CHARS:
+            raise BadRequest(f"messages are limited to {MAX_MESSAGE_CHARS} characters")
+        cleaned.append({"role": message["role"], "content": message["content"]})
+    if cleaned[-1]["role"] != "user" or not cleaned[-1]["content"].strip():
+        raise BadRequest("the last message must be a non-empty user message")
+    conversation_id = body.get("conversation_id") or str(uuid.uuid4())
+    return str(conversation_id), cleaned
+
+
+def conversation_summary(app, session):
+    """Rolling summary for a conversation, kept in a bounded LRU and seeded from its claimed Session.
+
+    The claim has just read the session from the store, so seeding needs no
+    further (blocking) read on the event loop.
+    """
+    summaries = app[SUMMARIES_KEY]
+    conversation_id = session.session_id
+    summary = summaries.get(conversation_id)
+    if summary is None:
+        summary = summaries[conversation_id] = ConversationSummary()
+        summary.update(session.summary_text, session.summary_covered)
+        while len(summaries) > CHAT_API_MAX_CONVERSATIONS:
+            summaries.popitem(last=False)
+    else:
+        summaries.move_to_end(conversation_id)
+    return summary
+
+
+def claim_turn(sessions, conversation_id, owner, messages):
+    """Claim the conversation for one reply, adding the request's user message to the stored history.
+
+    Returns the claimed Session, or None while another worker holds the claim.
+    """
+    def add_user_message(session):
+        if not session.messages:
+            session.messages = list(messages)
+        elif not (session.awaiting_reply and session.messages[-1] == messages[-1]):
+            # A retry of a turn whose worker died is already in the history
+            session.messages.append(messages[-1])
+
+    return sessions.claim(conversation_id, owner, SESSION_LEASE_SECONDS, add_user_message)
+
+
+def release_turn(sessions, conversation_id, owner, reply, summary):
+    """Save the reply and drop the claim, if it wasn't taken over in the meantime"""
+    def store(session):
+        session.messages.append({"role": "assistant", "content": reply})
+        session.summary_text, session.summary_covered = summary.snapshot()
+
+    return sessions.release(conversation_id, owner, store)
+
+
+async def reply_events(app, conversation_id, messages):
+    """Yield (event, data) pairs for one reply: meta, token..., done (or one error event if it's claimed elsewhere)"""
+    pipeline = app[PIPELINE_KEY]
+    sessions = app[SESSIONS_KEY]
+    loop = asyncio.get_running_loop()
+    owner = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    trace = pipeline.telemetry.start_trace("turn", session=conversation_id)
+    with trace.span("input"):
+        session = await loop.run_in_executor(None, claim_turn, sessions, conversation_id, owner, messages)
+        summary = conversation_summary(app, session) if session is not None else None
+    if session is None:
+        yield "error", {"conversation_id": conversation_id, "error": BUSY_ERROR}
+        return
+    messages = session.messages
+    saved = False
+    try:
+        turn = pipeline.arespond(messages, summary, trace)
+        yield "meta", {
+            "conversation_id": conversation_id,
+            "intent": turn.intent,
+            "context": asdict(turn.context_stats) if turn.context_stats else None,
+        }
+        reply = []
+        async for chunk in turn.chunks:
+            reply.append(chunk)
+            yield "token", {"delta": chunk}
+        full_response = "".join(reply)
+        messages = messages + [{"role": "assistant", "content": full_response}]
+        pipeline.finish(messages, summary)
+        with trace.span("save"):
+            await loop.run_in_executor(None, release_turn, sessions, conversation_id, owner, full_response, summary)
+        saved = True
+    finally:
+        if not saved:
+            # The client went away mid-reply: leave the message unanswered but claimable at once
+            await loop.run_in_executor(None, sessions.release, conversation_id, owner)
+    trace.finish()
+    yield "done", {"conversation_id": conversation_id, "content": full_response}
+
+
+async def read_json(request):
+    try:
+        return await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        raise BadRequest("request body is not valid JSON")
+
+
+async def write_event(response, event, data):
+    await response.write(f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8"))
+
+
+async def chat_sse(request):
+    try:
+        conversation_id, messages = parse_chat_request(await read_json(request))
+    except BadRequest as e:
+        return web.json_response({"error": str(e)}, status=400)
+
+    events = reply_events(request.app, conversation_id, messages)
+    # Closed here rather than left to the garbage collector, so a client that went away releases its turn now
+    try:
+        first = await events.__anext__()
+        if first[0] == "error":
+            return web.json_response(first[1], status=409)
+        response = web.StreamResponse(headers={
+            "Content-Type": "text/event-stream; charset=utf-8",
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        })
+        await response.prepare(request)
+        await write_event(response, *first)
+        async for event, data in events:
+            await write_event(response, event, data)
+        await response.write_eof()
+        return response
+    finally:
+        await events.aclose()
+
+
+async def chat_ws(request):
+    ws = web.WebSocketResponse(heartbeat=30)
+    await ws.prepare(request)
+    async for msg in ws:
+        if msg.type != WSMsgType.TEXT:
+            continue
+        try:
+            conversation_id, messages = parse_chat_request(json.loads(msg.data))
+        except (json.JSONDecodeError, BadRequest) as e:
+            await ws.send_json({"type": "error", "error": str(e)})
+            continue
+        events = reply_events(request.app, conversation_id, messages)
+        try:
+            async for event, data in events:
+                await ws.send_json({"type": event, **data}, dumps=lambda d: json.dumps(d, ensure_ascii=False))
+        finally:
+            await events.aclose()
+    return ws
+
+
+def parse_voice_start(body):
+    """Validate a voice start message; returns (conversation_id, earlier messages, language)"""
+    messages = body.get("messages") or []
+    if messages:
+        # Validated like a chat request, with a stand-in for the turn still to be spoken
+        _, messages = parse_chat_request({"messages": messages + [{"role": "user", "content": "-"}]})
+        messages.pop()
+    language = body.get("language") or "en"
+    if language not in ("en", "hi"):
+        raise BadRequest("'language' must be 'en' or 'hi'")
+    return str(body.get("conversation_id") or uuid.uuid4()), messages, language
+
+
+async def get_voice(app):
+    """The process's Voice, created (and its models loaded) on first use"""
+    if app[VOICE_KEY] is None:
+        app[VOICE_KEY] = await asyncio.get_running_loop().run_in_executor(None, create_voice)
+    return app[VOICE_KEY]
+
+
+def _dumps(data):
+    return json.dumps(data, ensure_ascii=False)
+
+
+async def send_audio(ws, ready):
+    for index, sentence, audio in ready:
+        if audio is None:
+            # This sentence stays silent; the reply text and the rest of the audio still come
+            await ws.send_json({"type": "audio_error", "index": index, "sentence": sentence,
+                                "error": "could not synthesize this sentence"}, dumps=_dumps)
+            continue
+        await ws.send_json({"type": "audio", "index": index, "sentence": sentence, "format": "wav",
+                            "bytes": len(audio)}, dumps=_dumps)
+        await ws.send_bytes(audio)
+
+
+async def synthesized(future):
+    """Audio from a synthesis future, or None if it failed (Voice.synthesize logs it)"""
+    try:
+        return await asyncio.wrap_future(future)
+    except Exception:
+        return None
+
+
+async def voice_reply(ws, app, voice, conversation_id, messages, utterance):
+    """Answer one transcribed utterance, speaking the reply a sentence at a time"""
+    await ws.send_json({"type": "transcript", "text": utterance.text, "speech_ms": utterance.speech_ms}, dumps=_dumps)
+    if not utterance.text:
+        return
+    messages.append({"role": "user", "content": utterance.text})
+    speaker = voice.speaker(detect_language(utterance.text))
+    events = reply_events(app, conversation_id, list(messages))
+    try:
+        async for event, data in events:
+            await ws.send_json({"type": event, **data}, dumps=_dumps)
+            if event == "token":
+                speaker.feed(data["delta"])
+                await send_audio(ws, speaker.ready())
+            elif event == "done":
+                messages.append({"role": "assistant", "content": data["content"]})
+    finally:
+        await events.aclose()
+    speaker.close()
+    for index, sentence, future in speaker.remaining():
+        await send_audio(ws, [(index, sentence, await synthesized(future))])
+    await ws.send_json({"type": "audio_done"})
+
+
+async def voice_ws(request):
+    ws = web.WebSocketResponse(heartbeat=30)
+    await ws.prepare(request)
+    try:
+        voice = await get_voice(request.app)
+    except (RuntimeError, ValueError) as e:
+        await ws.send_json({"type": "error", "error": f"voice is unavailable: {e}"})
+        await ws.close()
+        return ws
+    loop = asyncio.get_running_loop()
+    listener, conversation_id, messages = None, None, []
+    async for msg in ws:
+        events = []
+        if msg.type == WSMsgType.TEXT:
+            try:
+                body = json.loads(msg.data)
+                if not isinstance(body, dict):
+                    raise BadRequest("messages must be JSON objects")
+                if body.get("type") == "start":
+                    conversation_id, messages, language = parse_voice_start(body)
+                    listener = voice.listener(language)
+                elif body.get("type") == "end" and listener is not None:
+                    events = await loop.run_in_executor(None, listener.finish)
+            except (json.JSONDecodeError, BadRequest) as e:
+                await ws.send_json({"type": "error", "error": str(e)})
+                continue
+        elif msg.type == WSMsgType.BINARY:
+            if listener is None:
+                await ws.send_json({"type": "error", "error": "send a start message before audio"})
+                continue
+            # Detection and decoding are CPU work; keep them off the event loop
+            events = await loop.run_in_executor(None, listener.push, msg.data)
+        for kind, value in events:
+            if kind == "partial":
+                await ws.send_json({"type": "partial", "text": value}, dumps=_dumps)
+            else:
+                await voice_reply(ws, request.app, voice, conversation_id, messages, value)
+    return ws
+
+
+def ingest_authorized(request):
+    supplied = request.headers.get("X-Ingest-Token", "")
+    return bool(TRACKING_INGEST_TOKEN) and hmac.compare_digest(supplied.encode(), TRACKING_INGEST_TOKEN.encode())
+
+
+async def tracking_events(request):
+    tracking = request.app[PIPELINE_KEY].tracking
+    if tracking is None:
+        return web.json_response({"error": "tracking log is disabled"}, status=404)
+    if not TRACKING_INGEST_TOKEN:
+        return web.json_response({"error": "scan ingest is disabled (set TRACKING_INGEST_TOKEN)"}, status=403)
+    if not ingest_authorized(request):
+        return web.json_response({"error": "missing or wrong X-Ingest-Token"}, status=401)
+    try:
+        body = await read_json(request)
+        events = body.get("events") if isinstance(body, dict) else body
+        if not isinstance(events, list) or len(events) > MAX_TRACKING_BATCH:
+            raise BadRequest(f"expected a list of at most {MAX_TRACKING_BATCH} events")
+    except BadRequest as e:
+        return web.json_response({"error": str(e)}, status=400)
+    # File append and view updates are blocking; keep them off the event loop
+    accepted, errors = await asyncio.get_running_loop().run_in_executor(None, tracking.ingest, events)
+    return web.json_response({"accepted": accepted, "errors": errors}, status=200 if accepted or not errors else 400)
+
+
+async def health(request):
+    pipeline = request.app[PIPELINE_KEY]
+    return web.json_response({
+        "status": "ok",
+        "data_version": pipeline.data_version,
+        "data_generation": pipeline.data.snapshot.generation,
+        "context_mode": pipeline.context_mode,
+        "prompt_hash": pipeline.prompt_artifacts.content_hash,
+        "in_flight": pipeline.single_flight.in_flight(),
+        "conversations": len(request.app[SUMMARIES_KEY]),
+    })
+
+
+async def metrics(request):
+    pipeline = request.app[PIPELINE_KEY]
+    if not pipeline.telemetry.metrics_enabled:
+        return web.json_response({"error": "metrics are disabled (METRICS_ENABLED=1 turns them on)"}, status=404)
+    return web.Response(body=pipeline.telemetry.render_metrics().encode(),
+                        headers={"Content-Type": PROMETHEUS_CONTENT_TYPE})
+
+
+async def traces(request):
+    """The last sampled turns, oldest first"""
+    return web.json_response(list(request.app[PIPELINE_KEY].telemetry.tracer.recent))
+
+
+async def preflight(request):
+    return web.Response(status=204)
+
+
+def api_authorized(request):
+    supplied = request.headers.get("Authorization", "")
+    return hmac.compare_digest(supplied.encode(), f"Bearer {CHAT_API_TOKEN}".encode())
+
+
+@web.middleware
+async def require_token(request, handler):
+    # Preflights carry no credentials; the request they clear is checked
+    if (CHAT_API_TOKEN and request.method != "OPTIONS" and request.path not in OPEN_PATHS
+            and not api_authorized(request)):
+        return web.json_response({"error": "missing or wrong Authorization bearer token"}, status=401)
+    return await handler(request)
+
+
+def is_loopback(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+async def add_cors_headers(request, response):
+    # Runs before headers go out, so streamed SSE responses get them too
+    if request.path in NO_CORS_PATHS:
+        return
+    origins = [o.strip() for o in CHAT_API_CORS_ORIGINS.split(",") if o.strip()]
+    origin = request.headers.get("Origin")
+    allowed = "*" if "*" in origins else (origin if origin in origins else None)
+    if allowed:
+        response.headers["Access-Control-Allow-Origin"] = allowed
+        response.headers["Access-Control-Allow-Methods"] = "GET, POST, OPTIONS"
+        response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization"
+
+
+async def close_gateway(app):
+    await app[PIPELINE_KEY].gateway.aclose()
+
+
+def create_app(pipeline=None, sessions=None, voice=None):
+    app = web.Application(middlewares=[require_token])
+    app[PIPELINE_KEY] = pipeline or ChatPipeline.from_data_files(create_groq_gateway())
+    app[SUMMARIES_KEY] = OrderedDict()
+    app[SESSIONS_KEY] = sessions or create_session_store(SESSION_BACKEND, SESSION_DB_PATH,
+                                                         SESSION_MAX_AGE_DAYS * 86400)
+    app[VOICE_KEY] = voice
+    app.router.add_post("/chat", chat_sse)
+    app.router.add_route("OPTIONS", "/chat", preflight)
+    app.router.add_get("/chat/ws", chat_ws)
+    app.router.add_get("/voice/ws", voice_ws)
+    app.router.add_post("/tracking/events", tracking_events)
+    app.router.add_get("/health", health)
+    app.router.add_get("/metrics", metrics)
+    app.router.add_get("/traces", traces)
+    app.on_response_prepare.append(add_cors_headers)
+    app.on_cleanup.append(close_gateway)
+    return app
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if not CHAT_API_TOKEN and not is_loopback(CHAT_API_HOST):
+        raise SystemExit(f"refusing to serve on {CHAT_API_HOST} without CHAT_API_TOKEN; "
+                         "set it, or bind 127.0.0.1 behind a proxy")
+    web.run_app(create_app(), host=CHAT_API_HOST, port=CHAT_API_PORT, backlog=4096)
@@ -0,0 +1,62 @@
+# chat_client.py
+import json
+
+import httpx
+
+from chat_pipeline import ChatTurn, ERROR_REPLY
+from retrieval import ContextStats
+
+
+def iter_sse(lines):
+    """Parse a Server-Sent Events line stream into (event, data) pairs"""
+    event, data = "message", []
+    for line in lines:
+        if not line:
+            if data:
+                yield event, "\n".join(data)
+            event, data = "message", []
+        elif line.startswith("event:"):
+            event = line[6:].strip()
+        elif line.startswith("data:"):
+            data.append(line[5:].lstrip())
+
+
+class ChatApiClient:
+    """Thin client of chat_api.py for UIs that stream replies over SSE"""
+
+    def __init__(self, base_url, token="", timeout_seconds=60.0):
+        self.http_client = httpx.Client(base_url=base_url.rstrip("/"),
+                                        headers={"Authorization": f"Bearer {token}"} if token else None,
+                                        timeout=httpx.Timeout(timeout_seconds, connect=5.0))
+
+    def respond(self, messages, conversation_id):
+        """Start the reply to ``messages``; returns once the API has sent its metadata"""
+        request = self.http_client.build_request(
+            "POST", "/chat", json={"conversation_id": conversation_id, "messages": messages})
+        try:
+            response = self.http_client.send(request, stream=True)
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            return ChatTurn("error", iter((ERROR_REPLY.format(error=e),)))
+        events = iter_sse(response.iter_lines())
+        meta = {}
+        for event, data in events:
+            if event == "meta":
+                meta = json.loads(data)
+                break
+        context = meta.get("context")
+        return ChatTurn(meta.get("intent", "llm"), self._chunks(response, events),
+                        ContextStats(**context) if context else None)
+
+    @staticmethod
+    def _chunks(response, events):
+        try:
+            for event, data in events:
+                if event == "token":
+                    yield json.loads(data)["delta"]
+                elif event == "done":
+                    break
+        except httpx.HTTPError as e:
+            yield ERROR_REPLY.format(error=e)
+        finally:
+            response.close()
@@ -0,0 +1,385 @@
+# chat_pipeline.py
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from config import (GROQ_API_KEY, GROQ_MODEL_NAME, CONTEXT_TOKEN_BUDGET, PRODUCT_SEARCH_TOP_K,
+                    RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL_SECONDS, RESPONSE_CACHE_DB,
+                    HISTORY_TOKEN_BUDGET, SUMMARY_MODE, GROQ_BASE_URL, MODEL_RATE_LIMITS, DEFAULT_RATE_LIMITS,
+                    GROQ_TIMEOUT_SECONDS, GROQ_MAX_RETRIES, GROQ_MAX_CONNECTIONS, REQUEST_DEADLINE_SECONDS,
+                    PROMPT_DATA_ENCODING, CONTEXT_MODE, TOOL_MAX_ROUNDS, DATA_POLL_SECONDS, DATA_DELTAS_DIR,
+                    TRACKING_LOG_PATH, TRACKING_POLL_SECONDS, TRACKING_LOG_FSYNC, TRACE_SAMPLE_RATE, TRACE_LOG_PATH,
+                    METRICS_ENABLED, MODEL_ROUTING, MODEL_SMALL, MODEL_LARGE, MODEL_ROUTES,
+                    MODEL_FIRST_TOKEN_BUDGET_SECONDS, MODEL_COMPLEXITY_THRESHOLD, ANALYTICS_ENABLED, ANALYTICS_DIR)
+from prompts import CONVERSATION_SUMMARY_PROMPT, SYSTEM_PROMPT, TOOL_INSTRUCTION
+from retrieval import ContextRetriever, ContextStats, estimate_tokens
+from tools import ChatTools, ToolCalls, TOOL_SCHEMAS, tool_call_message
+from prompt_artifacts import PromptArtifacts
+from data_layer import DataLayer
+from tracking_events import TrackingService
+from intent_router import IntentRouter
+from language_id import detect_language
+from response_cache import ResponseCache, make_key
+from single_flight import SingleFlight, payload_key
+from conversation_memory import ConversationMemory, extractive_summarize
+from groq_client import GroqGateway, PRIORITY_LIVE, PRIORITY_SPECULATIVE, PRIORITY_BACKGROUND
+from telemetry import Telemetry, NULL_TRACE
+from model_router import ModelRouter
+from analytics import Analytics, NULL_EVENT
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+PRODUCTS_PATH = os.path.join(DATA_DIR, "products.json")
+ORDERS_PATH = os.path.join(DATA_DIR, "orders.json")
+DELTAS_DIR = DATA_DELTAS_DIR or os.path.join(DATA_DIR, "deltas")
+TRACKING_LOG = TRACKING_LOG_PATH or os.path.join(DATA_DIR, "tracking_events.jsonl")
+
+ERROR_REPLY = "😔 I apologize, but I encountered an error: {error}."
+
+
+def create_groq_gateway():
+    """Groq gateway configured from config.py (one per process)"""
+    requests_per_minute, tokens_per_minute = MODEL_RATE_LIMITS.get(GROQ_MODEL_NAME, DEFAULT_RATE_LIMITS)
+    return GroqGateway(
+        GROQ_API_KEY, requests_per_minute, tokens_per_minute,
+        # The other models routed to get schedulers of their own
+        model_rate_limits={model: limits for model, limits in MODEL_RATE_LIMITS.items() if model != GROQ_MODEL_NAME},
+        base_url=GROQ_BASE_URL,
+        timeout_seconds=GROQ_TIMEOUT_SECONDS,
+        max_connections=GROQ_MAX_CONNECTIONS,
+        max_retries=GROQ_MAX_RETRIES,
+        deadline_seconds=REQUEST_DEADLINE_SECONDS
+    )
+
+
+@dataclass
+class ChatTurn:
+    """One assistant reply: ``chunks`` yields its text as it is produced"""
+    intent: str
+    chunks: object
+    context_stats: ContextStats = None
+    # The model routing of an LLM turn
+    route: object = None
+
+
+async def _single_chunk(text):
+    yield text
+
+
+class ChatPipeline:
+    """Chat logic shared by the Streamlit UI and the headless API.
+
+    ``respond`` and ``arespond`` do the synchronous part of a turn (fast-path
+    routing, history and retrieval) up front and return a ChatTurn whose
+    chunks come from a plain iterator or an async iterator respectively.
+    Replies go through the reply cache, then single-flight coalescing, then
+    the Groq gateway. ``finish`` is called once the reply has been appended
+    to the conversation.
+
+    ``data`` is a DataLayer. Each turn reads ``data.snapshot`` once, so a
+    reload mid-reply doesn't mix versions, and the reply cache and
+    single-flight keys include that snapshot's version.
+
+    With ``context_mode="tools"`` the system prompt carries no records;
+    the request declares TOOL_SCHEMAS and each round's tool calls are run
+    (concurrently, cached for the turn) before the next round, so only the
+    final answer reaches the caller.
+
+    ``model_router`` picks the model per turn (``model`` is only the
+    default when routing is off, and the summarizer's model) and moves a
+    failing request to the other model.
+
+    ``respond`` and ``arespond`` take the turn's trace (see telemetry.py)
+    and record the language, route and context spans on it; the returned
+    chunks record upstream and stream. ``telemetry`` also serves the reply
+    cache, single-flight and gateway counters as metrics.
+
+    Every turn that isn't speculative is recorded by ``analytics`` (see
+    analytics.py) once its chunks end: its query type, language, whether
+    the fast path, the reply cache or the model answered it, errors,
+    latency and tokens.
+
+    A ``speculative`` turn (see speculation.py) is queued at
+    PRIORITY_SPECULATIVE and skips single-flight and error handling:
+    closing its chunks stops the upstream request, and an error is raised
+    to the caller instead of being written into the reply.
+    """
+
+    def __init__(self, gateway, data, model=GROQ_MODEL_NAME, executor=None, context_mode=CONTEXT_MODE,
+                 tracking=None, telemetry=None, analytics=None):
+        if context_mode not in ("retrieval", "tools"):
+            raise ValueError(f"unknown context mode {context_mode!r}; expected 'retrieval' or 'tools'")
+        self.gateway = gateway
+        self.model = model
+        self.data = data
+        self.tracking = tracking
+        self.context_mode = context_mode
+        self.tools = ChatTools()
+        if tracking is not None:
+            self.tools.register("track_shipment", tracking.track_shipment)
+        self.tool_system_prompt = SYSTEM_PROMPT + "\n\n" + TOOL_INSTRUCTION
+        self._retriever = (None, None)
+        self.intent_router = IntentRouter(tracking=tracking)
+        self.model_router = ModelRouter(gateway, model, MODEL_SMALL, MODEL_LARGE, MODEL_ROUTES,
+                                        enabled=MODEL_ROUTING == "cascade",
+                                        first_token_budget=MODEL_FIRST_TOKEN_BUDGET_SECONDS,
+                                        complexity_threshold=MODEL_COMPLEXITY_THRESHOLD)
+        self.response_cache = ResponseCache(RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL_SECONDS,
+                                            RESPONSE_CACHE_DB or None)
+        self.single_flight = SingleFlight()
+        summarizer = self.summarize_with_llm if SUMMARY_MODE == "llm" else extractive_summarize
+        self.conversation_memory = ConversationMemory(HISTORY_TOKEN_BUDGET, summarizer,
+                                                      executor or ThreadPoolExecutor(max_workers=2))
+        self.telemetry = telemetry or Telemetry(TRACE_SAMPLE_RATE, TRACE_LOG_PATH, METRICS_ENABLED)
+        self.telemetry.registry.add_collector(self.collect_metrics)
+        self.analytics = analytics or Analytics(ANALYTICS_DIR if ANALYTICS_ENABLED else None)
+
+    @classmethod
+    def from_data_files(cls, gateway, products_path=PRODUCTS_PATH, orders_path=ORDERS_PATH, deltas_dir=DELTAS_DIR,
+                        poll_seconds=DATA_POLL_SECONDS, **kwargs):
+        data = DataLayer(products_path, orders_path, deltas_dir, poll_seconds).start()
+        if "tracking" not in kwargs:
+            kwargs["tracking"] = TrackingService(TRACKING_LOG, data, TRACKING_POLL_SECONDS, TRACKING_LOG_FSYNC).start()
+        return cls(gateway, data, **kwargs)
+
+    @property
+    def data_version(self):
+        return self.data.snapshot.version
+
+    @property
+    def prompt_artifacts(self):
+        return PromptArtifacts.for_version(self.data_version, PROMPT_DATA_ENCODING)
+
+    def context_retriever(self, snapshot):
+        """ContextRetriever over ``snapshot``, reused while the snapshot is current"""
+        current, retriever = self._retriever
+        if current is not snapshot:
+            retriever = ContextRetriever(snapshot.product_index, snapshot.order_store, PRODUCT_SEARCH_TOP_K,
+                                         PromptArtifacts.for_version(snapshot.version, PROMPT_DATA_ENCODING),
+                                         self.tracking)
+            self._retriever = (snapshot, retriever)
+        return retriever
+
+    def summarize_with_llm(self, previous_summary, turns):
+        """Fold turns into the running summary with a small non-streaming completion."""
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in turns)
+        completion = self.gateway.complete(
+            priority=PRIORITY_BACKGROUND,
+            model=self.model,
+            messages=[
+                {"role": "system", "content": CONVERSATION_SUMMARY_PROMPT},
+                {"role": "user", "content": f"Existing summary:\n{previous_summary or '(none)'}\n\nNew turns:\n{transcript}"}
+            ],
+            temperature=0,
+            max_tokens=200
+        )
+        return completion.choices[0].message.content.strip()
+
+    def collect_metrics(self):
+        """Counters kept by the pipeline's components, for MetricsRegistry"""
+        cache = self.response_cache.stats()
+        gateway = self.gateway.stats()
+        yield ("chatbot_response_cache_lookups_total", "counter", "Reply cache lookups by result",
+               [({"result": result}, cache.get(key, 0))
+                for result, key in (("hit", "hits"), ("disk_hit", "disk_hits"), ("miss", "misses"))])
+        yield ("chatbot_response_cache_entries", "gauge", "Replies held in the in-memory cache",
+               [({}, cache["entries"])])
+        yield ("chatbot_single_flight_total", "counter", "Replies that called upstream vs. joined an identical one",
+               [({"result": key}, self.single_flight.metrics[key]) for key in ("upstream", "coalesced")])
+        yield ("chatbot_groq_requests_total", "counter", "Completed Groq requests", [({}, gateway.get("completed", 0))])
+        yield ("chatbot_groq_retries_total", "counter", "Retried Groq requests", [({}, gateway.get("retries", 0))])
+        yield ("chatbot_groq_errors_total", "counter", "Failed Groq attempts by HTTP status or exception",
+               [({"kind": key[7:]}, value) for key, value in gateway.items() if key.startswith("errors.")])
+        yield ("chatbot_groq_queue_depth", "gauge", "Requests waiting for the rate limiter",
+               [({}, gateway.get("scheduler_queue_depth", 0))])
+        models = self.model_router.counters()
+        yield ("chatbot_model_requests_total", "counter", "Requests per model, by outcome",
+               [({"model": model, "outcome": name.partition(".")[2] or name}, value)
+                for (model, name), value in models.items() if name == "completed" or name.startswith("failures.")])
+        yield ("chatbot_model_fallbacks_total", "counter", "Requests moved from this model to the other one",
+               [({"model": model}, value) for (model, name), value in models.items() if name == "fallbacks"])
+        yield ("chatbot_model_tokens_total", "counter", "Estimated tokens per model",
+               [({"model": model, "kind": name[:-7]}, value) for (model, name), value in models.items()
+                if name in ("prompt_tokens", "completion_tokens")])
+
+    def _prepare(self, messages, summary, snapshot, trace, speculative=False):
+        """Fast-path reply, or the completion request, its context stats and route decision.
+
+        A speculative turn is left out of the fast-path and routing counts
+        and the prompt-token histogram; ``record_speculation`` adds it if
+        it is used.
+        """
+        user_prompt = messages[-1]["content"]
+        with trace.span("language"):
+            language = detect_language(user_prompt)
+        with trace.span("route"):
+            fast_reply = self.intent_router.route(user_prompt, language, snapshot.order_store, count=not speculative)
+        trace.set(language=language)
+        if fast_reply:
+            return fast_reply, None, None, None
+        with trace.span("context"):
+            decision = self.model_router.choose(messages, language, count=not speculative)
+            request, context_stats = self._build_request(messages, summary, snapshot, decision.model)
+        trace.set(model=decision.model, turn_class=decision.turn_class, complexity=round(decision.complexity, 2))
+        if not speculative:
+            self.telemetry.observe_prompt(context_stats.prompt_tokens)
+        return None, request, context_stats, decision
+
+    def record_speculation(self, turn):
+        """Count a speculative LLM turn that answered a live message, as ``_prepare`` counts live turns"""
+        self.intent_router.record(turn.intent)
+        self.model_router.record_route(turn.route)
+        self.telemetry.observe_prompt(turn.context_stats.prompt_tokens)
+        self.telemetry.count_turn(turn.intent)
+
+    def _build_request(self, messages, summary, snapshot, model):
+        history = self.conversation_memory.build_history(messages, summary)
+        if self.context_mode == "tools":
+            system_prompt_with_data = self.tool_system_prompt
+            context_stats = ContextStats(history_tokens=sum(estimate_tokens(m["content"]) for m in history))
+        else:
+            system_prompt_with_data, context_stats = self.context_retriever(snapshot).build_system_prompt(
+                messages, CONTEXT_TOKEN_BUDGET, history)
+        api_messages_payload = [{"role": "system", "content": system_prompt_with_data}]
+        api_messages_payload.extend({"role": m["role"], "content": m["content"]} for m in history)
+        # What is actually sent: the system prompt and the history that fit, not the whole conversation
+        context_stats.prompt_tokens = sum(estimate_tokens(m["content"]) for m in api_messages_payload)
+        context_stats.model = model
+        request = dict(
+            model=model,
+            messages=api_messages_payload,
+            temperature=0.7,
+            max_tokens=800
+        )
+        if self.context_mode == "tools":
+            request.update(tools=TOOL_SCHEMAS, tool_choice="auto")
+        return request, context_stats
+
+    def respond(self, messages, summary, trace=NULL_TRACE, speculative=False):
+        """Start the reply to the last (user) message in ``messages``"""
+        snapshot = self.data.snapshot
+        # A speculation is recorded when it is taken, as the turn it answers
+        event = NULL_EVENT if speculative else self.analytics.start(messages[-1]["content"])
+        fast_reply, request, context_stats, decision = self._prepare(messages, summary, snapshot, trace, speculative)
+        intent = fast_reply.intent if fast_reply else "llm"
+        trace.set(intent=intent)
+        if fast_reply:
+            if not speculative:
+                self.telemetry.count_turn(intent)
+            event.set(route="fast_path", fast_path_intent=intent)
+            return ChatTurn(intent, self.analytics.observe_stream(iter((fast_reply.response,)), event))
+        if speculative:
+            return ChatTurn(intent, self._speculative_stream(request, snapshot), context_stats, decision)
+        self.telemetry.count_turn(intent)
+        event.set(prompt_tokens=context_stats.prompt_tokens)
+        chunks = self.analytics.observe_stream(self._stream(request, snapshot, event), event)
+        return ChatTurn(intent, self.telemetry.observe_stream(chunks, trace), context_stats, decision)
+
+    def arespond(self, messages, summary, trace=NULL_TRACE):
+        """``respond`` for asyncio callers; ``chunks`` is an async iterator"""
+        snapshot = self.data.snapshot
+        event = self.analytics.start(messages[-1]["content"])
+        fast_reply, request, context_stats, decision = self._prepare(messages, summary, snapshot, trace)
+        intent = fast_reply.intent if fast_reply else "llm"
+        trace.set(intent=intent)
+        self.telemetry.count_turn(intent)
+        if fast_reply:
+            event.set(route="fast_path", fast_path_intent=intent)
+            return ChatTurn(intent, self.analytics.observe_astream(_single_chunk(fast_reply.response), event))
+        event.set(prompt_tokens=context_stats.prompt_tokens)
+        chunks = self.analytics.observe_astream(self._astream(request, snapshot, event), event)
+        return ChatTurn(intent, self.telemetry.observe_astream(chunks, trace), context_stats, decision)
+
+    def _round_requests(self, request):
+        """Requests for successive tool rounds; the last one may not call tools"""
+        for round_number in range(TOOL_MAX_ROUNDS + 1):
+            yield dict(request, tool_choice="none") if round_number == TOOL_MAX_ROUNDS else request
+
+    def _tool_rounds(self, request, snapshot, priority=PRIORITY_LIVE):
+        """Stream the reply, running the tools the model calls between rounds"""
+        deadline = time.monotonic() + self.gateway.deadline_seconds
+        messages = list(request["messages"])
+        cache = {}
+        for round_request in self._round_requests(request):
+            calls, text = None, []
+            for chunk in self.model_router.stream(priority, deadline=deadline,
+                                                  **dict(round_request, messages=messages)):
+                if isinstance(chunk, ToolCalls):
+                    calls = chunk
+                else:
+                    text.append(chunk)
+                    yield chunk
+            if not calls:
+                return
+            messages.append(tool_call_message(calls, "".join(text)))
+            messages.extend(self.tools.run(calls, cache, snapshot))
+
+    async def _atool_rounds(self, request, snapshot):
+        deadline = time.monotonic() + self.gateway.deadline_seconds
+        messages = list(request["messages"])
+        cache = {}
+        for round_request in self._round_requests(request):
+            calls, text = None, []
+            async for chunk in self.model_router.astream(PRIORITY_LIVE, deadline=deadline,
+                                                         **dict(round_request, messages=messages)):
+                if isinstance(chunk, ToolCalls):
+                    calls = chunk
+                else:
+                    text.append(chunk)
+                    yield chunk
+            if not calls:
+                return
+            messages.append(tool_call_message(calls, "".join(text)))
+            messages.extend(await self.tools.arun(calls, cache, snapshot))
+
+    def _upstream(self, request, snapshot, priority=PRIORITY_LIVE):
+        if "tools" in request:
+            return self._tool_rounds(request, snapshot, priority)
+        return self.model_router.stream(priority, **request)
+
+    def _aupstream(self, request, snapshot):
+        if "tools" in request:
+            return self._atool_rounds(request, snapshot)
+        return self.model_router.astream(PRIORITY_LIVE, **request)
+
+    def _stream(self, request, snapshot, event=NULL_EVENT):
+        cache_key = make_key(request["messages"], request["model"], snapshot.version)
+
+        def uncached():
+            event.set(route="llm")
+            return self.single_flight.stream(payload_key(data_version=snapshot.version, **request),
+                                             lambda: self._upstream(request, snapshot))
+
+        # Until the cache misses, the reply is a cache hit
+        event.set(route="cache")
+        try:
+            yield from self.response_cache.stream(cache_key, uncached)
+        except Exception as e:
+            self.telemetry.count_error(e)
+            event.set(error=True)
+            yield ERROR_REPLY.format(error=e)
+
+    def _speculative_stream(self, request, snapshot):
+        cache_key = make_key(request["messages"], request["model"], snapshot.version)
+        yield from self.response_cache.stream(
+            cache_key, lambda: self._upstream(request, snapshot, PRIORITY_SPECULATIVE))
+
+    async def _astream(self, request, snapshot, event=NULL_EVENT):
+        cache_key = make_key(request["messages"], request["model"], snapshot.version)
+
+        def uncached():
+            event.set(route="llm")
+            return self.single_flight.astream(payload_key(data_version=snapshot.version, **request),
+                                              lambda: self._aupstream(request, snapshot))
+
+        event.set(route="cache")
+        try:
+            async for chunk in self.response_cache.astream(cache_key, uncached):
+                yield chunk
+        except Exception as e:
+            self.telemetry.count_error(e)
+            event.set(error=True)
+            yield ERROR_REPLY.format(error=e)
+
+    def finish(self, messages, summary):
+        self.conversation_memory.schedule_summary(messages, summary)
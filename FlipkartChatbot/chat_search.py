@@ -0,0 +1,158 @@
+# chat_search.py
+"""Tokens, phonetic keys and query expressions for searching saved chats.
+
+Saved messages are indexed by ConversationStore in an SQLite FTS5 table
+with two columns: the message text, tokenized so Devanagari words keep
+their vowel signs and viramas, and ``phonetic``, a consonant skeleton of
+every word. The skeleton is what lets a romanized query find Devanagari
+text and the other way round: "kharab" and "खराब" both become "krb",
+"refund" and "रिफंड" both become "rfnd". It is built by transliterating
+Devanagari, folding spellings that sound alike (ph/f, w/v, z/j, soft c/s,
+the h of aspirates, doubled letters) and dropping vowels, which is where
+romanized Hindi varies most ("kahan", "kaha", "kahaan").
+"""
+import re
+import unicodedata
+
+from product_search import STOPWORDS
+
+# What FTS5's unicode61 tokenizer with categories 'L* N* Co M*' keeps in a token (the danda separates)
+WORD_PATTERN = re.compile(r'(?:[^\W_]|[\u0300-\u036f\u0900-\u0963\u0966-\u097f])+')
+FTS_TOKENIZER = "unicode61 remove_diacritics 2 categories 'L* N* Co M*'"
+# Shorter keys match too many unrelated words to be worth indexing
+MIN_KEY_CHARS = 3
+# Words that say what is being searched for rather than what was said
+SEARCH_STOPWORDS = STOPWORDS | {'that', 'this', 'it', 'was', 'where', 'when', 'chat', 'conversation', 'wali', 'wala'}
+
+_CONSONANTS = {
+    'क': 'k', 'ख': 'kh', 'ग': 'g', 'घ': 'gh', 'ङ': 'n', 'च': 'ch', 'छ': 'chh', 'ज': 'j', 'झ': 'jh', 'ञ': 'n',
+    'ट': 't', 'ठ': 'th', 'ड': 'd', 'ढ': 'dh', 'ण': 'n', 'त': 't', 'थ': 'th', 'द': 'd', 'ध': 'dh', 'न': 'n',
+    'प': 'p', 'फ': 'ph', 'ब': 'b', 'भ': 'bh', 'म': 'm', 'य': 'y', 'र': 'r', 'ल': 'l', 'ळ': 'l', 'व': 'v',
+    'श': 'sh', 'ष': 'sh', 'स': 's', 'ह': 'h',
+}
+# Consonants with a nukta, after NFD splits them
+_NUKTA = {'क': 'q', 'ख': 'kh', 'ग': 'g', 'ज': 'z', 'ड': 'r', 'ढ': 'rh', 'फ': 'f', 'य': 'y'}
+# Anusvara, chandrabindu, visarga, virama
+_SIGNS = {'\u0902': 'n', '\u0901': 'n', '\u0903': 'h', '\u094d': ''}
+_NUKTA_SIGN = '\u093c'
+_VIRAMA = '\u094d'
+_VOWELS = 'aeiou'
+
+
+def _is_vowel_sign(char):
+    # Independent vowels and the dependent vowel signs (matras)
+    return '\u0904' <= char <= '\u0914' or '\u093e' <= char <= '\u094c' or char in '\u0960\u0961\u0962\u0963\u0972'
+
+
+def transliterate(word):
+    """A rough romanization of the Devanagari in ``word``; other characters pass through"""
+    chars = unicodedata.normalize('NFD', word)
+    out = []
+    for i, char in enumerate(chars):
+        if char in _CONSONANTS:
+            nukta = i + 1 < len(chars) and chars[i + 1] == _NUKTA_SIGN
+            out.append(_NUKTA.get(char, _CONSONANTS[char]) if nukta else _CONSONANTS[char])
+            following = chars[i + 2 if nukta else i + 1] if i + (2 if nukta else 1) < len(chars) else ''
+            # The inherent vowel, unless a vowel sign or virama replaces it
+            if not (_is_vowel_sign(following) or following == _VIRAMA):
+                out.append('a')
+        elif char in _SIGNS:
+            out.append(_SIGNS[char])
+        elif _is_vowel_sign(char):
+            out.append('a')
+        elif '०' <= char <= '९':
+            out.append(str(ord(char) - 0x966))
+        elif not unicodedata.combining(char):
+            out.append(char)
+    return ''.join(out)
+
+
+def phonetic_key(word):
+    """Consonant skeleton of a word; Devanagari and romanized spellings of it mostly agree"""
+    word = transliterate(word.lower()).replace('ph', 'f').replace('tch', 'ch')
+    out = []
+    previous = ''
+    i = 0
+    while i < len(word):
+        char = word[i]
+        following = word[i + 1] if i + 1 < len(word) else ''
+        if char == previous:
+            i += 1
+            continue
+        previous = char
+        if char == 'c':
+            if following == 'h':
+                i += 1
+                code = 'c'
+            else:
+                code = 's' if following in ('e', 'i', 'y') else 'k'
+        elif char == 'h' and out and out[-1] not in _VOWELS:
+            # The h of kh, th, sh, bh...
+            code = ''
+        elif char == 'y' and out:
+            code = ''
+        else:
+            code = {'w': 'v', 'z': 'j', 'q': 'k', 'x': 'ks'}.get(char, char)
+        out.append(code)
+        i += 1
+    key = ''.join(c for c in ''.join(out) if c not in _VOWELS)
+    return re.sub(r'(.)\1+', r'\1', key)
+
+
+def words(text):
+    return WORD_PATTERN.findall(text.lower())
+
+
+def phonetic_text(text):
+    """The ``phonetic`` column for a message: each distinct key once"""
+    keys = (phonetic_key(word) for word in words(text) if not word.isdigit())
+    return ' '.join(dict.fromkeys(key for key in keys if len(key) >= MIN_KEY_CHARS))
+
+
+def query_terms(query):
+    """(word, phonetic key or None) per query word, without stopwords unless that leaves nothing"""
+    tokens = list(dict.fromkeys(words(query)))
+    tokens = [t for t in tokens if t not in SEARCH_STOPWORDS] or tokens
+    terms = []
+    for token in tokens:
+        key = phonetic_key(token) if not token.isdigit() else ''
+        terms.append((token, key if len(key) >= MIN_KEY_CHARS else None))
+    return terms
+
+
+def match_expression(terms, all_terms=True):
+    """FTS5 MATCH expression: each term as a prefix of a word or by its phonetic key"""
+    groups = []
+    for token, key in terms:
+        group = f'"{token}"*'
+        if key:
+            group = f'({group} OR phonetic:"{key}")'
+        groups.append(group)
+    return (' AND ' if all_terms else ' OR ').join(groups)
+
+
+def highlight(text, terms, start_mark, end_mark, context_words=12):
+    """A window of ``text`` around the first word matching ``terms``, matches marked.
+
+    For rows FTS5's snippet() can't mark because they matched only on a
+    phonetic key.
+    """
+    tokens = {token for token, _ in terms}
+    keys = {key for _, key in terms if key}
+    found = list(WORD_PATTERN.finditer(text))
+    hits = [i for i, m in enumerate(found)
+            if any(m.group().lower().startswith(t) for t in tokens) or phonetic_key(m.group()) in keys]
+    if not hits:
+        return text[:context_words * 8]
+    first = max(0, hits[0] - context_words // 3)
+    last = min(len(found), first + context_words) - 1
+    start, end = found[first].start(), found[last].end()
+    if last == len(found) - 1:
+        end = len(text)
+    out, cursor = [], start
+    for i in hits:
+        if first <= i <= last:
+            out += [text[cursor:found[i].start()], start_mark, found[i].group(), end_mark]
+            cursor = found[i].end()
+    out.append(text[cursor:end])
+    return ('…' if start > 0 else '') + ''.join(out) + ('…' if end < len(text) else '')
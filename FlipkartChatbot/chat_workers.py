@@ -0,0 +1,292 @@
+# chat_workers.py
+"""A fixed pool of Streamlit chat workers behind the landing page's /start_chatbot.
+
+``WorkerPool`` starts ``size`` ``streamlit run app.py`` processes on
+consecutive ports when the landing page starts, before any visitor
+asks for one, and a supervisor thread checks each of them every
+``health_interval`` seconds (the process is alive and /_stcore/health
+answers). A worker that fails UNHEALTHY_AFTER checks in a row is
+restarted; one that keeps exiting is restarted with a growing backoff.
+The pool never grows, so no amount of traffic to /start_chatbot starts
+another process.
+
+``pick`` hands a visitor a healthy worker: the one it had before if that
+is still healthy (its Streamlit session lives there unless
+SESSION_BACKEND=sqlite), otherwise the one that was handed out least
+recently.
+
+WSGI servers that run the landing page in several processes should not
+each start a pool. Run the pool on its own instead:
+
+    python chat_workers.py --workers 4
+
+It writes the workers' state to CHAT_WORKER_STATUS_PATH after every
+round of checks, and ``PoolStatus`` reads it in each landing page
+process.
+"""
+import argparse
+import json
+import logging
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from dataclasses import dataclass
+
+HEALTH_PATH = "/_stcore/health"
+HEALTH_TIMEOUT_SECONDS = 1.0
+# Failed checks in a row before a running worker is restarted
+UNHEALTHY_AFTER = 3
+# A worker that hasn't answered a health check this long after starting is restarted
+STARTUP_TIMEOUT_SECONDS = 60.0
+MAX_RESTART_BACKOFF_SECONDS = 30.0
+STOP_GRACE_SECONDS = 5.0
+# How long PoolStatus trusts the status file it last read
+STATUS_CACHE_SECONDS = 1.0
+
+logger = logging.getLogger(__name__)
+
+
+def streamlit_command(port, address="127.0.0.1", script="app.py"):
+    return [sys.executable, "-m", "streamlit", "run", script, "--server.headless", "true",
+            "--server.port", str(port), "--server.address", address]
+
+
+def health_host(address):
+    """Where the supervisor reaches a worker listening on ``address``"""
+    return "127.0.0.1" if address in ("", "0.0.0.0", "::") else address
+
+
+def check_health(port, host="127.0.0.1", timeout=HEALTH_TIMEOUT_SECONDS):
+    try:
+        with urllib.request.urlopen(f"http://{host}:{port}{HEALTH_PATH}", timeout=timeout) as response:
+            return response.status == 200
+    except OSError:
+        return False
+
+
+@dataclass
+class Worker:
+    index: int
+    port: int
+    process: object = None
+    # starting, healthy, unhealthy or backoff
+    state: str = "starting"
+    started_at: float = 0.0
+    healthy_since: float = 0.0
+    failed_checks: int = 0
+    restarts: int = 0
+    backoff: float = 0.0
+    next_start: float = 0.0
+    last_assigned: float = 0.0
+    assigned: int = 0
+
+    def status(self):
+        return {"index": self.index, "port": self.port, "state": self.state, "restarts": self.restarts,
+                "assigned": self.assigned, "pid": self.process.pid if self.process else None}
+
+
+class WorkerPool:
+    """Starts, health-checks and restarts a fixed set of chat worker processes"""
+
+    def __init__(self, size, base_port=8501, command=streamlit_command, cwd=None, health_interval=2.0,
+                 status_path=None, host="127.0.0.1"):
+        self.command = command
+        self.cwd = cwd or os.path.dirname(os.path.abspath(__file__))
+        self.health_interval = health_interval
+        self.status_path = status_path
+        self.host = host
+        self.workers = [Worker(i, base_port + i) for i in range(size)]
+        self._lock = threading.Lock()
+        self._check_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        for worker in self.workers:
+            self._spawn(worker)
+        self._thread = threading.Thread(target=self._supervise, name="chat-worker-pool", daemon=True)
+        self._thread.start()
+        return self
+
+    def wait_ready(self, timeout=60.0, count=1):
+        """Block until ``count`` workers are healthy; returns whether they are"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.check() >= count:
+                return True
+            time.sleep(0.1)
+        return False
+
+    def _spawn(self, worker):
+        worker.process = subprocess.Popen(self.command(worker.port), cwd=self.cwd, stdin=subprocess.DEVNULL,
+                                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        worker.state, worker.failed_checks = "starting", 0
+        worker.started_at = time.monotonic()
+
+    def _stop(self, worker):
+        process, worker.process = worker.process, None
+        if process is None or process.poll() is not None:
+            return
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(STOP_GRACE_SECONDS)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+    def check(self):
+        """One round of health checks and restarts; returns how many workers are healthy"""
+        with self._check_lock:
+            return self._check()
+
+    def _check(self):
+        now = time.monotonic()
+        for worker in self.workers:
+            if worker.state == "backoff":
+                if now >= worker.next_start:
+                    self._spawn(worker)
+                continue
+            exited = worker.process is None or worker.process.poll() is not None
+            healthy = not exited and check_health(worker.port, self.host)
+            with self._lock:
+                if healthy:
+                    if worker.state != "healthy":
+                        logger.info("chat worker %d on port %d is healthy after %.1fs", worker.index, worker.port,
+                                    now - worker.started_at)
+                        worker.healthy_since = now
+                    worker.state, worker.failed_checks, worker.backoff = "healthy", 0, 0.0
+                    continue
+                worker.failed_checks += 1
+                if worker.state == "healthy":
+                    worker.state = "unhealthy"
+            if exited:
+                # Each exit before the worker became healthy again doubles the wait
+                worker.backoff = min(MAX_RESTART_BACKOFF_SECONDS, max(1.0, worker.backoff * 2))
+                logger.warning("chat worker %d on port %d exited; restarting in %.0fs", worker.index, worker.port,
+                               worker.backoff)
+                with self._lock:
+                    worker.state, worker.next_start = "backoff", now + worker.backoff
+                    worker.restarts += 1
+                    worker.process = None
+            elif ((worker.state == "unhealthy" and worker.failed_checks >= UNHEALTHY_AFTER)
+                  or (worker.state == "starting" and now - worker.started_at > STARTUP_TIMEOUT_SECONDS)):
+                logger.warning("chat worker %d on port %d is not answering; restarting", worker.index, worker.port)
+                self._stop(worker)
+                worker.restarts += 1
+                self._spawn(worker)
+        if self.status_path:
+            self._write_status()
+        return sum(worker.state == "healthy" for worker in self.workers)
+
+    def _supervise(self):
+        while not self._stopping.wait(self.health_interval):
+            try:
+                self.check()
+            except Exception:
+                logger.exception("chat worker health check failed")
+
+    def pick(self, preferred=None):
+        """Index and port of a healthy worker, ``preferred`` if it is one, or None if none is"""
+        with self._lock:
+            healthy = [w for w in self.workers if w.state == "healthy"]
+            if not healthy:
+                return None
+            worker = next((w for w in healthy if w.index == preferred), None)
+            if worker is None:
+                worker = min(healthy, key=lambda w: w.last_assigned)
+            worker.last_assigned = time.monotonic()
+            worker.assigned += 1
+            return worker.index, worker.port
+
+    def stats(self):
+        with self._lock:
+            return {"workers": [worker.status() for worker in self.workers],
+                    "healthy": sum(worker.state == "healthy" for worker in self.workers)}
+
+    def _write_status(self):
+        temp = f"{self.status_path}.{os.getpid()}.tmp"
+        with open(temp, "w", encoding="utf-8") as f:
+            json.dump({"written_at": time.time(), **self.stats()}, f)
+        os.replace(temp, self.status_path)
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+        for worker in self.workers:
+            self._stop(worker)
+
+
+class PoolStatus:
+    """``pick`` and ``stats`` of a pool run by ``python chat_workers.py``, from its status file"""
+
+    def __init__(self, status_path, stale_after=30.0):
+        self.status_path = status_path
+        self.stale_after = stale_after
+        self._status = None
+        self._read_at = 0.0
+        self._lock = threading.Lock()
+        self._next = 0
+
+    def _read(self):
+        now = time.monotonic()
+        if now - self._read_at > STATUS_CACHE_SECONDS:
+            try:
+                with open(self.status_path, encoding="utf-8") as f:
+                    status = json.load(f)
+            except (OSError, ValueError):
+                status = None
+            # A supervisor that stopped writing can't vouch for its workers
+            if not isinstance(status, dict) or time.time() - status.get("written_at", 0) > self.stale_after:
+                status = None
+            self._status, self._read_at = status, now
+        return self._status
+
+    def pick(self, preferred=None):
+        with self._lock:
+            status = self._read()
+            healthy = [w for w in status["workers"] if w["state"] == "healthy"] if status else []
+            if not healthy:
+                return None
+            worker = next((w for w in healthy if w["index"] == preferred), None)
+            if worker is None:
+                worker = healthy[self._next % len(healthy)]
+                self._next += 1
+            return worker["index"], worker["port"]
+
+    def stats(self):
+        with self._lock:
+            return self._read() or {"workers": [], "healthy": 0}
+
+
+if __name__ == "__main__":
+    from config import (CHAT_WORKER_ADDRESS, CHAT_WORKER_BASE_PORT, CHAT_WORKER_HEALTH_SECONDS,
+                        CHAT_WORKER_STATUS_PATH, CHAT_WORKERS)
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=CHAT_WORKERS)
+    parser.add_argument("--base-port", type=int, default=CHAT_WORKER_BASE_PORT)
+    parser.add_argument("--address", default=CHAT_WORKER_ADDRESS or "0.0.0.0",
+                        help="address the workers listen on (CHAT_WORKER_ADDRESS)")
+    parser.add_argument("--status", default=CHAT_WORKER_STATUS_PATH or os.path.join("chat_history", "workers.json"),
+                        help="file the landing page reads the workers' state from (its CHAT_WORKER_STATUS_PATH)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    if os.path.dirname(args.status):
+        os.makedirs(os.path.dirname(args.status), exist_ok=True)
+    pool = WorkerPool(args.workers, args.base_port, lambda port: streamlit_command(port, args.address),
+                      health_interval=CHAT_WORKER_HEALTH_SECONDS, status_path=args.status,
+                      host=health_host(args.address)).start()
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        while True:
+            time.sleep(3600)
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        pool.stop()
@@ -1,17 +1,143 @@
-from flask import Flask, render_template
-import subprocess
+from flask import Flask, Response, make_response, redirect, render_template, request
+import argparse
+import atexit
+import hashlib
+import os
+import threading
 
-app = Flask(__name__)
+import httpx
 
-@app.route('/')
-def index():
-    return render_template('index.html')
+from chat_workers import PoolStatus, WorkerPool, health_host, streamlit_command
+from config import (CHAT_API_TOKEN, CHAT_WORKER_ADDRESS, CHAT_WORKER_BASE_PORT, CHAT_WORKER_HEALTH_SECONDS,
+                    CHAT_WORKER_PUBLIC_URL, CHAT_WORKER_STATUS_PATH, CHAT_WORKERS, LANDING_CHAT_API_URL, LANDING_MODE)
+from static_assets import StaticAssets, compressed_variants, critical_css, respond
+
+# Where the page is cut to find the rules that draw what is above the fold
+ABOVE_THE_FOLD_END = "<!-- above-the-fold end -->"
+# Which chat worker a visitor was sent to, so they come back to the same Streamlit session
+WORKER_COOKIE = "chat_worker"
+# Largest chat request forwarded to the API (its own request limit)
+CHAT_PROXY_MAX_BYTES = 1 << 20
+
+
+def chat_api_client(base_url=LANDING_CHAT_API_URL, token=CHAT_API_TOKEN):
+    """HTTP client for chat_api.py, carrying its bearer token so the page never has to"""
+    return httpx.Client(base_url=base_url.rstrip("/"), headers={"Authorization": f"Bearer {token}"} if token else None,
+                        timeout=httpx.Timeout(60.0, connect=5.0))
+
+
+def create_app(production=None, pool=None, chat_client=None):
+    """The landing page. ``pool`` hands out chat workers for /start_chatbot (a WorkerPool or PoolStatus);
+    ``chat_client`` (an httpx.Client, see ``chat_api_client``) serves the widget's /chat"""
+    production = LANDING_MODE == "production" if production is None else production
+    app = Flask(__name__, static_folder=None if production else "static")
+    app.config["MAX_CONTENT_LENGTH"] = CHAT_PROXY_MAX_BYTES
+    chat_client = chat_client or chat_api_client()
+
+    if production:
+        assets = StaticAssets.build(os.path.join(app.root_path, "static"))
+        app.add_url_rule("/static/<path:filename>", endpoint="static", view_func=assets.serve)
+
+        @app.url_defaults
+        def fingerprint(endpoint, values):
+            if endpoint == "static" and "filename" in values:
+                values["filename"] = assets.fingerprinted(values["filename"])
+
+        page = {}
+        page_lock = threading.Lock()
+
+        def rendered_page():
+            """The page rendered once, with the critical CSS inlined, in every encoding"""
+            with page_lock:
+                if not page:
+                    html = render_template('index.html', critical_css=None)
+                    css = critical_css(assets.text("style.css"), html.split(ABOVE_THE_FOLD_END)[0])
+                    body = render_template('index.html', critical_css=css).encode("utf-8")
+                    page.update(compressed_variants(body, "text/html", hashlib.sha256(body).hexdigest()[:16]))
+            return page
+
+        @app.route('/')
+        def index():
+            return respond(rendered_page(), "text/html; charset=utf-8", "no-cache")
+    else:
+        @app.route('/')
+        def index():
+            return render_template('index.html', critical_css=None)
+
+    # Sends the visitor to a warm chat worker; never starts a process
+    @app.route('/start_chatbot')
+    def start_chatbot():
+        preferred = request.cookies.get(WORKER_COOKIE)
+        picked = pool.pick(int(preferred) if preferred and preferred.isdigit() else None) if pool else None
+        if picked is None:
+            response = make_response("No chat worker is available right now, please try again shortly.", 503)
+            response.headers["Retry-After"] = str(max(1, int(CHAT_WORKER_HEALTH_SECONDS)))
+            return response
+        index, port = picked
+        response = redirect(CHAT_WORKER_PUBLIC_URL.format(host=request.host.rsplit(":", 1)[0], port=port))
+        response.headers["Cache-Control"] = "no-store"
+        response.set_cookie(WORKER_COOKIE, str(index), httponly=True, samesite="Lax")
+        return response
+
+    # The widget's chat: forwarded to chat_api.py from this origin, with the token added here
+    @app.route('/chat', methods=['POST'])
+    def chat():
+        upstream_request = chat_client.build_request("POST", "/chat", content=request.get_data(),
+                                                     headers={"Content-Type": "application/json"})
+        try:
+            upstream = chat_client.send(upstream_request, stream=True)
+        except httpx.HTTPError:
+            return {"error": "The chat service is unavailable right now, please try again shortly."}, 502
+
+        def relay():
+            # Closing the upstream response when the visitor leaves ends the reply on the API as well
+            try:
+                yield from upstream.iter_bytes()
+            except httpx.HTTPError:
+                return
+            finally:
+                upstream.close()
+
+        return Response(relay(), status=upstream.status_code,
+                        content_type=upstream.headers.get("Content-Type", "application/json"),
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    @app.route('/chat_workers')
+    def chat_workers():
+        return pool.stats() if pool else {"workers": [], "healthy": 0}
+
+    return app
+
+
+def create_pool(workers=CHAT_WORKERS, address=CHAT_WORKER_ADDRESS or "127.0.0.1"):
+    """The pool for this process: the separate supervisor's if CHAT_WORKER_STATUS_PATH is set, else a new one
+    whose workers listen on ``address``, where /start_chatbot sends visitors (CHAT_WORKER_PUBLIC_URL)"""
+    if CHAT_WORKER_STATUS_PATH:
+        return PoolStatus(CHAT_WORKER_STATUS_PATH)
+    if workers <= 0:
+        return None
+    pool = WorkerPool(workers, CHAT_WORKER_BASE_PORT, lambda port: streamlit_command(port, address),
+                      health_interval=CHAT_WORKER_HEALTH_SECONDS, host=health_host(address)).start()
+    atexit.register(pool.stop)
+    return pool
+
+
+def wsgi_app():
+    """For WSGI servers running several processes (gunicorn 'chatbot:wsgi_app()'); workers come from
+    a separately run chat_workers.py through CHAT_WORKER_STATUS_PATH"""
+    return create_app(pool=PoolStatus(CHAT_WORKER_STATUS_PATH) if CHAT_WORKER_STATUS_PATH else None)
 
-# Optional: endpoint to start chatbot
-@app.route('/start_chatbot')
-def start_chatbot():
-    subprocess.Popen(["streamlit", "run", "chatbot.py"])
-    return "Chatbot launched!"
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    parser = argparse.ArgumentParser(description="Landing page with the chat widget")
+    parser.add_argument("--production", action="store_true", default=LANDING_MODE == "production",
+                        help="fingerprinted, cached and precompressed static files (LANDING_MODE=production)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=CHAT_WORKERS, help="chat workers to keep warm")
+    parser.add_argument("--debug", action="store_true")
+    args = parser.parse_args()
+    # Visitors are redirected to the workers on the host they reached this page on
+    app = create_app(args.production, create_pool(args.workers, CHAT_WORKER_ADDRESS or args.host))
+    # The reloader would start a second pool in its child process
+    app.run(host=args.host, port=args.port, debug=args.debug, use_reloader=False, threaded=True)
@@ -1,3 +1,4 @@
+import json
 import os
 import streamlit as st
 
@@ -11,4 +12,167 @@ except:
     load_dotenv()
     GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
-GROQ_MODEL_NAME = "llama3-8b-8192"
\ No newline at end of file
+GROQ_MODEL_NAME = os.getenv("GROQ_MODEL_NAME", "llama3-8b-8192")
+# Model cascade (model_router.py): "cascade" sends simple turns to MODEL_SMALL and harder ones to MODEL_LARGE,
+# moving a turn to the other model on a timeout, 429 or broken stream; "off" (the default, since a
+# fallback spends quota on both models) sends every turn to GROQ_MODEL_NAME
+MODEL_ROUTING = os.getenv("MODEL_ROUTING", "off")
+MODEL_SMALL = os.getenv("MODEL_SMALL", GROQ_MODEL_NAME)
+MODEL_LARGE = os.getenv("MODEL_LARGE", "llama3-70b-8192")
+# Seconds the first model gets to start streaming, queueing included, before the turn moves on
+MODEL_FIRST_TOKEN_BUDGET_SECONDS = float(os.getenv("MODEL_FIRST_TOKEN_BUDGET_SECONDS", "4"))
+# "auto" routes send turns whose complexity score (0-1) reaches this to MODEL_LARGE
+MODEL_COMPLEXITY_THRESHOLD = float(os.getenv("MODEL_COMPLEXITY_THRESHOLD", "0.5"))
+# Tier per turn class: "small", "large" or "auto"; a "<class>/hi" key applies to Hindi turns only.
+# MODEL_ROUTES takes a JSON object to override entries, e.g. '{"order/hi": "large"}'
+MODEL_ROUTES = {
+    "greeting": "small",
+    "order": "auto",
+    "product": "small",
+    "dispute": "large",
+    "general": "auto",
+    **json.loads(os.getenv("MODEL_ROUTES", "{}")),
+}
+
+# Point at a local OpenAI/Groq-compatible server for offline testing
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL") or None
+
+# Upstream limits per model as (requests per minute, tokens per minute)
+MODEL_RATE_LIMITS = {
+    "llama3-8b-8192": (30, 30000),
+    "llama3-70b-8192": (30, 6000),
+    "mixtral-8x7b-32768": (30, 5000),
+}
+DEFAULT_RATE_LIMITS = (30, 6000)
+GROQ_TIMEOUT_SECONDS = float(os.getenv("GROQ_TIMEOUT_SECONDS", "30"))
+GROQ_MAX_RETRIES = int(os.getenv("GROQ_MAX_RETRIES", "3"))
+GROQ_MAX_CONNECTIONS = int(os.getenv("GROQ_MAX_CONNECTIONS", "100"))
+# Overall budget for a live reply, including queueing and retries
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "45"))
+# Upper bound on prompt tokens spent on conversation history plus retrieved order/product records per turn;
+# records get what the history (at most about HISTORY_TOKEN_BUDGET) leaves
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+
+# "retrieval" puts the records relevant to the conversation in the system prompt; "tools" declares
+# lookup_order/track_shipment/search_products/check_stock and lets the model fetch records on demand
+CONTEXT_MODE = os.getenv("CONTEXT_MODE", "retrieval")
+# Model rounds that may call tools before the reply has to be written without them
+TOOL_MAX_ROUNDS = int(os.getenv("TOOL_MAX_ROUNDS", "3"))
+
+# How records are written into the prompt: "json" (compact JSON) or "table" (rows under a shared header)
+PROMPT_DATA_ENCODING = os.getenv("PROMPT_DATA_ENCODING", "json")
+
+# Data files are polled for changes every DATA_POLL_SECONDS (0 disables); JSONL delta files of order/product
+# upserts and deletes dropped into DATA_DELTAS_DIR (default data/deltas) are applied without a reload
+DATA_POLL_SECONDS = float(os.getenv("DATA_POLL_SECONDS", "2"))
+DATA_DELTAS_DIR = os.getenv("DATA_DELTAS_DIR", "")
+
+# Append-only carrier scan log (default data/tracking_events.jsonl) behind the per-order tracking views;
+# appends from other processes are picked up every TRACKING_POLL_SECONDS
+TRACKING_LOG_PATH = os.getenv("TRACKING_LOG_PATH", "")
+TRACKING_POLL_SECONDS = float(os.getenv("TRACKING_POLL_SECONDS", "1"))
+TRACKING_LOG_FSYNC = os.getenv("TRACKING_LOG_FSYNC", "0") == "1"
+# Shared secret carriers send in X-Ingest-Token to POST /tracking/events; the endpoint refuses every batch without it
+TRACKING_INGEST_TOKEN = os.getenv("TRACKING_INGEST_TOKEN", "")
+
+# Number of product search hits injected as context for product questions
+PRODUCT_SEARCH_TOP_K = int(os.getenv("PRODUCT_SEARCH_TOP_K", "5"))
+
+# Completed-reply cache; set RESPONSE_CACHE_DB to a file path to keep a shared SQLite tier
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600"))
+RESPONSE_CACHE_DB = os.getenv("RESPONSE_CACHE_DB", "")
+
+# Token budget for conversation history; older turns are folded into a summary
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1500"))
+# "extractive" summarizes locally; "llm" has the chat model write the summary in the background (an extra request)
+SUMMARY_MODE = os.getenv("SUMMARY_MODE", "extractive")
+
+# Headless chat API (chat_api.py); set CHAT_API_URL to make the Streamlit UI a thin client of it
+CHAT_API_HOST = os.getenv("CHAT_API_HOST", "127.0.0.1")
+CHAT_API_PORT = int(os.getenv("CHAT_API_PORT", "8000"))
+CHAT_API_URL = os.getenv("CHAT_API_URL", "")
+# Comma-separated origins allowed to call the API from a browser; the default is the landing page (chatbot.py)
+CHAT_API_CORS_ORIGINS = os.getenv("CHAT_API_CORS_ORIGINS", "http://localhost:5000,http://127.0.0.1:5000")
+# Bearer token every request except /health must carry; chat_api.py won't bind a non-loopback host without one
+CHAT_API_TOKEN = os.getenv("CHAT_API_TOKEN", "")
+# Conversations whose rolling summary the API keeps in memory
+CHAT_API_MAX_CONVERSATIONS = int(os.getenv("CHAT_API_MAX_CONVERSATIONS", "10000"))
+
+# Landing page (chatbot.py): "production" serves fingerprinted, precompressed static files with long-lived cache
+# headers and inlines critical CSS (static_assets.py); "development" serves the files as they are
+LANDING_MODE = os.getenv("LANDING_MODE", "development")
+# The chat widget posts to the landing page's own /chat, which forwards it here with CHAT_API_TOKEN added
+LANDING_CHAT_API_URL = os.getenv("LANDING_CHAT_API_URL", CHAT_API_URL or f"http://127.0.0.1:{CHAT_API_PORT}")
+
+# Chat workers behind the landing page's /start_chatbot (chat_workers.py): a fixed pool of `streamlit run app.py`
+# processes on consecutive ports from CHAT_WORKER_BASE_PORT, started with the landing page and health-checked.
+# CHAT_WORKER_PUBLIC_URL is where visitors reach a worker ({host} is the landing page's host name), so the workers
+# listen on CHAT_WORKER_ADDRESS; unset, they take the landing page's --host (0.0.0.0 in production).
+# Set CHAT_WORKER_STATUS_PATH when the pool runs on its own (python chat_workers.py) to read its state from there
+CHAT_WORKERS = int(os.getenv("CHAT_WORKERS", "2"))
+CHAT_WORKER_BASE_PORT = int(os.getenv("CHAT_WORKER_BASE_PORT", "8501"))
+CHAT_WORKER_PUBLIC_URL = os.getenv("CHAT_WORKER_PUBLIC_URL", "http://{host}:{port}")
+CHAT_WORKER_ADDRESS = os.getenv("CHAT_WORKER_ADDRESS", "")
+CHAT_WORKER_HEALTH_SECONDS = float(os.getenv("CHAT_WORKER_HEALTH_SECONDS", "2"))
+CHAT_WORKER_STATUS_PATH = os.getenv("CHAT_WORKER_STATUS_PATH", "")
+
+# Streamlit chat view: a streamed reply is redrawn at most this often; only the latest messages render on a rerun
+STREAM_RENDER_INTERVAL_MS = int(os.getenv("STREAM_RENDER_INTERVAL_MS", "50"))
+HISTORY_RENDER_WINDOW = int(os.getenv("HISTORY_RENDER_WINDOW", "30"))
+
+# Live conversation state (session_store.py): "memory" keeps it in this process, "sqlite" shares it between
+# workers on the host. A reply not finished within the lease is picked up by the next worker to open the session.
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", os.path.join("chat_history", "sessions.db"))
+SESSION_LEASE_SECONDS = float(os.getenv("SESSION_LEASE_SECONDS", "90"))
+SESSION_MAX_AGE_DAYS = float(os.getenv("SESSION_MAX_AGE_DAYS", "7"))
+
+# Saved chats (conversation_store.py); JSON files left in chat_history/ are migrated on startup
+CHAT_DB_PATH = os.getenv("CHAT_DB_PATH", os.path.join("chat_history", "chats.db"))
+CHAT_PAGE_SIZE = int(os.getenv("CHAT_PAGE_SIZE", "20"))
+# Chats listed for a sidebar search, best match first
+CHAT_SEARCH_RESULTS = int(os.getenv("CHAT_SEARCH_RESULTS", "10"))
+
+# Per-turn traces (telemetry.py): the fraction of turns whose stage timings are appended to TRACE_LOG_PATH.
+# 0 turns tracing off; below 1 samples turns at random, for busy periods
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+TRACE_LOG_PATH = os.getenv("TRACE_LOG_PATH", os.path.join("chat_history", "traces.jsonl"))
+# Prometheus metrics: chat_api.py serves them on /metrics, the Streamlit app on METRICS_HOST:METRICS_PORT/metrics
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "0") == "1"
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))
+
+# Chat analytics (analytics.py): one compact event per turn under ANALYTICS_DIR, rolled up per minute, hour and day
+# every ANALYTICS_ROLLUP_SECONDS by `python analytics.py --follow` for `streamlit run analytics_dashboard.py`.
+# Raw events and minute rollups are deleted after ANALYTICS_RAW_RETENTION_DAYS; hour and day rollups are kept
+ANALYTICS_ENABLED = os.getenv("ANALYTICS_ENABLED", "1") == "1"
+ANALYTICS_DIR = os.getenv("ANALYTICS_DIR", os.path.join("chat_history", "analytics"))
+ANALYTICS_ROLLUP_SECONDS = float(os.getenv("ANALYTICS_ROLLUP_SECONDS", "60"))
+ANALYTICS_RAW_RETENTION_DAYS = int(os.getenv("ANALYTICS_RAW_RETENTION_DAYS", "7"))
+
+# Quick-action speculation (speculation.py): the follow-ups offered under a reply are answered at low priority
+# while it is read, so a click is served at once. Skipped while more than SPECULATION_MAX_QUEUE_DEPTH requests
+# wait for upstream capacity or once a session has spent SPECULATION_SESSION_TOKEN_BUDGET estimated tokens on it.
+# Off by default: answers nobody clicks still spend quota
+SPECULATION_ENABLED = os.getenv("SPECULATION_ENABLED", "0") == "1"
+SPECULATION_SESSION_TOKEN_BUDGET = int(os.getenv("SPECULATION_SESSION_TOKEN_BUDGET", "8000"))
+SPECULATION_MAX_QUEUE_DEPTH = int(os.getenv("SPECULATION_MAX_QUEUE_DEPTH", "0"))
+SPECULATION_WORKERS = int(os.getenv("SPECULATION_WORKERS", "8"))
+
+# Voice conversations (voice.py, chat_api.py /voice/ws). Speech-to-text: "vosk" decodes while the user speaks with a
+# model directory per language (VOICE_STT_MODEL_EN/_HI); "whisper" (faster-whisper) takes a model size or path and
+# decodes once speech ends. Speech ends after VOICE_END_SILENCE_MS of silence.
+VOICE_STT_ENGINE = os.getenv("VOICE_STT_ENGINE", "vosk")
+VOICE_STT_MODELS = {
+    "en": os.getenv("VOICE_STT_MODEL_EN", os.path.join("models", "vosk-model-small-en-in-0.4")),
+    "hi": os.getenv("VOICE_STT_MODEL_HI", os.path.join("models", "vosk-model-small-hi-0.22")),
+}
+VOICE_END_SILENCE_MS = int(os.getenv("VOICE_END_SILENCE_MS", "500"))
+# Text-to-speech: "espeak" (espeak-ng) or "pyttsx3", with a voice per language; replies are spoken a sentence at a
+# time on VOICE_TTS_WORKERS threads. Audio is cached by text and language under VOICE_AUDIO_CACHE_DIR ("" keeps
+# it in memory only)
+VOICE_TTS_ENGINE = os.getenv("VOICE_TTS_ENGINE", "espeak")
+VOICE_TTS_VOICES = {"en": os.getenv("VOICE_TTS_VOICE_EN", "en-us"), "hi": os.getenv("VOICE_TTS_VOICE_HI", "hi")}
+VOICE_TTS_WORKERS = int(os.getenv("VOICE_TTS_WORKERS", "2"))
+VOICE_AUDIO_CACHE_DIR = os.getenv("VOICE_AUDIO_CACHE_DIR", os.path.join("chat_history", "tts_cache"))
@@ -0,0 +1,127 @@
+# conversation_memory.py
+import re
+import threading
+
+from retrieval import estimate_tokens, extract_entities
+
+# Per-turn length kept by the extractive summarizer
+EXTRACTIVE_TURN_CHARS = 160
+SUMMARY_MAX_CHARS = 2000
+
+_SENTENCE_END = re.compile(r'(?<=[.!?।])\s')
+
+
+class ConversationSummary:
+    """Rolling summary of the turns that no longer fit in the prompt.
+
+    ``covered`` is the number of leading messages folded into ``text``. It is
+    updated by a background worker, so readers take a consistent snapshot
+    through ``snapshot()``.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.covered = 0
+        self.pending = None
+        self._lock = threading.Lock()
+
+    def snapshot(self):
+        with self._lock:
+            return self.text, self.covered
+
+    def update(self, text, covered):
+        with self._lock:
+            if covered > self.covered:
+                self.text, self.covered = text, covered
+
+
+def extractive_summarize(previous_summary, turns):
+    """Local summarizer: keeps the first sentence of every folded turn"""
+    lines = [previous_summary] if previous_summary else []
+    for message in turns:
+        first = _SENTENCE_END.split(message['content'].strip(), maxsplit=1)[0]
+        if len(first) > EXTRACTIVE_TURN_CHARS:
+            first = first[:EXTRACTIVE_TURN_CHARS] + "..."
+        lines.append(f"{message['role']}: {first}")
+    text = "\n".join(lines)
+    # Oldest lines go first when the summary itself outgrows its budget
+    return text[-SUMMARY_MAX_CHARS:]
+
+
+def format_pinned_entities(messages):
+    entities = extract_entities(messages)
+    parts = []
+    if entities.order_ids:
+        parts.append("order IDs " + ", ".join(entities.order_ids))
+    if entities.tracking_numbers:
+        parts.append("tracking numbers " + ", ".join(entities.tracking_numbers))
+    if entities.product_ids:
+        parts.append("product IDs " + ", ".join(entities.product_ids))
+    if entities.emails:
+        parts.append("emails " + ", ".join(entities.emails))
+    return "; ".join(parts)
+
+
+class ConversationMemory:
+    """Fits conversation history into a token budget.
+
+    Recent messages are kept verbatim, newest first, until the budget is
+    spent. Older turns are represented by the rolling summary plus the
+    identifiers pinned from the whole conversation. Summaries are computed
+    on ``executor`` after a reply, never while building a prompt.
+    """
+
+    def __init__(self, token_budget, summarizer=extractive_summarize, executor=None):
+        self.token_budget = token_budget
+        self.summarizer = summarizer
+        self.executor = executor
+
+    def _window_start(self, messages, budget):
+        used = 0
+        start = len(messages)
+        for i in range(len(messages) - 1, -1, -1):
+            cost = estimate_tokens(messages[i]['content']) + 4
+            if used + cost > budget and start < len(messages):
+                break
+            used += cost
+            start = i
+        return start
+
+    def _header(self, messages, summary_text):
+        parts = []
+        if summary_text:
+            parts.append("Summary of the earlier conversation:\n" + summary_text)
+        pinned = format_pinned_entities(messages)
+        if pinned:
+            parts.append("Identifiers mentioned in this conversation: " + pinned)
+        return "\n\n".join(parts)
+
+    def build_history(self, messages, summary):
+        """Return the payload messages (after the main system prompt) for ``messages``"""
+        summary_text, covered = summary.snapshot()
+        header = self._header(messages, summary_text if covered else "")
+        budget = self.token_budget - (estimate_tokens(header) if header else 0)
+        start = self._window_start(messages, budget)
+        history = [{"role": "system", "content": header}] if header else []
+        history.extend({"role": m["role"], "content": m["content"]} for m in messages[start:])
+        return history
+
+    def schedule_summary(self, messages, summary):
+        """Fold turns that fell out of the window into the summary in the background"""
+        cutoff = self._window_start(messages, self.token_budget * 3 // 4)
+        summary_text, covered = summary.snapshot()
+        if cutoff <= covered or (summary.pending is not None and not summary.pending.done()):
+            return
+        turns = [dict(m) for m in messages[covered:cutoff]]
+
+        def fold():
+            try:
+                text = self.summarizer(summary_text, turns)
+            except Exception:
+                text = extractive_summarize(summary_text, turns)
+            summary.update(text, cutoff)
+
+        if self.executor is None:
+            fold()
+        else:
+            summary.pending = self.executor.submit(fold)
@@ -0,0 +1,310 @@
+# conversation_store.py
+"""Saved chats in SQLite (WAL).
+
+``chats`` holds one metadata row per conversation (title, timestamp,
+preview, message count) indexed by (timestamp, id), so the sidebar reads a
+page of rows without touching message bodies. ``messages`` is append-only:
+saving a conversation again only inserts the messages added since the last
+save.
+
+``message_search`` is an FTS5 index over the messages, kept up to date in
+the same transactions: a save indexes the messages it inserts, a delete or
+rewrite removes the chat's rows with FTS5's 'delete' command. It is an
+external-content table reading message text through ``search_content``,
+so the text is not stored twice; ``search_rows`` gives each message the
+integer rowid FTS5 needs and holds its phonetic keys (see chat_search.py).
+A database created before the index existed is indexed once on open, or
+ahead of time with ``--reindex``.
+
+Migrate an existing chat_history/ directory of JSON files with:
+
+    python conversation_store.py --migrate chat_history
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from chat_search import FTS_TOKENIZER, highlight, match_expression, phonetic_text, query_terms
+
+PREVIEW_CHARS = 50
+MIGRATED_DIR = "migrated"
+# Matching messages read per search, before keeping the best one per chat
+SEARCH_CANDIDATES_PER_CHAT = 5
+# Only the most recently saved matches are ranked, so a word in every other message costs no more than a rare one
+SEARCH_WINDOW = 5000
+SNIPPET_WORDS = 16
+REINDEX_BATCH = 10_000
+
+logger = logging.getLogger(__name__)
+
+
+def chat_preview(messages):
+    """Generate a preview snippet from chat messages"""
+    if not messages:
+        return "No messages"
+
+    user_msg = next((m for m in messages if m['role'] == 'user'), None)
+    assistant_msg = next((m for m in messages if m['role'] == 'assistant'), None)
+
+    preview = ""
+    if user_msg:
+        preview += f"Q: {user_msg['content'][:PREVIEW_CHARS]}"
+        if len(user_msg['content']) > PREVIEW_CHARS:
+            preview += "..."
+    if assistant_msg:
+        preview += f"\nA: {assistant_msg['content'][:PREVIEW_CHARS]}"
+        if len(assistant_msg['content']) > PREVIEW_CHARS:
+            preview += "..."
+    return preview
+
+
+class ConversationStore:
+    """Indexed, paginated store of saved chats shared by every session in the process"""
+
+    def __init__(self, db_path):
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS chats ("
+            "id TEXT PRIMARY KEY, title TEXT NOT NULL, timestamp TEXT NOT NULL, "
+            "preview TEXT NOT NULL, message_count INTEGER NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS chats_timestamp ON chats (timestamp, id)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            "chat_id TEXT NOT NULL, seq INTEGER NOT NULL, role TEXT NOT NULL, content TEXT NOT NULL, "
+            "PRIMARY KEY (chat_id, seq)) WITHOUT ROWID")
+        indexed = self._db.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'message_search'").fetchone() is not None
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS search_rows ("
+            "id INTEGER PRIMARY KEY, chat_id TEXT NOT NULL, seq INTEGER NOT NULL, phonetic TEXT NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS search_rows_chat ON search_rows (chat_id, seq)")
+        self._db.execute(
+            "CREATE VIEW IF NOT EXISTS search_content AS "
+            "SELECT r.id AS id, m.content AS content, r.phonetic AS phonetic FROM search_rows r "
+            "JOIN messages m ON m.chat_id = r.chat_id AND m.seq = r.seq")
+        self._db.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS message_search USING fts5("
+            f"content, phonetic, content='search_content', content_rowid='id', tokenize=\"{FTS_TOKENIZER}\")")
+        if not indexed and self._db.execute("SELECT 1 FROM messages LIMIT 1").fetchone():
+            self.rebuild_search_index()
+
+    def _last_stored(self, chat_id, count):
+        row = self._db.execute("SELECT role, content FROM messages WHERE chat_id = ? AND seq = ?",
+                               (chat_id, count - 1)).fetchone()
+        return {'role': row[0], 'content': row[1]} if row else None
+
+    def _index(self, chat_id, first_seq, contents):
+        """Add messages ``first_seq``... of a chat to the search index; called inside a write transaction"""
+        if not contents:
+            return
+        next_id = self._db.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM search_rows").fetchone()[0]
+        rows = [(next_id + i, chat_id, seq, content, phonetic_text(content))
+                for i, (seq, content) in enumerate(enumerate(contents, first_seq))]
+        self._db.executemany("INSERT INTO search_rows (id, chat_id, seq, phonetic) VALUES (?, ?, ?, ?)",
+                             [(row_id, chat, seq, phonetic) for row_id, chat, seq, _, phonetic in rows])
+        self._db.executemany("INSERT INTO message_search (rowid, content, phonetic) VALUES (?, ?, ?)",
+                             [(row_id, content, phonetic) for row_id, _, _, content, phonetic in rows])
+
+    def _unindex(self, chat_id):
+        """Remove a chat's messages from the search index, before the messages themselves"""
+        rows = self._db.execute(
+            "SELECT r.id, m.content, r.phonetic FROM search_rows r "
+            "JOIN messages m ON m.chat_id = r.chat_id AND m.seq = r.seq WHERE r.chat_id = ?", (chat_id,)).fetchall()
+        # An external-content index is told the exact values it indexed
+        self._db.executemany(
+            "INSERT INTO message_search (message_search, rowid, content, phonetic) VALUES ('delete', ?, ?, ?)", rows)
+        self._db.execute("DELETE FROM search_rows WHERE chat_id = ?", (chat_id,))
+
+    def save_chat(self, chat_id, title, messages, timestamp=None):
+        """Upsert the chat's metadata and append messages not stored yet.
+
+        If ``messages`` no longer extends what is stored (an imported chat
+        reusing an id, say) the stored messages are replaced.
+        """
+        timestamp = timestamp or datetime.now().isoformat()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute("SELECT message_count FROM chats WHERE id = ?", (chat_id,)).fetchone()
+                stored = row[0] if row else 0
+                if stored and (stored > len(messages) or self._last_stored(chat_id, stored) != {
+                        'role': messages[stored - 1]['role'], 'content': messages[stored - 1]['content']}):
+                    self._unindex(chat_id)
+                    self._db.execute("DELETE FROM messages WHERE chat_id = ?", (chat_id,))
+                    stored = 0
+                self._db.executemany(
+                    "INSERT INTO messages (chat_id, seq, role, content) VALUES (?, ?, ?, ?)",
+                    ((chat_id, seq, m['role'], m['content']) for seq, m in enumerate(messages[stored:], stored)))
+                self._index(chat_id, stored, [m['content'] for m in messages[stored:]])
+                self._db.execute(
+                    "INSERT INTO chats (id, title, timestamp, preview, message_count) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (id) DO UPDATE SET title = excluded.title, timestamp = excluded.timestamp, "
+                    "preview = excluded.preview, message_count = excluded.message_count",
+                    (chat_id, title, timestamp, chat_preview(messages), len(messages)))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def list_chats(self, limit=20, after=None):
+        """One sidebar page, newest first.
+
+        ``after`` is the cursor returned with the previous page; the next
+        cursor is None once there are no more chats.
+        """
+        with self._lock:
+            if after is None:
+                rows = self._db.execute(
+                    "SELECT id, title, timestamp, preview FROM chats "
+                    "ORDER BY timestamp DESC, id DESC LIMIT ?", (limit + 1,)).fetchall()
+            else:
+                rows = self._db.execute(
+                    "SELECT id, title, timestamp, preview FROM chats WHERE (timestamp, id) < (?, ?) "
+                    "ORDER BY timestamp DESC, id DESC LIMIT ?", (*after, limit + 1)).fetchall()
+        chats = [{'id': r[0], 'title': r[1], 'timestamp': r[2], 'preview': r[3]} for r in rows[:limit]]
+        cursor = (rows[limit - 1][2], rows[limit - 1][0]) if len(rows) > limit else None
+        return chats, cursor
+
+    def load_messages(self, chat_id):
+        """Messages of a saved chat in order, or None if it doesn't exist"""
+        with self._lock:
+            if self._db.execute("SELECT 1 FROM chats WHERE id = ?", (chat_id,)).fetchone() is None:
+                return None
+            rows = self._db.execute("SELECT role, content FROM messages WHERE chat_id = ? ORDER BY seq",
+                                    (chat_id,)).fetchall()
+        return [{'role': role, 'content': content} for role, content in rows]
+
+    def delete_chat(self, chat_id):
+        """Delete a chat; returns False if it didn't exist"""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                deleted = self._db.execute("DELETE FROM chats WHERE id = ?", (chat_id,)).rowcount
+                self._unindex(chat_id)
+                self._db.execute("DELETE FROM messages WHERE chat_id = ?", (chat_id,))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return deleted > 0
+
+    def search(self, query, limit=10, start_mark="<mark>", end_mark="</mark>"):
+        """Saved chats matching ``query``, best first, with a highlighted snippet of the best message each.
+
+        Every query word must appear, as the start of a word or by its
+        phonetic key; if no message has them all, messages with any of
+        them are ranked instead. BM25 ranks the newest SEARCH_WINDOW
+        matching messages (the phonetic column weighs half as much as the
+        words themselves). Returns dicts with the chat's id, title
+        and timestamp, the matching message's seq and role, and
+        ``snippet``.
+        """
+        terms = query_terms(query)
+        if not terms:
+            return []
+        with self._lock:
+            rows = self._search(match_expression(terms), limit)
+            if not rows and len(terms) > 1:
+                rows = self._search(match_expression(terms, all_terms=False), limit)
+        results = {}
+        for chat_id, seq, title, timestamp, role, content in rows:
+            if chat_id not in results:
+                # Marked here rather than by FTS5's snippet(), which can't see matches on phonetic keys
+                results[chat_id] = {'id': chat_id, 'title': title, 'timestamp': timestamp, 'seq': seq, 'role': role,
+                                    'snippet': highlight(content, terms, start_mark, end_mark, SNIPPET_WORDS)}
+                if len(results) == limit:
+                    break
+        return list(results.values())
+
+    def _search(self, expression, limit):
+        return self._db.execute(
+            "SELECT r.chat_id, r.seq, c.title, c.timestamp, m.role, m.content FROM ("
+            "SELECT id, score FROM ("
+            "SELECT rowid AS id, bm25(message_search, 1.0, 0.5) AS score FROM message_search "
+            "WHERE message_search MATCH ? ORDER BY rowid DESC LIMIT ?) ORDER BY score LIMIT ?) hits "
+            "JOIN search_rows r ON r.id = hits.id "
+            "JOIN messages m ON m.chat_id = r.chat_id AND m.seq = r.seq "
+            "JOIN chats c ON c.id = r.chat_id ORDER BY hits.score",
+            (expression, SEARCH_WINDOW, limit * SEARCH_CANDIDATES_PER_CHAT)).fetchall()
+
+    def rebuild_search_index(self):
+        """Index every stored message from scratch; returns how many were indexed"""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute("DELETE FROM search_rows")
+                self._db.execute("INSERT INTO message_search (message_search) VALUES ('delete-all')")
+                indexed = 0
+                cursor = self._db.execute("SELECT chat_id, seq, content FROM messages")
+                while True:
+                    batch = cursor.fetchmany(REINDEX_BATCH)
+                    if not batch:
+                        break
+                    self._db.executemany(
+                        "INSERT INTO search_rows (id, chat_id, seq, phonetic) VALUES (?, ?, ?, ?)",
+                        [(indexed + i + 1, chat_id, seq, phonetic_text(content))
+                         for i, (chat_id, seq, content) in enumerate(batch)])
+                    indexed += len(batch)
+                self._db.execute("INSERT INTO message_search (message_search) VALUES ('rebuild')")
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        logger.info("indexed %d saved messages for search", indexed)
+        return indexed
+
+    def count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM chats").fetchone()[0]
+
+    def migrate_json_dir(self, directory):
+        """Import chat_history/*.json files, then move them into a ``migrated`` subdirectory.
+
+        Returns (imported, failed). Files that fail to parse are left in place.
+        """
+        imported = failed = 0
+        target = Path(directory) / MIGRATED_DIR
+        for file in sorted(Path(directory).glob("*.json")):
+            try:
+                with open(file, 'r', encoding='utf-8') as f:
+                    chat_data = json.load(f)
+                messages = [{'role': m['role'], 'content': m['content']} for m in chat_data['messages']]
+                self.save_chat(file.stem, chat_data.get('title', 'Untitled Chat'),
+                               messages, chat_data.get('timestamp'))
+            except (OSError, ValueError, KeyError, TypeError):
+                failed += 1
+                continue
+            target.mkdir(exist_ok=True)
+            shutil.move(str(file), str(target / file.name))
+            imported += 1
+        return imported, failed
+
+
+if __name__ == "__main__":
+    from config import CHAT_DB_PATH
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--migrate", metavar="DIR", help="directory of saved chat JSON files")
+    parser.add_argument("--reindex", action="store_true", help="rebuild the search index from the stored messages")
+    parser.add_argument("--db", default=CHAT_DB_PATH)
+    args = parser.parse_args()
+    if not (args.migrate or args.reindex):
+        parser.error("nothing to do: pass --migrate DIR and/or --reindex")
+    store = ConversationStore(args.db)
+    if args.migrate:
+        imported, failed = store.migrate_json_dir(args.migrate)
+        print(f"Imported {imported} chats into {args.db}" + (f", {failed} files could not be read" if failed else ""))
+    if args.reindex:
+        print(f"Indexed {store.rebuild_search_index()} messages for search")
@@ -0,0 +1,420 @@
+# data_layer.py
+"""Products and orders that follow data/*.json and delta files while the server runs.
+
+``DataLayer.snapshot`` is an immutable DataSnapshot; a turn takes it once
+and uses it throughout, while updates build the next snapshot on the side
+and swap it in with a single assignment.
+
+Besides edits to products.json / orders.json (which reload that file),
+changes can be dropped into ``data/deltas/*.jsonl``, one per line:
+
+    {"op": "upsert", "kind": "order", "record": {"order_id": "ORD123", ...}}
+    {"op": "delete", "kind": "product", "id": "PROD001"}
+
+Files are applied in name order and may be appended to; only new complete
+lines are read. Deltas never copy or rebuild the loaded data: changed
+orders and products go into an overlay (OrderOverlay, LayeredProductIndex)
+on top of the unchanged base, so a batch costs time in proportion to the
+changes since the base was built. Once an overlay passes
+COMPACT_ORDER_CHANGES or COMPACT_PRODUCT_CHANGES, a background thread
+folds it into a new base and swaps that in, keeping the changes that
+arrived meanwhile on top.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, replace
+
+from order_store import OrderOverlay, OrderRecord, OrderStore
+from product_search import LayeredProductIndex, ProductIndex
+from response_cache import data_fingerprint
+
+logger = logging.getLogger(__name__)
+
+DELTA_SUFFIX = ".jsonl"
+ID_FIELDS = {"order": "order_id", "product": "id"}
+# Changes an overlay holds before it is compacted into a new base. Each delta batch rebuilds the
+# product overlay's small index, so that threshold is lower
+COMPACT_ORDER_CHANGES = 50_000
+COMPACT_PRODUCT_CHANGES = 2_000
+OPTIONAL_NUMBER = (int, float, type(None))
+OPTIONAL_TEXT = (str, type(None))
+# Types a delta record's fields may have; fields not listed are kept as they are
+FIELD_TYPES = {
+    "order": {
+        "order_id": (str,), "customer_email": OPTIONAL_TEXT, "order_date": OPTIONAL_TEXT,
+        "status": OPTIONAL_TEXT, "total_amount": OPTIONAL_NUMBER, "shipping_address": OPTIONAL_TEXT,
+        "tracking_number": OPTIONAL_TEXT, "delivery_date": OPTIONAL_TEXT, "estimated_delivery": OPTIONAL_TEXT,
+        "items": (list,), "tracking_status": (list,),
+    },
+    "product": {
+        "id": (str,), "name": OPTIONAL_TEXT, "category": (str,), "description": OPTIONAL_TEXT,
+        "price": OPTIONAL_NUMBER, "rating": OPTIONAL_NUMBER, "in_stock": (bool, type(None)),
+        "reviews_count": (int, type(None)), "features": (list,),
+    },
+}
+# List fields, and the types of their entries' fields (a dict) or of the entries themselves
+ENTRY_TYPES = {
+    ("order", "items"): {"product_id": OPTIONAL_TEXT, "product_name": OPTIONAL_TEXT,
+                         "quantity": OPTIONAL_NUMBER, "price": OPTIONAL_NUMBER},
+    ("order", "tracking_status"): {"status": OPTIONAL_TEXT, "date": OPTIONAL_TEXT, "location": OPTIONAL_TEXT},
+    ("product", "features"): (str,),
+}
+
+
+@dataclass(frozen=True)
+class DataSnapshot:
+    """One consistent version of the data.
+
+    ``version`` identifies the content (base file hashes chained with every
+    applied delta) and is what caches key on; ``generation`` counts swaps in
+    this process.
+    """
+    version: str
+    generation: int
+    product_index: ProductIndex
+    order_store: OrderStore
+
+
+class DeltaError(ValueError):
+    """A delta line that can't be applied"""
+
+
+def _check_type(value, allowed, name):
+    # bool is an int, but not a price or a quantity
+    if not isinstance(value, allowed) or (isinstance(value, bool) and bool not in allowed):
+        expected = " or ".join("null" if t is type(None) else t.__name__ for t in allowed)
+        raise DeltaError(f"{name} must be {expected}, not {type(value).__name__}")
+
+
+def validate_record(kind, record):
+    """Raise DeltaError unless ``record`` has the field types the stores rely on"""
+    if not isinstance(record, dict) or not record.get(ID_FIELDS[kind]):
+        raise DeltaError(f"upsert needs a record with {ID_FIELDS[kind]}")
+    for field, allowed in FIELD_TYPES[kind].items():
+        if field not in record:
+            continue
+        _check_type(record[field], allowed, f"{kind} {field}")
+        entry_types = ENTRY_TYPES.get((kind, field))
+        if entry_types is None:
+            continue
+        for i, entry in enumerate(record[field]):
+            if isinstance(entry_types, tuple):
+                _check_type(entry, entry_types, f"{kind} {field}[{i}]")
+                continue
+            _check_type(entry, (dict,), f"{kind} {field}[{i}]")
+            for key, entry_allowed in entry_types.items():
+                if key in entry:
+                    _check_type(entry[key], entry_allowed, f"{kind} {field}[{i}].{key}")
+
+
+def parse_change(line):
+    """Validate one delta line; returns (op, kind, record_id, record)"""
+    change = json.loads(line)
+    if not isinstance(change, dict):
+        raise DeltaError("change must be a JSON object")
+    op, kind = change.get("op"), change.get("kind")
+    if kind not in ID_FIELDS:
+        raise DeltaError(f"unknown kind {kind!r}")
+    if op == "upsert":
+        record = change.get("record")
+        validate_record(kind, record)
+        return op, kind, record[ID_FIELDS[kind]], record
+    if op == "delete":
+        record_id = change.get("id")
+        if not record_id or not isinstance(record_id, str):
+            raise DeltaError("delete needs an id")
+        return op, kind, record_id, None
+    raise DeltaError(f"unknown op {op!r}")
+
+
+def apply_changes(snapshot, changes, version):
+    """Next snapshot with ``changes`` (parsed delta lines) applied.
+
+    Changed records go into the snapshot's overlays (started here if it
+    has none); the base structures are shared with ``snapshot`` untouched.
+    """
+    order_changes, product_changes = {}, {}
+    for op, kind, record_id, record in changes:
+        if kind == "order":
+            order_changes[record_id] = OrderRecord.from_dict(record) if op == "upsert" else None
+        else:
+            product_changes[record_id] = record
+    order_store = snapshot.order_store
+    if order_changes:
+        order_store = (order_store.with_changes(order_changes) if isinstance(order_store, OrderOverlay)
+                       else OrderOverlay(order_store, order_changes))
+    product_index = snapshot.product_index
+    if product_changes:
+        product_index = (product_index.with_changes(product_changes)
+                         if isinstance(product_index, LayeredProductIndex)
+                         else LayeredProductIndex(product_index, product_changes))
+    return DataSnapshot(version, snapshot.generation + 1, product_index, order_store)
+
+
+def needs_compaction(snapshot):
+    """(orders, products): whether each overlay of ``snapshot`` is due to be folded into a new base"""
+    orders, products = snapshot.order_store, snapshot.product_index
+    return (isinstance(orders, OrderOverlay) and len(orders.changes) >= COMPACT_ORDER_CHANGES,
+            isinstance(products, LayeredProductIndex) and len(products.changes) >= COMPACT_PRODUCT_CHANGES)
+
+
+def compact(snapshot, orders=True, products=True):
+    """``snapshot`` with its overlays (those selected) folded into new base structures"""
+    order_store, product_index = snapshot.order_store, snapshot.product_index
+    if orders and isinstance(order_store, OrderOverlay):
+        order_store = order_store.compacted()
+    if products and isinstance(product_index, LayeredProductIndex):
+        product_index = product_index.compacted()
+    return replace(snapshot, order_store=order_store, product_index=product_index)
+
+
+def rebase(current, layered, compacted):
+    """``current`` with the overlays that ``compacted`` folded from ``layered`` replaced by their result.
+
+    Changes applied after ``layered`` stay in an overlay on the new base; an
+    overlay started over a different base (after a full reload) is kept.
+    """
+    order_store, product_index = current.order_store, current.product_index
+    if compacted.order_store is not layered.order_store and isinstance(order_store, OrderOverlay):
+        order_store = order_store.rebased(layered.order_store, compacted.order_store)
+    if compacted.product_index is not layered.product_index and isinstance(product_index, LayeredProductIndex):
+        product_index = product_index.rebased(layered.product_index, compacted.product_index)
+    return replace(current, order_store=order_store, product_index=product_index)
+
+
+def _load_products(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+
+
+def _load_orders(path):
+    try:
+        return OrderStore.from_file(path)
+    except FileNotFoundError:
+        return OrderStore()
+
+
+def _file_state(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class DataLayer:
+    """Current DataSnapshot plus the polling that keeps it up to date.
+
+    ``refresh`` checks the files once; ``start`` runs it every
+    ``poll_seconds`` on a daemon thread. A reload that fails (bad JSON in a
+    base file, say) keeps the current snapshot and records ``last_error``;
+    a delta line that isn't UTF-8, isn't valid JSON or whose record has the
+    wrong shape (see ``validate_record``) is skipped and counted, and the
+    lines around it are applied. Overlays that have grown past the compaction thresholds
+    are compacted on another daemon thread (``compact_now`` does it inline).
+    """
+
+    def __init__(self, products_path, orders_path, deltas_dir=None, poll_seconds=2.0):
+        self.products_path = products_path
+        self.orders_path = orders_path
+        self.deltas_dir = deltas_dir
+        self.poll_seconds = poll_seconds
+        self.metrics = Counter()
+        self.last_error = None
+        self.last_reload_ms = 0.0
+        self.last_compact_ms = 0.0
+        self._compactor = None
+        self._base_state = None
+        self._delta_offsets = {}
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.snapshot = None
+        with self._refresh_lock:
+            self._reload_base()
+
+    @property
+    def data_version(self):
+        return self.snapshot.version
+
+    def _base_files_state(self):
+        return _file_state(self.products_path), _file_state(self.orders_path)
+
+    def _reload_base(self):
+        """Re-read both base files, then every delta file from the start"""
+        started = time.perf_counter()
+        state = self._base_files_state()
+        products = _load_products(self.products_path)
+        order_store = _load_orders(self.orders_path)
+        generation = self.snapshot.generation + 1 if self.snapshot else 0
+        snapshot = DataSnapshot(data_fingerprint([self.products_path, self.orders_path]), generation,
+                                ProductIndex(products), order_store)
+        snapshot, self._delta_offsets = self._apply_deltas(snapshot, {})
+        if any(needs_compaction(snapshot)):
+            # A full reload reads everything anyway; start from a compact base
+            snapshot = compact(snapshot)
+        self._base_state = state
+        self.snapshot = replace(snapshot, generation=generation)
+        self.metrics['base_reloads'] += 1
+        self.last_reload_ms = (time.perf_counter() - started) * 1000
+
+    def _delta_files(self):
+        if not self.deltas_dir:
+            return []
+        try:
+            entries = sorted(e.name for e in os.scandir(self.deltas_dir)
+                             if e.is_file() and e.name.endswith(DELTA_SUFFIX))
+        except FileNotFoundError:
+            return []
+        return [os.path.join(self.deltas_dir, name) for name in entries]
+
+    @staticmethod
+    def _read_new_lines(path, offset):
+        """Complete lines (undecoded) appended to ``path`` after ``offset``, and the new offset"""
+        with open(path, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        return data[:end].splitlines(), offset + end
+
+    def _apply_deltas(self, snapshot, offsets):
+        """Snapshot with the delta lines past ``offsets`` applied, and the offsets after them"""
+        offsets = dict(offsets)
+        changes = []
+        digest = hashlib.sha1(snapshot.version.encode())
+        for path in self._delta_files():
+            lines, offsets[path] = self._read_new_lines(path, offsets.get(path, 0))
+            for raw in lines:
+                if not raw.strip():
+                    continue
+                try:
+                    # Decoded one line at a time so a stray byte costs only its own line
+                    line = raw.decode("utf-8")
+                    changes.append(parse_change(line))
+                except ValueError as e:
+                    self.metrics['delta_errors'] += 1
+                    logger.warning("skipping delta line in %s: %s", path, e)
+                    continue
+                digest.update(raw)
+        if not changes:
+            return snapshot, offsets
+        snapshot = apply_changes(snapshot, changes, digest.hexdigest()[:16])
+        self.metrics['delta_changes'] += len(changes)
+        self.metrics['delta_batches'] += 1
+        return snapshot, offsets
+
+    def _delta_rewritten(self):
+        """True if a delta file already read has shrunk (rewritten rather than appended to)"""
+        for path, offset in self._delta_offsets.items():
+            state = _file_state(path)
+            if state is not None and state[1] < offset:
+                return True
+        return False
+
+    def refresh(self):
+        """Pick up changed files; returns True if a new snapshot was swapped in"""
+        with self._refresh_lock:
+            previous = self.snapshot
+            reloading_base = False
+            try:
+                if self._base_files_state() != self._base_state or self._delta_rewritten():
+                    reloading_base = True
+                    self._reload_base()
+                else:
+                    started = time.perf_counter()
+                    snapshot, self._delta_offsets = self._apply_deltas(previous, self._delta_offsets)
+                    if snapshot is not previous:
+                        self.snapshot = snapshot
+                        self.last_reload_ms = (time.perf_counter() - started) * 1000
+            except Exception as e:
+                self.metrics['reload_errors'] += 1
+                self.last_error = f"{type(e).__name__}: {e}"
+                logger.warning("data reload failed, keeping version %s: %s", previous.version, e)
+                if reloading_base:
+                    # Don't retry the same broken files on every poll; the next change to them is picked up.
+                    # A later full reload reads every delta from the start again, so none are lost.
+                    self._base_state = self._base_files_state()
+                    self._delta_offsets = {path: (_file_state(path) or (0, 0))[1] for path in self._delta_files()}
+                # Otherwise the offsets stay before the lines that failed, and the next poll retries them
+                return False
+            if self.snapshot is previous:
+                return False
+            self.last_error = None
+            self.metrics['swaps'] += 1
+            logger.info("data version %s -> %s (generation %d, %.1f ms)", previous.version, self.snapshot.version,
+                        self.snapshot.generation, self.last_reload_ms)
+            self._start_compaction()
+            return True
+
+    def _start_compaction(self):
+        # Called with the refresh lock held
+        if not any(needs_compaction(self.snapshot)) or (self._compactor is not None and self._compactor.is_alive()):
+            return
+        self._compactor = threading.Thread(target=self._compact_in_background, name="data-compact", daemon=True)
+        self._compactor.start()
+
+    def _compact_in_background(self):
+        try:
+            self.compact_now()
+        except Exception:
+            self.metrics['compaction_errors'] += 1
+            logger.exception("data compaction failed")
+
+    def compact_now(self):
+        """Fold the overlays that are due into new base structures, then swap them in.
+
+        The build runs without the refresh lock, so deltas keep being
+        applied meanwhile; they stay in an overlay on top of the new base.
+        """
+        layered = self.snapshot
+        orders, products = needs_compaction(layered)
+        if not (orders or products):
+            return False
+        started = time.perf_counter()
+        compacted = compact(layered, orders, products)
+        with self._refresh_lock:
+            self.snapshot = rebase(self.snapshot, layered, compacted)
+            self.last_compact_ms = (time.perf_counter() - started) * 1000
+            self.metrics['compactions'] += 1
+        logger.info("compacted data overlays (orders=%s, products=%s) in %.0f ms", orders, products,
+                    self.last_compact_ms)
+        return True
+
+    def _poll(self):
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                self.refresh()
+            except Exception:
+                # One bad poll must not end hot reload for the rest of the process
+                self.metrics['reload_errors'] += 1
+                logger.exception("data poll failed")
+
+    def start(self):
+        """Poll for changes on a background thread (no-op if ``poll_seconds`` is 0)"""
+        if self.poll_seconds > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._poll, name="data-layer", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self):
+        snapshot = self.snapshot
+        return dict(self.metrics, version=snapshot.version, generation=snapshot.generation,
+                    orders=len(snapshot.order_store), products=len(snapshot.product_index),
+                    order_overlay=len(getattr(snapshot.order_store, "changes", ())),
+                    product_overlay=len(getattr(snapshot.product_index, "changes", ())),
+                    last_reload_ms=round(self.last_reload_ms, 1), last_compact_ms=round(self.last_compact_ms, 1),
+                    last_error=self.last_error)
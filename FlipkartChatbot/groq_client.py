@@ -0,0 +1,494 @@
+# groq_client.py
+import asyncio
+import heapq
+import itertools
+import json
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import aiohttp
+import httpx
+from groq import Groq, APIConnectionError, APIStatusError, APITimeoutError
+
+from retrieval import estimate_tokens
+from tools import ToolCalls
+
+# Lower numbers are served first
+PRIORITY_LIVE = 0
+PRIORITY_SPECULATIVE = 5
+PRIORITY_BACKGROUND = 10
+
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_CAP_SECONDS = 8.0
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+DEFAULT_BASE_URL = "https://api.groq.com"
+CHAT_COMPLETIONS_PATH = "/openai/v1/chat/completions"
+
+# Wait-time histogram buckets in seconds, Prometheus style (upper bounds)
+WAIT_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class DeadlineExceeded(Exception):
+    """The request could not be scheduled or completed before its deadline"""
+
+
+class TokenBucket:
+    """Continuously refilling bucket sized from a per-minute limit"""
+
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0
+        self.capacity = float(capacity if capacity is not None else per_minute)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until ``amount`` is available (0 if it is now)"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount):
+        self.level -= min(amount, self.capacity)
+
+
+class RequestScheduler:
+    """Admits upstream requests in priority order within RPM/TPM budgets.
+
+    Callers block in ``acquire`` until they are at the head of the priority
+    queue and both buckets can cover the request, or until their deadline.
+    """
+
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.metrics = Counter()
+        self.wait_histogram = [0] * (len(WAIT_BUCKETS) + 1)
+        self.wait_seconds_total = 0.0
+        self._queue = []
+        self._async_waiters = {}
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+
+    @property
+    def queue_depth(self):
+        with self._condition:
+            return len(self._queue)
+
+    def _enqueue(self, priority):
+        entry = (priority, next(self._sequence))
+        heapq.heappush(self._queue, entry)
+        self.metrics['max_queue_depth'] = max(self.metrics['max_queue_depth'], len(self._queue))
+        return entry
+
+    def _admit(self, entry, tokens, deadline, now):
+        """Take capacity if ``entry`` is at the head; return 0 when admitted, else seconds to wait (None: until notified)"""
+        if self._queue[0] == entry:
+            wait = max(self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+            if wait == 0:
+                self.requests.take(1)
+                self.tokens.take(tokens)
+                return 0
+        else:
+            wait = None
+        if deadline is not None:
+            remaining = deadline - now
+            if remaining <= 0:
+                self.metrics['deadline_exceeded'] += 1
+                raise DeadlineExceeded("timed out waiting for upstream capacity")
+            wait = remaining if wait is None else min(wait, remaining)
+        return wait
+
+    def _dequeue(self, entry):
+        self._queue.remove(entry)
+        heapq.heapify(self._queue)
+        self._condition.notify_all()
+        # Event-loop waiters can't wait on the condition; wake the new head directly
+        waiter = self._async_waiters.get(self._queue[0]) if self._queue else None
+        if waiter is not None:
+            loop, wakeup = waiter
+            loop.call_soon_threadsafe(wakeup.set)
+
+    def _record(self, started):
+        waited = time.monotonic() - started
+        self.metrics['admitted'] += 1
+        self.wait_seconds_total += waited
+        self.wait_histogram[next((i for i, b in enumerate(WAIT_BUCKETS) if waited <= b), len(WAIT_BUCKETS))] += 1
+        return waited
+
+    def acquire(self, tokens, priority=PRIORITY_LIVE, deadline=None):
+        started = time.monotonic()
+        with self._condition:
+            entry = self._enqueue(priority)
+            try:
+                while True:
+                    wait = self._admit(entry, tokens, deadline, time.monotonic())
+                    if wait == 0:
+                        break
+                    self._condition.wait(wait)
+            finally:
+                self._dequeue(entry)
+            return self._record(started)
+
+    async def acquire_async(self, tokens, priority=PRIORITY_LIVE, deadline=None):
+        """``acquire`` for event-loop callers; waits without blocking the loop"""
+        started = time.monotonic()
+        wakeup = asyncio.Event()
+        with self._condition:
+            entry = self._enqueue(priority)
+            self._async_waiters[entry] = (asyncio.get_running_loop(), wakeup)
+        try:
+            while True:
+                wakeup.clear()
+                with self._condition:
+                    wait = self._admit(entry, tokens, deadline, time.monotonic())
+                if wait == 0:
+                    break
+                try:
+                    await asyncio.wait_for(wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self._condition:
+                del self._async_waiters[entry]
+                self._dequeue(entry)
+        with self._condition:
+            return self._record(started)
+
+    def stats(self):
+        with self._condition:
+            admitted = self.metrics['admitted']
+            return dict(self.metrics, queue_depth=len(self._queue),
+                        mean_wait_seconds=self.wait_seconds_total / admitted if admitted else 0.0,
+                        wait_histogram=dict(zip([str(b) for b in WAIT_BUCKETS] + ['+Inf'], self.wait_histogram)))
+
+
+def _status_code(error):
+    if isinstance(error, APIStatusError):
+        return error.status_code
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status
+    return None
+
+
+def _retry_after(error):
+    response = getattr(error, 'response', None)
+    headers = response.headers if response is not None else getattr(error, 'headers', None)
+    value = headers.get('retry-after') if headers is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _merge_tool_call_deltas(pending, deltas):
+    """Accumulate streamed tool-call fragments (dicts keyed by ``index``) into ``pending``"""
+    for delta in deltas:
+        call = pending.setdefault(delta.get('index', len(pending)), {'id': None, 'name': '', 'arguments': ''})
+        call['id'] = delta.get('id') or call['id']
+        function = delta.get('function') or {}
+        call['name'] += function.get('name') or ''
+        call['arguments'] += function.get('arguments') or ''
+
+
+def _tool_calls(pending):
+    return ToolCalls(dict(call, id=call['id'] or f"call_{index}") for index, call in sorted(pending.items()))
+
+
+async def _before(deadline, awaitable):
+    """Await ``awaitable``, raising DeadlineExceeded if it is still pending at ``deadline`` (None waits forever)"""
+    if deadline is None:
+        return await awaitable
+    try:
+        return await asyncio.wait_for(awaitable, max(0.0, deadline - time.monotonic()))
+    except asyncio.TimeoutError:
+        if time.monotonic() < deadline:
+            raise
+        raise DeadlineExceeded("no reply before the first-token deadline") from None
+
+
+def error_kind(error):
+    """Label for an upstream failure: the HTTP status, or the exception class"""
+    status = _status_code(error)
+    return str(status) if status is not None else type(error).__name__
+
+
+def _is_retryable(error):
+    if isinstance(error, (APIConnectionError, APITimeoutError, aiohttp.ClientConnectionError, asyncio.TimeoutError)):
+        return True
+    return _status_code(error) in RETRYABLE_STATUS
+
+
+class GroqGateway:
+    """Process-wide Groq client with pooled connections, scheduling and retries.
+
+    The SDK's own retries are disabled; failures before the first streamed
+    token are retried here with full-jitter exponential backoff (honouring
+    Retry-After), always within the request deadline. Once tokens have been
+    delivered a failure is raised to the caller instead.
+
+    ``astream`` serves asyncio callers. It talks to the OpenAI-compatible
+    endpoint over an aiohttp session rather than the SDK's async client,
+    whose httpx pool stalls with thousands of concurrent streams; the session
+    is created on first use, so it binds to the event loop that runs it.
+    Both paths share the schedulers: one per model listed in
+    ``model_rate_limits``, and the default one for every other model.
+
+    ``retries`` overrides ``max_retries`` for one call. ``first_token_deadline``
+    (a ``time.monotonic()`` value) is when the first delta must have arrived,
+    queueing and retries included, so a caller with somewhere else to go
+    (see model_router.py) can fail fast; missing it fails the call with a
+    timeout.
+
+    When the request declares ``tools`` and the model calls them, the stream
+    ends with a ``ToolCalls`` list after any text deltas.
+    """
+
+    def __init__(self, api_key, requests_per_minute, tokens_per_minute, base_url=None, timeout_seconds=30.0,
+                 max_connections=100, max_retries=3, deadline_seconds=60.0, model_rate_limits=None):
+        self.http_client = httpx.Client(
+            timeout=httpx.Timeout(timeout_seconds, connect=5.0),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+        self.client = Groq(api_key=api_key, base_url=base_url or None, http_client=self.http_client, max_retries=0)
+        self.api_key = api_key
+        self.completions_url = (base_url or DEFAULT_BASE_URL).rstrip('/') + CHAT_COMPLETIONS_PATH
+        self.timeout_seconds = timeout_seconds
+        self.max_connections = max_connections
+        self._async_session = None
+        # Opens sync streams up to their first delta (see _open_stream); one per pooled connection at most
+        self._openers = ThreadPoolExecutor(max_workers=max_connections, thread_name_prefix="groq-stream-open")
+        self.scheduler = RequestScheduler(requests_per_minute, tokens_per_minute)
+        self.model_rate_limits = model_rate_limits or {}
+        self._model_schedulers = {}
+        self.max_retries = max_retries
+        self.deadline_seconds = deadline_seconds
+        self.metrics = Counter()
+        self._lock = threading.Lock()
+
+    def _count(self, name):
+        with self._lock:
+            self.metrics[name] += 1
+
+    def _count_error(self, error):
+        with self._lock:
+            self.metrics['errors'] += 1
+            self.metrics['errors.' + error_kind(error)] += 1
+
+    @staticmethod
+    def estimate_request_tokens(request):
+        prompt = sum(estimate_tokens(m.get('content') or '') for m in request.get('messages', ()))
+        if request.get('tools'):
+            prompt += estimate_tokens(json.dumps(request['tools']))
+        return prompt + request.get('max_tokens', 0)
+
+    def scheduler_for(self, model):
+        """The scheduler pacing ``model``'s requests"""
+        limits = self.model_rate_limits.get(model)
+        if limits is None:
+            return self.scheduler
+        with self._lock:
+            scheduler = self._model_schedulers.get(model)
+            if scheduler is None:
+                scheduler = self._model_schedulers[model] = RequestScheduler(*limits)
+            return scheduler
+
+    def _deadline(self, deadline):
+        return deadline if deadline is not None else time.monotonic() + self.deadline_seconds
+
+    @property
+    def async_session(self):
+        if self._async_session is None:
+            self._async_session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections),
+                timeout=aiohttp.ClientTimeout(sock_connect=5.0, sock_read=self.timeout_seconds),
+                headers={'Authorization': f'Bearer {self.api_key}'},
+            )
+        return self._async_session
+
+    async def aclose(self):
+        if self._async_session is not None:
+            await self._async_session.close()
+            self._async_session = None
+
+    def _retry_delay(self, error, attempt, deadline, retries=None):
+        """Seconds to wait before the next attempt, or re-raise if the error is final"""
+        if attempt >= (self.max_retries if retries is None else retries) or not _is_retryable(error):
+            raise error
+        self._count('retries')
+        if _status_code(error) == 429:
+            self._count('rate_limited')
+        delay = _retry_after(error) or random.uniform(0, min(BACKOFF_CAP_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+        if time.monotonic() + delay >= deadline:
+            self._count('deadline_exceeded')
+            raise DeadlineExceeded(f"no time left to retry after: {error}") from error
+        return delay
+
+    def complete(self, priority=PRIORITY_BACKGROUND, deadline=None, **request):
+        """Non-streaming chat completion"""
+        deadline = self._deadline(deadline)
+        tokens = self.estimate_request_tokens(request)
+        attempt = 0
+        scheduler = self.scheduler_for(request.get('model'))
+        while True:
+            scheduler.acquire(tokens, priority, deadline)
+            try:
+                result = self.client.chat.completions.create(
+                    timeout=max(0.1, deadline - time.monotonic()), **request)
+            except Exception as e:
+                self._count_error(e)
+                time.sleep(self._retry_delay(e, attempt, deadline))
+                attempt += 1
+                continue
+            self._count('completed')
+            return result
+
+    def stream(self, priority=PRIORITY_LIVE, deadline=None, retries=None, first_token_deadline=None, **request):
+        """Streaming chat completion yielding content deltas"""
+        deadline = self._deadline(deadline)
+        tokens = self.estimate_request_tokens(request)
+        scheduler = self.scheduler_for(request.get('model'))
+        first_by = deadline if first_token_deadline is None else min(deadline, first_token_deadline)
+        attempt = 0
+        while True:
+            scheduler.acquire(tokens, priority, first_by)
+            started = False
+            pending_calls = {}
+            try:
+                response, chunks = self._open_stream(request, max(0.1, deadline - time.monotonic()), first_by)
+                # Closed however the stream ends, the caller closing this generator included, so its
+                # pooled connection goes back instead of staying checked out
+                try:
+                    for chunk in chunks:
+                        # Each read is bounded by timeout_seconds only; the reply as a whole by the deadline
+                        if time.monotonic() > deadline:
+                            raise DeadlineExceeded("reply still streaming at the deadline")
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta
+                        if delta.tool_calls:
+                            _merge_tool_call_deltas(pending_calls, (t.model_dump() for t in delta.tool_calls))
+                        if delta.content is not None:
+                            started = True
+                            yield delta.content
+                finally:
+                    response.close()
+            except Exception as e:
+                self._count_error(e)
+                if started:
+                    raise
+                time.sleep(self._retry_delay(e, attempt, first_by, retries))
+                attempt += 1
+                continue
+            self._count('completed')
+            if pending_calls:
+                yield _tool_calls(pending_calls)
+            return
+
+    def _open_stream(self, request, remaining, first_by):
+        """The open stream (the caller closes it) and its chunks, giving up if none carries a delta by ``first_by``.
+
+        httpx applies one read timeout to every read of a response, so the
+        first-token budget can't be the read timeout without also cutting
+        later pauses short; chunks are read with ``timeout_seconds`` between
+        them. The request is opened and read up to its first delta on a
+        pooled helper thread while this one waits for it until ``first_by``.
+        """
+        def read_until_first_delta():
+            stream = self.client.chat.completions.create(
+                stream=True, timeout=httpx.Timeout(remaining, read=self.timeout_seconds), **request)
+            try:
+                chunks, head = iter(stream), []
+                for chunk in chunks:
+                    head.append(chunk)
+                    delta = chunk.choices[0].delta if chunk.choices else None
+                    if delta is not None and (delta.content is not None or delta.tool_calls):
+                        break
+            except BaseException:
+                stream.close()
+                raise
+            return stream, chunks, head
+
+        opened = self._openers.submit(read_until_first_delta)
+        try:
+            stream, chunks, head = opened.result(timeout=max(0.0, first_by - time.monotonic()))
+        except FutureTimeout:
+            # Close the response once the helper has it, so the connection isn't left half read
+            opened.add_done_callback(lambda f: f.exception() is None and f.result()[0].close())
+            raise DeadlineExceeded("no reply before the first-token deadline") from None
+        return stream, itertools.chain(head, chunks)
+
+    async def astream(self, priority=PRIORITY_LIVE, deadline=None, retries=None, first_token_deadline=None,
+                      **request):
+        """Async twin of ``stream`` for callers running on an event loop"""
+        deadline = self._deadline(deadline)
+        tokens = self.estimate_request_tokens(request)
+        scheduler = self.scheduler_for(request.get('model'))
+        first_by = deadline if first_token_deadline is None else min(deadline, first_token_deadline)
+        attempt = 0
+        while True:
+            await scheduler.acquire_async(tokens, priority, first_by)
+            started = False
+            pending_calls = {}
+            # Reads are bounded by ``first_by`` until a delta arrives, then only by the socket timeout
+            waiting_until = None if first_token_deadline is None else first_by
+            try:
+                async with await _before(waiting_until, self.async_session.post(
+                        self.completions_url, json=dict(request, stream=True),
+                        timeout=aiohttp.ClientTimeout(total=max(0.1, deadline - time.monotonic()),
+                                                      sock_connect=5.0, sock_read=self.timeout_seconds))) as response:
+                    response.raise_for_status()
+                    finished = False
+                    try:
+                        while True:
+                            line = await _before(waiting_until, response.content.readline())
+                            if not line:
+                                break
+                            if not line.startswith(b'data:'):
+                                continue
+                            data = line[5:].strip()
+                            if data == b'[DONE]':
+                                break
+                            choices = json.loads(data).get('choices')
+                            delta = (choices[0].get('delta') or {}) if choices else {}
+                            if delta.get('tool_calls') or delta.get('content') is not None:
+                                waiting_until = None
+                            if delta.get('tool_calls'):
+                                _merge_tool_call_deltas(pending_calls, delta['tool_calls'])
+                            content = delta.get('content')
+                            if content is not None:
+                                started = True
+                                yield content
+                        finished = True
+                    finally:
+                        # Abandoned (the caller closed this generator) or failed partway: drop the
+                        # connection instead of handing it back to the pool half read
+                        if not finished:
+                            response.close()
+            except Exception as e:
+                self._count_error(e)
+                if started:
+                    raise
+                await asyncio.sleep(self._retry_delay(e, attempt, first_by, retries))
+                attempt += 1
+                continue
+            self._count('completed')
+            if pending_calls:
+                yield _tool_calls(pending_calls)
+            return
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.metrics)
+        stats.update(('scheduler_' + k, v) for k, v in self.scheduler.stats().items())
+        with self._lock:
+            schedulers = dict(self._model_schedulers)
+        if schedulers:
+            stats['model_schedulers'] = {model: s.stats() for model, s in schedulers.items()}
+        return stats
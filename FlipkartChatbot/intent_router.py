@@ -0,0 +1,191 @@
+# intent_router.py
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass
+
+from prompts import QUICK_ACTIONS, ORDER_TRACKING_TEMPLATES
+from retrieval import ORDER_ID_PATTERN, TRACKING_NUMBER_PATTERN
+
+# Minimum score for a canned answer; anything below goes to the LLM
+CONFIDENCE_THRESHOLD = 1.0
+# Long messages usually carry details a template can't address
+MAX_FAST_PATH_WORDS = 20
+
+# (pattern, weight) signals per intent, English, Hinglish and Devanagari
+INTENT_SIGNALS = {
+    "return_policy": [
+        (r'\b(?:return|refund|exchange|replacement)\s+polic(?:y|ies)\b', 1.0),
+        (r'\breturn (?:window|period)\b', 1.0),
+        (r'\bhow (?:many days|long)\b.*\breturn', 1.0),
+        (r'\bcan i return\b', 0.6),
+        (r'\breturn (?:policy|niyam) kya\b', 1.0),
+        (r'रिटर्न पॉलिसी|वापसी (?:नीति|पॉलिसी)|रिटर्न के नियम', 1.0),
+    ],
+    "payment_methods": [
+        (r'\bpayment (?:methods?|options?|modes?)\b', 1.0),
+        (r'\b(?:how|ways? to|where) (?:can i |do i |to )?pay\b', 1.0),
+        (r'\bdo you (?:accept|support|take)\b.*\b(?:upi|cards?|cod|cash|wallets?|emi|net ?banking)\b', 1.0),
+        (r'\b(?:cash on delivery|cod|emi|upi)\b', 0.5),
+        (r'\bpayment kaise\b|\bkaise pay\b', 1.0),
+        (r'भुगतान (?:विधि|विधियां|के (?:तरीके|विकल्प))|पेमेंट (?:के )?(?:तरीके|विकल्प|ऑप्शन)|कैसे भुगतान', 1.0),
+    ],
+    # Status wording about the order itself; a bare "where"/"when" also asks where to leave a review, when a
+    # sale starts, ...
+    "order_status": [
+        (r'\b(?:status|track|tracking)\b', 0.6),
+        (r'\bwhere(?:\'s| is| are)\s+(?:my |the )?(?:orders?|parcels?|packages?|shipments?|delivery|ord\d|trk\d)', 0.6),
+        (r'\bwhen (?:will|would|does|is|can)\b.{0,30}\b(?:arrive|arriving|delivered|deliver|come|coming|reach'
+         r'|ship|shipped|dispatched)\b', 0.6),
+        (r'\b(?:kahan|kahaan|kidhar)\s+(?:hai|h|pahuncha)\b|\bkab\b.{0,20}\b(?:aayega|ayega|aaega|milega'
+         r'|pahunchega|deliver)\b|\bstatus kya\b', 0.6),
+        (r'(?:कहाँ|कहां) (?:है|पहुं?चा)|स्थिति|स्टेटस|ट्रैक|कब (?:आएगा|मिलेगा|पहुंचेगा|पहुँचेगा|डिलीवर)', 0.6),
+    ],
+}
+
+# Signals that the customer wants an action or has a problem, not the canned answer
+INTENT_BLOCKERS = {
+    "return_policy": r'\b(?:initiate|start|raise|want to return|wapas karna|status)\b|वापस करना चाह|शुरू',
+    "payment_methods": r'\b(?:fail(?:ed|ing)?|deducted|declined|not working|error|refund|kat gaya|twice)\b|कट गया|विफल|फेल',
+    "order_status": (
+        r'\b(?:return|refund|cancel|wrong|damaged|broken|missing|change|address)\b|रिटर्न|रिफंड|रद्द|वापस|खराब|गलत'
+        # Payment trouble
+        r'|\b(?:charged|charge|payment|paid|deducted|money|twice|double|overcharged|fraud|scam)\b'
+        r'|\b(?:paise?|paisa|kat gaya|kaat liya)\b|पैसे|भुगतान|कट गया|पेमेंट'
+        # Complaints: late, never came, frustration, escalation
+        r'|\b(?:(?:has|have|had|is|was|did)(?:n\'t| not)|never|still not|not yet)\b.{0,20}'
+        r'\b(?:arrived?|received?|delivered|came|come|shipped|here|reached)\b'
+        r'|\b(?:late|delayed?|upset|angry|frustrat\w*|disappointed|annoyed|worst|terrible|horrible|pathetic'
+        r'|unacceptable|ridiculous|complain\w*|escalate|manager|useless)\b'
+        r'|\b(?:abhi tak nahi|nahi (?:aaya|mila|pahucha)|shikayat|pareshan|gussa|bekar|ghatiya|bakwas)\b'
+        r'|अभी तक नहीं|नहीं (?:आया|मिला|पहुंचा|पहुँचा)|शिकायत|परेशान|नाराज|गुस्सा|बेकार|देर'
+        # Questions about what was bought rather than where it is
+        r'|\b(?:warranty|guarantee|reviews?|rating|rate|feedback|invoices?|bill|receipt|gst|products?|specs?'
+        r'|features?|manual|install\w*)\b|वारंटी|गारंटी|रिव्यू|समीक्षा|बिल|इनवॉइस|प्रोडक्ट'
+    ),
+}
+
+_SIGNALS = {intent: [(re.compile(p, re.IGNORECASE), w) for p, w in signals] for intent, signals in INTENT_SIGNALS.items()}
+_BLOCKERS = {intent: re.compile(p, re.IGNORECASE) for intent, p in INTENT_BLOCKERS.items()}
+
+
+@dataclass
+class RoutedReply:
+    intent: str
+    response: str
+    confidence: float
+
+
+def format_order_timeline(order, lang="en", view=None):
+    """Render a tracking timeline for an OrderRecord from the templates.
+
+    With a TrackingView the status, timeline and dates come from the view
+    (the latest scans) instead of the order record.
+    """
+    t = ORDER_TRACKING_TEMPLATES.get(lang, ORDER_TRACKING_TEMPLATES["en"])
+    events = view.recent if view is not None else order.tracking_status
+    status = view.status if view is not None else order.status
+    delivered = view.delivered_at if view is not None else order.delivery_date
+    estimated = view.eta if view is not None else order.estimated_delivery
+    lines = [t["header"].format(order_id=order.order_id, status=status)]
+    if order.items:
+        lines.append(t["items"].format(items=", ".join(f"{name} ×{qty}" for _, name, qty, _ in order.items)))
+    if events:
+        lines.append("")
+        lines.append(t["timeline_header"].format(tracking_number=order.tracking_number))
+        last = len(events) - 1
+        for i, (event_status, date, location) in enumerate(events):
+            lines.append(t["event"].format(marker="📍" if i == last else "✅", date=date, status=event_status,
+                                           location=location))
+    lines.append("")
+    days_in_transit = view.days_in_transit() if view is not None and not delivered else None
+    if days_in_transit is not None:
+        lines.append(t["in_transit"].format(days=days_in_transit, location=view.last_location))
+    if delivered:
+        lines.append(t["delivered"].format(date=delivered))
+    elif estimated:
+        lines.append(t["estimated"].format(date=estimated))
+    lines.append(t["footer"])
+    return "\n".join(lines)
+
+
+class IntentRouter:
+    """Answers deterministic intents from templates before the LLM is called.
+
+    Counters are process-wide and guarded by a lock since every Streamlit
+    session runs in its own thread. With a TrackingService, order status
+    replies come from its materialized views.
+    """
+
+    def __init__(self, order_store=None, tracking=None):
+        self.order_store = order_store
+        self.tracking = tracking
+        self.counts = Counter()
+        self.total = 0
+        self._lock = threading.Lock()
+
+    def classify(self, text):
+        """Return (intent, confidence) for the best-scoring canned intent"""
+        best_intent, best_score = None, 0.0
+        for intent, signals in _SIGNALS.items():
+            if _BLOCKERS[intent].search(text):
+                continue
+            score = sum(weight for pattern, weight in signals if pattern.search(text))
+            if intent == "order_status":
+                order_ids = set(m.upper() for m in ORDER_ID_PATTERN.findall(text))
+                order_ids.update(m.upper() for m in TRACKING_NUMBER_PATTERN.findall(text))
+                if len(order_ids) != 1:
+                    continue
+                # A bare order number is as clear as "where is my order"
+                score += 1.0 if len(text.split()) <= 2 else 0.4
+            if score > best_score:
+                best_intent, best_score = intent, score
+        return best_intent, best_score
+
+    def route(self, text, lang="en", order_store=None, count=True):
+        """Return a RoutedReply for confident canned intents, otherwise None.
+
+        Orders are looked up in ``order_store`` if given, else in the store
+        the router was created with. With ``count`` off the turn is left out
+        of ``stats`` (``record`` can add it later).
+        """
+        reply = None
+        if len(text.split()) <= MAX_FAST_PATH_WORDS:
+            intent, confidence = self.classify(text)
+            if intent and confidence >= CONFIDENCE_THRESHOLD:
+                store = self.order_store if order_store is None else order_store
+                reply = RoutedReply(intent, self._respond(intent, text, lang, store), confidence)
+        if count:
+            self.record(reply.intent if reply else "llm")
+        return reply
+
+    def record(self, intent):
+        """Count a turn answered as ``intent`` ("llm" for the model)"""
+        with self._lock:
+            self.total += 1
+            self.counts[intent] += 1
+
+    def _respond(self, intent, text, lang, order_store):
+        if intent == "order_status":
+            match = ORDER_ID_PATTERN.search(text)
+            if match:
+                order_id = match.group(0).upper()
+                order = order_store.get(order_id)
+            else:
+                tracking_number = TRACKING_NUMBER_PATTERN.search(text).group(0).upper()
+                order = order_store.by_tracking_number(tracking_number)
+            if order is None:
+                t = ORDER_TRACKING_TEMPLATES.get(lang, ORDER_TRACKING_TEMPLATES["en"])
+                if match:
+                    return t["not_found"].format(order_id=order_id)
+                return t["tracking_not_found"].format(tracking_number=tracking_number)
+            view = self.tracking.view_of(order) if self.tracking else None
+            return format_order_timeline(order, lang, view)
+        return QUICK_ACTIONS[intent].get(lang, QUICK_ACTIONS[intent]["en"])
+
+    def hit_rates(self):
+        """Share of routed messages per intent, including the LLM fall-through"""
+        with self._lock:
+            if not self.total:
+                return {}
+            return {intent: count / self.total for intent, count in self.counts.most_common()}
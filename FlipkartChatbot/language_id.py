@@ -0,0 +1,167 @@
+# language_id.py
+"""Language identification for chat messages: English, Hindi and Hinglish.
+
+Any Devanagari letter makes a message Hindi ("hi"). Latin text is scored
+word by word with character n-gram models (1- to 4-grams, with word
+boundary markers) trained on data/language_samples.jsonl: each word adds
+the log-likelihood ratio of Hinglish (romanized Hindi) over English, and a
+message whose total favours Hinglish by at least MIN_HINGLISH_SCORE is
+"hinglish". Anything less certain, including messages too short to tell
+("hi", "ok"), stays "en", the default reply language.
+
+Word scores and whole-message results are memoized, so re-rendering chat
+history costs one dict lookup per message. Lookups take no lock; filling
+and evicting the memo happen under one, since every Streamlit session and
+chat worker thread shares the process-wide identifier.
+"""
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+
+SAMPLES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "language_samples.jsonl")
+
+# Reply language (key of the en/hi templates) for each identified language
+REPLY_LANGUAGE = {"en": "en", "hi": "hi", "hinglish": "hi"}
+NGRAM_ORDERS = (1, 2, 3, 4)
+# Add-k smoothing for n-grams seen in only one of the two languages
+SMOOTHING = 0.5
+# Bound on one word's score, so a single odd word (a brand, a typo) can't decide a message
+MAX_WORD_SCORE = 6.0
+# Evidence needed to call a message Hinglish rather than fall back to English; about one clearly Hindi word
+MIN_HINGLISH_SCORE = 2.0
+# Latin messages shorter than this ("hi", "ok", "ji") are too short to tell and stay English
+MIN_LATIN_LETTERS = 3
+MAX_CACHED_MESSAGES = 100_000
+MAX_CACHED_WORDS = 200_000
+
+_DEVANAGARI = re.compile(r'[\u0900-\u097F]')
+# Whole Latin words only: "ORD12345" and "x2" contribute nothing
+_WORD = re.compile(r'\b[a-z]+\b')
+
+
+def _ngrams(word):
+    padded = f" {word} "
+    for n in NGRAM_ORDERS:
+        for i in range(len(padded) - n + 1):
+            yield padded[i:i + n]
+
+
+def load_samples(path=SAMPLES_PATH):
+    """(lang, text) pairs from a JSONL file of {"lang": ..., "text": ...} lines"""
+    with open(path, "r", encoding="utf-8") as f:
+        return [(sample["lang"], sample["text"]) for sample in map(json.loads, f) if sample.get("text")]
+
+
+class LanguageIdentifier:
+    """Character n-gram language identifier with per-word and per-message memoization"""
+
+    def __init__(self, samples):
+        counts = defaultdict(Counter)
+        for lang, text in samples:
+            if lang not in ("en", "hinglish"):
+                continue
+            for word in _WORD.findall(text.lower()):
+                counts[lang].update(_ngrams(word))
+        en, hinglish = counts["en"], counts["hinglish"]
+        if not en or not hinglish:
+            raise ValueError("need English and Hinglish samples")
+        vocabulary = len(en.keys() | hinglish.keys()) + 1
+        en_total = sum(en.values()) + SMOOTHING * vocabulary
+        hinglish_total = sum(hinglish.values()) + SMOOTHING * vocabulary
+        # log P(gram | hinglish) - log P(gram | en); unseen grams score 0
+        self._ratios = {
+            gram: math.log((hinglish[gram] + SMOOTHING) / hinglish_total) - math.log((en[gram] + SMOOTHING) / en_total)
+            for gram in en.keys() | hinglish.keys()
+        }
+        self._word_scores = {}
+        self._messages = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_file(cls, path=SAMPLES_PATH):
+        return cls(load_samples(path))
+
+    def word_score(self, word):
+        """Log-likelihood ratio of a lowercase word: > 0 leans Hinglish, < 0 English"""
+        score = self._word_scores.get(word)
+        if score is None:
+            ratios = self._ratios
+            grams = list(_ngrams(word))
+            score = sum(ratios.get(gram, 0.0) for gram in grams) / len(NGRAM_ORDERS)
+            score = max(-MAX_WORD_SCORE, min(MAX_WORD_SCORE, score))
+            with self._lock:
+                if len(self._word_scores) >= MAX_CACHED_WORDS:
+                    self._word_scores.clear()
+                self._word_scores[word] = score
+        return score
+
+    def score(self, text):
+        """Summed word scores of the Latin words in ``text``"""
+        word_scores = self._word_scores
+        total = 0.0
+        for word in _WORD.findall(text.lower()):
+            score = word_scores.get(word)
+            total += score if score is not None else self.word_score(word)
+        return total
+
+    def _looks_hinglish(self, text):
+        if sum(len(word) for word in _WORD.findall(text.lower())) < MIN_LATIN_LETTERS:
+            return False
+        return self.score(text) >= MIN_HINGLISH_SCORE
+
+    def identify(self, text):
+        """"en", "hi" or "hinglish" for one message"""
+        lang = self._messages.get(text)
+        if lang is not None:
+            self.hits += 1
+            return lang
+        if _DEVANAGARI.search(text):
+            lang = "hi"
+        else:
+            lang = "hinglish" if self._looks_hinglish(text) else "en"
+        messages = self._messages
+        with self._lock:
+            self.misses += 1
+            if text not in messages and len(messages) >= MAX_CACHED_MESSAGES:
+                # Oldest first; dicts keep insertion order
+                del messages[next(iter(messages))]
+            messages[text] = lang
+        return lang
+
+    def identify_batch(self, texts):
+        """``identify`` for each text, in order"""
+        identify = self.identify
+        return [identify(text) for text in texts]
+
+    def stats(self):
+        return {"cached_messages": len(self._messages), "cached_words": len(self._word_scores),
+                "hits": self.hits, "misses": self.misses, "ngrams": len(self._ratios)}
+
+
+_identifier = None
+_identifier_lock = threading.Lock()
+
+
+def default_identifier():
+    """Process-wide identifier trained on the bundled samples"""
+    global _identifier
+    if _identifier is None:
+        with _identifier_lock:
+            if _identifier is None:
+                _identifier = LanguageIdentifier.from_file()
+    return _identifier
+
+
+def detect_language(text):
+    """Reply language for a message: "hi" for Hindi or Hinglish, else "en" """
+    return REPLY_LANGUAGE[default_identifier().identify(text)]
+
+
+def detect_languages(texts):
+    """``detect_language`` for a batch of messages"""
+    return [REPLY_LANGUAGE[lang] for lang in default_identifier().identify_batch(texts)]
@@ -0,0 +1,256 @@
+# model_router.py
+"""Picks the model for each LLM turn and moves the turn to another model when that one fails.
+
+``choose`` classifies the last user message (greeting, order, product,
+dispute or general) and looks its tier up in the routing table: "small",
+"large", or "auto", which compares a complexity score with
+``complexity_threshold``. The score grows with message length, several
+order numbers, dispute wording, several questions, a long conversation
+and Hindi. A ``"<class>/hi"`` key overrides a class for Hindi turns.
+
+``stream``/``astream`` run the request on the chosen model with no
+retries, and give it ``first_token_budget`` seconds (queueing included)
+to start streaming. On a timeout, an error such as a 429, or a stream
+that breaks partway, the request goes to the other tier's model, which
+gets the gateway's usual retries. Both attempts share one deadline for
+the turn (the caller's, or ``deadline_seconds`` of the gateway from the
+start). If some of the reply was already sent, it is passed as a trailing
+assistant message so the fallback model carries on from there; its
+chunks are then ``UncachedChunk``s, so the stitched reply isn't cached.
+
+With routing off every turn goes to ``default_model`` and nothing falls
+back. Per-model requests, fallbacks, time to first token and token counts
+are kept for ``stats`` and the metrics endpoint.
+"""
+import re
+import threading
+import time
+from collections import Counter, deque
+from dataclasses import dataclass
+
+from groq_client import error_kind
+from response_cache import UncachedChunk
+from retrieval import ORDER_ID_PATTERN, TRACKING_NUMBER_PATTERN, estimate_tokens
+from tools import ToolCalls
+
+TIERS = ("small", "large")
+# Time-to-first-token samples kept per model for percentiles
+LATENCY_SAMPLES = 2000
+# Messages longer than this many tokens add the full length weight to the complexity score
+LONG_MESSAGE_TOKENS = 80
+
+_GREETING = re.compile(
+    r'^\s*(?:hi+|hello|hey|hii|namaste|namaskar|thanks?|thank you|thx|ok(?:ay)?|bye|good (?:morning|afternoon|evening))'
+    r'\b[\s!.,🙏😊]*$|^\s*(?:नमस्ते|नमस्कार|धन्यवाद|शुक्रिया|ठीक है)[\s!।.]*$', re.IGNORECASE)
+# Checked in order; the first match is the turn's class
+TURN_CLASSES = {
+    "dispute": r'\b(?:refund|damaged|broken|wrong|missing|defective|twice|deducted|complain\w*|escalate|fraud|'
+               r'not (?:received|delivered|working)|cancel\w*|replace\w*|kharab|galat|paisa kat)\b|'
+               r'रिफंड|खराब|गलत|शिकायत|टूटा|कट गया|रद्द',
+    "order": r'\b(?:order|delivery|deliver\w*|shipment|shipping|track\w*|package|parcel|courier)\b|'
+             r'ऑर्डर|डिलीवरी|पैकेज|ट्रैक',
+    "product": r'\b(?:price|cost|stock|available|availability|warranty|features?|specs?|compare|recommend\w*|'
+               r'offers?|discount|best|cheap\w*)\b|कीमत|स्टॉक|वारंटी|ऑफर|उपलब्ध',
+}
+_TURN_CLASSES = {name: re.compile(pattern, re.IGNORECASE) for name, pattern in TURN_CLASSES.items()}
+
+
+@dataclass
+class RouteDecision:
+    model: str
+    turn_class: str
+    complexity: float
+    tier: str
+
+
+def complexity(text, language, conversation_length):
+    """0-1 estimate of how hard a turn is for the small model"""
+    score = 0.3 * min(estimate_tokens(text) / LONG_MESSAGE_TOKENS, 1.0)
+    ids = {m.upper() for m in ORDER_ID_PATTERN.findall(text)} | {m.upper() for m in
+                                                                 TRACKING_NUMBER_PATTERN.findall(text)}
+    if len(ids) >= 2:
+        score += 0.25
+    if _TURN_CLASSES["dispute"].search(text):
+        score += 0.3
+    if text.count("?") >= 2:
+        score += 0.15
+    if conversation_length > 8:
+        score += 0.1
+    if language == "hi":
+        score += 0.15
+    return min(score, 1.0)
+
+
+def classify_turn(text):
+    if _GREETING.match(text):
+        return "greeting"
+    for name, pattern in _TURN_CLASSES.items():
+        if pattern.search(text) or (name == "order" and ORDER_ID_PATTERN.search(text)):
+            return name
+    return "general"
+
+
+class ModelRouter:
+    """Routing table and fallback over one GroqGateway"""
+
+    def __init__(self, gateway, default_model, small_model, large_model, routes, enabled=True,
+                 first_token_budget=4.0, complexity_threshold=0.5):
+        unknown = {tier for tier in routes.values() if tier not in TIERS + ("auto",)}
+        if unknown:
+            raise ValueError(f"unknown model tiers {sorted(unknown)}; expected 'small', 'large' or 'auto'")
+        self.gateway = gateway
+        self.default_model = default_model
+        self.models = {"small": small_model, "large": large_model}
+        self.routes = dict(routes)
+        self.enabled = enabled
+        self.first_token_budget = first_token_budget
+        self.complexity_threshold = complexity_threshold
+        # Keyed by (model, counter)
+        self.metrics = Counter()
+        self.routed = Counter()
+        self._first_token = {}
+        self._lock = threading.Lock()
+
+    def choose(self, messages, language, count=True):
+        """RouteDecision for the last (user) message of ``messages``; ``count`` adds it to the routing counts"""
+        text = messages[-1]["content"]
+        turn_class = classify_turn(text)
+        score = complexity(text, language, len(messages))
+        if not self.enabled:
+            return RouteDecision(self.default_model, turn_class, score, "default")
+        tier = self.routes.get(f"{turn_class}/{language}") or self.routes.get(turn_class, "auto")
+        if tier == "auto":
+            tier = "large" if score >= self.complexity_threshold else "small"
+        decision = RouteDecision(self.models[tier], turn_class, score, tier)
+        if count:
+            self.record_route(decision)
+        return decision
+
+    def record_route(self, decision):
+        """Add a decision made with ``count`` off to the routing counts"""
+        if decision.tier not in TIERS:
+            return
+        with self._lock:
+            self.routed[decision.turn_class, decision.tier] += 1
+
+    def _attempts(self, model):
+        """(model, last) pairs to try for a request that chose ``model``"""
+        fallback = None
+        if self.enabled:
+            fallback = next((m for m in self.models.values() if m != model), None)
+        if fallback is None:
+            return [(model, True)]
+        return [(model, False), (fallback, True)]
+
+    @staticmethod
+    def _continued(request, model, sent):
+        request = dict(request, model=model)
+        if sent:
+            request["messages"] = list(request["messages"]) + [{"role": "assistant", "content": "".join(sent)}]
+        return request
+
+    def _options(self, last, deadline):
+        # The last model gets the gateway's own retries, and whatever is left of the turn's deadline
+        if last:
+            return {}
+        return {"retries": 0, "first_token_deadline": min(deadline, time.monotonic() + self.first_token_budget)}
+
+    def stream(self, priority, deadline=None, **request):
+        """``GroqGateway.stream`` with fallback to the other model"""
+        if deadline is None:
+            deadline = time.monotonic() + self.gateway.deadline_seconds
+        sent = []
+        for model, last in self._attempts(request["model"]):
+            started, first, offset = time.monotonic(), None, len(sent)
+            try:
+                for chunk in self.gateway.stream(priority=priority, deadline=deadline, **self._options(last, deadline),
+                                                 **self._continued(request, model, sent)):
+                    if not isinstance(chunk, ToolCalls):
+                        first = first or time.monotonic()
+                        sent.append(chunk)
+                        # Finishing another model's reply: shown, but not cached
+                        if offset:
+                            chunk = UncachedChunk(chunk)
+                    yield chunk
+            except Exception as e:
+                self._record_failure(model, e, first is not None, last)
+                if last:
+                    raise
+                continue
+            self._record(model, request, started, first, sent[offset:])
+            return
+
+    async def astream(self, priority, deadline=None, **request):
+        """``GroqGateway.astream`` with fallback to the other model"""
+        if deadline is None:
+            deadline = time.monotonic() + self.gateway.deadline_seconds
+        sent = []
+        for model, last in self._attempts(request["model"]):
+            started, first, offset = time.monotonic(), None, len(sent)
+            try:
+                async for chunk in self.gateway.astream(priority=priority, deadline=deadline,
+                                                        **self._options(last, deadline),
+                                                        **self._continued(request, model, sent)):
+                    if not isinstance(chunk, ToolCalls):
+                        first = first or time.monotonic()
+                        sent.append(chunk)
+                        if offset:
+                            chunk = UncachedChunk(chunk)
+                    yield chunk
+            except Exception as e:
+                self._record_failure(model, e, first is not None, last)
+                if last:
+                    raise
+                continue
+            self._record(model, request, started, first, sent[offset:])
+            return
+
+    def _record(self, model, request, started, first, sent):
+        now = time.monotonic()
+        with self._lock:
+            self.metrics[model, "requests"] += 1
+            self.metrics[model, "completed"] += 1
+            self.metrics[model, "prompt_tokens"] += sum(estimate_tokens(m.get("content") or "")
+                                                        for m in request["messages"])
+            self.metrics[model, "completion_tokens"] += estimate_tokens("".join(sent))
+            if first is not None:
+                self.metrics[model, "stream_seconds"] += now - first
+                self._first_token.setdefault(model, deque(maxlen=LATENCY_SAMPLES)).append(first - started)
+
+    def _record_failure(self, model, error, mid_stream, last):
+        reason = "mid_stream" if mid_stream else error_kind(error)
+        with self._lock:
+            self.metrics[model, "requests"] += 1
+            self.metrics[model, "failures." + reason] += 1
+            if not last:
+                self.metrics[model, "fallbacks"] += 1
+
+    def counters(self):
+        """Copy of the per-model counters, keyed by (model, name)"""
+        with self._lock:
+            return dict(self.metrics)
+
+    def stats(self):
+        """Per-model counters, fallback rate and time-to-first-token percentiles, plus routing counts"""
+        with self._lock:
+            metrics = dict(self.metrics)
+            routed = dict(self.routed)
+            samples = {model: sorted(values) for model, values in self._first_token.items()}
+        models = {}
+        for (model, name), value in metrics.items():
+            entry = models.setdefault(model, {"requests": 0, "fallbacks": 0})
+            if name.startswith("failures."):
+                entry.setdefault("failures", {})[name[9:]] = value
+            else:
+                entry[name] = value
+        for model, entry in models.items():
+            entry["fallback_rate"] = entry["fallbacks"] / entry["requests"] if entry["requests"] else 0.0
+            stream_seconds = entry.pop("stream_seconds", 0.0)
+            if stream_seconds:
+                entry["tokens_per_second"] = round(entry.get("completion_tokens", 0) / stream_seconds, 1)
+            values = samples.get(model)
+            if values:
+                entry["ttft_p50_ms"] = round(values[len(values) // 2] * 1000, 1)
+                entry["ttft_p95_ms"] = round(values[min(len(values) - 1, int(len(values) * 0.95))] * 1000, 1)
+        return {"enabled": self.enabled, "models": models,
+                "routed": {f"{turn_class}/{tier}": value for (turn_class, tier), value in routed.items()}}
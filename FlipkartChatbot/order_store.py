@@ -0,0 +1,362 @@
+# order_store.py
+import json
+import sys
+from bisect import bisect_left, bisect_right
+
+JSON_CHUNK_SIZE = 1 << 16
+
+
+def iter_json_records(path, chunk_size=JSON_CHUNK_SIZE):
+    """Yield records from a JSON array or JSONL file without loading it whole"""
+    with open(path, 'r', encoding='utf-8') as f:
+        head = f.read(chunk_size)
+        stripped = head.lstrip()
+        if not stripped:
+            return
+        if stripped[0] != '[':
+            # JSON Lines: one record per line
+            buffer = head
+            while True:
+                lines = buffer.split('\n')
+                buffer = lines.pop()
+                for line in lines:
+                    if line.strip():
+                        yield json.loads(line)
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                buffer += chunk
+            if buffer.strip():
+                yield json.loads(buffer)
+            return
+
+        decoder = json.JSONDecoder()
+        buffer = stripped[1:]
+        pos = 0
+        eof = False
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos < len(buffer) and buffer[pos] == ']':
+                return
+            try:
+                record, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+            if end == len(buffer) and not eof:
+                # A number at the end of the buffer may continue in the next chunk
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                if chunk:
+                    buffer = buffer[pos:] + chunk
+                    pos = 0
+                    continue
+            yield record
+            pos = end
+            if pos > chunk_size:
+                buffer = buffer[pos:]
+                pos = 0
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _shared(pool, value):
+    """Return a canonical copy of a tuple so identical tracking events/items are stored once"""
+    if pool is None:
+        return value
+    return pool.setdefault(value, value)
+
+
+class OrderRecord:
+    """Compact in-memory order; nested lists are stored as tuples of tuples.
+
+    Fields outside the common schema (refund details and the like) are kept
+    in ``extra``, which stays None for the usual order.
+    """
+
+    __slots__ = ('order_id', 'customer_email', 'order_date', 'status', 'total_amount', 'items',
+                 'shipping_address', 'tracking_number', 'delivery_date', 'estimated_delivery',
+                 'tracking_status', 'extra')
+
+    ITEM_FIELDS = ('product_id', 'product_name', 'quantity', 'price')
+    TRACKING_FIELDS = ('status', 'date', 'location')
+
+    def __init__(self, order_id, customer_email, order_date, status, total_amount, items,
+                 shipping_address, tracking_number, delivery_date, estimated_delivery, tracking_status,
+                 extra=None):
+        self.order_id = order_id
+        self.customer_email = customer_email
+        self.order_date = order_date
+        self.status = status
+        self.total_amount = total_amount
+        self.items = items
+        self.shipping_address = shipping_address
+        self.tracking_number = tracking_number
+        self.delivery_date = delivery_date
+        self.estimated_delivery = estimated_delivery
+        self.tracking_status = tracking_status
+        self.extra = extra
+
+    @classmethod
+    def from_dict(cls, data, pool=None):
+        extra = {k: v for k, v in data.items() if k not in cls.__slots__}
+        return cls(
+            order_id=data['order_id'],
+            customer_email=(data.get('customer_email') or '').lower(),
+            order_date=_intern(data.get('order_date')),
+            status=_intern(data.get('status')),
+            total_amount=data.get('total_amount'),
+            items=tuple(_shared(pool, tuple(_intern(item.get(k)) for k in cls.ITEM_FIELDS))
+                        for item in data.get('items', ())),
+            shipping_address=data.get('shipping_address'),
+            tracking_number=data.get('tracking_number'),
+            delivery_date=_intern(data.get('delivery_date')),
+            estimated_delivery=_intern(data.get('estimated_delivery')),
+            tracking_status=tuple(_shared(pool, tuple(_intern(event.get(k)) for k in cls.TRACKING_FIELDS))
+                                  for event in data.get('tracking_status', ())),
+            extra=extra or None,
+        )
+
+    def to_dict(self):
+        """Rebuild the orders.json representation of this order"""
+        data = {
+            'order_id': self.order_id,
+            'customer_email': self.customer_email,
+            'order_date': self.order_date,
+            'status': self.status,
+            'total_amount': self.total_amount,
+            'items': [dict(zip(self.ITEM_FIELDS, item)) for item in self.items],
+            'shipping_address': self.shipping_address,
+            'tracking_number': self.tracking_number,
+        }
+        if self.delivery_date is not None:
+            data['delivery_date'] = self.delivery_date
+        if self.estimated_delivery is not None:
+            data['estimated_delivery'] = self.estimated_delivery
+        if self.extra:
+            data.update(self.extra)
+        data['tracking_status'] = [dict(zip(self.TRACKING_FIELDS, event)) for event in self.tracking_status]
+        return data
+
+
+class OrderStore:
+    """Orders indexed by order_id, tracking_number, customer_email and order_date.
+
+    Point lookups are dict hits. The order_date index is a pair of parallel
+    sorted lists; it is built lazily on the first range query so bulk loads
+    pay for one sort, and maintained with bisect afterwards.
+
+    ``copy`` shares the records but copies every index, so it costs time in
+    proportion to the store; to change a large store while readers use it,
+    put the changes in an OrderOverlay instead.
+    """
+
+    def __init__(self, records=()):
+        self._by_id = {}
+        self._by_tracking = {}
+        self._by_email = {}
+        self._date_keys = []
+        self._date_ids = []
+        self._date_index_dirty = True
+        self._tuple_pool = {}
+        for record in records:
+            self.add(record)
+
+    @classmethod
+    def from_file(cls, path):
+        store = cls()
+        for data in iter_json_records(path):
+            store.add(data)
+        return store
+
+    def copy(self):
+        """Independent store sharing the (immutable) records with this one"""
+        store = OrderStore.__new__(OrderStore)
+        store._by_id = self._by_id.copy()
+        store._by_tracking = self._by_tracking.copy()
+        # Repeat-buyer lists are replaced rather than mutated, so sharing them is safe
+        store._by_email = self._by_email.copy()
+        store._date_keys = self._date_keys.copy()
+        store._date_ids = self._date_ids.copy()
+        store._date_index_dirty = self._date_index_dirty
+        store._tuple_pool = self._tuple_pool
+        return store
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def __iter__(self):
+        return iter(self._by_id.values())
+
+    def __contains__(self, order_id):
+        return order_id in self._by_id
+
+    def add(self, order):
+        """Insert or replace an order given as a dict or OrderRecord"""
+        record = order if isinstance(order, OrderRecord) else OrderRecord.from_dict(order, self._tuple_pool)
+        if record.order_id in self._by_id:
+            self.remove(record.order_id)
+        self._by_id[record.order_id] = record
+        if record.tracking_number:
+            self._by_tracking[record.tracking_number] = record
+        if record.customer_email:
+            # Most customers have one order; only allocate a list for repeat buyers
+            existing = self._by_email.get(record.customer_email)
+            if existing is None:
+                self._by_email[record.customer_email] = record
+            elif isinstance(existing, list):
+                self._by_email[record.customer_email] = existing + [record]
+            else:
+                self._by_email[record.customer_email] = [existing, record]
+        if not self._date_index_dirty:
+            position = bisect_right(self._date_keys, record.order_date or '')
+            self._date_keys.insert(position, record.order_date or '')
+            self._date_ids.insert(position, record.order_id)
+        return record
+
+    def remove(self, order_id):
+        record = self._by_id.pop(order_id, None)
+        if record is None:
+            return None
+        if record.tracking_number and self._by_tracking.get(record.tracking_number) is record:
+            del self._by_tracking[record.tracking_number]
+        existing = self._by_email.get(record.customer_email)
+        if existing is record:
+            del self._by_email[record.customer_email]
+        elif isinstance(existing, list):
+            remaining = [r for r in existing if r is not record]
+            self._by_email[record.customer_email] = remaining[0] if len(remaining) == 1 else remaining
+        if not self._date_index_dirty:
+            lo = bisect_left(self._date_keys, record.order_date or '')
+            hi = bisect_right(self._date_keys, record.order_date or '')
+            position = self._date_ids.index(order_id, lo, hi)
+            del self._date_keys[position]
+            del self._date_ids[position]
+        return record
+
+    def get(self, order_id):
+        return self._by_id.get(order_id)
+
+    def by_tracking_number(self, tracking_number):
+        return self._by_tracking.get(tracking_number)
+
+    def by_email(self, email):
+        """All orders for a customer, newest first"""
+        existing = self._by_email.get(email.lower())
+        if existing is None:
+            return []
+        records = existing if isinstance(existing, list) else [existing]
+        return sorted(records, key=lambda r: r.order_date or '', reverse=True)
+
+    def _ensure_date_index(self):
+        if not self._date_index_dirty:
+            return
+        pairs = sorted((record.order_date or '', record.order_id) for record in self._by_id.values())
+        self._date_keys = [date for date, _ in pairs]
+        self._date_ids = [order_id for _, order_id in pairs]
+        self._date_index_dirty = False
+
+    def between(self, start_date=None, end_date=None):
+        """Orders with start_date <= order_date <= end_date (ISO strings), oldest first"""
+        self._ensure_date_index()
+        lo = bisect_left(self._date_keys, start_date) if start_date else 0
+        hi = bisect_right(self._date_keys, end_date) if end_date else len(self._date_keys)
+        return [self._by_id[order_id] for order_id in self._date_ids[lo:hi]]
+
+
+class OrderOverlay:
+    """An OrderStore seen through a set of changed orders, without copying it.
+
+    ``changes`` maps order ids to their new OrderRecord, or None for a
+    delete; only the changed orders are indexed here, and lookups in
+    ``base`` skip orders that have been changed. ``with_changes`` builds the
+    next overlay in time proportional to the changes so far, and
+    ``compacted`` applies them to a copy of ``base`` (done off the request
+    path once the overlay grows).
+    """
+
+    def __init__(self, base, changes):
+        self.base = base
+        self.changes = changes
+        self._by_tracking = {}
+        self._by_email = {}
+        size = len(base)
+        for order_id, record in changes.items():
+            size += (record is not None) - (order_id in base)
+            if record is None:
+                continue
+            if record.tracking_number:
+                self._by_tracking[record.tracking_number] = record
+            if record.customer_email:
+                self._by_email.setdefault(record.customer_email, []).append(record)
+        self._size = size
+
+    def with_changes(self, changes):
+        """A new overlay over the same base with ``changes`` ({id: OrderRecord or None}) added"""
+        return OrderOverlay(self.base, {**self.changes, **changes})
+
+    def compacted(self):
+        store = self.base.copy()
+        for order_id, record in self.changes.items():
+            if record is None:
+                store.remove(order_id)
+            else:
+                store.add(record)
+        return store
+
+    def rebased(self, overlay, compacted):
+        """This overlay over ``compacted`` (``overlay`` compacted), keeping the changes made after ``overlay``"""
+        if overlay.base is not self.base:
+            return self
+        missing = object()
+        changes = {order_id: record for order_id, record in self.changes.items()
+                   if overlay.changes.get(order_id, missing) is not record}
+        return OrderOverlay(compacted, changes) if changes else compacted
+
+    def _current(self, record):
+        return record if record is not None and record.order_id not in self.changes else None
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        for record in self.base:
+            if record.order_id not in self.changes:
+                yield record
+        for record in self.changes.values():
+            if record is not None:
+                yield record
+
+    def __contains__(self, order_id):
+        if order_id in self.changes:
+            return self.changes[order_id] is not None
+        return order_id in self.base
+
+    def get(self, order_id):
+        if order_id in self.changes:
+            return self.changes[order_id]
+        return self.base.get(order_id)
+
+    def by_tracking_number(self, tracking_number):
+        record = self._by_tracking.get(tracking_number)
+        return record if record is not None else self._current(self.base.by_tracking_number(tracking_number))
+
+    def by_email(self, email):
+        records = [r for r in self.base.by_email(email) if r.order_id not in self.changes]
+        records += self._by_email.get(email.lower(), [])
+        return sorted(records, key=lambda r: r.order_date or '', reverse=True)
+
+    def between(self, start_date=None, end_date=None):
+        records = [r for r in self.base.between(start_date, end_date) if r.order_id not in self.changes]
+        records += [r for r in self.changes.values() if r is not None
+                    and (not start_date or (r.order_date or '') >= start_date)
+                    and (not end_date or (r.order_date or '') <= end_date)]
+        return sorted(records, key=lambda r: r.order_date or '')
@@ -0,0 +1,419 @@
+# product_search.py
+import re
+import threading
+import unicodedata
+
+import numpy as np
+
+WORD_PATTERN = re.compile(r'[a-z0-9\u0900-\u097F]+')
+
+# Field weights for the combined term frequency (a simple BM25F)
+FIELD_WEIGHTS = (('name', 3.0), ('category', 2.0), ('features', 1.5), ('description', 1.0))
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Terms present in at least 1/DENSE_FRACTION of a large catalog get a dense score column
+DENSE_FRACTION = 32
+DENSE_MIN_PRODUCTS = 10_000
+MAX_DENSE_TERMS = 64
+# Postings per term scored up front to establish the pruning threshold
+SEED_POSTINGS = 256
+
+STOPWORDS = {
+    # English
+    'a', 'an', 'the', 'and', 'or', 'for', 'with', 'of', 'in', 'on', 'to', 'is', 'are', 'do', 'you', 'have',
+    'me', 'my', 'i', 'want', 'need', 'show', 'any', 'some', 'what', 'which', 'about', 'tell', 'please', 'buy',
+    # Romanized Hindi
+    'mujhe', 'mera', 'meri', 'kya', 'hai', 'hain', 'ka', 'ki', 'ke', 'ko', 'koi', 'chahiye', 'dikhao', 'batao',
+    'aur', 'mein', 'se', 'wala', 'wali', 'kuch', 'acha', 'achha', 'accha',
+    # Devanagari Hindi
+    'मुझे', 'मेरा', 'मेरी', 'क्या', 'है', 'हैं', 'का', 'की', 'के', 'को', 'कोई', 'चाहिए', 'दिखाओ', 'बताओ',
+    'और', 'में', 'से', 'वाला', 'वाली', 'कुछ', 'अच्छा',
+}
+
+# Hinglish and Devanagari product vocabulary mapped onto catalog (English) terms
+QUERY_SYNONYMS = {
+    'ghadi': ('watch', 'smartwatch'), 'gadi': ('watch', 'smartwatch'), 'घड़ी': ('watch', 'smartwatch'),
+    'घडी': ('watch', 'smartwatch'), 'स्मार्टवॉच': ('smartwatch',),
+    'kursi': ('chair',), 'कुर्सी': ('chair',),
+    'kofi': ('coffee',), 'kaafi': ('coffee',), 'कॉफी': ('coffee',), 'कॉफ़ी': ('coffee',),
+    'headphone': ('headphone',), 'हेडफोन': ('headphone',), 'हेडफ़ोन': ('headphone',), 'earphone': ('headphone',),
+    'joota': ('shoe',), 'joote': ('shoe',), 'jute': ('shoe',), 'जूता': ('shoe',), 'जूते': ('shoe',),
+    'kapde': ('clothing', 'shirt'), 'kapda': ('clothing', 'shirt'), 'कपड़े': ('clothing', 'shirt'),
+    'kamiz': ('shirt',), 'kameez': ('shirt',), 'कमीज': ('shirt',), 'शर्ट': ('shirt',),
+    'phone': ('phone', 'smartphone'), 'mobile': ('phone', 'smartphone'), 'मोबाइल': ('phone', 'smartphone'),
+    'फोन': ('phone', 'smartphone'), 'फ़ोन': ('phone', 'smartphone'),
+    'kitab': ('book',), 'kitaab': ('book',), 'किताब': ('book',),
+    'batti': ('lamp', 'light'), 'lamp': ('lamp',), 'लैंप': ('lamp',), 'बत्ती': ('lamp', 'light'),
+    'bag': ('bag', 'backpack'), 'बैग': ('bag', 'backpack'), 'thaila': ('bag',), 'थैला': ('bag',),
+    'speaker': ('speaker',), 'स्पीकर': ('speaker',),
+    'pani': ('water',), 'paani': ('water',), 'पानी': ('water',),
+    'dabba': ('box', 'container'), 'डब्बा': ('box', 'container'),
+}
+
+# An amount standing on its own or next to a currency marker; never the digits of an id like ORD12345, nor
+# a number running into other letters (128gb). Digits may be grouped, Indian style too (1,500 or 1,50,000),
+# and a trailing k means thousands (50k, 2.5k)
+_AMOUNT = (r'(?:(?:\brs\.?|₹|\binr)\s*|(?<![\w.,]))((?:\d{1,3}(?:,\d{2,3})+|\d+)(?:\.\d+)?(?:k\b)?)'
+           r'(?:(?=\s*(?:rs\b|inr\b|rupees?\b|/-))|(?![^\W_]|[.,]\d))')
+PRICE_CEILING_PATTERN = re.compile(
+    r'(?:\b(?:under|below|less than|within|upto|up to|neeche|niche)\b|\bbudget\b(?:\s*(?:is|of|:))?|नीचे|तक)\s*'
+    + _AMOUNT + r'|' + _AMOUNT + r'\s*(?:/-\s*)?(?:\b(?:se kam|tak|ke andar)\b|से कम|तक|के अंदर)', re.IGNORECASE)
+MIN_RATING_PATTERN = re.compile(r'(\d(?:\.\d)?)\s*(?:\+|plus)?\s*(?:star|stars|स्टार|rating)', re.IGNORECASE)
+IN_STOCK_PATTERN = re.compile(r'in stock|available|stock (?:me|mein)|उपलब्ध|स्टॉक में', re.IGNORECASE)
+
+
+def _stem(token):
+    # Plural folding is enough to make "headphones" match "headphone"
+    if len(token) > 3 and token.isascii() and token.endswith('s') and not token.endswith('ss'):
+        return token[:-1]
+    return token
+
+
+def tokenize(text):
+    """Lowercase, NFC-normalize and split Latin/Devanagari text into index terms"""
+    text = unicodedata.normalize('NFC', text.lower())
+    return [_stem(token) for token in WORD_PATTERN.findall(text) if token not in STOPWORDS]
+
+
+def query_terms(text):
+    """Tokenize a query and expand Hinglish/Devanagari words to catalog terms"""
+    terms = []
+    for token in tokenize(text):
+        for term in QUERY_SYNONYMS.get(token, (token,)):
+            term = _stem(term)
+            if term not in terms:
+                terms.append(term)
+    return terms
+
+
+def _parse_amount(amount):
+    """Rupees in an amount matched by ``_AMOUNT``: "1,50,000" -> 150000.0, "2.5k" -> 2500.0"""
+    amount = amount.replace(',', '').lower()
+    if amount.endswith('k'):
+        return float(amount[:-1]) * 1000
+    return float(amount)
+
+
+def parse_filters(text, categories=()):
+    """Extract price ceiling, minimum rating, stock and category cues from free text"""
+    filters = {}
+    match = PRICE_CEILING_PATTERN.search(text)
+    if match:
+        filters['max_price'] = _parse_amount(match.group(1) or match.group(2))
+    match = MIN_RATING_PATTERN.search(text)
+    if match and float(match.group(1)) <= 5:
+        filters['min_rating'] = float(match.group(1))
+    if IN_STOCK_PATTERN.search(text):
+        filters['in_stock'] = True
+    lowered = text.lower()
+    for category in categories:
+        if re.search(r'\b' + re.escape(category.lower()) + r'\b', lowered):
+            filters['category'] = category
+            break
+    return filters
+
+
+class ProductIndex:
+    """Inverted index over products with precomputed BM25 impacts.
+
+    Postings are stored CSR-style: for term ``t`` the matching documents are
+    ``doc_ids[offsets[t]:offsets[t + 1]]`` with BM25 contributions in the
+    parallel ``impacts`` array, so a query is a handful of array gathers and
+    adds. Facet columns (price, rating, stock, category) are NumPy arrays and
+    filters are applied as vectorized masks over the candidate set.
+
+    With ``reference`` (a larger index), document frequencies and the
+    average length are taken from it plus these products, so scores are
+    comparable with ``reference``'s; LayeredProductIndex relies on that.
+    """
+
+    def __init__(self, products, reference=None):
+        self.products = list(products)
+        self._position_by_id = {p['id']: i for i, p in enumerate(self.products)}
+        n = len(self.products)
+
+        self.categories = sorted({p.get('category', '') for p in self.products})
+        category_codes = {c.lower(): i for i, c in enumerate(self.categories)}
+        self._category_codes = category_codes
+        self.price = np.fromiter((p.get('price') or 0 for p in self.products), dtype=np.float32, count=n)
+        self.rating = np.fromiter((p.get('rating') or 0 for p in self.products), dtype=np.float32, count=n)
+        self.in_stock = np.fromiter((bool(p.get('in_stock')) for p in self.products), dtype=bool, count=n)
+        self.category = np.fromiter((category_codes[p.get('category', '').lower()] for p in self.products),
+                                    dtype=np.int32, count=n)
+
+        vocabulary = {}
+        posting_docs = []
+        posting_tfs = []
+        lengths = np.zeros(n, dtype=np.float32)
+        for doc, product in enumerate(self.products):
+            weighted = {}
+            for field, weight in FIELD_WEIGHTS:
+                value = product.get(field) or ''
+                if isinstance(value, (list, tuple)):
+                    value = ' '.join(value)
+                for token in tokenize(value):
+                    weighted[token] = weighted.get(token, 0.0) + weight
+            lengths[doc] = sum(weighted.values())
+            for token, tf in weighted.items():
+                term = vocabulary.get(token)
+                if term is None:
+                    term = vocabulary[token] = len(posting_docs)
+                    posting_docs.append([])
+                    posting_tfs.append([])
+                posting_docs[term].append(doc)
+                posting_tfs[term].append(tf)
+
+        self.vocabulary = vocabulary
+        sizes = np.fromiter((len(d) for d in posting_docs), dtype=np.int64, count=len(posting_docs))
+        self.offsets = np.zeros(len(posting_docs) + 1, dtype=np.int64)
+        np.cumsum(sizes, out=self.offsets[1:])
+        doc_ids = np.fromiter((d for docs in posting_docs for d in docs), dtype=np.int32,
+                              count=int(self.offsets[-1]))
+        tfs = np.fromiter((t for ts in posting_tfs for t in ts), dtype=np.float32, count=int(self.offsets[-1]))
+        del posting_docs, posting_tfs
+
+        self.document_count = n
+        self.average_length = float(lengths.mean()) if n else 1.0
+        df, total, average_length = sizes, n, self.average_length
+        if reference is not None:
+            words = sorted(vocabulary, key=vocabulary.get)
+            df = sizes + np.fromiter((reference.document_frequency(word) for word in words), dtype=np.int64,
+                                     count=len(words))
+            total = n + reference.document_count
+            average_length = reference.average_length
+        idf = np.log1p((total - df + 0.5) / (df + 0.5)).astype(np.float32)
+        norms = BM25_K1 * (1 - BM25_B + BM25_B * lengths / max(average_length, 1e-6))
+        impacts = (np.repeat(idf, sizes) * tfs * (BM25_K1 + 1) / (tfs + norms[doc_ids])).astype(np.float32)
+
+        # Impact-ordered postings: each term's list is sorted by descending score contribution
+        order = np.lexsort((-impacts, np.repeat(np.arange(len(sizes)), sizes)))
+        self.doc_ids = doc_ids[order]
+        self.impacts = impacts[order]
+        self.max_impact = np.zeros(len(sizes), dtype=np.float32)
+        self.max_impact[sizes > 0] = self.impacts[self.offsets[:-1][sizes > 0]]
+
+        # Very common terms also get a dense per-product column so they can be
+        # looked up for a candidate set without touching their whole posting list
+        self._dense = {}
+        if n >= DENSE_MIN_PRODUCTS:
+            common = [t for t in np.argsort(-sizes)[:MAX_DENSE_TERMS] if sizes[t] * DENSE_FRACTION >= n]
+            for term in common:
+                column = np.zeros(n, dtype=np.float32)
+                column[self._postings(term)[0]] = self._postings(term)[1]
+                self._dense[int(term)] = column
+
+        self._by_rating = np.argsort(-self.rating, kind='stable').astype(np.int32)
+        self._local = threading.local()
+
+    def __len__(self):
+        return len(self.products)
+
+    def get(self, product_id):
+        position = self._position_by_id.get(product_id)
+        return None if position is None else self.products[position]
+
+    def position(self, product_id):
+        return self._position_by_id.get(product_id)
+
+    def document_frequency(self, term):
+        index = self.vocabulary.get(term)
+        return 0 if index is None else int(self.offsets[index + 1] - self.offsets[index])
+
+    def _postings(self, term, limit=None):
+        start = self.offsets[term]
+        end = self.offsets[term + 1] if limit is None else min(start + limit, self.offsets[term + 1])
+        return self.doc_ids[start:end], self.impacts[start:end]
+
+    def _scratch(self):
+        scratch = getattr(self._local, 'scores', None)
+        if scratch is None or len(scratch) != len(self.products):
+            scratch = self._local.scores = np.zeros(len(self.products), dtype=np.float32)
+        return scratch
+
+    def _filter_mask(self, docs, category=None, in_stock=None, min_price=None, max_price=None, min_rating=None,
+                     exclude=None):
+        mask = np.ones(len(docs), dtype=bool) if exclude is None else ~exclude[docs]
+        if category is not None:
+            code = self._category_codes.get(category.lower(), -1)
+            mask &= self.category[docs] == code
+        if in_stock is not None:
+            mask &= self.in_stock[docs] == in_stock
+        if min_price is not None:
+            mask &= self.price[docs] >= min_price
+        if max_price is not None:
+            mask &= self.price[docs] <= max_price
+        if min_rating is not None:
+            mask &= self.rating[docs] >= min_rating
+        return mask
+
+    def search(self, query, k=5, category=None, in_stock=None, min_price=None, max_price=None, min_rating=None,
+               exclude=None):
+        """Return up to ``k`` (product, score) pairs ranked by BM25.
+
+        An empty (or all-stopword) query returns the best-rated products that
+        pass the filters. ``exclude`` is a boolean array over positions whose
+        products are left out.
+        """
+        filters = dict(category=category, in_stock=in_stock, min_price=min_price, max_price=max_price,
+                       min_rating=min_rating, exclude=exclude)
+        words = query_terms(query)
+        terms = [self.vocabulary[t] for t in words if t in self.vocabulary]
+        if not terms:
+            if words:
+                return []
+            return self._scan(self._by_rating, self.rating[self._by_rating], k, filters)
+        if len(terms) == 1:
+            # A single impact-ordered list is already ranked
+            docs, impacts = self._postings(terms[0])
+            return self._scan(docs, impacts, k, filters)
+
+        scratch = self._scratch()
+        sparse = [t for t in terms if t not in self._dense]
+        for term in sparse:
+            docs, impacts = self._postings(term)
+            scratch[docs] += impacts
+        try:
+            return self._ranked(terms, sparse, scratch, k, filters)
+        finally:
+            for term in sparse:
+                scratch[self._postings(term)[0]] = 0
+
+    def _ranked(self, terms, sparse, scratch, k, filters):
+        """Exact top-k with MaxScore-style pruning over impact-ordered postings.
+
+        A threshold is taken from the best few postings of every term. A
+        product can only reach the top k through an essential term whose
+        contribution is at least ``threshold - sum(max impact of the other
+        terms)``, so only that prefix of each essential posting list is scored.
+        """
+        def score(docs):
+            scores = scratch[docs] if sparse else np.zeros(len(docs), dtype=np.float32)
+            for term in terms:
+                if term in self._dense:
+                    scores += self._dense[term][docs]
+            return scores
+
+        lengths = [int(self.offsets[t + 1] - self.offsets[t]) for t in terms]
+        shortest, longest = min(lengths), max(lengths)
+        seed = SEED_POSTINGS
+        while True:
+            docs = np.concatenate([self._postings(t, seed)[0] for t in terms])
+            docs = docs[self._filter_mask(docs, **filters)]
+            top = self._top(docs, score(docs), k, duplicates=len(terms))
+            if seed >= longest:
+                # Every posting has been scored already
+                return top
+            # Selective filters leave few seeds and a weak threshold; keep widening
+            # until enough filtered postings back it, but not past the shortest
+            # list, which bounds the cost of the pruned pass anyway
+            if len(top) == k and (len(docs) >= SEED_POSTINGS or seed >= shortest):
+                break
+            seed = seed * 8 if seed >= shortest else min(seed * 8, shortest)
+
+        threshold = top[-1][1]
+        total_max = float(self.max_impact[terms].sum())
+        # Terms whose combined maximum can't reach the threshold are non-essential:
+        # a top-k product must contain at least one of the remaining terms
+        essential = sorted(terms, key=lambda t: self.max_impact[t])
+        reachable = 0.0
+        while len(essential) > 1 and reachable + float(self.max_impact[essential[0]]) < threshold:
+            reachable += float(self.max_impact[essential.pop(0)])
+        prefixes = []
+        for term in essential:
+            docs, impacts = self._postings(term)
+            needed = threshold - (total_max - float(self.max_impact[term]))
+            prefixes.append(docs[:np.searchsorted(-impacts, -needed, side='right')])
+        docs = np.concatenate(prefixes)
+        docs = docs[self._filter_mask(docs, **filters)]
+        return self._top(docs, score(docs), k, duplicates=len(terms))
+
+    def _scan(self, docs, scores, k, filters):
+        """Top k of an already-ranked list, reading blocks until k pass the filters"""
+        if all(v is None for v in filters.values()):
+            return self._top(docs[:k], scores[:k], k)
+        start, block = 0, k * 16
+        found = []
+        while start < len(docs) and sum(len(f) for f in found) < k:
+            window = slice(start, start + block)
+            found.append(np.nonzero(self._filter_mask(docs[window], **filters))[0] + start)
+            start += block
+            block *= 8
+        positions = np.concatenate(found)[:k] if found else np.empty(0, dtype=np.int64)
+        return self._top(docs[positions], scores[positions], k)
+
+    def _top(self, docs, scores, k, duplicates=1):
+        limit = k * duplicates
+        if len(docs) > limit:
+            best = np.argpartition(-scores, limit - 1)[:limit]
+            docs, scores = docs[best], scores[best]
+        order = np.argsort(-scores, kind='stable')
+        results = []
+        seen = set()
+        for i in order:
+            doc = int(docs[i])
+            if doc in seen:
+                continue
+            seen.add(doc)
+            results.append((self.products[doc], float(scores[i])))
+            if len(results) == k:
+                break
+        return results
+
+
+class LayeredProductIndex:
+    """An immutable ProductIndex with a small index of changed products on top.
+
+    ``changes`` maps product ids to their new record, or None for a delete.
+    The changed and deleted products are masked out of ``base``, and the
+    changed ones are indexed on their own with ``base``'s term statistics, so
+    a delta costs time in proportion to the changes rather than the catalog.
+    ``compacted`` folds everything into one new ProductIndex (a full build,
+    done off the request path).
+    """
+
+    def __init__(self, base, changes):
+        self.base = base
+        self.changes = changes
+        self.overlay = ProductIndex((p for p in changes.values() if p is not None), reference=base)
+        positions = [position for position in map(base.position, changes) if position is not None]
+        self._hidden = None
+        if positions:
+            self._hidden = np.zeros(len(base), dtype=bool)
+            self._hidden[positions] = True
+        self._size = len(base) - len(positions) + len(self.overlay)
+        self.categories = sorted(set(base.categories) | set(self.overlay.categories))
+
+    def with_changes(self, changes):
+        """A new layer over the same base with ``changes`` ({id: record or None}) added"""
+        return LayeredProductIndex(self.base, {**self.changes, **changes})
+
+    @property
+    def products(self):
+        return [p for p in self.base.products if p['id'] not in self.changes] + self.overlay.products
+
+    def compacted(self):
+        return ProductIndex(self.products)
+
+    def rebased(self, layer, compacted):
+        """This layer over ``compacted`` (``layer`` compacted), keeping the changes made after ``layer``"""
+        if layer.base is not self.base:
+            return self
+        missing = object()
+        changes = {product_id: record for product_id, record in self.changes.items()
+                   if layer.changes.get(product_id, missing) is not record}
+        return LayeredProductIndex(compacted, changes) if changes else compacted
+
+    def __len__(self):
+        return self._size
+
+    def get(self, product_id):
+        if product_id in self.changes:
+            return self.changes[product_id]
+        return self.base.get(product_id)
+
+    def search(self, query, k=5, **filters):
+        """``ProductIndex.search`` over both layers; the overlay shares the base's statistics"""
+        results = self.base.search(query, k, exclude=self._hidden, **filters) + self.overlay.search(query, k, **filters)
+        results.sort(key=lambda result: -result[1])
+        return results[:k]
@@ -0,0 +1,173 @@
+# prompt_artifacts.py
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from prompts import SYSTEM_PROMPT, PRODUCT_DATA_INSTRUCTION, ORDER_DATA_INSTRUCTION
+
+ENCODINGS = ("json", "table")
+# Encoded records remembered per artifact set
+MAX_MEMO_ENTRIES = 100_000
+# Artifact sets kept for recent data versions
+MAX_VERSIONS = 4
+
+PRODUCT_COLUMNS = ("id", "name", "category", "price", "rating", "reviews_count", "in_stock", "description",
+                   "features")
+PRODUCT_HEADER = "Columns: " + " | ".join(PRODUCT_COLUMNS) + " | other"
+ORDER_HEADER = ("Columns: order_id | customer_email | order_date | status | total_amount | "
+                "items (product_id name xquantity @price; ...) | shipping_address | tracking_number | "
+                "delivery_date | estimated_delivery | tracking (date status @location > ...) | other")
+
+
+def _json(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+def _cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "yes" if value else "no"
+    if isinstance(value, (list, tuple)):
+        value = "; ".join(_json(v) if isinstance(v, (dict, list)) else str(v) for v in value)
+    elif isinstance(value, dict):
+        value = _json(value)
+    return str(value).replace("|", "/").replace("\n", " ")
+
+
+def _row(cells):
+    return " | ".join(_cell(c) for c in cells)
+
+
+def _other(data):
+    return ", ".join(f"{k}={_cell(v)}" for k, v in data.items()) if data else ""
+
+
+def product_row(product):
+    """One table row for a product dict; unknown keys go in the trailing ``other`` column"""
+    return _row([product.get(c) for c in PRODUCT_COLUMNS]
+                + [_other({k: v for k, v in product.items() if k not in PRODUCT_COLUMNS})])
+
+
+def order_dict(order, view=None):
+    """orders.json representation of an OrderRecord, with status and tracking from a TrackingView if given"""
+    data = order.to_dict()
+    if view is not None:
+        data["status"] = view.status
+        for key, value in (("delivery_date", view.delivered_at), ("estimated_delivery", view.eta)):
+            if value is not None:
+                data[key] = value
+        data["tracking_status"] = [{"status": s, "date": at, "location": loc} for s, at, loc in view.recent]
+    return data
+
+
+def order_row(order, view=None):
+    """One table row for an OrderRecord, with status and tracking from a TrackingView if given"""
+    items = "; ".join(f"{product_id} {name} x{quantity} @{price}" for product_id, name, quantity, price in order.items)
+    events = view.recent if view is not None else order.tracking_status
+    tracking = " > ".join(f"{date} {status} @{location}" for status, date, location in events)
+    if view is not None:
+        status, delivered, estimated = view.status, view.delivered_at, view.eta
+    else:
+        status, delivered, estimated = order.status, order.delivery_date, order.estimated_delivery
+    return _row([order.order_id, order.customer_email, order.order_date, status, order.total_amount, items,
+                 order.shipping_address, order.tracking_number, delivered, estimated, tracking, _other(order.extra)])
+
+
+class PromptArtifacts:
+    """Prompt pieces that only depend on the data version and the encoding.
+
+    The fixed text around the data sections is split once, and every
+    record is encoded (with its token cost) the first time it is used, then
+    reused by every session. ``content_hash`` identifies the fixed text,
+    encoding and data version; it is deterministic, so every process
+    serving the same data reports the same hash and sends a byte-identical
+    prompt prefix.
+
+    ``json`` encodes records as compact JSON arrays. ``table`` writes one
+    ``|``-separated row per record under a shared column header, which
+    drops the repeated keys and quoting.
+    """
+
+    _registry = OrderedDict()
+    _registry_lock = threading.Lock()
+
+    def __init__(self, data_version="", encoding="json"):
+        from retrieval import estimate_tokens  # retrieval imports this module
+
+        if encoding not in ENCODINGS:
+            raise ValueError(f"unknown prompt data encoding {encoding!r}; expected one of {ENCODINGS}")
+        self.data_version = data_version
+        self.encoding = encoding
+        self._estimate = estimate_tokens
+        product_before, product_after = PRODUCT_DATA_INSTRUCTION.split("{product_data}")
+        order_before, order_after = ORDER_DATA_INSTRUCTION.split("{order_data}")
+        self.prefix = SYSTEM_PROMPT + "\n\n" + product_before
+        self.middle = product_after + "\n\n" + order_before
+        self.suffix = order_after
+        self.content_hash = hashlib.sha256(_json(
+            [self.prefix, self.middle, self.suffix, encoding, data_version, PRODUCT_HEADER, ORDER_HEADER]
+        ).encode('utf-8')).hexdigest()[:16]
+        self.static_tokens = estimate_tokens(self.prefix + self.middle + self.suffix)
+        self.header_tokens = {"product": estimate_tokens(PRODUCT_HEADER + "\n"),
+                              "order": estimate_tokens(ORDER_HEADER + "\n")}
+        self._memo = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_version(cls, data_version, encoding="json"):
+        """Shared artifact set for a data version, built on first use"""
+        key = (data_version, encoding)
+        with cls._registry_lock:
+            artifacts = cls._registry.get(key)
+            if artifacts is None:
+                artifacts = cls._registry[key] = cls(data_version, encoding)
+                while len(cls._registry) > MAX_VERSIONS:
+                    cls._registry.popitem(last=False)
+            else:
+                cls._registry.move_to_end(key)
+            return artifacts
+
+    def _encoded(self, kind, key, encode):
+        memo_key = (kind, key)
+        with self._lock:
+            entry = self._memo.get(memo_key)
+            if entry is not None:
+                self._memo.move_to_end(memo_key)
+                return entry
+        text = encode()
+        # +1 for the separator between records
+        entry = (text, self._estimate(text) + 1)
+        with self._lock:
+            self._memo[memo_key] = entry
+            while len(self._memo) > MAX_MEMO_ENTRIES:
+                self._memo.popitem(last=False)
+        return entry
+
+    def encode_product(self, product):
+        """(text, token cost) of one product record"""
+        if self.encoding == "table":
+            return self._encoded("product", product['id'], lambda: product_row(product))
+        return self._encoded("product", product['id'], lambda: _json(product))
+
+    def encode_order(self, order, view=None):
+        """(text, token cost) of one OrderRecord, with its TrackingView if the tracking log has scans for it"""
+        # A view only changes by gaining scans, so its count tells its versions apart
+        key = order.order_id if view is None else (order.order_id, view.event_count)
+        if self.encoding == "table":
+            return self._encoded("order", key, lambda: order_row(order, view))
+        return self._encoded("order", key, lambda: _json(order_dict(order, view)))
+
+    def section(self, kind, rows):
+        """Join encoded records into a data section"""
+        if self.encoding == "table":
+            return (PRODUCT_HEADER if kind == "product" else ORDER_HEADER) + "\n" + "\n".join(rows)
+        return "[" + ",".join(rows) + "]"
+
+    def section_overhead(self, kind):
+        """Token cost of an otherwise empty section (the table header)"""
+        return self.header_tokens[kind] if self.encoding == "table" else 1
+
+    def build(self, product_section, order_section):
+        return self.prefix + product_section + self.middle + order_section + self.suffix
@@ -82,6 +82,14 @@ Here is the available order information:
 Use this data to answer order-related queries. Provide detailed tracking information and status updates when available.
 """
 
+# Replaces the data sections when the model fetches records through tools
+TOOL_INSTRUCTION = """
+You have tools to look up orders, track shipments, search products and check stock.
+Call them whenever the customer asks about a specific order, shipment or product, and answer only from their results; never invent order details.
+Call several tools at once when you need more than one piece of information.
+If you need an order number, tracking number or email to look something up, ask the customer for it.
+"""
+
 # Common query types example (for your internal reference, not for LLM directly in this prompt)
 COMMON_QUERY_TYPES = [
     "Order Status",
@@ -108,4 +116,41 @@ QUICK_ACTIONS = {
         "en": "💳 **Accepted Payment Methods:**\n\n✅ Credit/Debit Cards (Visa, MasterCard, RuPay)\n✅ UPI (PhonePe, GPay, Paytm)\n✅ Net Banking\n✅ Wallets (Paytm, Amazon Pay)\n✅ Cash on Delivery (COD)\n✅ EMI Options Available\n\nNeed help with a specific payment issue?",
         "hi": "💳 **स्वीकृत भुगतान विधियां:**\n\n✅ क्रेडिट/डेबिट कार्ड (Visa, MasterCard, RuPay)\n✅ UPI (PhonePe, GPay, Paytm)\n✅ नेट बैंकिंग\n✅ वॉलेट (Paytm, Amazon Pay)\n✅ कैश ऑन डिलीवरी (COD)\n✅ EMI विकल्प उपलब्ध\n\nकिसी विशिष्ट भुगतान समस्या में मदद चाहिए?"
     }
-}
\ No newline at end of file
+}
+
+# Templates for order tracking replies served without calling the LLM
+ORDER_TRACKING_TEMPLATES = {
+    "en": {
+        "header": "📦 **Order {order_id}** — {status}",
+        "items": "🛍️ Items: {items}",
+        "timeline_header": "**Tracking timeline** (tracking no. {tracking_number}):",
+        "event": "{marker} {date} — {status} ({location})",
+        "in_transit": "🚚 In transit for {days} days, last scanned at {location}.",
+        "delivered": "✅ Delivered on {date}.",
+        "estimated": "🚚 Estimated delivery: {date}.",
+        "footer": "Need help with anything else for this order?",
+        "not_found": "😔 I couldn't find order **{order_id}**. Please double-check the order number — it looks like ORD12345.",
+        "tracking_not_found": "😔 I couldn't find a shipment with tracking number **{tracking_number}**. Please double-check it — it looks like TRK123456789, or share your order number (ORD12345) instead."
+    },
+    "hi": {
+        "header": "📦 **ऑर्डर {order_id}** — {status}",
+        "items": "🛍️ सामान: {items}",
+        "timeline_header": "**ट्रैकिंग टाइमलाइन** (ट्रैकिंग नंबर {tracking_number}):",
+        "event": "{marker} {date} — {status} ({location})",
+        "in_transit": "🚚 {days} दिनों से रास्ते में, आखिरी स्कैन: {location}।",
+        "delivered": "✅ {date} को डिलीवर हो गया।",
+        "estimated": "🚚 अनुमानित डिलीवरी: {date}।",
+        "footer": "क्या इस ऑर्डर के बारे में कोई और मदद चाहिए?",
+        "not_found": "😔 मुझे ऑर्डर **{order_id}** नहीं मिला। कृपया ऑर्डर नंबर दोबारा जांचें — यह ORD12345 जैसा दिखता है।",
+        "tracking_not_found": "😔 मुझे ट्रैकिंग नंबर **{tracking_number}** वाला कोई शिपमेंट नहीं मिला। कृपया इसे दोबारा जांचें — यह TRK123456789 जैसा दिखता है, या अपना ऑर्डर नंबर (ORD12345) बताएं।"
+    }
+}
+
+# Used off the critical path to fold older turns into a rolling summary
+CONVERSATION_SUMMARY_PROMPT = """
+You maintain a running summary of a customer support conversation for ShopEase.
+Update the existing summary with the new turns. Keep it under 120 words.
+Keep every order ID, tracking number, product name, email, amount and date exactly as written.
+Record what the customer wanted, what was answered, and anything still unresolved.
+Write the summary in English even if the conversation is in Hindi.
+"""
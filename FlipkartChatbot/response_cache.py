@@ -0,0 +1,175 @@
+# response_cache.py
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+
+# Number of trailing user/assistant messages that identify a request
+KEY_TAIL_MESSAGES = 3
+# Size of the pieces a cached reply is replayed in, so the UI still "types"
+REPLAY_CHUNK_CHARS = 24
+
+_WHITESPACE = re.compile(r'\s+')
+_TRAILING_PUNCTUATION = re.compile(r'[\s?!.।]+$')
+
+
+def normalize_text(text):
+    return _TRAILING_PUNCTUATION.sub('', _WHITESPACE.sub(' ', text.strip().lower()))
+
+
+def data_fingerprint(paths):
+    """Content hash of the data files, used as the data version in cache keys"""
+    digest = hashlib.sha1()
+    for path in paths:
+        try:
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(block)
+        except FileNotFoundError:
+            digest.update(b'missing:' + str(path).encode())
+    return digest.hexdigest()[:16]
+
+
+def make_key(api_messages_payload, model, data_version, tail=KEY_TAIL_MESSAGES):
+    """Cache key from the normalized conversation tail, model and data version.
+
+    The system prompt is hashed in as well: it carries the records retrieved
+    for this conversation, so identical tails with different context don't
+    share an answer.
+    """
+    system = [m['content'] for m in api_messages_payload if m['role'] == 'system']
+    turns = [(m['role'], normalize_text(m['content'])) for m in api_messages_payload if m['role'] != 'system']
+    material = json.dumps([model, data_version, system, turns[-tail:]], ensure_ascii=False)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+def replay(text, chunk_chars=REPLAY_CHUNK_CHARS):
+    """Yield a cached reply in small pieces, like a live completion stream"""
+    for start in range(0, len(text), chunk_chars):
+        yield text[start:start + chunk_chars]
+
+
+class UncachedChunk(str):
+    """A streamed chunk that may be shown but keeps its reply out of the cache.
+
+    model_router.py marks the text of a fallback model that finished a reply
+    another model had started with it.
+    """
+
+
+class ResponseCache:
+    """LRU + TTL cache of completed replies with an optional SQLite tier.
+
+    The in-memory tier is bounded by ``max_entries``; the disk tier (enabled
+    with ``db_path``) survives restarts and is shared by every process that
+    points at the same file.
+    """
+
+    def __init__(self, max_entries=1024, ttl_seconds=3600, db_path=None, max_disk_entries=100_000):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_disk_entries = max_disk_entries
+        self.metrics = Counter()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, expires_at REAL NOT NULL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_expires ON responses (expires_at)")
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                response, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.metrics['hits'] += 1
+                    return response
+                del self._entries[key]
+                self.metrics['expirations'] += 1
+            if self._db is not None:
+                row = self._db.execute("SELECT response, expires_at FROM responses WHERE key = ? AND expires_at > ?",
+                                       (key, now)).fetchone()
+                if row:
+                    self._store(key, row[0], row[1])
+                    self.metrics['disk_hits'] += 1
+                    return row[0]
+            self.metrics['misses'] += 1
+            return None
+
+    def put(self, key, response):
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._store(key, response, expires_at)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO responses (key, response, expires_at) VALUES (?, ?, ?)",
+                                 (key, response, expires_at))
+                self.metrics['disk_writes'] += 1
+                if self.metrics['disk_writes'] % 256 == 0:
+                    self._prune_disk()
+
+    def _store(self, key, response, expires_at):
+        self._entries[key] = (response, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.metrics['evictions'] += 1
+
+    def _prune_disk(self):
+        self._db.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+        self._db.execute(
+            "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_entries,))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+
+    def stream(self, key, stream_factory):
+        """Replay a cached reply, or run ``stream_factory()`` and cache it once complete.
+
+        Replies are only stored when the upstream stream finishes without
+        raising, so errors and abandoned streams are never cached; neither
+        are replies with an ``UncachedChunk`` in them.
+        """
+        cached = self.get(key)
+        if cached is not None:
+            yield from replay(cached)
+            return
+        chunks = []
+        for chunk in stream_factory():
+            chunks.append(chunk)
+            yield chunk
+        if chunks and not any(isinstance(chunk, UncachedChunk) for chunk in chunks):
+            self.put(key, ''.join(chunks))
+
+    async def astream(self, key, stream_factory):
+        """Async twin of ``stream``; ``stream_factory`` returns an async iterator"""
+        cached = self.get(key)
+        if cached is not None:
+            for chunk in replay(cached):
+                yield chunk
+            return
+        chunks = []
+        async for chunk in stream_factory():
+            chunks.append(chunk)
+            yield chunk
+        if chunks and not any(isinstance(chunk, UncachedChunk) for chunk in chunks):
+            self.put(key, ''.join(chunks))
+
+    def stats(self):
+        with self._lock:
+            lookups = self.metrics['hits'] + self.metrics['disk_hits'] + self.metrics['misses']
+            hit_rate = (self.metrics['hits'] + self.metrics['disk_hits']) / lookups if lookups else 0.0
+            return dict(self.metrics, entries=len(self._entries), hit_rate=hit_rate)
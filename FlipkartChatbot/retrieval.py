@@ -0,0 +1,165 @@
+# retrieval.py
+import re
+from dataclasses import dataclass, field
+
+from product_search import parse_filters
+from prompt_artifacts import PromptArtifacts
+
+ORDER_ID_PATTERN = re.compile(r'\bORD\d{3,}\b', re.IGNORECASE)
+TRACKING_NUMBER_PATTERN = re.compile(r'\bTRK\d{3,}\b', re.IGNORECASE)
+PRODUCT_ID_PATTERN = re.compile(r'\bPROD\d{3,}\b', re.IGNORECASE)
+EMAIL_PATTERN = re.compile(r'[\w.+-]+@[\w-]+(?:\.[\w-]+)+')
+# How many recent user messages feed the product search query
+PRODUCT_QUERY_MESSAGES = 2
+
+NO_ORDERS_MATCHED = "No order matches the order IDs, tracking numbers or emails in this conversation. Ask the customer for their order number."
+NO_PRODUCTS_MATCHED = "No product matches this conversation."
+
+
+def estimate_tokens(text):
+    """Cheap local token estimate (~4 UTF-8 bytes per token)"""
+    return (len(text.encode('utf-8')) + 3) // 4
+
+
+@dataclass
+class ConversationEntities:
+    order_ids: list = field(default_factory=list)
+    tracking_numbers: list = field(default_factory=list)
+    emails: list = field(default_factory=list)
+    product_ids: list = field(default_factory=list)
+    product_query: str = ''
+
+
+@dataclass
+class ContextStats:
+    order_records: int = 0
+    product_records: int = 0
+    data_tokens: int = 0
+    history_tokens: int = 0
+    prompt_tokens: int = 0
+    token_budget: int = 0
+    truncated: bool = False
+    prompt_hash: str = ''
+    model: str = ''
+
+
+def _add_unique(target, values):
+    for value in values:
+        if value not in target:
+            target.append(value)
+
+
+def extract_entities(messages):
+    """Pull identifiers out of the conversation, most recent mentions first"""
+    entities = ConversationEntities()
+    user_texts = []
+    for message in reversed(messages):
+        text = message.get('content') or ''
+        _add_unique(entities.order_ids, (m.upper() for m in ORDER_ID_PATTERN.findall(text)))
+        _add_unique(entities.tracking_numbers, (m.upper() for m in TRACKING_NUMBER_PATTERN.findall(text)))
+        _add_unique(entities.product_ids, (m.upper() for m in PRODUCT_ID_PATTERN.findall(text)))
+        _add_unique(entities.emails, (m.lower() for m in EMAIL_PATTERN.findall(text)))
+        if message.get('role') == 'user' and len(user_texts) < PRODUCT_QUERY_MESSAGES:
+            user_texts.append(text)
+    entities.product_query = ' '.join(reversed(user_texts))
+    return entities
+
+
+class ContextRetriever:
+    """Selects the order and product records relevant to a conversation"""
+
+    def __init__(self, product_index, order_store, search_top_k=5, artifacts=None, tracking=None):
+        self.product_index = product_index
+        self.order_store = order_store
+        self.search_top_k = search_top_k
+        self.artifacts = artifacts or PromptArtifacts()
+        # TrackingService whose views replace an order's own status and timeline once carrier scans arrive
+        self.tracking = tracking
+
+    def find_orders(self, entities):
+        found = {}
+        for order_id in entities.order_ids:
+            order = self.order_store.get(order_id)
+            if order:
+                found.setdefault(order.order_id, order)
+        for tracking_number in entities.tracking_numbers:
+            order = self.order_store.by_tracking_number(tracking_number)
+            if order:
+                found.setdefault(order.order_id, order)
+        for email in entities.emails:
+            for order in self.order_store.by_email(email):
+                found.setdefault(order.order_id, order)
+        return list(found.values())
+
+    def find_products(self, entities, orders=()):
+        found = {}
+        for product_id in entities.product_ids:
+            product = self.product_index.get(product_id)
+            if product:
+                found.setdefault(product_id, product)
+        for order in orders:
+            for product_id, *_ in order.items:
+                product = self.product_index.get(product_id)
+                if product:
+                    found.setdefault(product_id, product)
+        filters = parse_filters(entities.product_query, self.product_index.categories)
+        for product, _ in self.product_index.search(entities.product_query, k=self.search_top_k, **filters):
+            found.setdefault(product['id'], product)
+        return list(found.values())
+
+    def fallback_products(self, entities):
+        """Best-rated products, used when nothing specific was mentioned"""
+        filters = parse_filters(entities.product_query, self.product_index.categories)
+        return [product for product, _ in self.product_index.search('', k=self.search_top_k, **filters)]
+
+    def build_system_prompt(self, messages, token_budget, history=()):
+        """Build the system prompt with only the records relevant to the conversation.
+
+        ``history`` is the conversation payload sent after the system prompt,
+        and comes out of ``token_budget`` first. Records are added in
+        relevance order until the data sections take up the rest; the order
+        section gets first claim on it.
+        """
+        entities = extract_entities(messages)
+        matched_orders = self.find_orders(entities)
+        matched_products = self.find_products(entities, matched_orders)
+        browsing = not matched_products
+        if browsing:
+            matched_products = self.fallback_products(entities)
+
+        artifacts = self.artifacts
+        history_tokens = sum(estimate_tokens(m.get('content') or '') for m in history)
+        stats = ContextStats(token_budget=token_budget, history_tokens=history_tokens,
+                             prompt_hash=artifacts.content_hash)
+        remaining = token_budget - history_tokens
+        order_rows = []
+        for order in matched_orders:
+            view = self.tracking.scanned_view(order) if self.tracking is not None else None
+            text, cost = artifacts.encode_order(order, view)
+            if not order_rows:
+                cost += artifacts.section_overhead("order")
+            if cost > remaining:
+                stats.truncated = True
+                break
+            order_rows.append(text)
+            remaining -= cost
+        product_rows = []
+        for product in matched_products:
+            text, cost = artifacts.encode_product(product)
+            if not product_rows:
+                cost += artifacts.section_overhead("product")
+            if cost > remaining:
+                stats.truncated = stats.truncated or not browsing
+                break
+            product_rows.append(text)
+            remaining -= cost
+
+        product_section = artifacts.section("product", product_rows) if product_rows else NO_PRODUCTS_MATCHED
+        order_section = artifacts.section("order", order_rows) if order_rows else NO_ORDERS_MATCHED
+        system_prompt = artifacts.build(product_section, order_section)
+
+        stats.order_records = len(order_rows)
+        stats.product_records = len(product_rows)
+        stats.data_tokens = estimate_tokens(product_section) + estimate_tokens(order_section)
+        stats.prompt_tokens = artifacts.static_tokens + stats.data_tokens + history_tokens
+        return system_prompt, stats
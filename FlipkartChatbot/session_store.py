@@ -0,0 +1,231 @@
+# session_store.py
+"""Conversation session state shared by every worker process.
+
+A Session holds what a worker needs to carry on a conversation: its
+messages, the saved-chat id, the rolling summary and the ``processing``
+claim. Every save is optimistic: it succeeds only if the stored version is
+still the one the caller read, otherwise VersionConflict is raised and the
+caller re-reads (``update`` does that in a loop).
+
+``processing`` is a lease, not a flag: ``claim`` records the worker and an
+expiry. If that worker dies mid-reply the lease runs out, the session shows
+as not processing with the user's message still unanswered, and whichever
+worker opens it next answers it. A reply is only saved by ``release`` while
+the worker still holds the claim, so a slow worker whose lease was taken
+over can't add a second answer.
+
+Backends: ``MemorySessionStore`` (one process, the default) and
+``SQLiteSessionStore`` (a WAL database any number of processes on the host
+can share).
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+
+# Attempts ``update`` makes before letting VersionConflict through
+UPDATE_RETRIES = 10
+# Sessions MemorySessionStore keeps before dropping the least recently saved
+MAX_MEMORY_SESSIONS = 10_000
+
+
+class VersionConflict(RuntimeError):
+    """The session was saved by someone else since it was read"""
+
+
+@dataclass
+class Session:
+    session_id: str
+    messages: list = field(default_factory=list)
+    chat_id: str = ""
+    summary_text: str = ""
+    summary_covered: int = 0
+    processing_owner: str = ""
+    processing_until: float = 0.0
+    version: int = 0
+
+    @property
+    def processing(self):
+        """True while a live worker holds the claim"""
+        return bool(self.processing_owner) and self.processing_until > time.time()
+
+    @property
+    def awaiting_reply(self):
+        """The last message is the user's and nobody is answering it (e.g. its worker died)"""
+        return bool(self.messages) and self.messages[-1]["role"] == "user" and not self.processing
+
+    def copy(self):
+        return replace(self, messages=[dict(m) for m in self.messages])
+
+    def to_json(self):
+        return json.dumps({"messages": self.messages, "chat_id": self.chat_id, "summary_text": self.summary_text,
+                           "summary_covered": self.summary_covered, "processing_owner": self.processing_owner,
+                           "processing_until": self.processing_until}, ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, session_id, version, data):
+        return cls(session_id, version=version, **json.loads(data))
+
+
+class SessionStore(ABC):
+    """Read-modify-write helpers over a backend's ``get``/``save``/``delete``"""
+
+    @abstractmethod
+    def get(self, session_id):
+        """The stored Session, or None"""
+
+    @abstractmethod
+    def save(self, session):
+        """Store ``session`` if the stored version is still ``session.version``; returns it with the new version"""
+
+    @abstractmethod
+    def delete(self, session_id):
+        """Remove the session; returns True if there was one"""
+
+    def update(self, session_id, change):
+        """Apply ``change(session)`` to a fresh copy and save it, retrying on conflicts.
+
+        ``change`` may return False to leave the session as it is; ``update``
+        then returns None.
+        """
+        for _ in range(UPDATE_RETRIES):
+            session = self.get(session_id) or Session(session_id)
+            if change(session) is False:
+                return None
+            try:
+                return self.save(session)
+            except VersionConflict:
+                continue
+        raise VersionConflict(f"session {session_id} kept changing under {UPDATE_RETRIES} attempts")
+
+    def claim(self, session_id, owner, lease_seconds, change=None):
+        """Mark the session as being answered by ``owner``, applying ``change`` in the same save.
+
+        Returns the saved Session, or None if another worker holds a live claim.
+        """
+        def take(session):
+            if session.processing and session.processing_owner != owner:
+                return False
+            if change is not None:
+                change(session)
+            session.processing_owner = owner
+            session.processing_until = time.time() + lease_seconds
+
+        return self.update(session_id, take)
+
+    def release(self, session_id, owner, change=None):
+        """Apply ``change`` and clear the claim, only if ``owner`` still holds it; returns the Session or None"""
+        def finish(session):
+            if session.processing_owner != owner:
+                return False
+            if change is not None:
+                change(session)
+            session.processing_owner = ""
+            session.processing_until = 0.0
+
+        return self.update(session_id, finish)
+
+
+class MemorySessionStore(SessionStore):
+    """Sessions in this process only, least recently saved dropped past ``max_sessions``; nothing survives a restart"""
+
+    def __init__(self, max_sessions=MAX_MEMORY_SESSIONS):
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            return session.copy() if session is not None else None
+
+    def save(self, session):
+        with self._lock:
+            stored = self._sessions.get(session.session_id)
+            if (stored.version if stored is not None else 0) != session.version:
+                raise VersionConflict(session.session_id)
+            saved = replace(session.copy(), version=session.version + 1)
+            self._sessions[session.session_id] = saved
+            self._sessions.move_to_end(session.session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return saved.copy()
+
+    def delete(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+
+class SQLiteSessionStore(SessionStore):
+    """Sessions in a SQLite (WAL) database shared by the worker processes on one host.
+
+    A save is a single conditional UPDATE (or INSERT for a new session), so
+    the version check and the write are atomic across processes.
+    """
+
+    def __init__(self, db_path, busy_timeout_ms=5000):
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None,
+                                   timeout=busy_timeout_ms / 1000)
+        self._lock = threading.Lock()
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "id TEXT PRIMARY KEY, version INTEGER NOT NULL, data TEXT NOT NULL, updated_at REAL NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at)")
+
+    def get(self, session_id):
+        with self._lock:
+            row = self._db.execute("SELECT version, data FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return Session.from_json(session_id, *row) if row else None
+
+    def save(self, session):
+        data, now = session.to_json(), time.time()
+        with self._lock:
+            if session.version == 0:
+                saved = self._db.execute(
+                    "INSERT INTO sessions (id, version, data, updated_at) VALUES (?, 1, ?, ?) "
+                    "ON CONFLICT (id) DO NOTHING", (session.session_id, data, now)).rowcount
+            else:
+                saved = self._db.execute(
+                    "UPDATE sessions SET version = version + 1, data = ?, updated_at = ? WHERE id = ? AND version = ?",
+                    (data, now, session.session_id, session.version)).rowcount
+        if not saved:
+            raise VersionConflict(session.session_id)
+        return replace(session.copy(), version=session.version + 1)
+
+    def delete(self, session_id):
+        with self._lock:
+            return self._db.execute("DELETE FROM sessions WHERE id = ?", (session_id,)).rowcount > 0
+
+    def purge(self, max_age_seconds):
+        """Delete sessions not saved for ``max_age_seconds``; returns how many"""
+        with self._lock:
+            return self._db.execute("DELETE FROM sessions WHERE updated_at < ?",
+                                    (time.time() - max_age_seconds,)).rowcount
+
+    def count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+def create_session_store(backend, db_path, max_age_seconds=None):
+    """Session store for the SESSION_BACKEND setting: "memory" or "sqlite".
+
+    With sqlite, sessions idle for more than ``max_age_seconds`` are deleted on startup.
+    """
+    if backend == "sqlite":
+        store = SQLiteSessionStore(db_path)
+        if max_age_seconds:
+            store.purge(max_age_seconds)
+        return store
+    if backend == "memory":
+        return MemorySessionStore()
+    raise ValueError(f"unknown session backend {backend!r}")
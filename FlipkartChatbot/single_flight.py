@@ -0,0 +1,152 @@
+# single_flight.py
+import asyncio
+import hashlib
+import json
+import threading
+from collections import Counter
+
+
+def payload_key(**create_kwargs):
+    """Stable hash of a chat.completions.create call"""
+    material = json.dumps(create_kwargs, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+class _Flight:
+    __slots__ = ('chunks', 'done', 'error', 'condition')
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.condition = threading.Condition()
+
+
+class _AsyncFlight:
+    __slots__ = ('chunks', 'done', 'error', 'changed', 'task')
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.changed = asyncio.Event()
+        self.task = None
+
+    def notify(self):
+        # Waiters hold the old event; swapping in a fresh one re-arms the next wait
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+
+class SingleFlight:
+    """Coalesces identical concurrent streams into one upstream stream.
+
+    The first caller for a key starts the upstream stream on a background
+    thread; every caller, including that first one, reads the shared chunk
+    list from the start, so late joiners get the chunks produced so far
+    replayed before following the live stream. The producer keeps running
+    if an individual reader goes away.
+
+    ``astream`` does the same for asyncio callers, with the producer running
+    as a task on the caller's event loop instead of a thread.
+    """
+
+    def __init__(self):
+        self.metrics = Counter()
+        self._flights = {}
+        self._async_flights = {}
+        self._lock = threading.Lock()
+
+    def stream(self, key, stream_factory):
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+                self.metrics['upstream'] += 1
+                threading.Thread(target=self._produce, args=(key, flight, stream_factory), daemon=True).start()
+            else:
+                self.metrics['coalesced'] += 1
+                if flight.chunks:
+                    self.metrics['late_joiners'] += 1
+        return self._follow(flight)
+
+    def _produce(self, key, flight, stream_factory):
+        try:
+            for chunk in stream_factory():
+                with flight.condition:
+                    flight.chunks.append(chunk)
+                    flight.condition.notify_all()
+        except Exception as e:
+            flight.error = e
+        finally:
+            with self._lock:
+                # New identical requests after this point start a fresh stream
+                self._flights.pop(key, None)
+            with flight.condition:
+                flight.done = True
+                flight.condition.notify_all()
+
+    @staticmethod
+    def _follow(flight):
+        position = 0
+        while True:
+            with flight.condition:
+                while position >= len(flight.chunks) and not flight.done:
+                    flight.condition.wait()
+                pending = flight.chunks[position:]
+                finished = flight.done
+            for chunk in pending:
+                yield chunk
+            position += len(pending)
+            if finished and position >= len(flight.chunks):
+                if flight.error is not None:
+                    raise flight.error
+                return
+
+    def astream(self, key, stream_factory):
+        """Async twin of ``stream``; ``stream_factory`` returns an async iterator"""
+        with self._lock:
+            flight = self._async_flights.get(key)
+            if flight is None:
+                flight = self._async_flights[key] = _AsyncFlight()
+                self.metrics['upstream'] += 1
+                flight.task = asyncio.get_running_loop().create_task(self._aproduce(key, flight, stream_factory))
+            else:
+                self.metrics['coalesced'] += 1
+                if flight.chunks:
+                    self.metrics['late_joiners'] += 1
+        return self._afollow(flight)
+
+    async def _aproduce(self, key, flight, stream_factory):
+        try:
+            async for chunk in stream_factory():
+                flight.chunks.append(chunk)
+                flight.notify()
+        except Exception as e:
+            flight.error = e
+        finally:
+            with self._lock:
+                self._async_flights.pop(key, None)
+            flight.done = True
+            flight.notify()
+
+    @staticmethod
+    async def _afollow(flight):
+        position = 0
+        while True:
+            changed = flight.changed
+            if position < len(flight.chunks):
+                pending = flight.chunks[position:]
+                position += len(pending)
+                for chunk in pending:
+                    yield chunk
+            elif flight.done:
+                if flight.error is not None:
+                    raise flight.error
+                return
+            else:
+                await changed.wait()
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._flights) + len(self._async_flights)
@@ -0,0 +1,239 @@
+# speculation.py
+"""Answers the quick-action follow-ups offered under a reply before they are clicked.
+
+After a reply is shown, ``speculate`` queues the quick-action prompts
+offered under it. A small thread pool answers them through
+``ChatPipeline.respond(..., speculative=True)``, which queues the
+upstream request at PRIORITY_SPECULATIVE, so live turns are always
+admitted first. A speculation is skipped when the upstream queue is
+already longer than ``max_queue_depth``, or when it would take the
+session past ``token_budget`` estimated tokens. Prompts the intent
+router answers locally are not speculated.
+
+The next user message settles the session with ``take``. If it is one
+of the speculated prompts, asked on the same conversation, the returned
+ChatTurn replays the finished reply, or follows the one still streaming,
+and the other speculations are cancelled. Any other message cancels them
+all and ``take`` returns None, so the caller asks the pipeline as usual.
+A cancelled speculation closes its upstream stream at the next chunk.
+
+Tokens of speculations that were used count as used, those of the rest
+as wasted; ``stats`` reports both with the hit rate. A speculation is
+left out of the pipeline's fast-path, routing and prompt-token stats
+until ``take`` uses it.
+"""
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from chat_pipeline import ChatTurn
+from retrieval import estimate_tokens
+from single_flight import payload_key
+
+# Sessions whose speculations are kept; the least recently used are cancelled
+MAX_SESSIONS = 10000
+
+
+@dataclass
+class _Speculation:
+    prompt: str
+    # queued, running, done, failed, local, skipped or cancelled
+    state: str = "queued"
+    # "" until the session's next message settles it, then "used" or "wasted"
+    outcome: str = ""
+    tokens: int = 0
+    context_stats: object = None
+    route: object = None
+    chunks: list = field(default_factory=list)
+    cancelled: threading.Event = field(default_factory=threading.Event)
+    condition: threading.Condition = field(default_factory=threading.Condition)
+    settled: bool = False
+
+
+@dataclass
+class _Session:
+    # conversation_key of the messages the speculations follow
+    base: str = ""
+    speculations: dict = field(default_factory=dict)
+    # Estimated tokens spent on speculation over the session's lifetime
+    spent: int = 0
+
+
+def conversation_key(messages):
+    return payload_key(messages=[(m["role"], m["content"]) for m in messages])
+
+
+class SpeculationEngine:
+    """Background answers to the quick actions offered in each session"""
+
+    def __init__(self, pipeline, token_budget=8000, max_prompts=3, workers=8, max_queue_depth=0):
+        self.pipeline = pipeline
+        self.token_budget = token_budget
+        self.max_prompts = max_prompts
+        self.max_queue_depth = max_queue_depth
+        self.metrics = Counter()
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="speculation")
+        pipeline.telemetry.registry.add_collector(self.collect_metrics)
+
+    def speculate(self, session_id, messages, summary, prompts):
+        """Start answering ``prompts`` as the next user message after ``messages``"""
+        speculations = {prompt: _Speculation(prompt) for prompt in dict.fromkeys(prompts[:self.max_prompts])}
+        with self._lock:
+            session = self._sessions.pop(session_id, None) or _Session()
+            self._cancel(session)
+            session.base, session.speculations = conversation_key(messages), speculations
+            self._sessions[session_id] = session
+            while len(self._sessions) > MAX_SESSIONS:
+                self._cancel(self._sessions.popitem(last=False)[1])
+        # The caller may go on to change its list and summary
+        messages = list(messages)
+        for speculation in speculations.values():
+            self._executor.submit(self._run, session, speculation, messages, summary)
+
+    def take(self, session_id, messages):
+        """ChatTurn answering the last message of ``messages`` from a speculation, or None"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or not session.speculations:
+                return None
+            speculation = None
+            if conversation_key(messages[:-1]) == session.base:
+                speculation = session.speculations.get(messages[-1]["content"])
+            # One that hasn't reached the model yet would only start at low priority; the live turn goes first
+            if speculation is None or speculation.state not in ("running", "done") or speculation.context_stats is None:
+                if speculation is None or speculation.state != "local":
+                    self.metrics["misses"] += 1
+                self._cancel(session)
+                return None
+            self.metrics["hits" if speculation.state == "done" else "late_hits"] += 1
+            speculation.outcome = "used"
+            self._settle(speculation)
+            self._cancel(session)
+        analytics = self.pipeline.analytics
+        event = analytics.start(messages[-1]["content"])
+        event.set(route="speculation", prompt_tokens=speculation.context_stats.prompt_tokens)
+        turn = ChatTurn("llm", analytics.observe_stream(self._follow(speculation), event), speculation.context_stats,
+                        speculation.route)
+        self.pipeline.record_speculation(turn)
+        return turn
+
+    def cancel(self, session_id):
+        """Drop a session's speculations, e.g. when it starts another chat"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._cancel(session)
+
+    def _cancel(self, session):
+        """Drop the session's unused speculations, stopping those still queued or running"""
+        for speculation in session.speculations.values():
+            if speculation.outcome:
+                continue
+            speculation.outcome = "wasted"
+            speculation.cancelled.set()
+            self._settle(speculation)
+        session.speculations = {}
+
+    def _settle(self, speculation):
+        """Count a speculation's tokens once it has both ended and been used or dropped"""
+        if speculation.settled or not speculation.outcome or speculation.state in ("queued", "running"):
+            return
+        speculation.settled = True
+        self.metrics[speculation.outcome + "_tokens"] += speculation.tokens
+
+    def _end(self, speculation, state):
+        with self._lock:
+            with speculation.condition:
+                speculation.state = state
+                speculation.condition.notify_all()
+            self.metrics[state] += 1
+            self._settle(speculation)
+
+    def _run(self, session, speculation, messages, summary):
+        with self._lock:
+            if speculation.cancelled.is_set():
+                speculation.state = "cancelled"
+                self.metrics["cancelled"] += 1
+                self._settle(speculation)
+                return
+            speculation.state = "running"
+        try:
+            turn = self.pipeline.respond(messages + [{"role": "user", "content": speculation.prompt}], summary,
+                                         speculative=True)
+            if turn.intent != "llm":
+                # The intent router answers it as fast live
+                self._end(speculation, "local")
+                return
+            prompt_tokens = turn.context_stats.prompt_tokens
+            queue_depth = self.pipeline.gateway.scheduler_for(turn.context_stats.model).queue_depth
+            with self._lock:
+                if queue_depth > self.max_queue_depth:
+                    self.metrics["skipped_busy"] += 1
+                    over = True
+                elif session.spent + prompt_tokens > self.token_budget:
+                    self.metrics["skipped_budget"] += 1
+                    over = True
+                else:
+                    session.spent += prompt_tokens
+                    speculation.tokens = prompt_tokens
+                    speculation.context_stats = turn.context_stats
+                    speculation.route = turn.route
+                    over = False
+            if over:
+                self._end(speculation, "skipped")
+                return
+            chunks = turn.chunks
+            try:
+                for chunk in chunks:
+                    if speculation.cancelled.is_set():
+                        break
+                    with speculation.condition:
+                        speculation.chunks.append(chunk)
+                        speculation.condition.notify_all()
+            finally:
+                chunks.close()
+                completion_tokens = estimate_tokens("".join(speculation.chunks))
+                with self._lock:
+                    session.spent += completion_tokens
+                    speculation.tokens += completion_tokens
+        except Exception:
+            self._end(speculation, "failed")
+            return
+        self._end(speculation, "cancelled" if speculation.cancelled.is_set() else "done")
+
+    @staticmethod
+    def _follow(speculation):
+        position = 0
+        while True:
+            with speculation.condition:
+                while position == len(speculation.chunks) and speculation.state == "running":
+                    speculation.condition.wait()
+                chunks = speculation.chunks[position:]
+                state = speculation.state
+            yield from chunks
+            position += len(chunks)
+            if state != "running":
+                break
+        if state == "failed":
+            raise RuntimeError("the speculated reply failed partway")
+
+    def stats(self):
+        with self._lock:
+            metrics = dict(self.metrics)
+        settled = metrics.get("hits", 0) + metrics.get("late_hits", 0) + metrics.get("misses", 0)
+        metrics["hit_rate"] = (metrics.get("hits", 0) + metrics.get("late_hits", 0)) / settled if settled else 0.0
+        return metrics
+
+    def collect_metrics(self):
+        """Collector for the telemetry registry"""
+        with self._lock:
+            metrics = dict(self.metrics)
+        yield ("chatbot_speculation_total", "counter", "Quick-action speculations by how they ended",
+               [({"state": state}, metrics.get(state, 0)) for state in ("done", "failed", "local", "skipped", "cancelled")])
+        yield ("chatbot_speculation_lookups_total", "counter", "User messages after a speculation, by result",
+               [({"result": result}, metrics.get(result, 0)) for result in ("hits", "late_hits", "misses")])
+        yield ("chatbot_speculation_tokens_total", "counter", "Estimated tokens spent on speculation",
+               [({"kind": kind}, metrics.get(kind + "_tokens", 0)) for kind in ("used", "wasted")])
@@ -0,0 +1,261 @@
+# static_assets.py
+"""Fingerprinted, precompressed static files for the landing page's production mode.
+
+``StaticAssets.build`` reads every file under static/ once. Each one gets
+a fingerprinted name with a hash of its content (``style.css`` becomes
+``style.3f9a1c2e.css``). References inside stylesheets are rewritten to
+the fingerprinted names first, so a changed image also changes the hash
+of the CSS that uses it. Text files (CSS, JS, SVG, HTML) are compressed
+with gzip and, when the ``brotli`` package is installed, brotli. This
+happens once at build time, never per request, and a variant is only
+kept if it is at least MIN_SAVING smaller.
+
+``serve`` answers /static/ requests from memory:
+
+- fingerprinted names are cached for a year as immutable
+- the original names are revalidated on every use
+- each encoding has its own ETag, and a matching If-None-Match gets a 304
+- Accept-Encoding picks brotli, then gzip, then the file as it is
+
+``critical_css`` picks the rules a page needs to draw what is above the
+fold, so they can be inlined in the page while the full stylesheet loads
+without blocking rendering.
+
+Write the variants to a directory for a CDN or a web server's
+precompressed-file support with:
+
+    python static_assets.py --build static_build
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+from dataclasses import dataclass, field
+
+from flask import Response, abort, request
+
+# Seconds a fingerprinted file may be cached; its name changes with its content
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+# A compressed variant must be at least this much smaller to be worth sending
+MIN_SAVING = 0.1
+FINGERPRINT_CHARS = 8
+
+CSS_URL_PATTERN = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+HTML_SELECTOR_PATTERN = re.compile(r'''<([a-zA-Z][a-zA-Z0-9]*)|\sclass=["']([^"']*)["']|\sid=["']([^"']*)["']''')
+SELECTOR_TOKEN_PATTERN = re.compile(r'([.#]?)(-?[_a-zA-Z][_a-zA-Z0-9-]*)')
+
+
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def etag_matches(header, etag):
+    """Whether an If-None-Match header names ``etag`` (weak or strong) or is *"""
+    if not header:
+        return False
+    return any(tag.strip() in ("*", etag, "W/" + etag) for tag in header.split(","))
+
+
+def negotiate(accept_encoding, variants):
+    """The best of ``variants`` ({encoding: Variant}) for an Accept-Encoding header"""
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding in ("br", "gzip"):
+        if encoding in variants and accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return variants[encoding]
+    return variants["identity"]
+
+
+@dataclass
+class Variant:
+    encoding: str
+    body: bytes
+    etag: str
+
+
+@dataclass
+class Asset:
+    path: str
+    fingerprinted: str
+    content_type: str
+    variants: dict = field(default_factory=dict)
+
+
+def compressed_variants(body, content_type, digest):
+    """{encoding: Variant} for ``body``: as it is, plus gzip and brotli when they are worth it"""
+    variants = {"identity": Variant("identity", body, f'"{digest}"')}
+    if not content_type.startswith(COMPRESSIBLE_TYPES):
+        return variants
+    candidates = {"gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+    brotli = _brotli()
+    if brotli is not None:
+        candidates["br"] = brotli.compress(body, quality=11)
+    for encoding, compressed in candidates.items():
+        if len(compressed) <= len(body) * (1 - MIN_SAVING):
+            variants[encoding] = Variant(encoding, compressed, f'"{digest}-{encoding}"')
+    return variants
+
+
+def respond(variants, content_type, cache_control):
+    """A response for one of ``variants``, or a 304 if the client already has it"""
+    variant = negotiate(request.headers.get("Accept-Encoding"), variants)
+    headers = {"Cache-Control": cache_control, "ETag": variant.etag, "Vary": "Accept-Encoding"}
+    if variant.encoding != "identity":
+        headers["Content-Encoding"] = variant.encoding
+    if etag_matches(request.headers.get("If-None-Match"), variant.etag):
+        return Response(status=304, headers=headers)
+    return Response(variant.body, content_type=content_type, headers=headers)
+
+
+class StaticAssets:
+    """Every file under a static directory, fingerprinted and compressed, served from memory"""
+
+    def __init__(self, assets, url_path="/static"):
+        self.url_path = url_path
+        self._by_path = {asset.path: asset for asset in assets}
+        self._by_fingerprint = {asset.fingerprinted: asset for asset in assets}
+
+    @classmethod
+    def build(cls, static_dir, url_path="/static"):
+        files = {}
+        for root, _, names in os.walk(static_dir):
+            for name in names:
+                full = os.path.join(root, name)
+                path = os.path.relpath(full, static_dir).replace(os.sep, "/")
+                if not path.startswith("."):
+                    with open(full, "rb") as f:
+                        files[path] = f.read()
+        # Stylesheets name other files, so those get their fingerprints first
+        ordered = sorted(files, key=lambda path: (path.endswith(".css"), path))
+        assets = {}
+        for path in ordered:
+            body = files[path]
+            if path.endswith(".css"):
+                body = cls._rewrite_css(body.decode("utf-8"), path, assets, url_path).encode("utf-8")
+            digest = hashlib.sha256(body).hexdigest()
+            stem, ext = posixpath.splitext(path)
+            content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+            if content_type.startswith("text/"):
+                content_type += "; charset=utf-8"
+            assets[path] = Asset(path, f"{stem}.{digest[:FINGERPRINT_CHARS]}{ext}", content_type,
+                                 compressed_variants(body, content_type, digest[:16]))
+        return cls(assets.values(), url_path)
+
+    @staticmethod
+    def _rewrite_css(css, path, assets, url_path):
+        """Point url(...) references at the fingerprinted files, as absolute URLs so the CSS can be inlined"""
+        def replace(match):
+            quote, target = match.groups()
+            if re.match(r'^(?:[a-z]+:|/|#)', target):
+                return match.group(0)
+            resolved = posixpath.normpath(posixpath.join(posixpath.dirname(path), target))
+            asset = assets.get(resolved)
+            if asset is None:
+                return match.group(0)
+            return f"url({quote}{url_path}/{asset.fingerprinted}{quote})"
+        return CSS_URL_PATTERN.sub(replace, css)
+
+    def fingerprinted(self, path):
+        """The fingerprinted name of ``path``, or ``path`` if it isn't a known file"""
+        asset = self._by_path.get(path)
+        return asset.fingerprinted if asset else path
+
+    def text(self, path):
+        return self._by_path[path].variants["identity"].body.decode("utf-8")
+
+    def serve(self, filename):
+        """View for /static/<path:filename>"""
+        asset = self._by_fingerprint.get(filename)
+        if asset is not None:
+            cache_control = f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+        else:
+            asset = self._by_path.get(filename)
+            if asset is None:
+                abort(404)
+            cache_control = "no-cache"
+        return respond(asset.variants, asset.content_type, cache_control)
+
+    def stats(self):
+        sizes = {"files": len(self._by_path), "bytes": 0, "gzip_bytes": 0, "br_bytes": 0}
+        for asset in self._by_path.values():
+            sizes["bytes"] += len(asset.variants["identity"].body)
+            for encoding in ("gzip", "br"):
+                sizes[encoding + "_bytes"] += len(asset.variants.get(encoding, asset.variants["identity"]).body)
+        return sizes
+
+    def write(self, directory):
+        """Write every variant (name, name.gz, name.br) and a manifest.json of the fingerprinted names"""
+        suffixes = {"identity": "", "gzip": ".gz", "br": ".br"}
+        for asset in self._by_path.values():
+            target = os.path.join(directory, *asset.fingerprinted.split("/"))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            for encoding, variant in asset.variants.items():
+                with open(target + suffixes[encoding], "wb") as f:
+                    f.write(variant.body)
+        with open(os.path.join(directory, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump({path: asset.fingerprinted for path, asset in sorted(self._by_path.items())}, f, indent=2)
+
+
+def _top_level_rules(css):
+    """(selectors, block) for each top-level rule; at-rules are passed over"""
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    rules, depth, start = [], 0, 0
+    for i, char in enumerate(css):
+        if char == "{":
+            if depth == 0:
+                selectors, block_start = css[start:i].strip(), i
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                if not selectors.startswith("@"):
+                    rules.append((selectors, css[block_start:i + 1]))
+                start = i + 1
+    return rules
+
+
+def critical_css(css, html):
+    """The rules of ``css`` whose selectors only name tags, classes and ids that occur in ``html``"""
+    present = set()
+    for tag, classes, element_id in HTML_SELECTOR_PATTERN.findall(html):
+        if tag:
+            present.add(tag.lower())
+        present.update("." + name for name in classes.split())
+        if element_id:
+            present.add("#" + element_id)
+    kept = []
+    for selectors, block in _top_level_rules(css):
+        # Pseudo-classes like :hover don't change what is drawn first
+        wanted = [s.strip() for s in selectors.split(",")
+                  if all((prefix + name if prefix else name.lower()) in present
+                         for prefix, name in SELECTOR_TOKEN_PATTERN.findall(re.sub(r'::?[\w-]+(\([^)]*\))?', '', s)))]
+        if wanted:
+            kept.append(",".join(wanted) + block)
+    return "\n".join(re.sub(r'\s*([{};])\s*', r'\1', rule) for rule in kept)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--build", metavar="DIR", required=True, help="directory to write the variants to")
+    parser.add_argument("--static", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "static"))
+    args = parser.parse_args()
+    assets = StaticAssets.build(args.static)
+    assets.write(args.build)
+    print(f"Wrote {args.build}: {json.dumps(assets.stats())}" + ("" if _brotli() else " (brotli not installed)"))
@@ -0,0 +1,105 @@
+# stream_renderer.py
+"""Streams a reply into the Streamlit chat view without re-sending all of it per chunk.
+
+Writing ``full_response + "▌"`` into one placeholder for every chunk sends
+the whole reply again each time, so a long reply costs O(n²) in server CPU
+and bytes. ``StreamRenderer`` instead:
+
+- buffers chunks and flushes at most every ``interval`` seconds (or once
+  ``max_pending_chars`` are waiting), and
+- splits the reply into markdown blocks at blank lines outside code
+  fences. A finished block is written once into its own element and never
+  sent again; only the open block at the end is re-rendered on a flush.
+
+A block with no blank line in it (one long paragraph, or a long code
+block) still grows until it is closed.
+"""
+import time
+
+CURSOR = "▌"
+FENCE = "```"
+
+
+def _last_boundary(text):
+    """End of the last complete block in ``text`` (after a blank line outside a code fence), or 0"""
+    end = text.rfind("\n\n")
+    while end != -1:
+        # An even number of fences before the blank line means it isn't inside a code block
+        if text.count(FENCE, 0, end) % 2 == 0:
+            return end + 2
+        end = text.rfind("\n\n", 0, end)
+    return 0
+
+
+class StreamRenderer:
+    """Renders one streamed reply into ``container`` (anything with Streamlit's ``empty()``).
+
+    Call ``write`` for each chunk and ``close`` when the stream ends;
+    ``close`` returns the full reply. ``placeholder`` is shown until the
+    first flush. ``clock`` is only replaced in benchmarks. ``render_seconds``
+    adds up the time spent in flushes.
+    """
+
+    def __init__(self, container, interval=0.05, max_pending_chars=2000, placeholder=None, clock=time.monotonic):
+        self.container = container
+        self.interval = interval
+        self.max_pending_chars = max_pending_chars
+        self.clock = clock
+        self.flushes = 0
+        self.chars_sent = 0
+        self.render_seconds = 0.0
+        self._parts = []
+        self._pending = []
+        self._pending_chars = 0
+        self._open_text = ""
+        self._open = container.empty()
+        if placeholder:
+            self._open.markdown(placeholder)
+        self._last_flush = clock()
+
+    @property
+    def text(self):
+        return "".join(self._parts)
+
+    def write(self, chunk):
+        if not chunk:
+            return
+        self._parts.append(chunk)
+        self._pending.append(chunk)
+        self._pending_chars += len(chunk)
+        if self._pending_chars >= self.max_pending_chars or self.clock() - self._last_flush >= self.interval:
+            self.flush()
+
+    def flush(self, final=False):
+        """Render what's pending: finished blocks once each, then the open block"""
+        started = time.perf_counter()
+        text = self._open_text + "".join(self._pending)
+        self._pending = []
+        self._pending_chars = 0
+        boundary = len(text) if final else _last_boundary(text)
+        if boundary:
+            self._render(text[:boundary].rstrip("\n"))
+            text = text[boundary:]
+            if not final:
+                self._open = self.container.empty()
+        self._open_text = text
+        if text:
+            self._render(text if final else text + CURSOR)
+        self._last_flush = self.clock()
+        self.flushes += 1
+        self.render_seconds += time.perf_counter() - started
+
+    def _render(self, markdown):
+        self._open.markdown(markdown)
+        self.chars_sent += len(markdown)
+
+    def close(self):
+        """Flush the rest without the cursor; returns the whole reply"""
+        if not self._parts:
+            self._open.empty()
+        self.flush(final=True)
+        return self.text
+
+    def error(self, message):
+        """Show ``message`` in place of the open block"""
+        self._open.error(message)
@@ -0,0 +1,342 @@
+# telemetry.py
+"""Per-turn traces and Prometheus metrics for the chat pipeline.
+
+A trace covers one turn: named spans (input, language, route, context,
+upstream, stream, render, save) with their offsets and durations in ms,
+written as one JSON line per turn when the turn finishes. Only a sampled
+fraction of turns (``sample_rate``) is traced; the others get NULL_TRACE,
+whose methods do nothing, so tracing costs an attribute lookup per stage
+when it's off.
+
+Metrics are counters and histograms rendered in the Prometheus text
+format. Components that already keep counters (the reply cache, the Groq
+gateway) are read at scrape time through collectors instead of being
+counted twice. With metrics disabled, the ``count_*``/``observe_*`` calls
+return straight away and replies are not wrapped.
+"""
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30)
+TOKENS_PER_SECOND_BUCKETS = (10, 25, 50, 100, 200, 400, 800)
+PROMPT_TOKEN_BUCKETS = (250, 500, 1000, 2000, 4000, 8000)
+# Finished traces kept in memory for /traces
+RECENT_TRACES = 100
+
+logger = logging.getLogger(__name__)
+
+
+def _label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_label_value(v)}"' for k, v in labels) + "}"
+
+
+class CounterMetric:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            lines += [f"{self.name}{_label_text(k)} {v}" for k, v in self._values.items()]
+        return lines
+
+
+class HistogramMetric:
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                # One slot per bucket, then +Inf, sum
+                counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[len(self.buckets)] += 1
+            counts[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, counts in self._values.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), counts):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_label_text(key + (('le', bound),))} {cumulative}")
+                lines.append(f"{self.name}_sum{_label_text(key)} {counts[-1]}")
+                lines.append(f"{self.name}_count{_label_text(key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Metrics in the Prometheus text format.
+
+    A collector is a callable returning ``(name, type, help, samples)``
+    tuples, where samples is a list of ``(labels dict, value)``; it is
+    called on every ``render``.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help_text):
+        metric = CounterMetric(name, help_text)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS):
+        metric = HistogramMetric(name, help_text, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines += metric.render()
+        for collector in self._collectors:
+            for name, kind, help_text, samples in collector():
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+                lines += [f"{name}{_label_text(sorted(labels.items()))} {value}" for labels, value in samples]
+        return "\n".join(lines) + "\n"
+
+
+class Trace:
+    """Spans of one sampled turn; times are ms from the start of the trace"""
+    sampled = True
+
+    def __init__(self, tracer, name, attributes):
+        self.tracer = tracer
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.attributes = attributes
+        self.started_at = time.time()
+        self.origin = time.perf_counter()
+        self.spans = []
+
+    @contextmanager
+    def span(self, name, **attributes):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(name, start, time.perf_counter(), **attributes)
+
+    def add_span(self, name, start, end, **attributes):
+        """Record a span between two ``time.perf_counter()`` readings"""
+        span = {"name": name, "start_ms": round((start - self.origin) * 1000, 3),
+                "duration_ms": round((end - start) * 1000, 3)}
+        if attributes:
+            span["attributes"] = attributes
+        self.spans.append(span)
+
+    def mark(self, name, **attributes):
+        """A zero-length span, e.g. the first token"""
+        now = time.perf_counter()
+        self.add_span(name, now, now, **attributes)
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def finish(self):
+        self.tracer.export({
+            "trace_id": self.trace_id, "name": self.name,
+            "started_at": self.started_at, "duration_ms": round((time.perf_counter() - self.origin) * 1000, 3),
+            "attributes": self.attributes, "spans": self.spans,
+        })
+
+
+class _NullTrace:
+    """Stands in for a turn that isn't sampled"""
+    sampled = False
+    trace_id = None
+    _span = nullcontext()
+
+    def span(self, name, **attributes):
+        return self._span
+
+    def add_span(self, name, start, end, **attributes):
+        pass
+
+    def mark(self, name, **attributes):
+        pass
+
+    def set(self, **attributes):
+        pass
+
+    def finish(self):
+        pass
+
+
+NULL_TRACE = _NullTrace()
+
+
+class Tracer:
+    """Starts a Trace for a ``sample_rate`` fraction of turns and appends finished ones to ``log_path``"""
+
+    def __init__(self, sample_rate, log_path=None):
+        self.sample_rate = sample_rate
+        self.log_path = log_path
+        self.recent = deque(maxlen=RECENT_TRACES)
+        self._lock = threading.Lock()
+        if sample_rate > 0 and log_path and os.path.dirname(log_path):
+            os.makedirs(os.path.dirname(log_path), exist_ok=True)
+
+    def start(self, name, **attributes):
+        if self.sample_rate <= 0 or (self.sample_rate < 1 and random.random() >= self.sample_rate):
+            return NULL_TRACE
+        return Trace(self, name, attributes)
+
+    def export(self, record):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            self.recent.append(record)
+            if self.log_path:
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(line)
+
+
+class Telemetry:
+    """Tracer plus the chat metrics; one per process"""
+
+    def __init__(self, sample_rate=0.0, trace_log_path=None, metrics_enabled=False):
+        self.tracer = Tracer(sample_rate, trace_log_path)
+        self.metrics_enabled = metrics_enabled
+        self.registry = MetricsRegistry()
+        self.turns = self.registry.counter("chatbot_turns_total", "Replies started, by intent")
+        self.errors = self.registry.counter("chatbot_errors_total", "Replies that ended in an error, by error type")
+        self.ttft = self.registry.histogram("chatbot_ttft_seconds", "Time to the first reply chunk")
+        self.reply_seconds = self.registry.histogram("chatbot_reply_seconds", "Time to the last reply chunk")
+        self.tokens_per_second = self.registry.histogram(
+            "chatbot_tokens_per_second", "Reply chunks per second after the first", TOKENS_PER_SECOND_BUCKETS)
+        self.prompt_tokens = self.registry.histogram(
+            "chatbot_prompt_tokens", "Estimated prompt tokens per model turn", PROMPT_TOKEN_BUCKETS)
+
+    def start_trace(self, name, **attributes):
+        return self.tracer.start(name, **attributes)
+
+    def count_turn(self, intent):
+        if self.metrics_enabled:
+            self.turns.inc(intent=intent)
+
+    def count_error(self, error):
+        if self.metrics_enabled:
+            self.errors.inc(type=type(error).__name__)
+
+    def observe_prompt(self, tokens):
+        if self.metrics_enabled:
+            self.prompt_tokens.observe(tokens)
+
+    def _observe_reply(self, trace, started, first, chunks):
+        end = time.perf_counter()
+        if first is None:
+            first = end
+        trace.add_span("upstream", started, first)
+        trace.add_span("stream", first, end, chunks=chunks)
+        if self.metrics_enabled:
+            self.ttft.observe(first - started)
+            self.reply_seconds.observe(end - started)
+            if chunks > 1 and end > first:
+                self.tokens_per_second.observe((chunks - 1) / (end - first))
+
+    def observe_stream(self, chunks, trace=NULL_TRACE):
+        """Pass ``chunks`` through, timing the first and last one; unwrapped when nothing would be recorded"""
+        if not (self.metrics_enabled or trace.sampled):
+            return chunks
+        return self._observed(chunks, trace)
+
+    def _observed(self, chunks, trace):
+        started, first, count = time.perf_counter(), None, 0
+        for chunk in chunks:
+            if first is None:
+                first = time.perf_counter()
+            count += 1
+            yield chunk
+        self._observe_reply(trace, started, first, count)
+
+    def observe_astream(self, chunks, trace=NULL_TRACE):
+        """``observe_stream`` for async iterators"""
+        if not (self.metrics_enabled or trace.sampled):
+            return chunks
+        return self._aobserved(chunks, trace)
+
+    async def _aobserved(self, chunks, trace):
+        started, first, count = time.perf_counter(), None, 0
+        async for chunk in chunks:
+            if first is None:
+                first = time.perf_counter()
+            count += 1
+            yield chunk
+        self._observe_reply(trace, started, first, count)
+
+    def render_metrics(self):
+        return self.registry.render()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    telemetry = None
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            body, content_type = self.telemetry.render_metrics().encode(), PROMETHEUS_CONTENT_TYPE
+        elif self.path == "/traces":
+            body, content_type = json.dumps(list(self.telemetry.tracer.recent)).encode(), "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(telemetry, host, port):
+    """Serve /metrics and /traces from a daemon thread; returns the server, or None if the port is taken"""
+    handler = type("MetricsHandler", (_MetricsHandler,), {"telemetry": telemetry})
+    try:
+        server = ThreadingHTTPServer((host, port), handler)
+    except OSError as e:
+        logger.warning("metrics endpoint not started on %s:%s: %s", host, port, e)
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
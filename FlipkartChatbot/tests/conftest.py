@@ -0,0 +1,34 @@
+# tests/conftest.py
+"""Fixtures shared by the tests; run from the FlipkartChatbot directory with ``python -m pytest tests``."""
+import asyncio
+import threading
+
+import pytest
+from aiohttp import web
+
+from benchmarks.fake_groq import FakeGroqConfig, create_app
+
+
+@pytest.fixture
+def fake_groq():
+    """Start a fake server with the given config on a free port in a background loop; yields a starter"""
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    runners = []
+
+    def start(**config):
+        async def serve():
+            runner = web.AppRunner(create_app(FakeGroqConfig(ttft_jitter_ms=0, **config)))
+            await runner.setup()
+            site = web.TCPSite(runner, "127.0.0.1", 0)
+            await site.start()
+            runners.append(runner)
+            return runner.addresses[0][1]
+
+        port = asyncio.run_coroutine_threadsafe(serve(), loop).result(timeout=10)
+        return f"http://127.0.0.1:{port}"
+
+    yield start
+    for runner in runners:
+        asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result(timeout=10)
+    loop.call_soon_threadsafe(loop.stop)
@@ -0,0 +1,18 @@
+# tests/test_analytics.py
+"""Rollups of turn events summarized by analytics.summarize.
+
+Run from the FlipkartChatbot directory with ``python -m pytest tests``.
+"""
+import numpy as np
+
+from analytics import EVENT_DTYPE, ROUTES, aggregate_events, summarize
+
+
+def test_only_fast_path_and_cache_turns_count_as_answered_locally():
+    events = np.zeros(len(ROUTES), dtype=EVENT_DTYPE)
+    events["at"] = 1_700_000_000
+    events["route"] = [ROUTES.index(route) for route in ROUTES]
+    events["latency_ms"] = 100
+    total = summarize(aggregate_events(events, 60), by=()).iloc[0]
+    assert total["turns"] == 4
+    assert total["answered_locally"] == 0.5
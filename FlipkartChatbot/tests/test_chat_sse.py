@@ -0,0 +1,63 @@
+# tests/test_chat_sse.py
+"""chat_api.chat_sse closes the reply's event generator on every way out, with reply_events replaced.
+
+Run from the FlipkartChatbot directory with ``python -m pytest tests``.
+"""
+import asyncio
+
+from aiohttp.test_utils import make_mocked_request
+
+import chat_api
+
+BODY = {"messages": [{"role": "user", "content": "hello"}]}
+
+
+class Recorder:
+    def __init__(self, events):
+        self.events = events
+        self.closed = False
+
+    async def reply_events(self, app, conversation_id, messages):
+        try:
+            for event in self.events:
+                yield event
+        finally:
+            # Where the real generator releases the conversation's claim
+            self.closed = True
+
+
+def sse_request(recorder, monkeypatch, write_error=None):
+    monkeypatch.setattr(chat_api, "reply_events", recorder.reply_events)
+    request = make_mocked_request("POST", "/chat")
+
+    async def json():
+        return BODY
+    request.json = json
+    if write_error is not None:
+        async def write_event(response, event, data):
+            raise write_error
+        monkeypatch.setattr(chat_api, "write_event", write_event)
+    return request
+
+
+async def closed_on_return(recorder, request):
+    """chat_sse's response (or error), and whether the events were closed before the loop could finalize them"""
+    try:
+        return await chat_api.chat_sse(request), recorder.closed
+    except ConnectionResetError as e:
+        return e, recorder.closed
+
+
+def test_busy_conversation_closes_the_events(monkeypatch):
+    recorder = Recorder([("error", {"error": "busy"}), ("never", {})])
+    response, closed = asyncio.run(closed_on_return(recorder, sse_request(recorder, monkeypatch)))
+    assert response.status == 409
+    assert closed
+
+
+def test_client_gone_mid_reply_closes_the_events(monkeypatch):
+    recorder = Recorder([("meta", {}), ("token", {"delta": "Hi"}), ("done", {})])
+    request = sse_request(recorder, monkeypatch, write_error=ConnectionResetError())
+    error, closed = asyncio.run(closed_on_return(recorder, request))
+    assert isinstance(error, ConnectionResetError)
+    assert closed
@@ -0,0 +1,54 @@
+# tests/test_chat_workers.py
+"""The status file PoolStatus reads, and where the landing page's own pool binds its workers.
+
+Run from the FlipkartChatbot directory with ``python -m pytest tests``.
+"""
+import json
+import time
+
+import chatbot
+from chat_workers import PoolStatus
+
+
+def write_status(path, status):
+    path.write_text(json.dumps(status), encoding="utf-8")
+    return PoolStatus(str(path))
+
+
+def test_status_is_read_and_a_healthy_worker_picked(tmp_path):
+    pool = write_status(tmp_path / "workers.json", {
+        "written_at": time.time(), "healthy": 1,
+        "workers": [{"index": 0, "port": 8501, "state": "healthy"}, {"index": 1, "port": 8502, "state": "starting"}],
+    })
+    assert pool.pick() == (0, 8501)
+
+
+def test_status_without_written_at_or_not_an_object_means_no_workers(tmp_path):
+    for status in ({"workers": [{"index": 0, "port": 8501, "state": "healthy"}]}, [], "up"):
+        pool = write_status(tmp_path / "workers.json", status)
+        assert pool.pick() is None
+        assert pool.stats() == {"workers": [], "healthy": 0}
+
+
+class RecordingPool:
+    def __init__(self, size, base_port, command, health_interval, host):
+        self.command, self.host = command, host
+
+    def start(self):
+        return self
+
+    def stop(self):
+        pass
+
+
+def test_workers_listen_where_visitors_are_sent(monkeypatch):
+    monkeypatch.setattr(chatbot, "WorkerPool", RecordingPool)
+    monkeypatch.setattr(chatbot, "CHAT_WORKER_STATUS_PATH", "")
+
+    pool = chatbot.create_pool(2, "0.0.0.0")
+    command = pool.command(8501)
+    assert command[command.index("--server.address") + 1] == "0.0.0.0"
+    assert pool.host == "127.0.0.1"
+
+    pool = chatbot.create_pool(2, "10.0.0.5")
+    assert pool.command(8501)[-1] == "10.0.0.5" and pool.host == "10.0.0.5"
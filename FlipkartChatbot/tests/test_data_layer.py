@@ -0,0 +1,45 @@
+# tests/test_data_layer.py
+"""Delta files applied by DataLayer.refresh, including lines that can't be decoded or parsed.
+
+Run from the FlipkartChatbot directory with ``python -m pytest tests``.
+"""
+import json
+import os
+import shutil
+
+import pytest
+
+from data_layer import DataLayer
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+
+@pytest.fixture
+def layer(tmp_path):
+    for name in ("products.json", "orders.json"):
+        shutil.copy(os.path.join(DATA_DIR, name), tmp_path / name)
+    (tmp_path / "deltas").mkdir()
+    return DataLayer(str(tmp_path / "products.json"), str(tmp_path / "orders.json"),
+                     deltas_dir=str(tmp_path / "deltas"), poll_seconds=0)
+
+
+def upsert_price(product_id, price):
+    record = {"id": product_id, "name": "Smartwatch Pro X", "category": "Electronics", "price": price}
+    return json.dumps({"op": "upsert", "kind": "product", "record": record}).encode() + b"\n"
+
+
+def test_bad_lines_skip_only_themselves(layer):
+    path = os.path.join(layer.deltas_dir, "001.jsonl")
+    with open(path, "wb") as f:
+        f.write(upsert_price("PROD001", 199.0) + b'{"op": "upsert", \xff}\n' + b"not json\n"
+                + upsert_price("PROD002", 9.5))
+    assert layer.refresh()
+    assert layer.snapshot.product_index.get("PROD001")["price"] == 199.0
+    assert layer.snapshot.product_index.get("PROD002")["price"] == 9.5
+    assert layer.metrics["delta_errors"] == 2
+    assert layer.last_error is None
+
+    with open(path, "ab") as f:
+        f.write(upsert_price("PROD001", 179.0))
+    assert layer.refresh()
+    assert layer.snapshot.product_index.get("PROD001")["price"] == 179.0
@@ -0,0 +1,112 @@
+# tests/test_groq_stream.py
+"""GroqGateway.stream and astream timeouts against benchmarks.fake_groq.
+
+Run from the FlipkartChatbot directory with ``python -m pytest tests``.
+"""
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from groq_client import DeadlineExceeded, GroqGateway
+
+REQUEST = {"model": "llama3-8b-8192", "messages": [{"role": "user", "content": "where is my order"}],
+           "max_tokens": 40}
+
+
+def gateway(base_url, timeout_seconds):
+    return GroqGateway("test", 1000, 1_000_000, base_url=base_url, timeout_seconds=timeout_seconds, max_retries=0)
+
+
+def test_pause_after_first_token_outlasting_first_token_budget_is_not_cut(fake_groq):
+    base_url = fake_groq(ttft_ms=50, stall_ms=1500, reply_tokens=40)
+    started = time.monotonic()
+    reply = "".join(gateway(base_url, timeout_seconds=5).stream(
+        retries=0, first_token_deadline=time.monotonic() + 0.5, **REQUEST))
+    assert len(reply.split()) == 40
+    assert time.monotonic() - started >= 1.5
+
+
+def test_no_first_token_within_budget_raises_deadline_exceeded(fake_groq):
+    base_url = fake_groq(ttft_ms=3000)
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        "".join(gateway(base_url, timeout_seconds=5).stream(
+            retries=0, first_token_deadline=time.monotonic() + 0.5, **REQUEST))
+    assert time.monotonic() - started < 2
+
+
+def test_pause_between_chunks_longer_than_timeout_fails_the_stream(fake_groq):
+    base_url = fake_groq(ttft_ms=50, stall_ms=3000, reply_tokens=40)
+    received = []
+    started = time.monotonic()
+    with pytest.raises(Exception):
+        for delta in gateway(base_url, timeout_seconds=0.5).stream(
+                retries=0, first_token_deadline=time.monotonic() + 2, **REQUEST):
+            received.append(delta)
+    assert received and len(received) < 40
+    assert time.monotonic() - started < 2.5
+
+
+def test_astream_first_token_budget_bounds_only_the_first_delta(fake_groq):
+    base_url = fake_groq(ttft_ms=50, stall_ms=1500, reply_tokens=40)
+
+    async def collect():
+        client = gateway(base_url, timeout_seconds=5)
+        deltas = [delta async for delta in client.astream(
+            retries=0, first_token_deadline=time.monotonic() + 0.5, **REQUEST)]
+        await client.aclose()
+        return "".join(deltas)
+
+    assert len(asyncio.run(collect()).split()) == 40
+
+
+def test_astream_no_first_token_within_budget_raises_deadline_exceeded(fake_groq):
+    base_url = fake_groq(ttft_ms=3000)
+
+    async def collect():
+        client = gateway(base_url, timeout_seconds=5)
+        try:
+            return [delta async for delta in client.astream(
+                retries=0, first_token_deadline=time.monotonic() + 0.5, **REQUEST)]
+        finally:
+            await client.aclose()
+
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(collect())
+    assert time.monotonic() - started < 2
+
+
+def test_stream_stalled_past_the_deadline_fails_between_chunks(fake_groq):
+    base_url = fake_groq(ttft_ms=50, stall_ms=1500, reply_tokens=40)
+    received = []
+    with pytest.raises(DeadlineExceeded):
+        for delta in gateway(base_url, timeout_seconds=5).stream(
+                retries=0, deadline=time.monotonic() + 1, **REQUEST):
+            received.append(delta)
+    assert received and len(received) < 40
+
+
+class RecordingStream:
+    """Stands in for the SDK's Stream: one delta, and whether it was closed"""
+
+    def __init__(self):
+        self.closed = False
+
+    def __iter__(self):
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content="Hello", tool_calls=None))])
+
+    def close(self):
+        self.closed = True
+
+
+def test_closing_the_generator_closes_the_upstream_stream():
+    client = gateway("http://127.0.0.1:9", timeout_seconds=5)
+    opened = RecordingStream()
+    client.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=lambda **_: opened)))
+    deltas = client.stream(retries=0, **REQUEST)
+    assert next(deltas) == "Hello"
+    deltas.close()
+    assert opened.closed
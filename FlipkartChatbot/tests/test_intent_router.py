@@ -0,0 +1,66 @@
+# tests/test_intent_router.py
+"""IntentRouter.classify on INTENT_SIGNALS and INTENT_BLOCKERS in English, Hinglish and Devanagari.
+
+Run from the FlipkartChatbot directory with ``python -m pytest tests``.
+"""
+import pytest
+
+from intent_router import CONFIDENCE_THRESHOLD, IntentRouter
+
+router = IntentRouter()
+
+
+@pytest.mark.parametrize("text, intent", [
+    ("What is your return policy?", "return_policy"),
+    ("return policy kya hai", "return_policy"),
+    ("रिटर्न पॉलिसी क्या है?", "return_policy"),
+    ("What payment methods do you accept?", "payment_methods"),
+    ("payment kaise karu", "payment_methods"),
+    ("भुगतान के तरीके बताइए", "payment_methods"),
+    ("Where is my order ORD123?", "order_status"),
+    ("ORD123", "order_status"),
+    ("mera order ORD123 kahan hai", "order_status"),
+    ("TRK98765 kab aayega", "order_status"),
+    ("मेरा ऑर्डर ORD123 कहाँ है?", "order_status"),
+])
+def test_canned_intents_are_confident(text, intent):
+    assert router.classify(text)[0] == intent
+    assert router.classify(text)[1] >= CONFIDENCE_THRESHOLD
+
+
+@pytest.mark.parametrize("text", [
+    # Complaints and trouble go to the model however much they look like a status question
+    "where is my order ORD123, it's late",
+    "Where is my order ORD123? It still hasn't arrived",
+    "ORD123 ka paisa kat gaya but status kya hai",
+    "mera order ORD123 abhi tak nahi aaya, kahan hai",
+    "मेरा ऑर्डर ORD123 अभी तक नहीं आया, कहाँ है?",
+    "I want to return ORD123, what is the return policy?",
+    "return policy kya hai, wapas karna hai",
+    "payment failed, what payment methods do you accept?",
+    "पेमेंट के तरीके बताओ, पैसे कट गया",
+])
+def test_blocked_messages_go_to_the_model(text):
+    intent, confidence = router.classify(text)
+    assert intent is None or confidence < CONFIDENCE_THRESHOLD
+
+
+@pytest.mark.parametrize("text", [
+    "Where are my orders ORD123 and ORD456?",
+    "ORD123 aur TRK98765 kahan hai",
+    "ORD123 और ORD456 कहाँ है?",
+])
+def test_several_order_numbers_are_not_a_status_answer(text):
+    assert router.classify(text)[0] != "order_status"
+
+
+def test_questions_without_an_order_number_are_not_a_status_answer():
+    assert router.classify("where is my order?")[0] is None
+    assert router.classify("when does the sale start?")[0] is None
+
+
+def test_route_counts_the_model_fall_through():
+    counted = IntentRouter()
+    assert counted.route("What is your return policy?").intent == "return_policy"
+    assert counted.route("where is my order ORD123, it's late") is None
+    assert counted.hit_rates() == {"return_policy": 0.5, "llm": 0.5}
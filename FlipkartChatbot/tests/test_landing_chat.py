@@ -0,0 +1,47 @@
+# tests/test_landing_chat.py
+"""The landing page's /chat proxy in front of chat_api.py, with the upstream replaced by an httpx MockTransport.
+
+Run from the FlipkartChatbot directory with ``python -m pytest tests``.
+"""
+import httpx
+
+from chatbot import chat_api_client, create_app
+
+SSE = b'event: token\ndata: {"delta": "Hi"}\n\nevent: done\ndata: {"content": "Hi"}\n\n'
+BODY = b'{"messages": [{"role": "user", "content": "hello"}]}'
+
+
+def landing(handler):
+    client = chat_api_client("http://chat-api", token="secret")
+    client._transport = httpx.MockTransport(handler)
+    return create_app(production=False, chat_client=client).test_client()
+
+
+def test_chat_is_forwarded_with_the_token_and_streamed_back():
+    seen = {}
+
+    def handler(request):
+        seen.update(path=request.url.path, auth=request.headers.get("Authorization"), body=request.content)
+        return httpx.Response(200, content=SSE, headers={"Content-Type": "text/event-stream"})
+
+    response = landing(handler).post("/chat", data=BODY, content_type="application/json")
+    assert response.status_code == 200
+    assert response.data == SSE
+    assert response.headers["Content-Type"].startswith("text/event-stream")
+    assert seen == {"path": "/chat", "auth": "Bearer secret", "body": BODY}
+
+
+def test_api_errors_pass_through_and_an_unreachable_api_is_a_502():
+    busy = landing(lambda request: httpx.Response(409, json={"error": "busy"}))
+    assert busy.post("/chat", data=BODY).status_code == 409
+
+    def refuse(request):
+        raise httpx.ConnectError("connection refused")
+
+    assert landing(refuse).post("/chat", data=BODY).status_code == 502
+
+
+def test_page_posts_to_its_own_origin_without_the_token():
+    page = landing(lambda request: httpx.Response(200)).get("/").get_data(as_text=True)
+    assert 'const CHAT_URL = "/chat";' in page
+    assert "secret" not in page
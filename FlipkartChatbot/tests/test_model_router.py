@@ -0,0 +1,57 @@
+# tests/test_model_router.py
+"""ModelRouter falling back to the other model, and the reply cache skipping stitched replies.
+
+Run from the FlipkartChatbot directory with ``python -m pytest tests``.
+"""
+import asyncio
+
+from model_router import ModelRouter
+from response_cache import ResponseCache
+
+REQUEST = {"model": "small", "messages": [{"role": "user", "content": "where is my order"}]}
+
+
+class BrokenThenFine:
+    """Gateway whose small model breaks after two chunks and whose large model answers"""
+    deadline_seconds = 5
+
+    def __init__(self):
+        self.requests = []
+
+    def _chunks(self, request):
+        self.requests.append(request)
+        if request["model"] == "small":
+            yield "Your order "
+            yield "is "
+            raise ConnectionError("stream reset")
+        yield "out for delivery."
+
+    def stream(self, priority=None, deadline=None, retries=None, first_token_deadline=None, **request):
+        yield from self._chunks(request)
+
+    async def astream(self, priority=None, deadline=None, retries=None, first_token_deadline=None, **request):
+        for chunk in self._chunks(request):
+            yield chunk
+
+
+def router(gateway):
+    return ModelRouter(gateway, "small", "small", "large", {}, enabled=True)
+
+
+def test_stream_broken_partway_is_finished_by_the_other_model_and_not_cached():
+    gateway, cache = BrokenThenFine(), ResponseCache()
+    reply = "".join(cache.stream("key", lambda: router(gateway).stream(0, **REQUEST)))
+    assert reply == "Your order is out for delivery."
+    assert gateway.requests[1]["model"] == "large"
+    assert gateway.requests[1]["messages"][-1] == {"role": "assistant", "content": "Your order is "}
+    assert cache.get("key") is None
+
+
+def test_astream_broken_partway_is_finished_by_the_other_model_and_not_cached():
+    gateway, cache = BrokenThenFine(), ResponseCache()
+
+    async def collect():
+        return "".join([chunk async for chunk in cache.astream("key", lambda: router(gateway).astream(0, **REQUEST))])
+
+    assert asyncio.run(collect()) == "Your order is out for delivery."
+    assert cache.get("key") is None
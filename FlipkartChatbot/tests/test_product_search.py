@@ -0,0 +1,27 @@
+# tests/test_product_search.py
+"""Price ceilings read by product_search.parse_filters.
+
+Run from the FlipkartChatbot directory with ``python -m pytest tests``.
+"""
+import pytest
+
+from product_search import parse_filters
+
+
+@pytest.mark.parametrize("text, max_price", [
+    ("chair under 1000", 1000.0),
+    ("chair under rs 1,500", 1500.0),
+    ("smartwatch under 1,000", 1000.0),
+    ("laptop below ₹1,50,000", 150000.0),
+    ("tv within 12,345 rupees", 12345.0),
+    ("phone under 50k", 50000.0),
+    ("earphones under 2.5K", 2500.0),
+    ("budget is 999.50", 999.5),
+    ("joote 2,000 tak", 2000.0),
+    ("500/- se kam wala bag", 500.0),
+    ("where is ORD12345 tak", None),
+    ("phone under 128gb", None),
+    ("phone under 1,5 lakh", None),
+])
+def test_price_ceiling(text, max_price):
+    assert parse_filters(text).get('max_price') == max_price
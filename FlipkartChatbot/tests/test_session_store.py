@@ -0,0 +1,121 @@
+# tests/test_session_store.py
+"""Worker processes answering one conversation through SQLiteSessionStore, including one killed mid-turn.
+
+Run from the FlipkartChatbot directory with ``python -m pytest tests``.
+"""
+import multiprocessing
+import os
+import signal
+import time
+
+import pytest
+
+from session_store import SQLiteSessionStore, SessionStore
+
+TURNS = 100
+SESSION_ID = "shared"
+# Short enough for the test to wait out, long enough to still be live right after the kill
+LEASE_SECONDS = 2
+
+
+def answer_turns(db_path, owner, start):
+    """Claim the session for each turn with its message, then release it with the reply, as a worker does"""
+    store = SQLiteSessionStore(db_path)
+    start.wait()
+    for turn in range(TURNS):
+        question = {"role": "user", "content": f"{owner} question {turn}"}
+        while store.claim(SESSION_ID, owner, lease_seconds=30, change=lambda s: s.messages.append(question)) is None:
+            pass
+        released = store.release(SESSION_ID, owner,
+                                 lambda s: s.messages.append({"role": "assistant", "content": f"{owner} answer {turn}"}))
+        assert released is not None
+
+
+def test_concurrent_claims_lose_no_updates(tmp_path):
+    db_path = str(tmp_path / "sessions.db")
+    SQLiteSessionStore(db_path)
+    context = multiprocessing.get_context("spawn")
+    start = context.Event()
+    workers = [context.Process(target=answer_turns, args=(db_path, owner, start)) for owner in ("a", "b")]
+    for worker in workers:
+        worker.start()
+    start.set()
+    for worker in workers:
+        worker.join(timeout=120)
+    assert [worker.exitcode for worker in workers] == [0, 0]
+
+    session = SQLiteSessionStore(db_path).get(SESSION_ID)
+    contents = [message["content"] for message in session.messages]
+    assert len(contents) == 2 * 2 * TURNS
+    # Every turn is there, and each answer directly follows its own question: no claim overlapped another
+    for question, answer in zip(contents[::2], contents[1::2]):
+        owner, _, turn = question.split()
+        assert answer == f"{owner} answer {turn}"
+    for owner in ("a", "b"):
+        assert [c for c in contents if c.startswith(f"{owner} question")] == \
+            [f"{owner} question {turn}" for turn in range(TURNS)]
+    assert not session.processing
+    assert session.version == 2 * 2 * TURNS
+
+
+def claim_and_hang(db_path, claimed):
+    """Claim the session with the user's message, then stall mid-reply until killed"""
+    store = SQLiteSessionStore(db_path)
+    question = {"role": "user", "content": "where is ORD12345"}
+    assert store.claim(SESSION_ID, "a", LEASE_SECONDS, change=lambda s: s.messages.append(question)) is not None
+    claimed.set()
+    time.sleep(60)
+
+
+def answer_waiting_turn(db_path):
+    """Pick up the unanswered message as a worker opening the session does"""
+    store = SQLiteSessionStore(db_path)
+    assert store.get(SESSION_ID).awaiting_reply
+    assert store.claim(SESSION_ID, "b", LEASE_SECONDS) is not None
+    assert store.release(SESSION_ID, "b",
+                         lambda s: s.messages.append({"role": "assistant", "content": "b answer"})) is not None
+
+
+@pytest.mark.skipif(not hasattr(signal, "SIGKILL"), reason="needs SIGKILL")
+def test_killed_worker_lease_expires_and_turn_is_answered_once(tmp_path):
+    db_path = str(tmp_path / "sessions.db")
+    store = SQLiteSessionStore(db_path)
+    context = multiprocessing.get_context("spawn")
+    claimed = context.Event()
+    worker = context.Process(target=claim_and_hang, args=(db_path, claimed))
+    worker.start()
+    assert claimed.wait(timeout=60)
+    os.kill(worker.pid, signal.SIGKILL)
+    worker.join(timeout=10)
+    assert worker.exitcode == -signal.SIGKILL
+
+    # The dead worker's lease still blocks others until it runs out
+    session = store.get(SESSION_ID)
+    assert session.processing and session.processing_owner == "a"
+    assert store.claim(SESSION_ID, "b", LEASE_SECONDS) is None
+    deadline = time.monotonic() + LEASE_SECONDS + 5
+    while not store.get(SESSION_ID).awaiting_reply:
+        assert time.monotonic() < deadline, "lease of the killed worker never expired"
+        time.sleep(0.1)
+
+    survivor = context.Process(target=answer_waiting_turn, args=(db_path,))
+    survivor.start()
+    survivor.join(timeout=60)
+    assert survivor.exitcode == 0
+    # A late release under the dead worker's name changes nothing
+    assert store.release(SESSION_ID, "a", lambda s: s.messages.append({"role": "assistant", "content": "a"})) is None
+
+    session = store.get(SESSION_ID)
+    assert [m["content"] for m in session.messages] == ["where is ORD12345", "b answer"]
+    assert not session.processing and not session.awaiting_reply
+    # One save each: a's claim, b's claim, b's release
+    assert session.version == 3
+
+
+def test_backend_must_implement_storage():
+    class Incomplete(SessionStore):
+        def get(self, session_id):
+            return None
+
+    with pytest.raises(TypeError):
+        Incomplete()
@@ -0,0 +1,36 @@
+# tests/test_speculation.py
+"""SpeculationEngine answers against benchmarks.fake_groq, and what they add to the pipeline's stats.
+
+Run from the FlipkartChatbot directory with ``python -m pytest tests``.
+"""
+import time
+
+from analytics import Analytics
+from chat_pipeline import ChatPipeline
+from conversation_memory import ConversationSummary
+from groq_client import GroqGateway
+from speculation import SpeculationEngine
+
+MESSAGES = [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "Hello! How can I help?"}]
+PROMPTS = ["Can you compare the warranty on your smartwatches and headphones for me?",
+           "Which of your backpacks would suit a long trip with a laptop inside?"]
+
+
+def test_speculations_count_as_turns_only_when_taken(fake_groq):
+    gateway = GroqGateway("test", 1000, 1_000_000, base_url=fake_groq(ttft_ms=10, reply_tokens=10))
+    pipeline = ChatPipeline.from_data_files(gateway, poll_seconds=0, tracking=None, analytics=Analytics(None))
+    engine = SpeculationEngine(pipeline)
+    try:
+        engine.speculate("s", MESSAGES, ConversationSummary(), PROMPTS)
+        deadline = time.monotonic() + 10
+        while engine.metrics["done"] < len(PROMPTS) and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert engine.metrics["done"] == len(PROMPTS)
+        assert pipeline.intent_router.total == 0
+
+        turn = engine.take("s", MESSAGES + [{"role": "user", "content": PROMPTS[0]}])
+        assert turn is not None and "".join(turn.chunks)
+        assert pipeline.intent_router.total == 1
+        assert pipeline.intent_router.counts["llm"] == 1
+    finally:
+        pipeline.data.stop()
@@ -0,0 +1,93 @@
+# tests/test_tools.py
+"""Tool argument checking in tools.py and ChatTools.run's answers, errors and per-turn cache.
+
+Run from the FlipkartChatbot directory with ``python -m pytest tests``.
+"""
+import json
+import os
+
+import pytest
+
+from data_layer import DataLayer
+from tools import ChatTools, ToolError, validate_arguments
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+
+@pytest.fixture(scope="module")
+def data():
+    layer = DataLayer(os.path.join(DATA_DIR, "products.json"), os.path.join(DATA_DIR, "orders.json"), poll_seconds=0)
+    return layer.snapshot
+
+
+def call(call_id, name, **arguments):
+    return {"id": call_id, "name": name, "arguments": json.dumps(arguments)}
+
+
+def test_numbers_and_booleans_sent_as_strings_are_converted():
+    checked = validate_arguments("search_products", {"query": "phone", "max_price": "500", "in_stock": "True",
+                                                     "min_rating": 4, "category": None})
+    assert checked == {"query": "phone", "max_price": 500.0, "in_stock": True, "min_rating": 4}
+    assert validate_arguments("lookup_order", {"order_id": 12345}) == {"order_id": "12345"}
+
+
+@pytest.mark.parametrize("tool, arguments, error", [
+    ("search_products", {"query": "phone", "max_price": "cheap"}, "max_price must be a number"),
+    ("search_products", {"query": "phone", "in_stock": "yes"}, "in_stock must be a boolean"),
+    ("search_products", {"query": "phone", "max_price": True}, "max_price must be a number"),
+    ("lookup_order", {"order_id": ["ORD123"]}, "order_id must be a string"),
+    ("lookup_order", {"orderid": "ORD123"}, "unknown argument 'orderid'"),
+    ("search_products", {"max_price": 500}, "missing required argument query"),
+])
+def test_bad_arguments_are_refused(tool, arguments, error):
+    with pytest.raises(ToolError, match=error):
+        validate_arguments(tool, arguments)
+
+
+def test_tools_without_a_schema_take_their_arguments_as_given():
+    assert validate_arguments("loyalty_points", {"customer": 7}) == {"customer": 7}
+
+
+def test_errors_come_back_to_the_model(data):
+    tools = ChatTools()
+    messages = tools.run([
+        call("1", "refund_now", order_id="ORD123"),
+        call("2", "search_products", query="phone", max_price="cheap"),
+        {"id": "3", "name": "lookup_order", "arguments": "{not json"},
+    ], {}, data)
+    errors = [json.loads(m["content"])["error"] for m in messages]
+    assert errors == ["unknown tool 'refund_now'", "max_price must be a number, not \"cheap\"",
+                      "arguments are not valid JSON"]
+    assert [m["tool_call_id"] for m in messages] == ["1", "2", "3"]
+    assert tools.stats()["errors"] == 3 and tools.stats()["unknown"] == 1
+
+
+def test_a_repeated_call_in_a_turn_is_answered_from_the_cache(data):
+    tools = ChatTools()
+    answered = []
+
+    def check_stock(data, product_id=None, name=None):
+        answered.append(product_id)
+        return {"products": [{"id": product_id, "in_stock": True}]}
+
+    tools.register("check_stock", check_stock)
+    cache = {}
+    first = tools.run([call("1", "check_stock", product_id="PROD001")], cache, data)
+    # Same arguments in another order, twice in the next round
+    again = tools.run([{"id": "2", "name": "check_stock", "arguments": '{ "product_id": "PROD001" }'},
+                       call("3", "check_stock", product_id="PROD001")], cache, data)
+    assert answered == ["PROD001"]
+    assert [m["content"] for m in again] == [first[0]["content"]] * 2
+    assert tools.stats()["calls"] == 3 and tools.stats()["cache_hits"] == 2
+
+    # Another turn starts with an empty cache
+    tools.run([call("4", "check_stock", product_id="PROD001")], {}, data)
+    assert answered == ["PROD001", "PROD001"]
+
+
+def test_local_tools_answer_from_the_snapshot(data):
+    messages = ChatTools().run([call("1", "check_stock", product_id="prod001"),
+                                call("2", "lookup_order", order_id="ORD000000")], {}, data)
+    stock, order = (json.loads(m["content"]) for m in messages)
+    assert [p["id"] for p in stock["products"]] == ["PROD001"]
+    assert order == {"orders": [], "order_id": "ORD000000"}
@@ -0,0 +1,34 @@
+# tests/test_tracking_events.py
+"""TrackingService's background tail keeps going after a poll fails.
+
+Run from the FlipkartChatbot directory with ``python -m pytest tests``.
+"""
+import os
+import threading
+
+from data_layer import DataLayer
+from tracking_events import TrackingService
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+
+def test_a_failed_poll_does_not_stop_tailing(tmp_path):
+    data = DataLayer(os.path.join(DATA_DIR, "products.json"), os.path.join(DATA_DIR, "orders.json"), poll_seconds=0)
+    tracking = TrackingService(str(tmp_path / "tracking.jsonl"), data, poll_seconds=0.01)
+    polls = []
+    polled_again = threading.Event()
+
+    def catch_up():
+        polls.append(1)
+        if len(polls) == 1:
+            raise OSError("log briefly unreadable")
+        polled_again.set()
+        return 0
+
+    tracking.catch_up = catch_up
+    tracking.start()
+    try:
+        assert polled_again.wait(5)
+    finally:
+        tracking.stop()
+    assert tracking.metrics["poll_errors"] == 1
@@ -0,0 +1,42 @@
+# tests/test_voice.py
+"""Sentence synthesis in voice.py with a failing synthesizer, and how espeak is given the text.
+
+Run from the FlipkartChatbot directory with ``python -m pytest tests``.
+"""
+import subprocess
+import time
+
+import voice
+from voice import AudioCache, EspeakSynthesizer, Voice
+
+
+class FailingOnDiscounts:
+    name = "test"
+
+    def synthesize(self, text, language):
+        if "%" in text:
+            raise subprocess.CalledProcessError(1, "espeak-ng")
+        return text.encode("utf-8")
+
+
+def test_a_failed_sentence_comes_back_without_audio_and_the_rest_is_spoken():
+    speaker = Voice(None, FailingOnDiscounts(), AudioCache()).speaker("en")
+    speaker.feed("Your order shipped. -10% off your next one. ")
+    speaker.close()
+    deadline = time.monotonic() + 5
+    while not all(future.done() for _, _, future in speaker.pending) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    audio = [audio for _, _, audio in speaker.ready()]
+    assert audio == [b"Your order shipped.", None]
+    assert speaker.voice.metrics["synthesis_errors"] == 1
+
+
+def test_espeak_reads_the_text_from_stdin(monkeypatch):
+    calls = []
+    monkeypatch.setattr(voice.shutil, "which", lambda name: "/usr/bin/espeak-ng")
+    monkeypatch.setattr(voice.subprocess, "run", lambda args, **kwargs: calls.append((args, kwargs)) or
+                        subprocess.CompletedProcess(args, 0, stdout=b"RIFF"))
+    assert EspeakSynthesizer({"en": "en"}).synthesize("-w /tmp/out.wav", "en") == b"RIFF"
+    args, kwargs = calls[0]
+    assert "--stdin" in args and "-w /tmp/out.wav" not in args
+    assert kwargs["input"] == "-w /tmp/out.wav".encode("utf-8")
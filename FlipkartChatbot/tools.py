@@ -0,0 +1,285 @@
+# tools.py
+"""Tools the model can call instead of receiving data in the prompt.
+
+``TOOL_SCHEMAS`` is sent with the chat request; ``ChatTools`` answers the
+calls from the order store and product index of the turn's DataSnapshot.
+A real backend can be plugged in by registering a handler under the same
+name.
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Records returned by a single tool call
+MAX_TOOL_RESULTS = 5
+
+TOOL_SCHEMAS = [
+    {"type": "function", "function": {
+        "name": "lookup_order",
+        "description": "Get full order details (items, amounts, status, address, tracking) by order ID, "
+                       "or every order of a customer by email.",
+        "parameters": {"type": "object", "properties": {
+            "order_id": {"type": "string", "description": "Order ID such as ORD12345"},
+            "email": {"type": "string", "description": "Customer email address"},
+        }},
+    }},
+    {"type": "function", "function": {
+        "name": "track_shipment",
+        "description": "Get the delivery status and tracking timeline of a shipment by tracking number or order ID.",
+        "parameters": {"type": "object", "properties": {
+            "tracking_number": {"type": "string", "description": "Tracking number such as TRK123456"},
+            "order_id": {"type": "string", "description": "Order ID such as ORD12345"},
+        }},
+    }},
+    {"type": "function", "function": {
+        "name": "search_products",
+        "description": "Search the product catalog. Returns the best matches with price, rating, reviews, "
+                       "stock and features.",
+        "parameters": {"type": "object", "properties": {
+            "query": {"type": "string", "description": "What the customer is looking for"},
+            "category": {"type": "string"},
+            "max_price": {"type": "number"},
+            "min_rating": {"type": "number"},
+            "in_stock": {"type": "boolean"},
+        }, "required": ["query"]},
+    }},
+    {"type": "function", "function": {
+        "name": "check_stock",
+        "description": "Check whether a product is in stock, by product ID or product name.",
+        "parameters": {"type": "object", "properties": {
+            "product_id": {"type": "string", "description": "Product ID such as PROD001"},
+            "name": {"type": "string", "description": "Product name"},
+        }},
+    }},
+]
+
+
+PARAMETERS = {schema["function"]["name"]: schema["function"]["parameters"] for schema in TOOL_SCHEMAS}
+BOOLEAN_STRINGS = {"true": True, "false": False}
+
+
+class ToolCalls(list):
+    """Tool calls a completion asked for, as dicts with ``id``, ``name`` and ``arguments`` (a JSON string)"""
+
+
+class ToolError(Exception):
+    """A tool was called with arguments it can't answer; reported back to the model"""
+
+
+def _json(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+def _upper(value):
+    return value.strip().upper() if isinstance(value, str) and value.strip() else None
+
+
+def _cache_key(call):
+    try:
+        arguments = json.dumps(json.loads(call["arguments"] or "{}"), sort_keys=True)
+    except ValueError:
+        arguments = call["arguments"]
+    return call["name"], arguments
+
+
+def _coerce(name, value, expected):
+    """``value`` as the JSON schema type ``expected``; models send "500" for 500 often enough to accept it"""
+    if expected == "string":
+        if isinstance(value, str):
+            return value
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return str(value)
+    elif expected == "number":
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return value
+        if isinstance(value, str):
+            try:
+                return float(value.strip())
+            except ValueError:
+                pass
+    elif expected == "boolean":
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, str) and value.strip().lower() in BOOLEAN_STRINGS:
+            return BOOLEAN_STRINGS[value.strip().lower()]
+    else:
+        return value
+    raise ToolError(f"{name} must be a {expected}, not {_json(value)}")
+
+
+def validate_arguments(tool, arguments):
+    """Arguments checked against (and coerced to) the tool's parameter schema; raises ToolError"""
+    parameters = PARAMETERS.get(tool)
+    if parameters is None:
+        # A registered tool without a schema here takes what it is given
+        return arguments
+    properties = parameters.get("properties", {})
+    checked = {}
+    for name, value in arguments.items():
+        if name not in properties:
+            raise ToolError(f"unknown argument {name!r}; expected {', '.join(properties)}")
+        # Models pass null for arguments they mean to leave out
+        if value is not None:
+            checked[name] = _coerce(name, value, properties[name].get("type"))
+    missing = [name for name in parameters.get("required", ()) if name not in checked]
+    if missing:
+        raise ToolError(f"missing required argument {', '.join(missing)}")
+    return checked
+
+
+def tool_call_message(calls, content=None):
+    """The assistant message that records ``calls`` in the conversation"""
+    return {"role": "assistant", "content": content or None, "tool_calls": [
+        {"id": call["id"], "type": "function", "function": {"name": call["name"], "arguments": call["arguments"]}}
+        for call in calls]}
+
+
+def lookup_order(data, order_id=None, email=None):
+    if _upper(order_id):
+        order = data.order_store.get(_upper(order_id))
+        return {"orders": [order.to_dict()] if order else [], "order_id": _upper(order_id)}
+    if email and email.strip():
+        orders = data.order_store.by_email(email.strip())
+        return {"orders": [o.to_dict() for o in orders[:MAX_TOOL_RESULTS]], "total_orders": len(orders)}
+    raise ToolError("pass order_id or email")
+
+
+def track_shipment(data, tracking_number=None, order_id=None):
+    if _upper(tracking_number):
+        order = data.order_store.by_tracking_number(_upper(tracking_number))
+    elif _upper(order_id):
+        order = data.order_store.get(_upper(order_id))
+    else:
+        raise ToolError("pass tracking_number or order_id")
+    if order is None:
+        return {"found": False}
+    events = [dict(zip(order.TRACKING_FIELDS, event)) for event in order.tracking_status]
+    return {
+        "found": True,
+        "order_id": order.order_id,
+        "tracking_number": order.tracking_number,
+        "status": order.status,
+        "last_location": events[-1]["location"] if events else None,
+        "estimated_delivery": order.estimated_delivery,
+        "delivery_date": order.delivery_date,
+        "events": events,
+    }
+
+
+def search_products(data, query="", category=None, max_price=None, min_rating=None, in_stock=None):
+    index = data.product_index
+    if category and category.lower() not in {c.lower() for c in index.categories}:
+        category = None
+    hits = index.search(query or "", k=MAX_TOOL_RESULTS, category=category, in_stock=in_stock,
+                        max_price=max_price, min_rating=min_rating)
+    return {"products": [product for product, _ in hits]}
+
+
+def check_stock(data, product_id=None, name=None):
+    if _upper(product_id):
+        product = data.product_index.get(_upper(product_id))
+        products = [product] if product else []
+    elif name and name.strip():
+        products = [product for product, _ in data.product_index.search(name, k=3)]
+    else:
+        raise ToolError("pass product_id or name")
+    return {"products": [{"id": p["id"], "name": p.get("name"), "in_stock": bool(p.get("in_stock")),
+                          "price": p.get("price")} for p in products]}
+
+
+class ChatTools:
+    """Runs the tools in TOOL_SCHEMAS.
+
+    Handlers are called as ``handler(data, **arguments)`` where ``data`` is
+    the DataSnapshot the turn started with. ``run`` executes the calls of
+    one model round concurrently and answers repeats from ``cache``, a dict
+    the caller keeps for the duration of a turn. Handlers return
+    JSON-serializable values. Arguments are checked against the tool's
+    schema in TOOL_SCHEMAS first (numbers and booleans sent as strings are
+    converted); bad arguments, unknown tools and handlers that raise come
+    back to the model as ``{"error": ...}``.
+    """
+
+    def __init__(self, executor=None):
+        self.executor = executor or ThreadPoolExecutor(max_workers=8, thread_name_prefix="tool")
+        self.handlers = {
+            "lookup_order": lookup_order,
+            "track_shipment": track_shipment,
+            "search_products": search_products,
+            "check_stock": check_stock,
+        }
+        self.metrics = Counter()
+        self._lock = threading.Lock()
+
+    def register(self, name, handler):
+        """Answer ``name`` with ``handler(data, **arguments)`` instead of the local implementation"""
+        self.handlers[name] = handler
+
+    def call(self, name, arguments, data):
+        """Run one tool against ``data`` and return its result as a JSON string"""
+        handler = self.handlers.get(name)
+        try:
+            if handler is None:
+                raise ToolError(f"unknown tool {name!r}")
+            try:
+                kwargs = json.loads(arguments) if arguments else {}
+            except ValueError:
+                raise ToolError("arguments are not valid JSON")
+            if not isinstance(kwargs, dict):
+                raise ToolError("arguments must be a JSON object")
+            result = handler(data, **validate_arguments(name, kwargs))
+        except ToolError as e:
+            self._count('errors')
+            result = {"error": str(e)}
+        except Exception as e:
+            # A failing tool costs the model one answer, not the customer the whole turn
+            logger.exception("tool %s failed", name)
+            self._count('errors')
+            result = {"error": f"{name} failed: {type(e).__name__}"}
+        self._count(name if handler is not None else 'unknown')
+        return _json(result)
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.metrics[name] += amount
+
+    def _plan(self, calls, cache):
+        """Cache keys per call, and the distinct ones that still have to run"""
+        keys = [_cache_key(call) for call in calls]
+        pending = [key for key in dict.fromkeys(keys) if key not in cache]
+        self._count('calls', len(calls))
+        self._count('cache_hits', len(calls) - len(pending))
+        return keys, pending
+
+    @staticmethod
+    def _messages(calls, keys, cache):
+        return [{"role": "tool", "tool_call_id": call["id"], "name": call["name"], "content": cache[key]}
+                for call, key in zip(calls, keys)]
+
+    def run(self, calls, cache, data):
+        """Tool result messages for ``calls``, in order"""
+        keys, pending = self._plan(calls, cache)
+        if len(pending) == 1:
+            cache[pending[0]] = self.call(*pending[0], data)
+        else:
+            for key, result in zip(pending, self.executor.map(lambda key: self.call(*key, data), pending)):
+                cache[key] = result
+        return self._messages(calls, keys, cache)
+
+    async def arun(self, calls, cache, data):
+        """``run`` for event-loop callers; handlers run on the executor"""
+        keys, pending = self._plan(calls, cache)
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(*(loop.run_in_executor(self.executor, self.call, *key, data)
+                                         for key in pending))
+        cache.update(zip(pending, results))
+        return self._messages(calls, keys, cache)
+
+    def stats(self):
+        with self._lock:
+            return dict(self.metrics)
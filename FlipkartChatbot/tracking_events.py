@@ -0,0 +1,354 @@
+# tracking_events.py
+"""Carrier scan events in an append-only log, with materialized per-order views.
+
+Every scan is one JSON line in the log:
+
+    {"tracking_number": "TRK789456124", "status": "Out for Delivery", "at": "2024-01-24T08:10:00",
+     "location": "Bangalore Local", "eta": "2024-01-24"}
+
+(``order_id`` may be given instead of ``tracking_number``; ``eta`` is
+optional.) ``TrackingService.ingest`` validates a batch and appends it
+with a single write. Views are only ever built from the log: the service
+tails it, so scans appended by other processes are picked up too.
+
+An order's view combines its record in the current data snapshot (its
+``tracking_status`` in orders.json, or a delta) with its scans from the
+log. The two are kept apart: when a delta or a reload replaces the
+record, the view is rebuilt from the new record and the same scans the
+next time it is read. Scans for orders that don't exist yet are counted
+as unmatched (a replay after the order arrives picks them up).
+
+Rebuild all views from the log and report throughput with:
+
+    python tracking_events.py --replay
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from datetime import date
+
+from tools import ToolError
+
+logger = logging.getLogger(__name__)
+
+# Timeline entries kept per view (newest last)
+MAX_RECENT_EVENTS = 6
+# Lines parsed per batch while catching up with the log
+REPLAY_BATCH_LINES = 10_000
+# Statuses before the parcel leaves the warehouse; transit days count from the first scan after them
+PRE_SHIPMENT_STATUSES = {"order placed", "processing", "confirmed", "packed"}
+
+_decode = json.JSONDecoder().decode
+
+
+class InvalidEvent(ValueError):
+    """A scan event that can't be logged"""
+
+
+def _is_delivered(status):
+    return status.lower().startswith("delivered")
+
+
+def normalize_event(event):
+    """Validated, compact copy of one scan event"""
+    if not isinstance(event, dict):
+        raise InvalidEvent("event must be a JSON object")
+    key = {k: str(event[k]).strip().upper() for k in ("order_id", "tracking_number") if event.get(k)}
+    if not key:
+        raise InvalidEvent("event needs order_id or tracking_number")
+    status, at = event.get("status"), event.get("at")
+    if not isinstance(status, str) or not status.strip():
+        raise InvalidEvent("event needs a status")
+    if not isinstance(at, str):
+        raise InvalidEvent("event needs an ISO date/time in 'at'")
+    try:
+        date.fromisoformat(at[:10])
+    except ValueError:
+        raise InvalidEvent(f"bad 'at' value {at!r}")
+    normalized = dict(key, status=status.strip(), at=at, location=str(event.get("location") or ""))
+    if event.get("eta"):
+        normalized["eta"] = str(event["eta"])
+    return normalized
+
+
+class TrackingView:
+    """Current tracking state of one order; replaced, never mutated, when a scan arrives"""
+
+    __slots__ = ('order_id', 'tracking_number', 'status', 'last_location', 'last_event_at', 'shipped_at', 'eta',
+                 'delivered_at', 'event_count', 'recent')
+
+    def __init__(self, order_id, tracking_number, status=None, last_location=None, last_event_at=None,
+                 shipped_at=None, eta=None, delivered_at=None, event_count=0, recent=()):
+        self.order_id = order_id
+        self.tracking_number = tracking_number
+        self.status = status
+        self.last_location = last_location
+        self.last_event_at = last_event_at
+        self.shipped_at = shipped_at
+        self.eta = eta
+        self.delivered_at = delivered_at
+        self.event_count = event_count
+        self.recent = recent
+
+    @classmethod
+    def from_order(cls, order):
+        """View of an OrderRecord's own tracking history"""
+        view = cls(order.order_id, order.tracking_number, order.status, eta=order.estimated_delivery,
+                   delivered_at=order.delivery_date)
+        for status, at, location in order.tracking_status:
+            view = view.advanced(status, at or '', location)
+        # orders.json's status wins over its own timeline when the two disagree
+        view.status = order.status or view.status
+        return view
+
+    def merged(self, scans):
+        """This view (an order's own history) after the scans in ``scans``, a view built from log scans alone"""
+        view = self
+        for status, at, location in scans.recent:
+            view = view.advanced(status, at, location)
+        # Scans older than the ones ``scans`` still lists only count towards these
+        shipped_at = min(filter(None, (view.shipped_at, scans.shipped_at)), default=None)
+        return TrackingView(view.order_id, view.tracking_number, view.status, view.last_location,
+                            view.last_event_at, shipped_at, scans.eta or view.eta,
+                            view.delivered_at or scans.delivered_at,
+                            view.event_count + scans.event_count - len(scans.recent), view.recent)
+
+    def advanced(self, status, at, location, eta=None):
+        """The view after one more scan; ``self`` if the scan is a duplicate"""
+        event = (status, at, location)
+        if event in self.recent:
+            return self
+        latest = self.last_event_at is None or at >= self.last_event_at
+        shipped_at = self.shipped_at
+        if (shipped_at is None or at < shipped_at) and status.lower() not in PRE_SHIPMENT_STATUSES:
+            shipped_at = at
+        if latest:
+            recent = (self.recent + (event,))[-MAX_RECENT_EVENTS:]
+        else:
+            recent = tuple(sorted(self.recent + (event,), key=lambda e: e[1]))[-MAX_RECENT_EVENTS:]
+        return TrackingView(
+            self.order_id, self.tracking_number,
+            status=status if latest else self.status,
+            last_location=location if latest else self.last_location,
+            last_event_at=at if latest else self.last_event_at,
+            shipped_at=shipped_at,
+            eta=eta or self.eta,
+            delivered_at=at[:10] if not self.delivered_at and _is_delivered(status) else self.delivered_at,
+            event_count=self.event_count + 1,
+            recent=recent,
+        )
+
+    def days_in_transit(self, today=None):
+        """Days from the first post-warehouse scan to delivery (or today); None before shipping"""
+        if not self.shipped_at:
+            return None
+        end = date.fromisoformat(self.delivered_at[:10]) if self.delivered_at else (today or date.today())
+        return max(0, (end - date.fromisoformat(self.shipped_at[:10])).days)
+
+    def to_dict(self):
+        return {
+            "order_id": self.order_id,
+            "tracking_number": self.tracking_number,
+            "status": self.status,
+            "last_location": self.last_location,
+            "last_event_at": self.last_event_at,
+            "estimated_delivery": self.eta,
+            "delivery_date": self.delivered_at,
+            "days_in_transit": self.days_in_transit(),
+            "events": [{"status": s, "date": at, "location": loc} for s, at, loc in self.recent],
+        }
+
+
+class TrackingService:
+    """Tracking log plus the per-order views derived from it.
+
+    ``data`` is the DataLayer whose orders seed the views. Lookups are
+    dict hits on the current views; ``catch_up`` (called after every
+    ingest, and every ``poll_seconds`` once started) applies log lines
+    appended since the last read.
+    """
+
+    def __init__(self, log_path, data, poll_seconds=1.0, fsync=False):
+        self.log_path = log_path
+        self.data = data
+        self.poll_seconds = poll_seconds
+        self.fsync = fsync
+        self.metrics = Counter()
+        # order_id -> TrackingView of the order's log scans alone
+        self._scans = {}
+        # order_id -> (OrderRecord, scans view, combined view), valid while both are still current
+        self._views = {}
+        self._offset = 0
+        self._write_lock = threading.Lock()
+        self._apply_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.catch_up()
+
+    # --- reads ---
+
+    @staticmethod
+    def _find(order_store, order_id=None, tracking_number=None):
+        if order_id:
+            return order_store.get(order_id)
+        return order_store.by_tracking_number(tracking_number) if tracking_number else None
+
+    def view_of(self, order):
+        """Current TrackingView of an OrderRecord from the current snapshot"""
+        scans = self._scans.get(order.order_id)
+        cached = self._views.get(order.order_id)
+        if cached is not None and cached[0] is order and cached[1] is scans:
+            return cached[2]
+        view = TrackingView.from_order(order)
+        if scans is not None:
+            view = view.merged(scans)
+        # Views are immutable; a racing reader at worst builds the same one twice
+        self._views[order.order_id] = (order, scans, view)
+        return view
+
+    def scanned_view(self, order):
+        """TrackingView of ``order`` if the log has scans for it, else None (its record says it all)"""
+        return self.view_of(order) if order.order_id in self._scans else None
+
+    def view(self, order_id=None, tracking_number=None, order_store=None):
+        """Current TrackingView of an order, or None if the order is unknown"""
+        store = order_store if order_store is not None else self.data.snapshot.order_store
+        order = self._find(store, order_id, tracking_number)
+        return None if order is None else self.view_of(order)
+
+    def track_shipment(self, data, tracking_number=None, order_id=None):
+        """``track_shipment`` tool handler answering from the views"""
+        tracking_number = tracking_number.strip().upper() if tracking_number and tracking_number.strip() else None
+        order_id = order_id.strip().upper() if order_id and order_id.strip() else None
+        if not tracking_number and not order_id:
+            raise ToolError("pass tracking_number or order_id")
+        view = self.view(order_id, tracking_number, data.order_store)
+        return {"found": False} if view is None else dict(view.to_dict(), found=True)
+
+    # --- writes ---
+
+    def ingest(self, events):
+        """Validate and append a batch of scan events; returns (accepted, errors)"""
+        lines, errors = [], []
+        for i, event in enumerate(events):
+            try:
+                lines.append(json.dumps(normalize_event(event), ensure_ascii=False, separators=(',', ':')))
+            except InvalidEvent as e:
+                errors.append({"index": i, "error": str(e)})
+        if lines:
+            payload = ("\n".join(lines) + "\n").encode("utf-8")
+            with self._write_lock:
+                fd = os.open(self.log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    os.write(fd, payload)
+                    if self.fsync:
+                        os.fsync(fd)
+                finally:
+                    os.close(fd)
+            self.metrics['ingested'] += len(lines)
+            self.metrics['ingest_batches'] += 1
+        self.metrics['rejected'] += len(errors)
+        self.catch_up()
+        return len(lines), errors
+
+    def _apply(self, event, order_store):
+        order = self._find(order_store, event.get("order_id"), event.get("tracking_number"))
+        if order is None:
+            self.metrics['unmatched'] += 1
+            return
+        scans = self._scans.get(order.order_id) or TrackingView(order.order_id, order.tracking_number)
+        updated = scans.advanced(event["status"], event["at"], event["location"], event.get("eta"))
+        if updated is scans:
+            self.metrics['duplicates'] += 1
+            return
+        self._scans[order.order_id] = updated
+        self.metrics['applied'] += 1
+
+    def catch_up(self):
+        """Apply complete log lines appended since the last read; returns how many were read"""
+        with self._apply_lock:
+            try:
+                with open(self.log_path, "rb") as f:
+                    f.seek(self._offset)
+                    count = 0
+                    order_store = self.data.snapshot.order_store
+                    while True:
+                        lines = f.readlines(REPLAY_BATCH_LINES * 128)
+                        if not lines:
+                            break
+                        if not lines[-1].endswith(b"\n"):
+                            # A batch still being written; read it next time
+                            lines.pop()
+                            f.seek(self._offset + sum(len(line) for line in lines))
+                            if not lines:
+                                break
+                        for line in lines:
+                            try:
+                                self._apply(_decode(line.decode("utf-8")), order_store)
+                            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                                self.metrics['bad_lines'] += 1
+                                logger.warning("skipping tracking log line: %s", e)
+                        self._offset += sum(len(line) for line in lines)
+                        count += len(lines)
+            except FileNotFoundError:
+                return 0
+            return count
+
+    def replay(self):
+        """Drop every view and rebuild them from the whole log; returns (events, seconds)"""
+        started = time.perf_counter()
+        with self._apply_lock:
+            self._scans = {}
+            self._views = {}
+            self._offset = 0
+            for name in ('applied', 'duplicates', 'unmatched', 'bad_lines'):
+                self.metrics.pop(name, None)
+        events = self.catch_up()
+        return events, time.perf_counter() - started
+
+    def _poll(self):
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                self.catch_up()
+            except Exception:
+                # One bad poll (say the log is briefly unreadable) must not end tailing for the process
+                self.metrics['poll_errors'] += 1
+                logger.exception("tracking log poll failed")
+
+    def start(self):
+        """Tail the log on a background thread (no-op if ``poll_seconds`` is 0)"""
+        if self.poll_seconds > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._poll, name="tracking-log", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self):
+        return dict(self.metrics, views=len(self._views), scanned_orders=len(self._scans), log_bytes=self._offset)
+
+
+if __name__ == "__main__":
+    from chat_pipeline import PRODUCTS_PATH, ORDERS_PATH, TRACKING_LOG
+    from data_layer import DataLayer
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--replay", action="store_true", help="rebuild the views from the log")
+    parser.add_argument("--log", default=TRACKING_LOG)
+    parser.add_argument("--orders", default=ORDERS_PATH)
+    parser.add_argument("--products", default=PRODUCTS_PATH)
+    args = parser.parse_args()
+    if not args.replay:
+        parser.error("nothing to do; pass --replay")
+    service = TrackingService(args.log, DataLayer(args.products, args.orders, poll_seconds=0), poll_seconds=0)
+    events, seconds = service.replay()
+    print(json.dumps(dict(service.stats(), events=events, seconds=round(seconds, 3),
+                          events_per_second=round(events / seconds) if seconds else 0)))
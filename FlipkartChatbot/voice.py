@@ -0,0 +1,559 @@
+# voice.py
+"""Speech in and out for voice conversations.
+
+Input is 16 kHz mono 16-bit little-endian PCM in chunks of any size, e.g.
+20 ms microphone frames sent over chat_api.py's /voice/ws. A Listener runs
+each chunk through the VoiceActivityDetector and feeds the frames inside an
+utterance to a transcriber stream as they arrive, so decoding keeps pace
+with the speaker. Once ``end_silence_ms`` of silence follows speech, the
+stream is finished and the final text is handed over.
+
+Transcribers are pluggable: an engine has a ``name`` and a
+``stream(language)`` returning an object with ``accept(pcm)`` (the partial
+transcript so far, or None) and ``finish()`` (the final text). "vosk"
+decodes incrementally with a local Kaldi model per language; "whisper"
+(faster-whisper) buffers the utterance and decodes it once it ends, which
+is more accurate and slower. Both libraries are optional and only
+imported when their engine is created.
+
+Output is synthesized a sentence at a time while the reply streams:
+SentenceSplitter cuts complete sentences off the streamed text and
+SentenceSpeaker synthesizes them on a thread pool, handing the audio back
+in reply order. Synthesized audio is kept in an AudioCache, addressed by a
+hash of the engine, language and text, so repeated sentences (greetings,
+policy answers) are not synthesized again. Synthesizers are "espeak"
+(the espeak-ng command) and "pyttsx3"; both return WAV bytes. A sentence
+that fails to synthesize comes back without audio (None) and the rest of
+the reply is still spoken.
+"""
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import wave
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+
+from config import (VOICE_STT_ENGINE, VOICE_STT_MODELS, VOICE_TTS_ENGINE, VOICE_TTS_VOICES, VOICE_AUDIO_CACHE_DIR,
+                    VOICE_END_SILENCE_MS, VOICE_TTS_WORKERS)
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2
+FRAME_MS = 30
+# Frames quieter than this are never speech, whatever the noise floor
+MIN_SPEECH_DBFS = -50.0
+# Longest utterance before it is cut off and transcribed
+MAX_UTTERANCE_MS = 30000
+# A sentence still open after this many characters is cut at its last comma or space
+MAX_SENTENCE_CHARS = 220
+
+_SENTENCE_END = re.compile(r'[.!?।]+["\')\]]*(?=\s)|\n+')
+# Words whose trailing full stop doesn't end a sentence
+_ABBREVIATIONS = {"rs", "mr", "mrs", "ms", "dr", "no", "st", "approx", "etc", "vs", "e.g", "i.e", "inr"}
+_MARKDOWN = [
+    (re.compile(r'\[([^\]]*)\]\([^)]*\)'), r'\1'),
+    (re.compile(r'[*_`#>|]+'), ''),
+    (re.compile(r'^\s*[-•]\s+', re.MULTILINE), ''),
+    (re.compile(r'\s+'), ' '),
+]
+
+
+def read_wav(data):
+    """PCM frames of a 16 kHz mono 16-bit WAV file (bytes or path)"""
+    with wave.open(io.BytesIO(data) if isinstance(data, bytes) else data, "rb") as f:
+        if (f.getframerate(), f.getnchannels(), f.getsampwidth()) != (SAMPLE_RATE, 1, SAMPLE_WIDTH):
+            raise ValueError(f"expected {SAMPLE_RATE} Hz mono 16-bit audio, got {f.getframerate()} Hz, "
+                             f"{f.getnchannels()} channels, {8 * f.getsampwidth()}-bit")
+        return f.readframes(f.getnframes())
+
+
+def wav_bytes(pcm, sample_rate=SAMPLE_RATE):
+    """16-bit mono PCM wrapped in a WAV header"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(SAMPLE_WIDTH)
+        f.setframerate(sample_rate)
+        f.writeframes(pcm)
+    return buffer.getvalue()
+
+
+def frame_dbfs(frame):
+    """RMS level of a PCM frame in dB below full scale"""
+    samples = np.frombuffer(frame, dtype="<i2").astype(np.float32)
+    rms = float(np.sqrt(np.mean(samples * samples))) if len(samples) else 0.0
+    return 20 * np.log10(max(rms, 1.0) / 32768)
+
+
+def speakable(text):
+    """Reply text with the markdown a voice would read out removed"""
+    for pattern, replacement in _MARKDOWN:
+        text = pattern.sub(replacement, text)
+    return text.strip()
+
+
+class VoiceActivityDetector:
+    """Energy-based speech detection against an adaptive noise floor.
+
+    ``push`` takes PCM of any length and returns events: ("start", pcm)
+    when speech begins, carrying the ``preroll_ms`` before it, ("audio",
+    pcm) for each frame inside the utterance, and ("end", trailing silence
+    in ms) once ``end_silence_ms`` of silence follows it. A frame is speech
+    when it is ``margin_db`` above the noise floor, which follows the level
+    of non-speech frames; ``min_speech_ms`` of speech starts an utterance.
+    """
+
+    def __init__(self, sample_rate=SAMPLE_RATE, frame_ms=FRAME_MS, margin_db=12.0, min_speech_ms=90,
+                 end_silence_ms=VOICE_END_SILENCE_MS, preroll_ms=300):
+        self.frame_bytes = sample_rate * frame_ms // 1000 * SAMPLE_WIDTH
+        self.frame_ms = frame_ms
+        self.margin_db = margin_db
+        self.start_frames = max(1, min_speech_ms // frame_ms)
+        self.end_frames = max(1, end_silence_ms // frame_ms)
+        self.max_frames = MAX_UTTERANCE_MS // frame_ms
+        self.noise_floor = None
+        self.in_speech = False
+        self._pending = b""
+        self._preroll = deque(maxlen=max(self.start_frames, preroll_ms // frame_ms))
+        self._voiced_run = 0
+        self._silent_run = 0
+        self._utterance_frames = 0
+
+    def _is_speech(self, level):
+        if self.noise_floor is None:
+            self.noise_floor = level
+        speech = level > max(self.noise_floor + self.margin_db, MIN_SPEECH_DBFS)
+        if not speech:
+            # Falls at once, rises slowly, so speech doesn't drag the floor up
+            self.noise_floor = level if level < self.noise_floor else 0.95 * self.noise_floor + 0.05 * level
+        return speech
+
+    def push(self, pcm):
+        events = []
+        data = self._pending + pcm
+        usable = len(data) - len(data) % self.frame_bytes
+        self._pending = data[usable:]
+        for offset in range(0, usable, self.frame_bytes):
+            frame = data[offset:offset + self.frame_bytes]
+            speech = self._is_speech(frame_dbfs(frame))
+            if not self.in_speech:
+                self._preroll.append(frame)
+                self._voiced_run = self._voiced_run + 1 if speech else 0
+                if self._voiced_run >= self.start_frames:
+                    self.in_speech = True
+                    self._silent_run = 0
+                    self._utterance_frames = len(self._preroll)
+                    events.append(("start", b"".join(self._preroll)))
+                    self._preroll.clear()
+                continue
+            events.append(("audio", frame))
+            self._utterance_frames += 1
+            self._silent_run = 0 if speech else self._silent_run + 1
+            if self._silent_run >= self.end_frames or self._utterance_frames >= self.max_frames:
+                events.append(("end", self._silent_run * self.frame_ms))
+                self.in_speech = False
+                self._voiced_run = 0
+        return events
+
+    def flush(self):
+        """End an utterance still open when the audio stops"""
+        if not self.in_speech:
+            return []
+        self.in_speech = False
+        self._voiced_run = 0
+        return [("end", self._silent_run * self.frame_ms)]
+
+
+@dataclass
+class Utterance:
+    text: str
+    language: str
+    # Speech length, and silence heard after it before the end was detected
+    speech_ms: int
+    trailing_silence_ms: int
+    # time.perf_counter() when the final transcript was ready
+    transcribed_at: float
+
+
+class Listener:
+    """VoiceActivityDetector plus a transcriber stream per utterance, for one audio stream"""
+
+    def __init__(self, transcriber, language, vad=None):
+        self.transcriber = transcriber
+        self.language = language
+        self.vad = vad or VoiceActivityDetector()
+        self._stream = None
+        self._speech_bytes = 0
+        self._partial = None
+
+    def push(self, pcm):
+        """Events for a chunk of PCM: ("partial", text) while speaking, ("final", Utterance) at the end"""
+        return self._handle(self.vad.push(pcm))
+
+    def finish(self):
+        """Events for the end of the audio, closing an utterance still open"""
+        return self._handle(self.vad.flush())
+
+    def _handle(self, vad_events):
+        events = []
+        for kind, value in vad_events:
+            if kind == "start":
+                self._stream = self.transcriber.stream(self.language)
+                self._speech_bytes, self._partial = 0, None
+            if kind in ("start", "audio"):
+                self._speech_bytes += len(value)
+                partial = self._stream.accept(value)
+                if partial and partial != self._partial:
+                    self._partial = partial
+                    events.append(("partial", partial))
+            elif kind == "end":
+                text = self._stream.finish().strip()
+                self._stream = None
+                speech_ms = self._speech_bytes * 1000 // (SAMPLE_RATE * SAMPLE_WIDTH) - value
+                events.append(("final", Utterance(text, self.language, speech_ms, value, time.perf_counter())))
+        return events
+
+
+class _VoskStream:
+    def __init__(self, recognizer):
+        self.recognizer = recognizer
+        self.segments = []
+
+    def accept(self, pcm):
+        if self.recognizer.AcceptWaveform(pcm):
+            self.segments.append(json.loads(self.recognizer.Result()).get("text", ""))
+            partial = ""
+        else:
+            partial = json.loads(self.recognizer.PartialResult()).get("partial", "")
+        return " ".join(s for s in self.segments + [partial] if s) or None
+
+    def finish(self):
+        self.segments.append(json.loads(self.recognizer.FinalResult()).get("text", ""))
+        return " ".join(s for s in self.segments if s)
+
+
+class VoskTranscriber:
+    """Incremental decoding with a local Vosk (Kaldi) model directory per language"""
+    name = "vosk"
+
+    def __init__(self, models):
+        try:
+            import vosk
+        except ImportError:
+            raise RuntimeError("the vosk speech engine is not installed (pip install vosk)") from None
+        vosk.SetLogLevel(-1)
+        self._vosk = vosk
+        self.model_paths = dict(models)
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def _model(self, language):
+        path = self.model_paths.get(language) or self.model_paths.get("en")
+        with self._lock:
+            model = self._models.get(path)
+            if model is None:
+                if not path or not os.path.isdir(path):
+                    raise RuntimeError(f"no Vosk model for {language!r} at {path!r}")
+                model = self._models[path] = self._vosk.Model(path)
+            return model
+
+    def stream(self, language):
+        return _VoskStream(self._vosk.KaldiRecognizer(self._model(language), SAMPLE_RATE))
+
+
+class _WhisperStream:
+    def __init__(self, model, language):
+        self.model = model
+        self.language = language
+        self.chunks = []
+
+    def accept(self, pcm):
+        self.chunks.append(pcm)
+        return None
+
+    def finish(self):
+        audio = np.frombuffer(b"".join(self.chunks), dtype="<i2").astype(np.float32) / 32768
+        segments, _ = self.model.transcribe(audio, language=self.language, beam_size=1)
+        return " ".join(segment.text.strip() for segment in segments)
+
+
+class WhisperTranscriber:
+    """faster-whisper; ``models`` maps a language to a model size or path (one multilingual model serves both)"""
+    name = "whisper"
+
+    def __init__(self, models, device="cpu", compute_type="int8"):
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError:
+            raise RuntimeError("the whisper speech engine is not installed (pip install faster-whisper)") from None
+        self._whisper_model = WhisperModel
+        self.model_names = dict(models)
+        self.device = device
+        self.compute_type = compute_type
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def stream(self, language):
+        name = self.model_names.get(language) or self.model_names.get("en") or "small"
+        with self._lock:
+            model = self._models.get(name)
+            if model is None:
+                model = self._models[name] = self._whisper_model(name, device=self.device,
+                                                                 compute_type=self.compute_type)
+        return _WhisperStream(model, language)
+
+
+class EspeakSynthesizer:
+    """The espeak-ng command line synthesizer; ``voices`` maps a language to an espeak voice"""
+    name = "espeak"
+
+    def __init__(self, voices, words_per_minute=165):
+        self.binary = shutil.which("espeak-ng") or shutil.which("espeak")
+        if self.binary is None:
+            raise RuntimeError("espeak-ng is not installed")
+        self.voices = dict(voices)
+        self.words_per_minute = words_per_minute
+
+    def synthesize(self, text, language):
+        voice = self.voices.get(language) or self.voices.get("en", "en")
+        # On stdin, so a reply starting with "-" can't be read as an option
+        return subprocess.run([self.binary, "--stdout", "--stdin", "-v", voice, "-s", str(self.words_per_minute)],
+                              input=text.encode("utf-8"), capture_output=True, check=True).stdout
+
+
+class Pyttsx3Synthesizer:
+    """pyttsx3 (the platform's speech engine); calls are serialized because the engine isn't thread-safe"""
+    name = "pyttsx3"
+
+    def __init__(self, voices):
+        try:
+            import pyttsx3
+        except ImportError:
+            raise RuntimeError("pyttsx3 is not installed (pip install pyttsx3)") from None
+        self.engine = pyttsx3.init()
+        self.voices = dict(voices)
+        self._voice_ids = {voice.id for voice in self.engine.getProperty("voices")}
+        self._lock = threading.Lock()
+
+    def synthesize(self, text, language):
+        voice = self.voices.get(language)
+        with self._lock, tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "speech.wav")
+            if voice in self._voice_ids:
+                self.engine.setProperty("voice", voice)
+            self.engine.save_to_file(text, path)
+            self.engine.runAndWait()
+            with open(path, "rb") as f:
+                return f.read()
+
+
+TRANSCRIBERS = {"vosk": VoskTranscriber, "whisper": WhisperTranscriber}
+SYNTHESIZERS = {"espeak": EspeakSynthesizer, "pyttsx3": Pyttsx3Synthesizer}
+
+
+class AudioCache:
+    """Content-addressed synthesized audio: an in-memory LRU in front of one file per key under ``directory``"""
+
+    def __init__(self, directory=None, max_memory_entries=256):
+        self.directory = directory
+        self.max_memory_entries = max_memory_entries
+        self.metrics = Counter()
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(engine, language, text):
+        material = json.dumps([engine, language, speakable(text)], ensure_ascii=False)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".wav")
+
+    def get(self, key):
+        with self._lock:
+            audio = self._memory.get(key)
+            if audio is not None:
+                self._memory.move_to_end(key)
+                self.metrics["hits"] += 1
+                return audio
+        if self.directory:
+            try:
+                with open(self._path(key), "rb") as f:
+                    audio = f.read()
+            except FileNotFoundError:
+                pass
+            else:
+                self._remember(key, audio)
+                with self._lock:
+                    self.metrics["hits"] += 1
+                    self.metrics["disk_hits"] += 1
+                return audio
+        with self._lock:
+            self.metrics["misses"] += 1
+        return None
+
+    def put(self, key, audio):
+        self._remember(key, audio)
+        if self.directory:
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Written under a temporary name and renamed, so readers never see half a file
+            fd, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(audio)
+            os.replace(temporary, path)
+        with self._lock:
+            self.metrics["bytes_written"] += len(audio)
+
+    def _remember(self, key, audio):
+        with self._lock:
+            self._memory[key] = audio
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.metrics["hits"] + self.metrics["misses"]
+            return dict(self.metrics, entries=len(self._memory),
+                        hit_rate=self.metrics["hits"] / lookups if lookups else 0.0)
+
+
+class SentenceSplitter:
+    """Cuts complete sentences off streamed reply text"""
+
+    def __init__(self):
+        self._buffer = ""
+
+    def feed(self, text):
+        """Sentences completed by ``text``"""
+        self._buffer += text
+        sentences = []
+        start = 0
+        for match in _SENTENCE_END.finditer(self._buffer):
+            words = self._buffer[start:match.start()].split()
+            last = words[-1].lower() if words else ""
+            if match.group().startswith(".") and (last in _ABBREVIATIONS or (len(last) == 1 and last.isalpha()) or
+                                                  (last.isdigit() and len(words) == 1)):
+                # "Rs. 499", "2. Open the order", "A. K. Singh"
+                continue
+            sentences.append(self._buffer[start:match.end()])
+            start = match.end()
+        self._buffer = self._buffer[start:]
+        if len(self._buffer) > MAX_SENTENCE_CHARS:
+            cut = max(self._buffer.rfind(", ", 0, MAX_SENTENCE_CHARS), self._buffer.rfind(" ", 0, MAX_SENTENCE_CHARS))
+            if cut > 0:
+                sentences.append(self._buffer[:cut + 1])
+                self._buffer = self._buffer[cut + 1:]
+        return [sentence for sentence in map(speakable, sentences) if sentence]
+
+    def flush(self):
+        rest, self._buffer = speakable(self._buffer), ""
+        return [rest] if rest else []
+
+
+class SentenceSpeaker:
+    """Synthesizes one streamed reply a sentence at a time; audio comes back in reply order"""
+
+    def __init__(self, voice, language):
+        self.voice = voice
+        self.language = language
+        self.splitter = SentenceSplitter()
+        self.pending = deque()
+        self.count = 0
+
+    def _submit(self, sentences):
+        for sentence in sentences:
+            self.pending.append((self.count, sentence, self.voice.executor.submit(
+                self.voice.synthesize, sentence, self.language)))
+            self.count += 1
+
+    def feed(self, text):
+        self._submit(self.splitter.feed(text))
+
+    def close(self):
+        """Queue the unfinished last sentence"""
+        self._submit(self.splitter.flush())
+
+    def ready(self):
+        """(index, sentence, audio) for each sentence synthesized so far, in order, without waiting.
+
+        ``audio`` is None for a sentence whose synthesis failed.
+        """
+        done = []
+        while self.pending and self.pending[0][2].done():
+            index, sentence, future = self.pending.popleft()
+            done.append((index, sentence, None if future.exception() is not None else future.result()))
+        return done
+
+    def remaining(self):
+        """(index, sentence, future) for the sentences not yet returned by ``ready``"""
+        while self.pending:
+            yield self.pending.popleft()
+
+
+class Voice:
+    """Transcriber, synthesizer and audio cache shared by a process's voice conversations"""
+
+    def __init__(self, transcriber, synthesizer, cache, workers=VOICE_TTS_WORKERS,
+                 end_silence_ms=VOICE_END_SILENCE_MS):
+        self.transcriber = transcriber
+        self.synthesizer = synthesizer
+        self.cache = cache
+        self.end_silence_ms = end_silence_ms
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tts")
+        self.metrics = Counter()
+        self._lock = threading.Lock()
+
+    def listener(self, language):
+        return Listener(self.transcriber, language, VoiceActivityDetector(end_silence_ms=self.end_silence_ms))
+
+    def speaker(self, language):
+        return SentenceSpeaker(self, language)
+
+    def synthesize(self, text, language):
+        """WAV audio for ``text``, from the cache when it has been synthesized before"""
+        key = AudioCache.key(self.synthesizer.name, language, text)
+        audio = self.cache.get(key)
+        if audio is None:
+            started = time.perf_counter()
+            try:
+                audio = self.synthesizer.synthesize(speakable(text), language)
+            except Exception:
+                with self._lock:
+                    self.metrics["synthesis_errors"] += 1
+                logger.exception("could not synthesize %r", text[:80])
+                raise
+            with self._lock:
+                self.metrics["synthesized"] += 1
+                self.metrics["synthesis_seconds"] += time.perf_counter() - started
+            self.cache.put(key, audio)
+        return audio
+
+    def stats(self):
+        with self._lock:
+            metrics = dict(self.metrics)
+        return {"transcriber": self.transcriber.name, "synthesizer": self.synthesizer.name,
+                **metrics, "cache": self.cache.stats()}
+
+
+def create_voice():
+    """Voice configured from config.py; raises RuntimeError when an engine isn't installed"""
+    if VOICE_STT_ENGINE not in TRANSCRIBERS:
+        raise ValueError(f"unknown speech-to-text engine {VOICE_STT_ENGINE!r}; expected one of {sorted(TRANSCRIBERS)}")
+    if VOICE_TTS_ENGINE not in SYNTHESIZERS:
+        raise ValueError(f"unknown text-to-speech engine {VOICE_TTS_ENGINE!r}; expected one of {sorted(SYNTHESIZERS)}")
+    return Voice(TRANSCRIBERS[VOICE_STT_ENGINE](VOICE_STT_MODELS), SYNTHESIZERS[VOICE_TTS_ENGINE](VOICE_TTS_VOICES),
+                 AudioCache(VOICE_AUDIO_CACHE_DIR or None))